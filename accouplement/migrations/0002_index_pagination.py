@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accouplement', '0001_initial'),
+        ('troupeau', '0004_message_boucle_active'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='accouplement',
+            name='accouplemen_date_de_bd66d7_idx',
+        ),
+        migrations.AddIndex(
+            model_name='accouplement',
+            index=models.Index(fields=['date_debut_lutte', 'id'], name='accouplemen_date_de_059acf_idx'),
+        ),
+    ]
@@ -36,7 +36,7 @@ class Accouplement(models.Model):
         indexes = [
             models.Index(fields=['boucle_brebis']),
             models.Index(fields=['boucle_belier']),
-            models.Index(fields=['date_debut_lutte']),
+            models.Index(fields=['date_debut_lutte', 'id']),  # tri des listes (pagination par curseur)
         ]
         # Évite les doublons exacts pour un même couple à une même date
         constraints = [
@@ -0,0 +1,313 @@
+# accouplement/planification.py
+"""
+Planification d'une campagne de lutte.
+
+1. Sélection ensembliste (une requête chacune) des brebis éligibles et des
+   béliers disponibles à la date cible, avec les mêmes règles que
+   Accouplement.clean() : âges, repos de 213 jours (brebis) et de 28 jours
+   (bélier), pas de gestation confirmée en cours.
+2. Matrice F attendu bélier × brebis (troupeau.stock_parente.matrice_parente :
+   stock partagé sur disque, sinon calcul direct).
+3. Affectation brebis → bélier minimisant la consanguinité totale sous
+   contrainte de capacité par bélier : flot de coût minimum par plus courts
+   chemins successifs (Dijkstra avec potentiels) sur le graphe des béliers.
+4. Enregistrement du plan en un seul bulk_create transactionnel.
+"""
+import logging
+import math
+from datetime import date, timedelta
+from heapq import heapify, heappop, heappush
+
+from django.db import transaction
+
+from gestation.models import GESTATION_DUREE_JOURS, Gestation
+from pahou.pagination import invalider
+from troupeau.models import Troupeau
+
+from .models import Accouplement
+
+logger = logging.getLogger(__name__)
+
+# Mêmes seuils que Accouplement.clean()
+AGE_MIN_BREBIS_MOIS = 10
+AGE_MIN_BELIER_MOIS = 8
+AGE_MAX_BELIER_MOIS = 60
+REPOS_BREBIS_JOURS = 213
+REPOS_BELIER_JOURS = 28
+JOURS_PAR_MOIS = 30.44
+
+CAPACITE_PAR_DEFAUT = 40
+
+# Les coûts sont des entiers (F × 100 000) pour des potentiels exacts
+ECHELLE = 100_000
+# Coût d'une brebis laissée sans bélier : toujours plus cher que n'importe quel couple
+COUT_NON_AFFECTEE = 10 * ECHELLE
+# Couple interdit (F au-dessus du seuil) : plus cher que de laisser la brebis sans bélier
+COUT_INTERDIT = 2 * COUT_NON_AFFECTEE
+
+
+def _jours(mois):
+    """Nombre minimal de jours pour atteindre `mois` (âge = jours / 30.44)."""
+    return math.ceil(mois * JOURS_PAR_MOIS)
+
+
+# =========================
+# Sélection des candidats
+# =========================
+
+def _candidats(sexe, race=None, proprietaire=None):
+    qs = Troupeau.objects.filter(sexe=sexe, boucle_active=True)
+    if race:
+        qs = qs.filter(race=race)
+    if proprietaire:
+        qs = qs.filter(proprietaire_ovin=proprietaire)
+    return qs
+
+
+def brebis_eligibles(date_cible, race=None, proprietaire=None):
+    """
+    Femelles actives d'au moins 10 mois, sans accouplement depuis moins de
+    213 jours (ni prévu après la date cible) et sans gestation confirmée en
+    cours (date de gestation + durée de gestation après la date cible).
+    Une date de naissance inconnue n'exclut pas l'animal (comme clean()).
+    """
+    recentes = Accouplement.objects.filter(
+        date_debut_lutte__gt=date_cible - timedelta(days=REPOS_BREBIS_JOURS)
+    ).values("boucle_brebis_id")
+    gestantes = Gestation.objects.filter(
+        etat_gestation="Confirmée",
+        date_gestation__gt=date_cible - timedelta(days=GESTATION_DUREE_JOURS),
+    ).values("boucle_brebis_id")
+
+    return (
+        _candidats("femelle", race, proprietaire)
+        .exclude(naissance_date__gt=date_cible - timedelta(days=_jours(AGE_MIN_BREBIS_MOIS)))
+        .exclude(pk__in=recentes)
+        .exclude(pk__in=gestantes)
+        .order_by("boucle_ovin")
+    )
+
+
+def beliers_disponibles(date_cible, race=None, proprietaire=None):
+    """
+    Mâles actifs de 8 mois à moins de 60 mois, sans campagne commencée
+    depuis moins de 28 jours (ni prévue après la date cible).
+    """
+    recents = Accouplement.objects.filter(
+        date_debut_lutte__gt=date_cible - timedelta(days=REPOS_BELIER_JOURS)
+    ).values("boucle_belier_id")
+
+    return (
+        _candidats("male", race, proprietaire)
+        .exclude(naissance_date__gt=date_cible - timedelta(days=_jours(AGE_MIN_BELIER_MOIS)))
+        .exclude(naissance_date__lte=date_cible - timedelta(days=_jours(AGE_MAX_BELIER_MOIS)))
+        .exclude(pk__in=recents)
+        .order_by("boucle_ovin")
+    )
+
+
+# =========================
+# Affectation (flot de coût minimum)
+# =========================
+
+def affecter(couts, capacites):
+    """
+    Affecte chaque brebis e à un bélier r (couts[e][r], entiers) en respectant
+    capacites[r], en minimisant d'abord le nombre de brebis non affectées puis
+    le coût total. Retourne une liste : indice du bélier ou None.
+
+    Plus courts chemins successifs, une brebis à la fois : un chemin part de
+    la brebis vers un bélier b1 ; si b1 est plein, une brebis de b1 glisse vers
+    b2, etc., jusqu'à un bélier ayant de la place. Le graphe ne contient que
+    les béliers (+ un nœud « non affectée » de capacité illimitée) ; le coût de
+    l'arc a → b est le meilleur c[x][b] - c[x][a] parmi les brebis x de a, tenu
+    dans un tas par couple (a, b). Dijkstra avec potentiels, arrêt au premier
+    bélier libre : O(R²) par brebis au pire, O(R) quand la place ne manque pas.
+    """
+    n_beliers = len(capacites)
+    R = n_beliers + 1  # dernier nœud : « non affectée »
+    libre = list(capacites) + [len(couts)]
+    potentiel = [0] * R
+    affectation = [None] * len(couts)
+    membres = [[] for _r in range(R)]
+    # Tas des arcs sortants, construits seulement quand le bélier devient plein
+    # (un bélier libre, comme le nœud « non affectée », n'est jamais traversé)
+    tas = [None] * R
+
+    def cout(e, r):
+        return couts[e][r] if r < n_beliers else COUT_NON_AFFECTEE
+
+    def entrees(e, r):
+        base = cout(e, r)
+        return [(b, (cout(e, b) - base, e)) for b in range(R) if b != r]
+
+    def placer(e, r):
+        affectation[e] = r
+        membres[r].append(e)
+        if tas[r] is not None:
+            for b, entree in entrees(e, r):
+                heappush(tas[r][b], entree)
+
+    def remplir(r):
+        tas[r] = [[] for _b in range(R)]
+        for e in membres[r]:
+            if affectation[e] == r:
+                for b, entree in entrees(e, r):
+                    tas[r][b].append(entree)
+        for h in tas[r]:
+            heapify(h)
+
+    def meilleur_arc(a, b):
+        h = tas[a][b]
+        # Suppression paresseuse des brebis qui ont quitté a
+        while h and affectation[h[0][1]] != a:
+            heappop(h)
+        return h[0] if h else None
+
+    for r in range(R):
+        if not libre[r]:
+            remplir(r)
+
+    for e in range(len(couts)):
+        dist = [cout(e, r) - potentiel[r] for r in range(R)]
+        precedent = [None] * R
+        via = [None] * R
+        restants = set(range(R))
+        while True:
+            # À distance égale, un bélier libre termine la recherche tout de suite
+            a = min(restants, key=lambda r: (dist[r], not libre[r]))
+            restants.discard(a)
+            if libre[a] > 0:
+                cible = a
+                break
+            for b in restants:
+                arc = meilleur_arc(a, b)
+                if arc is None:
+                    continue
+                d = dist[a] + arc[0] + potentiel[a] - potentiel[b]
+                if d < dist[b]:
+                    dist[b], precedent[b], via[b] = d, a, arc[1]
+
+        borne = dist[cible]
+        for r in range(R):
+            potentiel[r] += min(dist[r], borne)
+
+        libre[cible] -= 1
+        if not libre[cible]:
+            remplir(cible)
+        b = cible
+        while precedent[b] is not None:
+            a = precedent[b]
+            placer(via[b], b)
+            b = a
+        placer(e, b)
+
+    return [r if r is not None and r < n_beliers else None for r in affectation]
+
+
+# =========================
+# Plan complet
+# =========================
+
+def planifier_saillies(date_cible, capacite=CAPACITE_PAR_DEFAUT, race=None, proprietaire=None, seuil=None):
+    """
+    Calcule le plan de lutte à `date_cible`.
+    `seuil` (0..1, optionnel) : F attendu au-delà duquel un couple est interdit.
+
+    Retourne un dict :
+      couples        [(brebis, belier, F)] triés par bélier puis brebis ;
+      non_affectees  [brebis] ;
+      beliers        [(belier, nb brebis)] ;
+      f_moyen, f_max ; nb_brebis, nb_beliers.
+    """
+    from troupeau.stock_parente import matrice_parente
+
+    champs = ("id", "boucle_ovin", "race", "naissance_date")
+    brebis = list(brebis_eligibles(date_cible, race, proprietaire).only(*champs))
+    beliers = list(beliers_disponibles(date_cible, race, proprietaire).only(*champs))
+
+    ids_beliers = [b.pk for b in beliers]
+    ids_brebis = [b.pk for b in brebis]
+    matrice = matrice_parente(ids_beliers, ids_brebis)
+
+    # couts[e][r] : matrice transposée (brebis × béliers), en entiers
+    couts = [
+        [
+            COUT_INTERDIT if seuil is not None and matrice[r][e] > seuil else round(matrice[r][e] * ECHELLE)
+            for r in range(len(beliers))
+        ]
+        for e in range(len(brebis))
+    ]
+    affectation = affecter(couts, [capacite] * len(beliers)) if beliers else [None] * len(brebis)
+
+    couples, non_affectees = [], []
+    charge = [0] * len(beliers)
+    for e, r in enumerate(affectation):
+        if r is None:
+            non_affectees.append(brebis[e])
+        else:
+            couples.append((brebis[e], beliers[r], matrice[r][e]))
+            charge[r] += 1
+    couples.sort(key=lambda c: (c[1].boucle_ovin, c[0].boucle_ovin))
+
+    coefficients = [f for _b, _r, f in couples]
+    return {
+        "date_cible": date_cible,
+        "couples": couples,
+        "non_affectees": non_affectees,
+        "beliers": list(zip(beliers, charge)),
+        "f_moyen": sum(coefficients) / len(coefficients) if coefficients else 0.0,
+        "f_max": max(coefficients) if coefficients else 0.0,
+        "nb_brebis": len(brebis),
+        "nb_beliers": len(beliers),
+    }
+
+
+def enregistrer_plan(plan):
+    """
+    Crée les Accouplement du plan en un seul bulk_create (totaux en cache de
+    la liste invalidés au commit). Les règles de clean() sont revérifiées de façon ensembliste dans la
+    transaction (un animal devenu inéligible entre-temps annule tout).
+    Retourne le nombre d'accouplements créés.
+    """
+    date_cible = plan["date_cible"]
+    if date_cible > date.today():
+        raise ValueError("La date de début de lutte ne peut pas être dans le futur.")
+    if not plan["couples"]:
+        return 0
+
+    ids_brebis = {b.pk for b, _r, _f in plan["couples"]}
+    ids_beliers = {r.pk for _b, r, _f in plan["couples"]}
+
+    with transaction.atomic():
+        # Verrouille les lignes candidates (PostgreSQL) pour la durée de la vérification
+        brebis_ok = set(
+            brebis_eligibles(date_cible).filter(pk__in=ids_brebis)
+            .select_for_update().values_list("pk", flat=True)
+        )
+        beliers_ok = set(
+            beliers_disponibles(date_cible).filter(pk__in=ids_beliers)
+            .select_for_update().values_list("pk", flat=True)
+        )
+        refuses = (ids_brebis - brebis_ok) | (ids_beliers - beliers_ok)
+        if refuses:
+            boucles = Troupeau.objects.filter(pk__in=refuses).values_list("boucle_ovin", flat=True)
+            raise ValueError(
+                "Animaux devenus inéligibles depuis le calcul du plan : " + ", ".join(sorted(boucles))
+            )
+
+        observations = f"Plan de lutte du {date_cible.strftime('%d/%m/%Y')}"
+        crees = Accouplement.objects.bulk_create([
+            Accouplement(
+                boucle_brebis_id=b.pk,
+                boucle_belier_id=r.pk,
+                date_debut_lutte=date_cible,
+                observations=f"{observations} (F attendu {f * 100:.2f}%)",
+            )
+            for b, r, f in plan["couples"]
+        ], batch_size=500)
+        # bulk_create n'envoie pas post_save : totaux de la liste périmés à la main
+        transaction.on_commit(lambda: invalider(Accouplement))
+
+    logger.info("[Accouplement] Plan de lutte du %s : %s accouplements créés", date_cible, len(crees))
+    return len(crees)
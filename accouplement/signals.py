@@ -4,6 +4,7 @@ from django.dispatch import receiver
 import logging
 
 from .models import Accouplement
+from pahou.pagination import suivre_modifications
 
 logger = logging.getLogger(__name__)
 
@@ -66,3 +67,7 @@ def accouplement_post_save(sender, instance: Accouplement, created: bool, **kwar
             "[Incohérence] Gestation avant vérification pour %s.",
             instance,
         )
+
+
+# Totaux en cache des listes paginées (pahou/pagination.py)
+suivre_modifications(Accouplement)
@@ -1,3 +1,126 @@
-from django.test import TestCase
+import itertools
+import random
+import tempfile
+from datetime import date, timedelta
 
-# Create your tests here.
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from gestation.models import Gestation
+from troupeau.tests import CACHE_TEST, creer_animal
+
+from .models import Accouplement
+from .planification import (
+    COUT_INTERDIT, affecter, beliers_disponibles, brebis_eligibles, enregistrer_plan, planifier_saillies,
+)
+
+DATE_CIBLE = date(2024, 6, 1)
+
+
+def ne_il_y_a(jours):
+    return DATE_CIBLE - timedelta(days=jours)
+
+
+class AffectationTests(SimpleTestCase):
+
+    def verifier_optimal(self, couts, capacites):
+        """Comparaison avec l'énumération de toutes les affectations (petites instances)."""
+        affectation = affecter(couts, capacites)
+        for r, capacite in enumerate(capacites):
+            self.assertLessEqual(affectation.count(r), capacite)
+
+        def valeur(choix):
+            return (choix.count(None), sum(couts[e][r] for e, r in enumerate(choix) if r is not None))
+
+        possibles = [
+            choix for choix in itertools.product([*range(len(capacites)), None], repeat=len(couts))
+            if all(choix.count(r) <= capacite for r, capacite in enumerate(capacites))
+        ]
+        self.assertEqual(valeur(affectation), min(valeur(choix) for choix in possibles))
+
+    def test_optimal_sous_capacite(self):
+        hasard = random.Random(7)
+        for _essai in range(40):
+            n_brebis, n_beliers = hasard.randint(1, 6), hasard.randint(1, 3)
+            couts = [[hasard.choice([0, 3125, 6250, 12500, 25000]) for _r in range(n_beliers)]
+                     for _e in range(n_brebis)]
+            capacites = [hasard.randint(0, 3) for _r in range(n_beliers)]
+            with self.subTest(couts=couts, capacites=capacites):
+                self.verifier_optimal(couts, capacites)
+
+    def test_glissement_vers_un_autre_belier(self):
+        # La brebis 1 ne peut aller qu'au bélier 0 : la brebis 0 doit lui laisser la place
+        self.assertEqual(affecter([[0, 100], [0, COUT_INTERDIT]], [1, 1]), [1, 0])
+
+    def test_couple_interdit_laisse_la_brebis_sans_belier(self):
+        self.assertEqual(affecter([[COUT_INTERDIT], [0]], [2]), [None, 0])
+        self.assertEqual(affecter([[0], [0], [0]], [2]).count(None), 1)
+
+
+@override_settings(CACHES=CACHE_TEST, PARENTE_STOCK_DIR=tempfile.mkdtemp(prefix='parente-tests-'))
+class PlanificationTests(TransactionTestCase):
+
+    def setUp(self):
+        self.pere = creer_animal('PERE', 'male', naissance_date=ne_il_y_a(1000))
+        self.mere = creer_animal('MERE', 'femelle', naissance_date=ne_il_y_a(1000))
+        self.fille = creer_animal('FILLE', 'femelle', self.pere, self.mere, naissance_date=ne_il_y_a(400))
+        self.belier = creer_animal('BELIER', 'male', naissance_date=ne_il_y_a(400))
+
+    def boucles(self, qs):
+        return list(qs.values_list('boucle_ovin', flat=True))
+
+    def test_regles_d_eligibilite(self):
+        creer_animal('AGNELLE', 'femelle', naissance_date=ne_il_y_a(300))      # moins de 10 mois
+        creer_animal('INCONNUE', 'femelle')                                    # naissance inconnue : gardée
+        vendue = creer_animal('VENDUE', 'femelle', naissance_date=ne_il_y_a(1000))
+        vendue.statut = 'vendu'
+        vendue.save()
+        luttee = creer_animal('LUTTEE', 'femelle', naissance_date=ne_il_y_a(1000))
+        gestante = creer_animal('GESTANTE', 'femelle', naissance_date=ne_il_y_a(1000))
+        creer_animal('AGNEAU', 'male', naissance_date=ne_il_y_a(200))          # moins de 8 mois
+        creer_animal('VIEUX', 'male', naissance_date=ne_il_y_a(1900))          # 60 mois et plus
+        repos = creer_animal('REPOS', 'male', naissance_date=ne_il_y_a(1000))
+        Accouplement.objects.bulk_create([
+            Accouplement(boucle_brebis=luttee, boucle_belier=repos, date_debut_lutte=ne_il_y_a(20)),
+            # Lutte ancienne : ni repos de la brebis (213 j) ni du bélier (28 j)
+            Accouplement(boucle_brebis=self.mere, boucle_belier=self.pere, date_debut_lutte=ne_il_y_a(213)),
+        ])
+        Gestation.objects.bulk_create([
+            Gestation(boucle_brebis=gestante, date_gestation=ne_il_y_a(60),
+                      methode_confirmation='Echographie', etat_gestation='Confirmée'),
+            Gestation(boucle_brebis=self.fille, date_gestation=ne_il_y_a(60),
+                      methode_confirmation='Palpation', etat_gestation='Non Confirmée'),
+        ])
+
+        self.assertEqual(self.boucles(brebis_eligibles(DATE_CIBLE)), ['FILLE', 'INCONNUE', 'MERE'])
+        self.assertEqual(self.boucles(beliers_disponibles(DATE_CIBLE)), ['BELIER', 'PERE'])
+
+    def test_plan_evite_la_consanguinite(self):
+        plan = planifier_saillies(DATE_CIBLE, capacite=1)
+        self.assertEqual(
+            sorted((b.boucle_ovin, r.boucle_ovin, f) for b, r, f in plan['couples']),
+            [('FILLE', 'BELIER', 0.0), ('MERE', 'PERE', 0.0)],
+        )
+        self.assertEqual((plan['f_max'], plan['non_affectees']), (0.0, []))
+
+        # Seuil : sans le bélier étranger, la fille ne peut pas aller à son père
+        self.belier.statut = 'vendu'
+        self.belier.save()
+        plan = planifier_saillies(DATE_CIBLE, capacite=2, seuil=0.2)
+        self.assertEqual([(b.boucle_ovin, r.boucle_ovin) for b, r, _f in plan['couples']], [('MERE', 'PERE')])
+        self.assertEqual([b.boucle_ovin for b in plan['non_affectees']], ['FILLE'])
+
+    def test_enregistrement_revalide_le_plan(self):
+        plan = planifier_saillies(DATE_CIBLE, capacite=1)
+        Accouplement.objects.bulk_create([
+            Accouplement(boucle_brebis=self.fille, boucle_belier=self.belier, date_debut_lutte=ne_il_y_a(5)),
+        ])
+        with self.assertRaisesMessage(ValueError, 'FILLE'):
+            enregistrer_plan(plan)
+        self.assertEqual(Accouplement.objects.count(), 1)
+
+        Accouplement.objects.all().delete()
+        self.assertEqual(enregistrer_plan(plan), 2)
+        self.assertEqual(
+            sorted(Accouplement.objects.values_list('boucle_brebis__boucle_ovin', 'boucle_belier__boucle_ovin')),
+            [('FILLE', 'BELIER'), ('MERE', 'PERE')],
+        )
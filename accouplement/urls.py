@@ -15,6 +15,9 @@ urlpatterns = [
     path("<int:pk>/modifier/", views.AccouplementUpdateView.as_view(), name="modifier"),
     path("<int:pk>/supprimer/", views.AccouplementDeleteView.as_view(), name="supprimer"),
 
+    # Planification de la lutte
+    path("planification/", views.planification_saillies, name="planification"),
+
     # Utilitaires
     path("export/csv/", views.export_accouplements_csv, name="export_csv"),
     path("api/", views.api_accouplements, name="api_list"),
@@ -1,15 +1,17 @@
 # accouplement/views.py
-from datetime import datetime
+from datetime import date, datetime
 
-import csv
 from django.contrib import messages
 from django.db.models import Q, Count
-from django.http import HttpResponse, JsonResponse
-from django.shortcuts import render, get_object_or_404
+from django.http import JsonResponse
+from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse_lazy
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 
 from .models import Accouplement
+from pahou.exports import iterer, reponse_csv
+from pahou.pagination import PaginationCurseurMixin, compter_en_cache, memoriser
+from .planification import CAPACITE_PAR_DEFAUT, enregistrer_plan, planifier_saillies
 from troupeau.models import Troupeau
 
 
@@ -78,7 +80,7 @@ def _filtered_queryset(request):
 # Vues HTML
 # ======================
 
-class AccouplementListView(ListView):
+class AccouplementListView(PaginationCurseurMixin, ListView):
     model = Accouplement
     template_name = "accouplement/liste.html"
     context_object_name = "accouplements"
@@ -90,14 +92,14 @@ class AccouplementListView(ListView):
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         base = _filtered_queryset(self.request)
-        ctx["total"] = base.count()
-        ctx["reussis"] = base.filter(accouplement_reussi=True).count()
-        ctx["en_cours"] = base.filter(accouplement_reussi=False).count()
-        ctx["par_mois"] = (
+        ctx["total"] = compter_en_cache(base)
+        ctx["reussis"] = compter_en_cache(base.filter(accouplement_reussi=True))
+        ctx["en_cours"] = compter_en_cache(base.filter(accouplement_reussi=False))
+        ctx["par_mois"] = memoriser(base, "par_mois", lambda: list(
             base.values("date_debut_lutte__year", "date_debut_lutte__month")
             .annotate(c=Count("id"))
             .order_by("-date_debut_lutte__year", "-date_debut_lutte__month")
-        )
+        ))
         # valeurs de filtres pour le formulaire
         ctx["filters"] = {
             "q": self.request.GET.get("q", ""),
@@ -212,36 +214,94 @@ def dashboard(request):
 
 
 # ======================
-# Export CSV
+# Planification de la lutte
 # ======================
 
-def export_accouplements_csv(request):
-    qs = _filtered_queryset(request)
+def planification_saillies(request):
+    """
+    GET  : aperçu du plan de lutte (brebis éligibles -> béliers disponibles,
+           consanguinité totale minimale sous capacité par bélier).
+    POST : recalcule le même plan et l'enregistre (bulk_create transactionnel).
+    Paramètres : date, capacite, race, proprietaire, seuil (F max en %).
+    """
+    params = request.POST if request.method == "POST" else request.GET
+
+    date_cible = _parse_date(params.get("date")) or date.today()
+    capacite = (params.get("capacite") or "").strip()
+    capacite = int(capacite) if capacite.isdigit() and int(capacite) > 0 else CAPACITE_PAR_DEFAUT
+    race = params.get("race") if params.get("race") in dict(Troupeau.RACE_CHOIX) else None
+    proprietaire = (
+        params.get("proprietaire") if params.get("proprietaire") in dict(Troupeau.PROPRIETAIRE_CHOIX) else None
+    )
+    try:
+        seuil = float(params["seuil"].replace(",", ".")) / 100 if params.get("seuil") else None
+    except ValueError:
+        seuil = None
 
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = 'attachment; filename="accouplements.csv"'
-    writer = csv.writer(response, delimiter=";")
+    plan = planifier_saillies(date_cible, capacite=capacite, race=race, proprietaire=proprietaire, seuil=seuil)
 
-    writer.writerow([
-        "Brebis", "Bélier",
-        "Début lutte", "Fin lutte",
-        "Vérif gestation", "Date gestation",
-        "Réussi", "Observations",
-    ])
+    if request.method == "POST":
+        try:
+            nb = enregistrer_plan(plan)
+        except ValueError as e:
+            messages.error(request, str(e))
+        else:
+            messages.success(request, f"Plan de lutte enregistré : {nb} accouplement(s) créé(s).")
+            return redirect("accouplement:liste")
 
-    for a in qs:
-        writer.writerow([
-            getattr(a.boucle_brebis, "boucle_ovin", ""),
-            getattr(a.boucle_belier, "boucle_ovin", ""),
-            a.date_debut_lutte.isoformat() if a.date_debut_lutte else "",
-            a.date_fin_lutte.isoformat() if a.date_fin_lutte else "",
-            a.date_verification_gestation.isoformat() if a.date_verification_gestation else "",
-            a.date_gestation.isoformat() if a.date_gestation else "",
-            "Oui" if a.accouplement_reussi else "Non",
-            (a.observations or "").replace("\n", " ").strip(),
-        ])
-
-    return response
+    ctx = {
+        "plan": plan,
+        "filters": {
+            "date": date_cible.isoformat(),
+            "capacite": capacite,
+            "race": race or "",
+            "proprietaire": proprietaire or "",
+            "seuil": params.get("seuil", ""),
+        },
+        "race_choices": Troupeau.RACE_CHOIX,
+        "proprietaire_choices": Troupeau.PROPRIETAIRE_CHOIX,
+        "date_future": date_cible > date.today(),
+    }
+    return render(request, "accouplement/planification.html", ctx)
+
+
+# ======================
+# Export CSV
+# ======================
+
+def export_accouplements_csv(request):
+    """Export CSV des accouplements filtrés, en flux (boucles lues par jointure)."""
+    lignes = iterer(
+        _filtered_queryset(request),
+        "boucle_brebis__boucle_ovin", "boucle_belier__boucle_ovin",
+        "date_debut_lutte", "date_fin_lutte",
+        "date_verification_gestation", "date_gestation",
+        "accouplement_reussi", "observations",
+    )
+
+    def formater():
+        for brebis, belier, debut, fin, verification, gestation, reussi, observations in lignes:
+            yield [
+                brebis or "",
+                belier or "",
+                debut.isoformat() if debut else "",
+                fin.isoformat() if fin else "",
+                verification.isoformat() if verification else "",
+                gestation.isoformat() if gestation else "",
+                "Oui" if reussi else "Non",
+                (observations or "").replace("\n", " ").strip(),
+            ]
+
+    return reponse_csv(
+        "accouplements.csv",
+        [
+            "Brebis", "Bélier",
+            "Début lutte", "Fin lutte",
+            "Vérif gestation", "Date gestation",
+            "Réussi", "Observations",
+        ],
+        formater(),
+    )
 
 
 # ======================
@@ -1,6 +1,6 @@
 # alimentation/views.py
 from django.contrib import messages
-from django.db.models import Q, Count, Sum
+from django.db.models import Count, Sum
 from django.urls import reverse_lazy
 from django.utils import timezone
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView
@@ -8,6 +8,7 @@ from django.shortcuts import render
 
 from .models import Alimentation
 from .forms import AlimentationForm
+from recherche.moteur import rechercher
 
 
 class AlimentationListView(ListView):
@@ -29,12 +30,7 @@ class AlimentationListView(ListView):
         )
         q = (self.request.GET.get("q") or "").strip()
         if q:
-            qs = qs.filter(
-                Q(Boucle_Ovin__boucle_ovin__icontains=q) |
-                Q(Observations__icontains=q) |
-                Q(Type_Aliment__icontains=q) |
-                Q(Objectif__icontains=q)
-            )
+            qs = rechercher(qs, q)  # index plein texte, classé par pertinence
         return qs
 
     def get_context_data(self, **kwargs):
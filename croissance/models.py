@@ -2,6 +2,8 @@ from django.db import models
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 
+from pahou.mixins import SuiviModificationsMixin
+
 # Pas d'import direct de Troupeau pour éviter les soucis d'import circulaire
 # On référence la FK sous forme de chaîne : 'troupeau.Troupeau'
 
@@ -19,7 +21,7 @@ EVALUATION_CHOICES = [
 ]
 
 
-class Croissance(models.Model):
+class Croissance(SuiviModificationsMixin, models.Model):
     Boucle_Ovin = models.ForeignKey(
         'troupeau.Troupeau',
         on_delete=models.CASCADE,
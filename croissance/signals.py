@@ -14,47 +14,43 @@ def log_croissance_changes(sender, instance: Croissance, **kwargs):
     la contrainte unique_together et on met à jour l'historique si déjà présent.
     """
     # 1) Pas d'historisation pour une première création ni pour une ligne historique
-    if not instance.pk or instance.est_historique:
+    if not instance.pk or instance._state.adding or instance.est_historique:
         return
 
-    # 2) Récupérer l'état précédent pour comparer
-    try:
-        previous = Croissance.objects.get(pk=instance.pk)
-    except Croissance.DoesNotExist:
-        return
+    # 2) État précédent d'après le cliché pris à la lecture (aucune requête)
+    anciennes_valeurs = instance.get_dirty_fields()
 
     # 3) Déterminer si quelque chose de pertinent a changé
-    changed = any([
-        previous.Poids_Kg != instance.Poids_Kg,
-        previous.Taille_CM != instance.Taille_CM,
-        previous.Etat_Sante != instance.Etat_Sante,
-        previous.Croissance_Evaluation != instance.Croissance_Evaluation,
-    ])
-    if not changed:
+    if anciennes_valeurs.keys().isdisjoint({'Poids_Kg', 'Taille_CM', 'Etat_Sante', 'Croissance_Evaluation'}):
         return
+    previous = {
+        champ: anciennes_valeurs.get(champ, getattr(instance, champ))
+        for champ in ('Date_mesure', 'Poids_Kg', 'Taille_CM', 'Etat_Sante',
+                      'Croissance_Evaluation', 'Age_en_Mois', 'Observations')
+    }
 
     # 4) Créer/mettre à jour l'entrée historique unique pour (Boucle_Ovin, Date_mesure, True)
     hist, created = Croissance.objects.get_or_create(
         Boucle_Ovin=instance.Boucle_Ovin,
-        Date_mesure=previous.Date_mesure,
+        Date_mesure=previous['Date_mesure'],
         est_historique=True,
         defaults={
-            'Poids_Kg': previous.Poids_Kg,
-            'Taille_CM': previous.Taille_CM,
-            'Etat_Sante': previous.Etat_Sante,
-            'Croissance_Evaluation': previous.Croissance_Evaluation,
-            'Age_en_Mois': previous.Age_en_Mois,
-            'Observations': previous.Observations,
+            'Poids_Kg': previous['Poids_Kg'],
+            'Taille_CM': previous['Taille_CM'],
+            'Etat_Sante': previous['Etat_Sante'],
+            'Croissance_Evaluation': previous['Croissance_Evaluation'],
+            'Age_en_Mois': previous['Age_en_Mois'],
+            'Observations': previous['Observations'],
         }
     )
 
     if not created:
         # On écrase le snapshot pour refléter la dernière "ancienne" valeur
         Croissance.objects.filter(pk=hist.pk).update(
-            Poids_Kg=previous.Poids_Kg,
-            Taille_CM=previous.Taille_CM,
-            Etat_Sante=previous.Etat_Sante,
-            Croissance_Evaluation=previous.Croissance_Evaluation,
-            Age_en_Mois=previous.Age_en_Mois,
-            Observations=previous.Observations,
+            Poids_Kg=previous['Poids_Kg'],
+            Taille_CM=previous['Taille_CM'],
+            Etat_Sante=previous['Etat_Sante'],
+            Croissance_Evaluation=previous['Croissance_Evaluation'],
+            Age_en_Mois=previous['Age_en_Mois'],
+            Observations=previous['Observations'],
         )
@@ -1,3 +1,56 @@
+from datetime import date
+
 from django.test import TestCase
 
-# Create your tests here.
+from troupeau.models import Troupeau
+
+from .models import Croissance
+
+
+class SuiviModificationsTests(TestCase):
+
+    def setUp(self):
+        self.animal = Troupeau.objects.create(
+            boucle_ovin='C1', sexe='femelle', race='balami', statut='naissance',
+            origine_ovin='pahou', proprietaire_ovin='miguel', naissance_date=date(2024, 1, 1),
+        )
+        mesure = Croissance.objects.create(
+            Boucle_Ovin=self.animal, Date_mesure=date(2024, 3, 15), Poids_Kg=7.0, Taille_CM=40.0,
+            Etat_Sante='Bon', Observations='première pesée',
+        )
+        self.mesure = Croissance.objects.get(pk=mesure.pk)
+
+    def test_champs_modifies_sans_relire_la_ligne(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.mesure.get_dirty_fields(), {})
+            self.mesure.Poids_Kg = 7.5
+            self.mesure.Boucle_Ovin_id = self.animal.pk     # même valeur : pas modifié
+            self.assertEqual(self.mesure.get_dirty_fields(), {'Poids_Kg': 7.0})
+
+        # Champ différé affecté sans avoir été lu : valeur initiale lue en base
+        partielle = Croissance.objects.only('Date_mesure').get(pk=self.mesure.pk)
+        partielle.Taille_CM = 42.0
+        with self.assertNumQueries(1):
+            self.assertEqual(partielle.get_dirty_fields(), {'Taille_CM': 40.0})
+
+    def test_historique_de_l_ancienne_valeur(self):
+        self.mesure.Poids_Kg = 7.5
+        self.mesure.save()
+        historique = Croissance.objects.get(est_historique=True)
+        self.assertEqual((historique.Poids_Kg, historique.Observations), (7.0, 'première pesée'))
+        self.assertEqual(self.mesure.get_dirty_fields(), {})
+
+        # Sans changement de mesure : pas de nouvel historique
+        self.mesure.Observations = 'corrigée'
+        self.mesure.save()
+        self.assertEqual(Croissance.objects.get(est_historique=True).Poids_Kg, 7.0)
+
+    def test_seuls_les_champs_modifies_sont_ecrits(self):
+        # Écriture concurrente d'un autre champ entre la lecture et la sauvegarde
+        Croissance.objects.filter(pk=self.mesure.pk).update(Observations='écrite ailleurs')
+        self.mesure.Taille_CM = 41.0
+        self.mesure.save()
+        self.assertEqual(
+            Croissance.objects.filter(pk=self.mesure.pk).values_list('Taille_CM', 'Observations').get(),
+            (41.0, 'écrite ailleurs'),
+        )
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from troupeau.consanguinite import recalculer_fa_genealogies
 from .models import Genealogie
 
 
@@ -19,6 +20,7 @@ class GenealogieAdmin(admin.ModelAdmin):
     autocomplete_fields = ("agneau", "mere", "pere")
     list_select_related = ("agneau", "mere", "pere")
     ordering = ("agneau__boucle_ovin",)
+    actions = ("recalculer_fa",)
 
     @admin.display(description="Agneau", ordering="agneau__boucle_ovin")
     def agneau_link(self, obj):
@@ -34,9 +36,14 @@ class GenealogieAdmin(admin.ModelAdmin):
 
     @admin.display(description="Consanguinité", ordering="fa")
     def fa_pct(self, obj):
-        # obj.coefficient_consanguinite renvoie le pourcentage (0..100)
+        # obj.coefficient_consanguinite renvoie le pourcentage (0..100) du champ fa stocké
         return f"{obj.coefficient_consanguinite:.2f} %"
 
     @admin.display(description="Risque")
     def risque_txt(self, obj):
         return obj.risque_consanguinite
+
+    @admin.action(description="Recalculer Fa des généalogies sélectionnées")
+    def recalculer_fa(self, request, queryset):
+        count = recalculer_fa_genealogies(queryset)
+        self.message_user(request, f"Fa recalculé : {count} généalogie(s) mise(s) à jour.")
@@ -0,0 +1,100 @@
+from collections import defaultdict, deque
+
+from django.db import migrations
+
+
+def _ordonner(parents):
+    """Rang topologique (parents avant enfants) ; un cycle est rompu au plus petit id."""
+    enfants = defaultdict(list)
+    attente = {}
+    for pk, couple in parents.items():
+        attente[pk] = 0
+        for parent in couple:
+            if parent is not None and parent != pk and parent in parents:
+                enfants[parent].append(pk)
+                attente[pk] += 1
+    file = deque(sorted(pk for pk, n in attente.items() if n == 0))
+    rang = {}
+    while len(rang) < len(parents):
+        if not file:
+            file.append(min(pk for pk in parents if pk not in rang))
+        pk = file.popleft()
+        if pk in rang:
+            continue
+        rang[pk] = len(rang)
+        for enfant in enfants[pk]:
+            if enfant not in rang:
+                attente[enfant] -= 1
+                if attente[enfant] == 0:
+                    file.append(enfant)
+    return rang
+
+
+def _consanguinite(pedigree):
+    """
+    F de chaque animal d'un pedigree [(id, pere_id, mere_id), ...] par la
+    méthode tabulaire (parenté récursive mémorisée). Figé ici plutôt
+    qu'importé de troupeau.consanguinite, qui suit le modèle courant.
+    """
+    parents = {pk: (pere_id, mere_id) for pk, pere_id, mere_id in pedigree}
+    rang = _ordonner(parents)
+
+    def parent(pk, i):
+        p = parents[pk][i]
+        return p if p in rang and rang[p] < rang[pk] else None
+
+    parentes = {}
+
+    def parente(a, b):
+        if a is None or b is None:
+            return 0.0
+        if rang[a] < rang[b]:
+            a, b = b, a
+        if (a, b) not in parentes:
+            if a == b:
+                valeur = 0.5 * (1.0 + parente(parent(a, 0), parent(a, 1)))
+            else:
+                valeur = 0.5 * (parente(parent(a, 0), b) + parente(parent(a, 1), b))
+            parentes[(a, b)] = valeur
+        return parentes[(a, b)]
+
+    # Ordre topologique : la récursion s'appuie sur les parentés déjà calculées
+    return {pk: round(max(parente(parent(pk, 0), parent(pk, 1)), 0.0), 5)
+            for pk in sorted(parents, key=rang.get)}
+
+
+def recalculer_fa(apps, schema_editor):
+    """
+    Le signal post_save stockait Fa en pourcentage alors que save() le stockait
+    en 0..1 : on recalcule toutes les fiches dans l'unité unique (0..1).
+    """
+    Troupeau = apps.get_model('troupeau', 'Troupeau')
+    Genealogie = apps.get_model('genealogie', 'Genealogie')
+
+    surcharges = {
+        agneau_id: (pere_id, mere_id)
+        for agneau_id, pere_id, mere_id in Genealogie.objects.values_list('agneau_id', 'pere_id', 'mere_id')
+    }
+    pedigree = [
+        (pk, *surcharges.get(pk, (pere_id, mere_id)))
+        for pk, pere_id, mere_id in Troupeau.objects.values_list('id', 'pere_boucle_id', 'mere_boucle_id')
+    ]
+    coefficients = _consanguinite(pedigree)
+
+    lignes = []
+    for g in Genealogie.objects.only('id', 'agneau_id', 'fa'):
+        g.fa = coefficients.get(g.agneau_id, 0.0)
+        lignes.append(g)
+    Genealogie.objects.bulk_update(lignes, ['fa'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('genealogie', '0001_initial'),
+        ('troupeau', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(recalculer_fa, migrations.RunPython.noop),
+    ]
@@ -77,87 +77,18 @@ class Genealogie(models.Model):
             raise ValidationError(errors)
 
     # -----------------------
-    # Outils de calcul
+    # Consanguinité
     # -----------------------
-    def _get_parents(self, ovin):
-        """
-        Renvoie (pere, mere) pour un Troupeau donné.
-        Priorité :
-          1) la table Genealogie si dispo (plus stricte),
-          2) fallback vers les FK du modèle Troupeau.
-        """
-        if ovin is None:
-            return None, None
-
-        try:
-            g = ovin.genealogie  # peut ne pas exister
-            return g.pere, g.mere
-        except Genealogie.DoesNotExist:
-            return getattr(ovin, 'pere_boucle', None), getattr(ovin, 'mere_boucle', None)
-
-    def _coefficient_parente(self, ovin1, ovin2, cache):
-        """
-        Coefficient de parenté entre deux individus.
-        Stratégie simple, symétrique, avec mémoïsation.
-        """
-        if ovin1 is None or ovin2 is None:
-            return 0.0
-        key = ('r', getattr(ovin1, 'pk', None), getattr(ovin2, 'pk', None))
-        if key in cache:
-            return cache[key]
-
-        if getattr(ovin1, 'pk', None) and getattr(ovin2, 'pk', None) and ovin1.pk == ovin2.pk:
-            cache[key] = 1.0
-            return 1.0
-
-        p1, m1 = self._get_parents(ovin1)
-        p2, m2 = self._get_parents(ovin2)
-
-        if p1 is None and m1 is None and p2 is None and m2 is None:
-            cache[key] = 0.0
-            return 0.0
-
-        r12 = 0.5 * (self._coefficient_parente(p1, ovin2, cache) + self._coefficient_parente(m1, ovin2, cache))
-        r21 = 0.5 * (self._coefficient_parente(ovin1, p2, cache) + self._coefficient_parente(ovin1, m2, cache))
-        r = (r12 + r21) / 2.0
-
-        cache[key] = r
-        return r
-
-    def _coefficient_consanguinite(self, ovin, cache):
-        """
-        Wright : F = 0.5(F_père + F_mère) + 0.25 * R(père, mère)
-        (valeur dans 0..1). Utilise un cache pour éviter les recomputations.
-        """
-        if ovin is None:
-            return 0.0
-        key = ('f', getattr(ovin, 'pk', None))
-        if key in cache:
-            return cache[key]
-
-        pere, mere = self._get_parents(ovin)
-        if pere is None or mere is None:
-            cache[key] = 0.0
-            return 0.0
-
-        Fp = self._coefficient_consanguinite(pere, cache)
-        Fm = self._coefficient_consanguinite(mere, cache)
-        rpm = self._coefficient_parente(pere, mere, cache)
-
-        F = 0.5 * (Fp + Fm) + 0.25 * rpm
-        # garde-fou numérique
-        F = 0.0 if F < 0 else float(f"{F:.5f}")
-        cache[key] = F
-        return F
+    # `fa` n'est pas calculé ici : le post_save (genealogie/signals.py) recalcule
+    # au commit F de l'agneau et de sa descendance, `fa` compris, en une passe.
 
     @property
     def coefficient_consanguinite(self):
         """
-        Fa renvoyé en pourcentage (ex: 12.5 pour 12.5%).
+        Fa renvoyé en pourcentage (ex: 12.5 pour 12.5%), lu depuis le champ
+        `fa` stocké (0..1) : aucun recalcul à l'affichage.
         """
-        cache = {}
-        fa_0_1 = self._coefficient_consanguinite(self.agneau, cache)
-        return round(fa_0_1 * 100.0, 4)
+        return round((self.fa or 0.0) * 100.0, 4)
 
     @property
     def risque_consanguinite(self):
@@ -169,15 +100,3 @@ class Genealogie(models.Model):
         if fa >= 6.25:
             return _("⚠️ Risque modéré ({fa}%)").format(fa=fa)
         return _("✔️ Risque faible ({fa}%)").format(fa=fa)
-
-    # -----------------------
-    # Sauvegarde
-    # -----------------------
-    def save(self, *args, **kwargs):
-        # mettre à jour fa (0..1) à chaque enregistrement
-        try:
-            self.fa = round(self._coefficient_consanguinite(self.agneau, cache={}), 5)
-        except Exception:
-            # on n’empêche pas l’enregistrement si le calcul échoue
-            pass
-        return super().save(*args, **kwargs)
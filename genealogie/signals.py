@@ -1,26 +1,31 @@
 # genealogie/signals.py
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+
+from troupeau.ascendance import mettre_a_jour_ascendance
+from troupeau.consanguinite import propager_consanguinite
+from troupeau.pedigree import patcher_index, signaler_filiation
 from .models import Genealogie
 
 
-@receiver(post_save, sender=Genealogie)
-def calculer_fa_automatiquement(sender, instance: Genealogie, created, **kwargs):
+@receiver(post_save, sender=Genealogie, dispatch_uid="genealogie_post_save_index_pedigree")
+def mettre_a_jour_index_pedigree(sender, instance: Genealogie, **kwargs):
     """
-    Après chaque sauvegarde de Genealogie, calcule le coefficient de consanguinité (en %)
-    via la propriété `coefficient_consanguinite` et le stocke dans le champ `fa`.
-
-    - On compare avant d’écrire pour éviter les écritures inutiles.
-    - On utilise QuerySet.update(...) pour ne PAS redéclencher post_save.
+    Les parents déclarés ici sont prioritaires dans l'index de pedigree : F de
+    l'agneau et de sa descendance (Troupeau et Genealogie.fa) est recalculé au commit.
     """
-    try:
-        nouveau_fa = float(instance.coefficient_consanguinite)  # pourcentage (0..100)
-    except Exception:
-        # En cas de souci (parents manquants, etc.), ne bloque pas la sauvegarde.
-        return
+    agneau_id, pere_id, mere_id = instance.agneau_id, instance.pere_id, instance.mere_id
+    patcher_index(lambda index: index.appliquer_genealogie(agneau_id, pere_id, mere_id))
+    mettre_a_jour_ascendance(agneau_id)
+    signaler_filiation(using=kwargs.get('using'))
+    transaction.on_commit(lambda: propager_consanguinite(agneau_id), using=kwargs.get('using'))
 
-    ancien_fa = float(instance.fa or 0.0)
 
-    # Tolérance pour éviter les micro-différences d'arrondi
-    if abs(nouveau_fa - ancien_fa) > 1e-6:
-        Genealogie.objects.filter(pk=instance.pk).update(fa=nouveau_fa)
+@receiver(post_delete, sender=Genealogie, dispatch_uid="genealogie_post_delete_index_pedigree")
+def retirer_de_index_pedigree(sender, instance: Genealogie, **kwargs):
+    agneau_id = instance.agneau_id
+    patcher_index(lambda index: index.retirer_genealogie(agneau_id))
+    mettre_a_jour_ascendance(agneau_id)
+    signaler_filiation(using=kwargs.get('using'))
+    transaction.on_commit(lambda: propager_consanguinite(agneau_id), using=kwargs.get('using'))
@@ -1,3 +1,55 @@
-from django.test import TestCase
+import tempfile
 
-# Create your tests here.
+from django.test import TransactionTestCase, override_settings
+
+from troupeau.consanguinite import recalculer_fa_genealogies
+from troupeau.models import Troupeau
+from troupeau.tests import CACHE_TEST, coefficient, creer_animal
+
+from .models import Genealogie
+
+
+@override_settings(CACHES=CACHE_TEST, PARENTE_STOCK_DIR=tempfile.mkdtemp(prefix='parente-tests-'))
+class PropagationGenealogieTests(TransactionTestCase):
+    """Une fiche Genealogie remplace les parents de l'agneau : F de sa descendance suit."""
+
+    def setUp(self):
+        self.p = creer_animal('P', 'male')
+        self.m = creer_animal('M', 'femelle')
+        self.m2 = creer_animal('M2', 'femelle')
+        self.s = creer_animal('S', 'male', self.p, self.m)
+        self.d = creer_animal('D', 'femelle', self.p, self.m)
+        # C sans parents sur sa fiche ; E = S × C
+        self.c = creer_animal('C', 'femelle')
+        self.e = creer_animal('E', 'male', self.s, self.c)
+
+    def test_creation_puis_suppression(self):
+        self.assertEqual(coefficient(self.e), 0.0)
+
+        genealogie = Genealogie.objects.create(agneau=self.c, pere=self.s, mere=self.d)
+        self.assertEqual(coefficient(self.c), 0.25)
+        # E = S × sa fille consanguine (issue de S × sœur) : 3/8
+        self.assertEqual(coefficient(self.e), 0.375)
+        self.assertEqual(Genealogie.objects.get(pk=genealogie.pk).fa, 0.25)
+
+        genealogie.delete()
+        self.assertEqual(coefficient(self.c), 0.0)
+        self.assertEqual(coefficient(self.e), 0.0)
+
+    def test_fa_des_descendants(self):
+        Genealogie.objects.create(agneau=self.e, pere=self.s, mere=self.c)
+        self.assertEqual(Genealogie.objects.get(agneau=self.e).fa, 0.0)
+        Genealogie.objects.create(agneau=self.c, pere=self.p, mere=self.m2)
+        # C demi-sœur de S : E = 1/8, fa de la fiche de E réécrit
+        self.assertEqual(Troupeau.objects.get(pk=self.e.pk).coefficient_consanguinite, 0.125)
+        self.assertEqual(Genealogie.objects.get(agneau=self.e).fa, 0.125)
+
+    def test_recalcul_limite_a_la_selection(self):
+        g_c = Genealogie.objects.create(agneau=self.c, pere=self.s, mere=self.d)
+        g_e = Genealogie.objects.create(agneau=self.e, pere=self.s, mere=self.c)
+        Genealogie.objects.update(fa=0.9)
+        self.assertEqual(recalculer_fa_genealogies(Genealogie.objects.filter(pk=g_e.pk)), 1)
+        self.assertEqual(Genealogie.objects.get(pk=g_e.pk).fa, 0.375)
+        self.assertEqual(Genealogie.objects.get(pk=g_c.pk).fa, 0.9)
+        self.assertEqual(recalculer_fa_genealogies(), 1)
+        self.assertEqual(Genealogie.objects.get(pk=g_c.pk).fa, 0.25)
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestation', '0002_alter_gestation_options_and_more'),
+        ('troupeau', '0004_message_boucle_active'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='gestation',
+            name='gestation_g_date_ge_2472c9_idx',
+        ),
+        migrations.AddIndex(
+            model_name='gestation',
+            index=models.Index(fields=['date_gestation', 'id'], name='gestation_g_date_ge_1f8e14_idx'),
+        ),
+    ]
@@ -69,7 +69,7 @@ class Gestation(models.Model):
         ]
         indexes = [
             models.Index(fields=["boucle_brebis"]),
-            models.Index(fields=["date_gestation"]),
+            models.Index(fields=["date_gestation", "id"]),  # tri des listes (pagination par curseur)
             models.Index(fields=["etat_gestation"]),
         ]
 
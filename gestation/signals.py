@@ -2,6 +2,7 @@ from django.db.models.signals import pre_save
 from django.dispatch import receiver
 from django.core.exceptions import ValidationError
 from .models import Gestation
+from pahou.pagination import suivre_modifications
 
 
 @receiver(pre_save, sender=Gestation)
@@ -48,3 +49,7 @@ def verifier_gestation_confirmee(sender, instance: Gestation, **kwargs):
             raise ValidationError(
                 f"Un suivi 'Non Confirmée' existe déjà pour la brebis {brebis} à la date {d}."
             )
+
+
+# Totaux en cache des listes paginées (pahou/pagination.py)
+suivre_modifications(Gestation)
@@ -2,14 +2,15 @@
 from datetime import date
 from django.contrib import messages
 from django.core.exceptions import ValidationError
-from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
 from django.db import IntegrityError
-from django.db.models import Q, Count
+from django.db.models import Count
 from django.shortcuts import get_object_or_404, render, redirect
 from django.views import View
 
 from .forms import GestationForm
 from .models import Gestation
+from pahou.pagination import paginer
+from recherche.moteur import rechercher
 
 
 # ---------- Helpers ----------
@@ -40,14 +41,6 @@ def _filtered_queryset(request):
     dfrom = _parse_date(request.GET.get("from"))
     dto = _parse_date(request.GET.get("to"))
 
-    if q:
-        qs = qs.filter(
-            Q(boucle_brebis__boucle_ovin__icontains=q)
-            | Q(methode_confirmation__icontains=q)
-            | Q(etat_gestation__icontains=q)
-            | Q(observations__icontains=q)
-        )
-
     if etat:
         qs = qs.filter(etat_gestation=etat)
 
@@ -56,7 +49,10 @@ def _filtered_queryset(request):
     if dto:
         qs = qs.filter(date_gestation__lte=dto)
 
-    return qs.order_by("-date_gestation", "-id")
+    qs = qs.order_by("-date_gestation", "-id")
+    if q:
+        qs = rechercher(qs, q)  # index plein texte, classé par pertinence
+    return qs
 
 
 # ---------- Vues CRUD ----------
@@ -64,14 +60,7 @@ class GestationListView(View):
     def get(self, request):
         qs = _filtered_queryset(request)
 
-        paginator = Paginator(qs, 20)
-        page_number = request.GET.get("page", 1)
-        try:
-            page_obj = paginator.page(page_number)
-        except PageNotAnInteger:
-            page_obj = paginator.page(1)
-        except EmptyPage:
-            page_obj = paginator.page(paginator.num_pages)
+        page_obj = paginer(request, qs, 20)
 
         ctx = {
             "gestations": page_obj.object_list,
@@ -14,19 +14,13 @@ class HistoriquetroupeauAdmin(admin.ModelAdmin):
         'troupeau_display',
         'date_evenement',
         'statut',
-        'ancienne_boucle',
-        'nouvelle_boucle',
-        'ancien_statut',
-        'nouveau_statut',
+        'changements_display',
         'observations',
     )
     list_filter = ('statut', 'date_evenement')
     search_fields = (
         'troupeau__boucle_ovin',   # snake_case correct
-        'ancienne_boucle',
-        'nouvelle_boucle',
-        'ancien_statut',
-        'nouveau_statut',
+        'changements',             # texte du diff JSON (boucles, statuts…)
         'observations',
     )
     date_hierarchy = 'date_evenement'
@@ -42,66 +36,16 @@ class HistoriquetroupeauAdmin(admin.ModelAdmin):
         'troupeau',
         'date_evenement',
         'statut',
-        'ancienne_boucle',
-        'ancienne_naissance_date',
-        'ancienne_boucle_active',
-        'ancien_proprietaire',
-        'ancienne_origine',
-        'ancien_statut',
-        'ancien_sexe',
-        'ancienne_race',
-        'ancienne_achat_date',
-        'ancienne_entree_date',
-        'ancienne_date_sortie',
-        'nouvelle_boucle',
-        'nouvelle_naissance_date',
-        'nouvelle_boucle_active',
-        'nouveau_proprietaire',
-        'nouvelle_origine',
-        'nouveau_statut',
-        'nouveau_sexe',
-        'nouvelle_race',
-        'nouvelle_achat_date',
-        'nouvelle_entree_date',
-        'nouvelle_date_sortie',
         'observations',
+        'changements_display',
     )
 
     fieldsets = (
         ('Référence', {
             'fields': ('troupeau', 'date_evenement', 'statut', 'observations')
         }),
-        ('Anciennes valeurs', {
-            'classes': ('collapse',),
-            'fields': (
-                'ancienne_boucle',
-                'ancienne_naissance_date',
-                'ancienne_boucle_active',
-                'ancien_proprietaire',
-                'ancienne_origine',
-                'ancien_statut',
-                'ancien_sexe',
-                'ancienne_race',
-                'ancienne_achat_date',
-                'ancienne_entree_date',
-                'ancienne_date_sortie',
-            )
-        }),
-        ('Nouvelles valeurs', {
-            'classes': ('collapse',),
-            'fields': (
-                'nouvelle_boucle',
-                'nouvelle_naissance_date',
-                'nouvelle_boucle_active',
-                'nouveau_proprietaire',
-                'nouvelle_origine',
-                'nouveau_statut',
-                'nouveau_sexe',
-                'nouvelle_race',
-                'nouvelle_achat_date',
-                'nouvelle_entree_date',
-                'nouvelle_date_sortie',
-            )
+        ('Changements', {
+            'fields': ('changements_display',)
         }),
     )
 
@@ -128,3 +72,7 @@ class HistoriquetroupeauAdmin(admin.ModelAdmin):
     def troupeau_display(self, obj):
         # La FK peut être nulle (Suppression) → garde-fou
         return getattr(obj.troupeau, 'boucle_ovin', '—')
+
+    @admin.display(description="Changements")
+    def changements_display(self, obj):
+        return obj.resume_changements or '—'
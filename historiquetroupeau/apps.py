@@ -6,3 +6,5 @@ class HistoriquetroupeauConfig(AppConfig):
 
     def ready(self):
         import troupeau.signals  # enregistre les receivers
+        # Pas de suivre_modifications() : ecriture.py et retention.py écrivent en
+        # masse et appellent invalider() ; un receveur post_delete ralentirait la purge
@@ -0,0 +1,190 @@
+# historiquetroupeau/ecriture.py
+"""
+Écriture groupée de l'historique du troupeau.
+
+enregistrer(ligne) reçoit une instance Historiquetroupeau non sauvegardée :
+  - dans une transaction, la ligne est mise en tampon ; toutes les lignes de
+    la transaction sont insérées par un seul bulk_create après le COMMIT.
+    Rien n'est écrit si la transaction est annulée, ni pour les lignes d'un
+    savepoint annulé (sauvegarde refusée puis rattrapée par l'appelant) ;
+  - hors transaction, la ligne est insérée immédiatement ;
+  - dans un bloc `with ecriture_groupee():`, les lignes validées sont
+    accumulées puis insérées par lots de `taille_lot` et à la sortie du bloc
+    (scripts qui sauvegardent beaucoup d'animaux hors transaction, chaque
+    save() ayant alors sa propre petite transaction).
+
+Savepoints : chaque ligne est confiée à transaction.on_commit(robust=True) ;
+Django écarte les callbacks d'un savepoint annulé et n'exécute les autres
+qu'après le COMMIT. Le callback range la ligne dans le tampon du thread et
+celui de la dernière ligne enregistrée vide le tampon : une seule insertion
+par transaction. Une erreur d'insertion après le COMMIT est journalisée et
+n'empêche pas les autres callbacks on_commit de la transaction (index de
+pedigree, propagation de F, invalidations). Si le dernier callback a été
+écarté (savepoint annulé en fin de transaction), les lignes validées restent
+en tampon jusqu'à la prochaine écriture d'historique, la fin de la requête,
+la fin de la tranche de tâche (signal taches.moteur.tranche_terminee), la
+sortie d'ecriture_groupee() ou vider() (commandes).
+
+Une ligne dont l'animal a été supprimé dans la même transaction est écrite
+avec troupeau NULL, comme l'aurait fait le SET_NULL de la clé étrangère.
+Chaque insertion met à jour le résumé journalier (resume.py) et l'index de
+recherche (recherche/moteur.py) dans la même transaction.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+from functools import partial
+
+from django.core.signals import request_finished
+from django.db import router, transaction
+from django.dispatch import receiver
+
+from pahou.pagination import invalider
+from recherche.moteur import indexer
+from taches.moteur import tranche_terminee
+
+from .models import Historiquetroupeau
+from .resume import ajouter_au_resume, compter
+
+logger = logging.getLogger(__name__)
+
+TAILLE_LOT = 1000
+
+_local = threading.local()
+
+
+class _Tampon:
+    """Lignes validées (COMMIT fait) d'une base, pas encore insérées."""
+
+    def __init__(self):
+        self.lignes = []
+        self.dernier = 0     # numéro de la dernière ligne confiée à on_commit
+
+
+class _Groupe:
+    def __init__(self, taille_lot):
+        self.taille_lot = taille_lot
+        self.lignes = {}     # using -> [lignes]
+
+    def ajouter(self, lignes, using):
+        en_attente = self.lignes.setdefault(using, [])
+        en_attente.extend(lignes)
+        if len(en_attente) >= self.taille_lot:
+            self.lignes[using] = []
+            _inserer(en_attente, using)
+
+    def vider(self):
+        lignes, self.lignes = self.lignes, {}
+        for using, en_attente in lignes.items():
+            _inserer(en_attente, using)
+
+
+def _tampons():
+    if not hasattr(_local, 'tampons'):
+        _local.tampons = {}
+    return _local.tampons
+
+
+def _tampon(using):
+    return _tampons().setdefault(using, _Tampon())
+
+
+def _groupes():
+    if not hasattr(_local, 'groupes'):
+        _local.groupes = []
+    return _local.groupes
+
+
+def _valider(using, ligne, numero):
+    """Callback on_commit d'une ligne : exécuté seulement si son savepoint a été conservé."""
+    tampon = _tampon(using)
+    tampon.lignes.append(ligne)
+    if numero == tampon.dernier:
+        _vider_tampon(using)
+
+
+def _vider_tampon(using):
+    """Insère les lignes validées en tampon ; une erreur est journalisée (après le COMMIT métier)."""
+    tampon = _tampon(using)
+    lignes, tampon.lignes = tampon.lignes, []
+    try:
+        _transmettre(lignes, using)
+    except Exception:
+        logger.exception("[Historique] %s ligne(s) d'historique non enregistrée(s)", len(lignes))
+
+
+def _transmettre(lignes, using):
+    if not lignes:
+        return
+    groupes = _groupes()
+    if groupes:
+        groupes[-1].ajouter(lignes, using)
+    else:
+        _inserer(lignes, using)
+
+
+def _inserer(lignes, using):
+    """Insère les lignes ; une erreur remonte à l'appelant."""
+    if not lignes:
+        return
+    ids = {ligne.troupeau_id for ligne in lignes if ligne.troupeau_id}
+    if ids:
+        modele_troupeau = Historiquetroupeau._meta.get_field('troupeau').related_model
+        existants = set(modele_troupeau._base_manager.using(using)
+                        .filter(pk__in=ids).values_list('pk', flat=True))
+        for ligne in lignes:
+            if ligne.troupeau_id and ligne.troupeau_id not in existants:
+                ligne.troupeau = None
+    with transaction.atomic(using=using):
+        Historiquetroupeau.objects.using(using).bulk_create(lignes, batch_size=TAILLE_LOT)
+        ajouter_au_resume(compter(lignes), using=using)
+        indexer(Historiquetroupeau, [ligne.pk for ligne in lignes if ligne.pk], using=using)
+    invalider(Historiquetroupeau)
+
+
+def enregistrer(ligne, using=None):
+    """Enregistre une ligne d'historique (voir le docstring du module)."""
+    using = using or router.db_for_write(Historiquetroupeau)
+    tampon = _tampon(using)
+    if not transaction.get_connection(using).in_atomic_block:
+        # Hors transaction (ou gestion manuelle) : écriture immédiate, avec les
+        # lignes validées restées en tampon
+        lignes, tampon.lignes = [*tampon.lignes, ligne], []
+        _transmettre(lignes, using)
+        return
+
+    tampon.dernier += 1
+    transaction.on_commit(partial(_valider, using, ligne, tampon.dernier), using=using, robust=True)
+
+
+def vider():
+    """Insère les lignes validées restées en tampon dans ce thread."""
+    for using in list(_tampons()):
+        _vider_tampon(using)
+
+
+@receiver(request_finished, dispatch_uid="historique_vider_tampon")
+@receiver(tranche_terminee, dispatch_uid="historique_vider_tampon_tranche")
+def vider_fin_requete(sender, **kwargs):
+    vider()
+
+
+@contextmanager
+def ecriture_groupee(taille_lot=TAILLE_LOT):
+    """
+    Regroupe les insertions d'historique jusqu'à la sortie du bloc :
+
+        with ecriture_groupee():
+            for animal in animaux:
+                animal.save()
+    """
+    groupe = _Groupe(taille_lot)
+    _groupes().append(groupe)
+    try:
+        yield groupe
+    finally:
+        _groupes().remove(groupe)
+        try:
+            vider()
+        finally:
+            groupe.vider()
@@ -0,0 +1,58 @@
+# historiquetroupeau/management/commands/nettoyer_historique.py
+"""
+Purge de l'historique du troupeau hors rétention (à planifier, ex. cron quotidien).
+
+    python manage.py nettoyer_historique
+    python manage.py nettoyer_historique --garder 50 --jours 730 --archiver
+    python manage.py nettoyer_historique --dry-run
+
+Par défaut : HISTORIQUE_RETENTION_NOMBRE lignes par animal et
+HISTORIQUE_RETENTION_JOURS jours (settings) ; 0 désactive une limite.
+"""
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from historiquetroupeau.retention import lignes_a_purger, parametres_retention, purger_historique
+
+
+class Command(BaseCommand):
+    help = "Supprime (ou archive puis supprime) l'historique au-delà de la rétention configurée."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--garder', type=int, default=None,
+                            help="Lignes conservées par animal (0 : pas de limite).")
+        parser.add_argument('--jours', type=int, default=None,
+                            help="Âge maximal en jours (0 : pas de limite).")
+        parser.add_argument('--archiver', action='store_true',
+                            help="Archive les lignes purgées (JSON lines gzip) avant suppression.")
+        parser.add_argument('--repertoire', default=None,
+                            help="Répertoire des archives (défaut : HISTORIQUE_ARCHIVE_DIR).")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Compte les lignes concernées sans rien supprimer.")
+
+    def handle(self, *args, **options):
+        nombre, jours = parametres_retention()
+        if options['garder'] is not None:
+            nombre = options['garder'] or None
+        if options['jours'] is not None:
+            jours = options['jours'] or None
+        if (nombre or 0) < 0 or (jours or 0) < 0:
+            raise CommandError("--garder et --jours doivent être positifs.")
+        if nombre is None and jours is None:
+            raise CommandError("Aucune limite de rétention : rien à purger.")
+
+        if options['dry_run']:
+            nb = lignes_a_purger(nombre, jours).count()
+            self.stdout.write(f"{nb} ligne(s) d'historique seraient purgées.")
+            return
+
+        repertoire = Path(options['repertoire']) if options['repertoire'] else None
+        debut = time.monotonic()
+        resultat = purger_historique(nombre, jours, archiver=options['archiver'], repertoire=repertoire)
+        archive = f", archive : {resultat['archive']}" if resultat['archive'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"Historique purgé : {resultat['supprimees']} ligne(s){archive}, "
+            f"en {time.monotonic() - debut:.2f} s."
+        ))
@@ -0,0 +1,27 @@
+# historiquetroupeau/management/commands/reconstruire_resume_historique.py
+"""
+Recalcule le résumé journalier de l'historique (date × statut → nombre)
+depuis la table d'historique.
+
+    python manage.py reconstruire_resume_historique
+
+À lancer après une écriture qui ne passe pas par historiquetroupeau.ecriture
+(SQL brut, restauration de sauvegarde, suppression depuis l'admin).
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from historiquetroupeau.resume import reconstruire_resume
+
+
+class Command(BaseCommand):
+    help = "Recalcule le résumé journalier de l'historique utilisé par les statistiques."
+
+    def handle(self, *args, **options):
+        debut = time.monotonic()
+        nb = reconstruire_resume()
+        self.stdout.write(self.style.SUCCESS(
+            f"Résumé de l'historique reconstruit : {nb} ligne(s) (jour × statut), "
+            f"en {time.monotonic() - debut:.2f} s."
+        ))
@@ -0,0 +1,83 @@
+import django.core.serializers.json
+from django.db import migrations, models
+
+# Colonnes historiques (ancienne, nouvelle) -> champ de Troupeau, clé du diff
+COLONNES = {
+    'boucle_ovin': ('ancienne_boucle', 'nouvelle_boucle'),
+    'naissance_date': ('ancienne_naissance_date', 'nouvelle_naissance_date'),
+    'boucle_active': ('ancienne_boucle_active', 'nouvelle_boucle_active'),
+    'proprietaire_ovin': ('ancien_proprietaire', 'nouveau_proprietaire'),
+    'origine_ovin': ('ancienne_origine', 'nouvelle_origine'),
+    'statut': ('ancien_statut', 'nouveau_statut'),
+    'sexe': ('ancien_sexe', 'nouveau_sexe'),
+    'race': ('ancienne_race', 'nouvelle_race'),
+    'achat_date': ('ancienne_achat_date', 'nouvelle_achat_date'),
+    'entree_date': ('ancienne_entree_date', 'nouvelle_entree_date'),
+    'date_sortie': ('ancienne_date_sortie', 'nouvelle_date_sortie'),
+}
+# Résumé généré par l'ancien signal de modification, redondant avec le diff
+PREFIXE_RESUME = "Champs modifiés: "
+LOT = 5000
+
+
+def _par_lots(Historique, champs):
+    dernier = 0
+    while True:
+        lot = list(Historique.objects.filter(pk__gt=dernier).order_by('pk').values_list('pk', *champs)[:LOT])
+        if not lot:
+            return
+        yield lot
+        dernier = lot[-1][0]
+
+
+def colonnes_vers_changements(apps, schema_editor):
+    Historique = apps.get_model('historiquetroupeau', 'Historiquetroupeau')
+    colonnes = [c for paire in COLONNES.values() for c in paire]
+    table = schema_editor.quote_name(Historique._meta.db_table)
+    encodeur = django.core.serializers.json.DjangoJSONEncoder(separators=(',', ':'))
+    with schema_editor.connection.cursor() as cursor:
+        for lot in _par_lots(Historique, ['observations', *colonnes]):
+            parametres = []
+            for pk, observations, *valeurs in lot:
+                ligne = dict(zip(colonnes, valeurs))
+                changements = {
+                    champ: [ligne[ancienne], ligne[nouvelle]]
+                    for champ, (ancienne, nouvelle) in COLONNES.items()
+                    if ligne[ancienne] is not None or ligne[nouvelle] is not None
+                }
+                if observations and observations.startswith(PREFIXE_RESUME):
+                    observations = None
+                parametres.append((encodeur.encode(changements), observations, pk))
+            cursor.executemany(f"UPDATE {table} SET changements = %s, observations = %s WHERE id = %s", parametres)
+
+
+def changements_vers_colonnes(apps, schema_editor):
+    Historique = apps.get_model('historiquetroupeau', 'Historiquetroupeau')
+    colonnes = [c for paire in COLONNES.values() for c in paire]
+    for lot in _par_lots(Historique, []):
+        objets = list(Historique.objects.filter(pk__in=[pk for pk, in lot]))
+        for h in objets:
+            changements = h.changements or {}
+            for champ, (ancienne, nouvelle) in COLONNES.items():
+                valeurs = changements.get(champ) or (None, None)
+                for colonne, valeur in zip((ancienne, nouvelle), valeurs):
+                    setattr(h, colonne, h._meta.get_field(colonne).to_python(valeur))
+            if h.statut == 'Modification' and not h.observations and changements:
+                h.observations = (PREFIXE_RESUME + ', '.join(changements))[:500]
+        Historique.objects.bulk_update(objets, colonnes + ['observations'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('historiquetroupeau', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historiquetroupeau',
+            name='changements',
+            field=models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder),
+        ),
+        migrations.RunPython(colonnes_vers_changements, changements_vers_colonnes),
+    ]
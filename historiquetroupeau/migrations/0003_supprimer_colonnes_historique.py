@@ -0,0 +1,101 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:51
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('historiquetroupeau', '0002_changements'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='historiquetroupeau',
+            name='ancien_proprietaire',
+        ),
+        migrations.RemoveField(
+            model_name='historiquetroupeau',
+            name='ancien_sexe',
+        ),
+        migrations.RemoveField(
+            model_name='historiquetroupeau',
+            name='ancien_statut',
+        ),
+        migrations.RemoveField(
+            model_name='historiquetroupeau',
+            name='ancienne_achat_date',
+        ),
+        migrations.RemoveField(
+            model_name='historiquetroupeau',
+            name='ancienne_boucle',
+        ),
+        migrations.RemoveField(
+            model_name='historiquetroupeau',
+            name='ancienne_boucle_active',
+        ),
+        migrations.RemoveField(
+            model_name='historiquetroupeau',
+            name='ancienne_date_sortie',
+        ),
+        migrations.RemoveField(
+            model_name='historiquetroupeau',
+            name='ancienne_entree_date',
+        ),
+        migrations.RemoveField(
+            model_name='historiquetroupeau',
+            name='ancienne_naissance_date',
+        ),
+        migrations.RemoveField(
+            model_name='historiquetroupeau',
+            name='ancienne_origine',
+        ),
+        migrations.RemoveField(
+            model_name='historiquetroupeau',
+            name='ancienne_race',
+        ),
+        migrations.RemoveField(
+            model_name='historiquetroupeau',
+            name='nouveau_proprietaire',
+        ),
+        migrations.RemoveField(
+            model_name='historiquetroupeau',
+            name='nouveau_sexe',
+        ),
+        migrations.RemoveField(
+            model_name='historiquetroupeau',
+            name='nouveau_statut',
+        ),
+        migrations.RemoveField(
+            model_name='historiquetroupeau',
+            name='nouvelle_achat_date',
+        ),
+        migrations.RemoveField(
+            model_name='historiquetroupeau',
+            name='nouvelle_boucle',
+        ),
+        migrations.RemoveField(
+            model_name='historiquetroupeau',
+            name='nouvelle_boucle_active',
+        ),
+        migrations.RemoveField(
+            model_name='historiquetroupeau',
+            name='nouvelle_date_sortie',
+        ),
+        migrations.RemoveField(
+            model_name='historiquetroupeau',
+            name='nouvelle_entree_date',
+        ),
+        migrations.RemoveField(
+            model_name='historiquetroupeau',
+            name='nouvelle_naissance_date',
+        ),
+        migrations.RemoveField(
+            model_name='historiquetroupeau',
+            name='nouvelle_origine',
+        ),
+        migrations.RemoveField(
+            model_name='historiquetroupeau',
+            name='nouvelle_race',
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:05
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def remplir_resume(apps, schema_editor):
+    Historique = apps.get_model('historiquetroupeau', 'Historiquetroupeau')
+    Resume = apps.get_model('historiquetroupeau', 'ResumeHistoriqueJour')
+    lignes = (Historique.objects.order_by()
+              .values_list('date_evenement', 'statut')
+              .annotate(n=Count('id')))
+    Resume.objects.bulk_create(
+        (Resume(date=date, statut=statut, nombre=n) for date, statut, n in lignes),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('historiquetroupeau', '0003_supprimer_colonnes_historique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumeHistoriqueJour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('statut', models.CharField(choices=[('Création', 'Création'), ('Modification', 'Modification'), ('Suppression', 'Suppression'), ('Naissance', 'Naissance'), ('Vendu', 'Vendu'), ('Décédé', 'Décédé'), ('Sortie', 'Sortie'), ('Prêt notre ferme', 'Prêt notre ferme'), ('Prêt autre ferme', 'Prêt autre ferme'), ('Échange Ovin', 'Échange Ovin'), ('Achat', 'Achat'), ('Soin', 'Soin')], max_length=30)),
+                ('nombre', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': "Résumé journalier de l'historique",
+                'verbose_name_plural': "Résumés journaliers de l'historique",
+                'db_table': 'historiquetroupeau_resume_jour',
+                'constraints': [models.UniqueConstraint(fields=('date', 'statut'), name='uniq_resume_historique_jour')],
+            },
+        ),
+        migrations.RunPython(remplir_resume, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('historiquetroupeau', '0004_resume_jour'),
+        ('troupeau', '0004_message_boucle_active'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='historiquetroupeau',
+            name='historiquet_date_ev_e5ef69_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='historiquetroupeau',
+            name='historiquet_statut_25b2d2_idx',
+        ),
+        migrations.AddIndex(
+            model_name='historiquetroupeau',
+            index=models.Index(fields=['date_evenement', 'id'], name='historiquet_date_ev_2d70cb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historiquetroupeau',
+            index=models.Index(fields=['statut', 'date_evenement', 'id'], name='historiquet_statut_34de4e_idx'),
+        ),
+    ]
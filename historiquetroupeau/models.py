@@ -1,4 +1,6 @@
 # historiquetroupeau/models.py
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
 
@@ -37,31 +39,9 @@ class Historiquetroupeau(models.Model):
     date_evenement = models.DateField()
     statut = models.CharField(max_length=30, choices=STATUT_CHOIX)
 
-    # Anciennes valeurs
-    ancienne_boucle = models.CharField(max_length=20, blank=True, null=True)
-    ancienne_naissance_date = models.DateField(blank=True, null=True)
-    ancienne_boucle_active = models.BooleanField(blank=True, null=True)
-    ancien_proprietaire = models.CharField(max_length=50, blank=True, null=True)
-    ancienne_origine = models.CharField(max_length=50, blank=True, null=True)
-    ancien_statut = models.CharField(max_length=30, blank=True, null=True)
-    ancien_sexe = models.CharField(max_length=10, blank=True, null=True)
-    ancienne_race = models.CharField(max_length=50, blank=True, null=True)
-    ancienne_achat_date = models.DateField(blank=True, null=True)
-    ancienne_entree_date = models.DateField(blank=True, null=True)
-    ancienne_date_sortie = models.DateField(blank=True, null=True)
-
-    # Nouvelles valeurs
-    nouvelle_boucle = models.CharField(max_length=20, blank=True, null=True)
-    nouvelle_naissance_date = models.DateField(blank=True, null=True)
-    nouvelle_boucle_active = models.BooleanField(blank=True, null=True)
-    nouveau_proprietaire = models.CharField(max_length=50, blank=True, null=True)
-    nouvelle_origine = models.CharField(max_length=50, blank=True, null=True)
-    nouveau_statut = models.CharField(max_length=30, blank=True, null=True)
-    nouveau_sexe = models.CharField(max_length=10, blank=True, null=True)
-    nouvelle_race = models.CharField(max_length=50, blank=True, null=True)
-    nouvelle_achat_date = models.DateField(blank=True, null=True)
-    nouvelle_entree_date = models.DateField(blank=True, null=True)
-    nouvelle_date_sortie = models.DateField(blank=True, null=True)
+    # Différences {champ de Troupeau: [ancienne valeur, nouvelle valeur]} ;
+    # ancienne valeur None pour une création, nouvelle valeur None pour une suppression
+    changements = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
 
     observations = models.TextField(blank=True, null=True)
 
@@ -72,14 +52,112 @@ class Historiquetroupeau(models.Model):
         db_table = 'historiquetroupeau'
         indexes = [
             models.Index(fields=['troupeau']),
-            models.Index(fields=['date_evenement']),
-            models.Index(fields=['statut']),
+            models.Index(fields=['date_evenement', 'id']),  # tri des listes (pagination par curseur)
+            models.Index(fields=['statut', 'date_evenement', 'id']),  # liste filtrée par statut
         ]
 
     def __str__(self):
-        boucle = (
-            self.troupeau.boucle_ovin
-            if self.troupeau else
-            (self.nouvelle_boucle or self.ancienne_boucle or "?")
-        )
-        return f"📍 {boucle} - {self.statut} ({self.date_evenement})"
+        return f"📍 {self.boucle or '?'} - {self.statut} ({self.date_evenement})"
+
+    # --- Lecture du diff ---
+
+    def valeurs(self, champ):
+        """(ancienne, nouvelle) valeur brute (JSON) d'un champ, (None, None) s'il n'a pas changé."""
+        ancien, nouveau = (self.changements or {}).get(champ) or (None, None)
+        return ancien, nouveau
+
+    @property
+    def boucles(self):
+        """(ancienne, nouvelle) boucle enregistrées dans le diff."""
+        return self.valeurs('boucle_ovin')
+
+    @property
+    def boucle(self):
+        """Boucle de l'animal, ou celle du diff si l'animal a été supprimé."""
+        if self.troupeau_id and self.troupeau:
+            return self.troupeau.boucle_ovin
+        ancienne, nouvelle = self.boucles
+        return nouvelle or ancienne
+
+    @property
+    def lignes_changements(self):
+        """[{'champ', 'libelle', 'ancien', 'nouveau'}] avec des valeurs affichables."""
+        return lignes_changements(self.changements)
+
+    @property
+    def resume_changements(self):
+        """Résumé sur une ligne : « Statut : Actif → Vendu ; ... »."""
+        return resumer_changements(self.changements)
+
+
+def _champ_troupeau(champ):
+    """(field | None, libellé) d'un champ de Troupeau nommé dans le diff."""
+    modele = Historiquetroupeau._meta.get_field('troupeau').related_model
+    try:
+        field = modele._meta.get_field(champ)
+    except FieldDoesNotExist:
+        return None, champ
+    return field, str(field.verbose_name).capitalize()
+
+
+def lignes_changements(changements):
+    """Lignes affichables d'un diff `changements` (sans instance, ex. export en flux)."""
+    lignes = []
+    for champ, (ancien, nouveau) in (changements or {}).items():
+        field, libelle = _champ_troupeau(champ)
+        lignes.append({
+            'champ': champ,
+            'libelle': libelle,
+            'ancien': _afficher(field, ancien),
+            'nouveau': _afficher(field, nouveau),
+        })
+    return lignes
+
+
+def resumer_changements(changements):
+    return " ; ".join(
+        f"{ligne['libelle']} : {ligne['ancien']} → {ligne['nouveau']}"
+        for ligne in lignes_changements(changements)
+    )
+
+
+class ResumeHistoriqueJour(models.Model):
+    """
+    Nombre d'événements d'historique par jour et par statut, tenu à jour par
+    l'écriture de l'historique (voir historiquetroupeau/resume.py) : les
+    statistiques se lisent ici plutôt que par un GROUP BY sur tout l'historique.
+    """
+    date = models.DateField()
+    statut = models.CharField(max_length=30, choices=Historiquetroupeau.STATUT_CHOIX)
+    nombre = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Résumé journalier de l'historique"
+        verbose_name_plural = "Résumés journaliers de l'historique"
+        db_table = 'historiquetroupeau_resume_jour'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'statut'], name='uniq_resume_historique_jour'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.statut} : {self.nombre}"
+
+
+def _afficher(field, valeur):
+    """Valeur JSON du diff rendue comme dans l'interface (dates, Oui/Non, libellés)."""
+    if valeur is None or valeur == '':
+        return "—"
+    if field is not None:
+        try:
+            valeur = field.to_python(valeur)
+        except ValidationError:
+            return str(valeur)
+        if field.choices:
+            return str(dict(field.flatchoices).get(valeur, valeur))
+    if isinstance(valeur, bool):
+        return "Oui" if valeur else "Non"
+    if isinstance(valeur, float):
+        return f"{valeur:.4g}"
+    if hasattr(valeur, 'strftime'):
+        return valeur.strftime("%d/%m/%Y")
+    return str(valeur)
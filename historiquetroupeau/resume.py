@@ -0,0 +1,93 @@
+# historiquetroupeau/resume.py
+"""
+Résumé journalier de l'historique : une ligne (date, statut, nombre) par jour
+et par statut, lue par l'API de statistiques et le tableau de bord.
+
+Mise à jour incrémentale :
+  - ecriture._inserer() ajoute les lignes insérées, dans la même transaction
+    que le bulk_create ;
+  - retention.purger_historique() retire les lignes purgées.
+Les autres écritures (SQL brut, import hors ORM, suppression depuis l'admin)
+ne sont pas suivies : `python manage.py reconstruire_resume_historique` recalcule
+tout depuis la table d'historique.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from .models import Historiquetroupeau, ResumeHistoriqueJour
+
+
+def compter(lignes):
+    """Counter {(date, statut): nombre} pour des instances Historiquetroupeau."""
+    return Counter((ligne.date_evenement, ligne.statut) for ligne in lignes)
+
+
+def ajouter_au_resume(comptes, using=None):
+    """Ajoute (ou retire, nombres négatifs) des comptes {(date, statut): n}."""
+    using = using or 'default'
+    resumes = ResumeHistoriqueJour.objects.using(using)
+    with transaction.atomic(using=using):
+        for (date, statut), n in comptes.items():
+            if not n:
+                continue
+            if resumes.filter(date=date, statut=statut).update(nombre=F('nombre') + n):
+                continue
+            if n < 0:
+                # Jour absent du résumé (écrit hors suivi) : rien à retirer
+                continue
+            try:
+                with transaction.atomic(using=using):
+                    resumes.create(date=date, statut=statut, nombre=n)
+            except IntegrityError:
+                # Créée entre-temps par une autre transaction
+                resumes.filter(date=date, statut=statut).update(nombre=F('nombre') + n)
+
+
+def retirer_du_resume(comptes, using=None):
+    ajouter_au_resume(Counter({cle: -n for cle, n in comptes.items()}), using=using)
+
+
+def reconstruire_resume(batch_size=1000):
+    """Recalcule tout le résumé depuis l'historique. Retourne le nombre de lignes."""
+    lignes = (Historiquetroupeau.objects.order_by()
+              .values_list('date_evenement', 'statut')
+              .annotate(n=Count('id')))
+    with transaction.atomic():
+        ResumeHistoriqueJour.objects.all().delete()
+        ResumeHistoriqueJour.objects.bulk_create(
+            (ResumeHistoriqueJour(date=date, statut=statut, nombre=n) for date, statut, n in lignes),
+            batch_size=batch_size,
+        )
+    return ResumeHistoriqueJour.objects.count()
+
+
+# =========================
+# Lecture
+# =========================
+
+def totaux(statut=None, debut=None, fin=None):
+    """(total, [{'statut', 'c'}, ...] par nombre décroissant), filtrables par statut et dates."""
+    resumes = ResumeHistoriqueJour.objects.order_by()
+    if statut:
+        resumes = resumes.filter(statut=statut)
+    if debut:
+        resumes = resumes.filter(date__gte=debut)
+    if fin:
+        resumes = resumes.filter(date__lte=fin)
+    par_statut = list(
+        resumes.values('statut').annotate(c=Sum('nombre'))
+        .filter(c__gt=0).order_by('-c')
+    )
+    return sum(s['c'] for s in par_statut), par_statut
+
+
+def serie_journaliere(debut, fin):
+    """[{'date', 'c'}, ...] par jour de debut à fin inclus (parcours d'index sur la date)."""
+    return list(
+        ResumeHistoriqueJour.objects
+        .filter(date__gte=debut, date__lte=fin)
+        .values('date').annotate(c=Sum('nombre'))
+        .filter(c__gt=0).order_by('date')
+    )
@@ -0,0 +1,130 @@
+# historiquetroupeau/retention.py
+"""
+Rétention de l'historique du troupeau, en tâche planifiée (commande
+`nettoyer_historique` ou page maintenance/nettoyer-historique/ pour le staff)
+plutôt qu'à chaque sauvegarde d'animal.
+
+Une ligne est purgée si :
+  - elle n'est pas parmi les `nombre` plus récentes de son animal, d'après un
+    classement ROW_NUMBER() OVER (PARTITION BY animal ORDER BY date, id DESC) ;
+  - ou elle est antérieure de plus de `jours` jours à aujourd'hui.
+Les lignes d'animaux supprimés (troupeau NULL) ne relèvent que de la limite
+d'âge. Sans archivage, la purge est un seul DELETE ... WHERE id IN
+(sous-requête classée), sans lecture préalable des lignes.
+
+Avec archivage, les lignes purgées sont d'abord écrites en JSON lines
+compressé (gzip) dans HISTORIQUE_ARCHIVE_DIR, puis supprimées par lots
+d'identifiants archivés dans la même transaction : une ligne n'est jamais
+supprimée sans avoir été archivée.
+
+Le résumé journalier (resume.py) est décrémenté dans la même transaction
+que la suppression.
+"""
+import gzip
+import json
+import logging
+import os
+from collections import Counter
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from pahou.pagination import invalider
+from recherche.moteur import desindexer, desindexer_requete
+
+from .models import Historiquetroupeau
+from .resume import retirer_du_resume
+
+logger = logging.getLogger(__name__)
+
+
+def parametres_retention():
+    """(nombre, jours) configurés dans les settings ; None = pas de limite."""
+    return (getattr(settings, 'HISTORIQUE_RETENTION_NOMBRE', 100),
+            getattr(settings, 'HISTORIQUE_RETENTION_JOURS', None))
+
+
+def repertoire_archives():
+    return Path(getattr(settings, 'HISTORIQUE_ARCHIVE_DIR',
+                        Path(settings.BASE_DIR) / 'var' / 'archives' / 'historique'))
+
+
+def lignes_a_purger(nombre=None, jours=None):
+    """QuerySet des lignes hors rétention (aucune si les deux limites sont None)."""
+    filtre = Q()
+    if nombre is not None:
+        classees = (Historiquetroupeau.objects
+                    .filter(troupeau__isnull=False)
+                    .annotate(rang=Window(
+                        RowNumber(),
+                        partition_by=F('troupeau_id'),
+                        order_by=[F('date_evenement').desc(), F('id').desc()],
+                    ))
+                    .filter(rang__gt=nombre)
+                    .values('pk'))
+        filtre |= Q(pk__in=classees)
+    if jours is not None:
+        filtre |= Q(date_evenement__lt=timezone.localdate() - timedelta(days=jours))
+    if not filtre:
+        return Historiquetroupeau.objects.none()
+    return Historiquetroupeau.objects.filter(filtre).order_by()
+
+
+def _archiver(lignes, repertoire):
+    """Écrit les lignes en JSON lines gzip ; retourne (chemin, ids archivés, comptes par jour et statut)."""
+    repertoire.mkdir(parents=True, exist_ok=True)
+    chemin = repertoire / f"historique-{timezone.now():%Y%m%d-%H%M%S-%f}.jsonl.gz"
+    temporaire = chemin.with_suffix('.tmp')
+    ids = []
+    comptes = Counter()
+    with gzip.open(temporaire, 'wt', encoding='utf-8') as f:
+        for ligne in lignes.order_by('troupeau_id', 'date_evenement', 'id').values().iterator(chunk_size=2000):
+            f.write(json.dumps(ligne, cls=DjangoJSONEncoder, ensure_ascii=False))
+            f.write('\n')
+            ids.append(ligne['id'])
+            comptes[ligne['date_evenement'], ligne['statut']] += 1
+    if not ids:
+        temporaire.unlink()
+        return None, ids, comptes
+    os.replace(temporaire, chemin)
+    return chemin, ids, comptes
+
+
+def purger_historique(nombre=None, jours=None, archiver=False, repertoire=None, taille_lot=1000):
+    """
+    Purge les lignes hors rétention. Retourne {'supprimees': n, 'archive': chemin | None}.
+    """
+    lignes = lignes_a_purger(nombre, jours)
+    if not archiver:
+        # Pas de receveur de suppression sur Historiquetroupeau : DELETE direct
+        with transaction.atomic():
+            comptes = {(r['date_evenement'], r['statut']): r['n'] for r in
+                       lignes.values('date_evenement', 'statut').annotate(n=Count('id'))}
+            desindexer_requete(lignes)
+            nb, _detail = lignes.delete()
+            retirer_du_resume(comptes)
+        invalider(Historiquetroupeau)
+        logger.info("[Historique] Rétention : %s ligne(s) supprimée(s)", nb)
+        return {'supprimees': nb, 'archive': None}
+
+    with transaction.atomic():
+        chemin, ids, comptes = _archiver(lignes, repertoire or repertoire_archives())
+        try:
+            nb = 0
+            for debut in range(0, len(ids), taille_lot):
+                nb += Historiquetroupeau.objects.filter(pk__in=ids[debut:debut + taille_lot]).delete()[0]
+            desindexer(Historiquetroupeau, ids)
+            retirer_du_resume(comptes)
+        except BaseException:
+            if chemin is not None:
+                chemin.unlink(missing_ok=True)
+            raise
+    invalider(Historiquetroupeau)
+    logger.info("[Historique] Rétention : %s ligne(s) archivée(s) dans %s puis supprimée(s)", nb, chemin)
+    return {'supprimees': nb, 'archive': chemin}
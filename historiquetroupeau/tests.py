@@ -1,3 +1,175 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from pahou.pagination import invalider, paginer, version_modele
+from recherche.models import DocumentRecherche
+from taches.moteur import tranche_terminee
+from troupeau.tests import CACHE_TEST, creer_animal
+
+from .ecriture import enregistrer
+from .models import Historiquetroupeau, ResumeHistoriqueJour
+from .retention import purger_historique
+
+
+def ligne(animal, jours=0, observations=''):
+    return Historiquetroupeau(troupeau=animal, statut='Modification', observations=observations,
+                              date_evenement=date.today() - timedelta(days=jours))
+
+
+class Annulation(Exception):
+    pass
+
+
+@override_settings(CACHES=CACHE_TEST)
+class EcritureTests(TestCase):
+
+    def setUp(self):
+        self.animal = creer_animal('A1', 'male')
+
+    def test_une_insertion_par_transaction_sans_les_savepoints_annules(self):
+        with CaptureQueriesContext(connection) as requetes:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    enregistrer(ligne(self.animal, observations='gardee'))
+                    try:
+                        with transaction.atomic():
+                            enregistrer(ligne(self.animal, observations='annulee'))
+                            raise Annulation
+                    except Annulation:
+                        pass
+                    enregistrer(ligne(self.animal, observations='gardee'))
+        self.assertEqual(Historiquetroupeau.objects.filter(observations='gardee').count(), 2)
+        self.assertFalse(Historiquetroupeau.objects.filter(observations='annulee').exists())
+        insertions = [q for q in requetes.captured_queries if q['sql'].startswith('INSERT INTO "historiquetroupeau"')]
+        self.assertEqual(len(insertions), 1)
+
+    def test_savepoint_final_annule_vide_en_fin_de_tranche(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                enregistrer(ligne(self.animal, observations='gardee'))
+                try:
+                    with transaction.atomic():
+                        enregistrer(ligne(self.animal, observations='annulee'))
+                        raise Annulation
+                except Annulation:
+                    pass
+        # Le callback de la dernière ligne a été écarté : la ligne validée attend en tampon
+        self.assertFalse(Historiquetroupeau.objects.filter(observations='gardee').exists())
+        tranche_terminee.send(sender=None)
+        self.assertTrue(Historiquetroupeau.objects.filter(observations='gardee').exists())
+        self.assertFalse(Historiquetroupeau.objects.filter(observations='annulee').exists())
+
+
+@override_settings(CACHES=CACHE_TEST)
+class ErreurInsertionTests(TransactionTestCase):
+
+    def test_erreur_journalisee_sans_bloquer_les_autres_callbacks(self):
+        animal = creer_animal('A1', 'male')
+        executes = []
+        with mock.patch('historiquetroupeau.ecriture.ajouter_au_resume', side_effect=DatabaseError("panne")):
+            with self.assertLogs('historiquetroupeau.ecriture', 'ERROR'):
+                with transaction.atomic():
+                    enregistrer(ligne(animal, observations='perdue'))
+                    transaction.on_commit(lambda: executes.append(True))
+        self.assertEqual(executes, [True])
+        self.assertFalse(Historiquetroupeau.objects.filter(observations='perdue').exists())
+
+
+@override_settings(CACHES=CACHE_TEST)
+class RetentionTests(TestCase):
+
+    def setUp(self):
+        self.animal = creer_animal('A1', 'male')
+
+    def remplir(self, n):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                for i in range(n):
+                    enregistrer(ligne(self.animal, jours=i % 3))
+
+    def purger(self):
+        with CaptureQueriesContext(connection) as requetes:
+            resultat = purger_historique(nombre=0)
+        return resultat['supprimees'], len(requetes.captured_queries)
+
+    def test_purge_ensembliste(self):
+        """Nombre de requêtes indépendant du nombre de lignes (aucun receveur par ligne)."""
+        self.remplir(5)
+        supprimees, requetes_petit = self.purger()
+        self.assertEqual(supprimees, 5)
+
+        self.remplir(60)
+        supprimees, requetes_grand = self.purger()
+        self.assertEqual(supprimees, 60)
+        self.assertEqual(requetes_grand, requetes_petit)
+
+        self.assertFalse(Historiquetroupeau.objects.exists())
+        self.assertFalse(DocumentRecherche.objects.filter(modele='historiquetroupeau.historiquetroupeau').exists())
+        self.assertFalse(ResumeHistoriqueJour.objects.filter(nombre__gt=0).exists())
+
+
+@override_settings(CACHES=CACHE_TEST)
+class PaginationTests(TestCase):
+    """Pagination par curseur (pahou/pagination.py) sur la liste de l'historique."""
+
+    TAILLE = 5
+
+    def setUp(self):
+        cache.clear()
+        animal = creer_animal('A1', 'male')
+        Historiquetroupeau.objects.bulk_create([ligne(animal, jours=i % 4) for i in range(23)])
+        invalider(Historiquetroupeau)
+        self.qs = Historiquetroupeau.objects.order_by('-date_evenement', '-id')
+        self.ids = list(self.qs.values_list('id', flat=True))
+
+    def page(self, **params):
+        return paginer(RequestFactory().get('/', params), self.qs, self.TAILLE)
+
+    def test_curseurs_suivant_puis_precedent(self):
+        pages = [self.page()]
+        while pages[-1].has_next():
+            pages.append(self.page(apres=pages[-1].curseur_suivant, page=pages[-1].next_page_number()))
+        self.assertEqual([o.pk for p in pages for o in p], self.ids)
+        self.assertEqual([p.number for p in pages], [1, 2, 3, 4, 5])
+
+        retour = [pages[-1]]
+        while retour[-1].has_previous():
+            retour.append(self.page(avant=retour[-1].curseur_precedent,
+                                    page=retour[-1].previous_page_number()))
+        self.assertEqual([o.pk for p in reversed(retour) for o in p], self.ids)
+
+    def test_numero_de_page_sans_curseur(self):
+        for numero in range(1, 6):
+            page = self.page(page=numero)
+            debut = (numero - 1) * self.TAILLE
+            self.assertEqual([o.pk for o in page], self.ids[debut:debut + self.TAILLE])
+            self.assertEqual(page.has_next(), numero < 5)
+        # Au-delà de la dernière page : dernière page
+        self.assertEqual([o.pk for o in self.page(page=99)], self.ids[20:])
+
+    def test_seconde_moitie_sur_le_total_en_cache(self):
+        self.page(page=2)   # total mis en cache
+        with self.assertNumQueries(1):
+            page = self.page(page=4)
+        self.assertEqual([o.pk for o in page], self.ids[15:20])
+
+    def test_total_en_cache_trop_grand(self):
+        self.page(page=2)
+        # Suppression non suivie : le total en cache (23) dépasse les 7 lignes restantes
+        Historiquetroupeau.objects.filter(pk__in=self.ids[:16]).delete()
+        page = self.page(page=4)
+        self.assertEqual((page.number, page.paginator.count), (2, 7))
+        self.assertEqual([o.pk for o in page], self.ids[21:])
+        self.assertFalse(page.has_next())
+
+    def test_invalider_change_la_version(self):
+        versions = {version_modele(Historiquetroupeau)}
+        for _ in range(3):
+            invalider(Historiquetroupeau)
+            versions.add(version_modele(Historiquetroupeau))
+        self.assertEqual(len(versions), 4)
@@ -34,8 +34,9 @@ urlpatterns = [
     # Dashboard (si le template existe)
     path("dashboard/", views.tableau_de_bord, name="dashboard"),
 
-    # Export CSV
+    # Exports CSV / Excel
     path("export/csv/", views.export_historique_csv, name="export_csv"),
+    path("export/excel/", views.export_historique_excel, name="export_excel"),
 
     # API JSON
     path("api/", views.api_historique_list, name="api_list"),
@@ -1,14 +1,18 @@
 # historiquetroupeau/views.py
 from datetime import datetime, timedelta
-import csv
 
-from django.db.models import Q, Count
-from django.http import HttpResponse, JsonResponse
-from django.shortcuts import get_object_or_404, render
+from django.contrib import messages
+from django.db.models import Count
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
 from django.views.generic import ListView, DetailView
 
-from .models import Historiquetroupeau
+from . import resume
+from .models import Historiquetroupeau, resumer_changements
+from pahou.exports import iterer, reponse_csv, reponse_xlsx
+from pahou.pagination import PaginationCurseurMixin, compter_en_cache, memoriser
+from recherche.moteur import rechercher
 from troupeau.models import Troupeau
 
 
@@ -34,7 +38,7 @@ def _parse_date(val):
 def _filtered_queryset(request):
     """
     Filtres communs (liste, export, API):
-      - q : texte (boucle, statut, observations, anciennes/nouvelles boucles)
+      - q : texte (boucle, statut, observations, valeurs du diff `changements`)
       - statut : égalité exacte
       - from / to : bornes inclusives sur date_evenement (date)
       - troupeau_id : par animal (id)
@@ -47,15 +51,6 @@ def _filtered_queryset(request):
     dto = _parse_date(request.GET.get("to"))
     troupeau_id = (request.GET.get("troupeau_id") or "").strip()
 
-    if q:
-        qs = qs.filter(
-            Q(troupeau__boucle_ovin__icontains=q) |
-            Q(statut__icontains=q) |
-            Q(ancienne_boucle__icontains=q) |
-            Q(nouvelle_boucle__icontains=q) |
-            Q(observations__icontains=q)
-        )
-
     if statut:
         qs = qs.filter(statut=statut)
 
@@ -67,12 +62,30 @@ def _filtered_queryset(request):
     if troupeau_id.isdigit():
         qs = qs.filter(troupeau_id=int(troupeau_id))
 
-    return qs.order_by("-date_evenement", "-id")
+    qs = qs.order_by("-date_evenement", "-id")
+    if q:
+        qs = rechercher(qs, q)  # index plein texte, classé par pertinence
+    return qs
+
+
+def _couvert_par_resume(request):
+    """Filtres (statut, dates) que le résumé journalier sait compter sans lire l'historique."""
+    get = request.GET
+    return not (get.get("q") or "").strip() and not (get.get("troupeau_id") or "").strip().isdigit()
+
+
+def _totaux_resume(request):
+    get = request.GET
+    return resume.totaux(
+        statut=(get.get("statut") or "").strip(),
+        debut=_parse_date(get.get("from")),
+        fin=_parse_date(get.get("to")),
+    )
 
 
 # ========= Vues HTML =========
 
-class HistoriquetroupeauListView(ListView):
+class HistoriquetroupeauListView(PaginationCurseurMixin, ListView):
     """
     Liste filtrable/paginée de l'historique.
     GET: q, statut, from, to, troupeau_id
@@ -87,13 +100,17 @@ class HistoriquetroupeauListView(ListView):
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        base_qs = _filtered_queryset(self.request)
-        ctx["total"] = base_qs.count()
-        ctx["par_statut"] = (
-            base_qs.values("statut")
-                  .annotate(c=Count("id"))
-                  .order_by("-c")
-        )
+        if _couvert_par_resume(self.request):
+            # Filtres couverts par le résumé journalier : pas de parcours de l'historique
+            ctx["total"], ctx["par_statut"] = _totaux_resume(self.request)
+        else:
+            base_qs = self.object_list
+            ctx["total"] = compter_en_cache(base_qs)
+            ctx["par_statut"] = memoriser(base_qs, "par_statut", lambda: list(
+                base_qs.values("statut")
+                      .annotate(c=Count("id"))
+                      .order_by("-c")
+            ))
         ctx["filters"] = {
             "q": self.request.GET.get("q", ""),
             "statut": self.request.GET.get("statut", ""),
@@ -138,39 +155,66 @@ class HistoriqueParTroupeauListView(ListView):
 
 # ========= Export CSV =========
 
-def export_historique_csv(request):
+EXPORT_ENTETES = [
+    "Date", "Boucle", "Statut",
+    "Ancienne boucle", "Nouvelle boucle",
+    "Ancien statut", "Nouveau statut",
+    "Changements", "Observations",
+]
+
+
+def _lignes_export(qs):
     """
-    Export CSV des événements filtrés (mêmes filtres que la liste).
+    Lignes d'export (ordre EXPORT_ENTETES) lues par lots : boucle de l'animal
+    par jointure, diff résumé en mémoire ; la date reste une date.
     """
-    qs = _filtered_queryset(request)
+    for date_evenement, boucle_animal, statut, changements, observations in iterer(
+        qs, "date_evenement", "troupeau__boucle_ovin", "statut", "changements", "observations",
+    ):
+        ancienne_boucle, nouvelle_boucle = (changements or {}).get("boucle_ovin") or (None, None)
+        ancien_statut, nouveau_statut = (changements or {}).get("statut") or (None, None)
+        yield [
+            date_evenement,
+            boucle_animal or nouvelle_boucle or ancienne_boucle or "",
+            statut or "",
+            ancienne_boucle or "",
+            nouvelle_boucle or "",
+            ancien_statut or "",
+            nouveau_statut or "",
+            resumer_changements(changements),
+            (observations or "").replace("\n", " ").strip(),
+        ]
+
+
+def export_historique_csv(request):
+    """Export CSV des événements filtrés (mêmes filtres que la liste), en flux."""
+    def formater():
+        for ligne in _lignes_export(_filtered_queryset(request)):
+            ligne[0] = ligne[0].strftime("%d/%m/%Y") if ligne[0] else ""
+            yield ligne
 
     # UTF-8 + BOM pour Excel
-    response = HttpResponse(content_type="text/csv; charset=utf-8")
-    response["Content-Disposition"] = f'attachment; filename="historique_{timezone.localdate().isoformat()}.csv"'
-    response.write("\ufeff")
-
-    writer = csv.writer(response, delimiter=";", lineterminator="\n")
-    writer.writerow([
-        "Date", "Boucle", "Statut",
-        "Ancienne boucle", "Nouvelle boucle",
-        "Ancien statut", "Nouveau statut",
-        "Observations",
-    ])
-
-    for evt in qs:
-        boucle = evt.troupeau.boucle_ovin if evt.troupeau else ""
-        writer.writerow([
-            evt.date_evenement.strftime("%d/%m/%Y") if evt.date_evenement else "",
-            boucle,
-            evt.statut or "",
-            evt.ancienne_boucle or "",
-            evt.nouvelle_boucle or "",
-            evt.ancien_statut or "",
-            evt.nouveau_statut or "",
-            (evt.observations or "").replace("\n", " ").strip(),
-        ])
+    return reponse_csv(
+        f"historique_{timezone.localdate().isoformat()}.csv", EXPORT_ENTETES, formater(),
+        content_type="text/csv; charset=utf-8", bom=True, lineterminator="\n",
+    )
 
-    return response
+
+def export_historique_excel(request):
+    """Export Excel des événements filtrés : feuille des événements et décompte par statut."""
+    qs = _filtered_queryset(request)
+    if _couvert_par_resume(request):
+        par_statut = ([r["statut"], r["c"]] for r in _totaux_resume(request)[1])
+    else:
+        par_statut = qs.order_by().values_list("statut").annotate(c=Count("id")).order_by("-c").iterator()
+    try:
+        return reponse_xlsx(f"historique_{timezone.localdate().isoformat()}.xlsx", [
+            ("Événements", EXPORT_ENTETES, _lignes_export(qs)),
+            ("Par statut", ["Statut", "Nombre"], par_statut),
+        ])
+    except ImportError:
+        messages.error(request, "La fonctionnalité Excel nécessite la librairie openpyxl")
+        return redirect("historiquetroupeau:liste")
 
 
 # ========= API JSON =========
@@ -186,11 +230,12 @@ def api_historique_list(request):
         "date_evenement": e.date_evenement.isoformat() if e.date_evenement else None,
         "statut": e.statut,
         "troupeau_id": e.troupeau_id,
-        "boucle": e.troupeau.boucle_ovin if e.troupeau else None,
-        "ancienne_boucle": e.ancienne_boucle,
-        "nouvelle_boucle": e.nouvelle_boucle,
-        "ancien_statut": e.ancien_statut,
-        "nouveau_statut": e.nouveau_statut,
+        "boucle": e.boucle,
+        "ancienne_boucle": e.boucles[0],
+        "nouvelle_boucle": e.boucles[1],
+        "ancien_statut": e.valeurs("statut")[0],
+        "nouveau_statut": e.valeurs("statut")[1],
+        "changements": e.changements,
         "observations": e.observations,
     } for e in qs]
     return JsonResponse({"results": data})
@@ -210,17 +255,10 @@ def api_historique_stats(request):
     today = timezone.localdate()
     since = today - timedelta(days=days)
 
-    qs = Historiquetroupeau.objects.all()
-    total = qs.count()
-    par_statut = list(qs.values("statut").annotate(c=Count("id")).order_by("-c"))
-
-    recent_qs = (
-        qs.filter(date_evenement__gte=since)
-          .values("date_evenement")
-          .annotate(c=Count("id"))
-          .order_by("date_evenement")
-    )
-    recent = [{"date": r["date_evenement"].isoformat(), "count": r["c"]} for r in recent_qs]
+    # Lu dans le résumé journalier (quelques centaines de lignes), pas dans l'historique
+    total, par_statut = resume.totaux()
+    recent = [{"date": r["date"].isoformat(), "count": r["c"]}
+              for r in resume.serie_journaliere(since, today)]
 
     return JsonResponse({
         "total": total,
@@ -238,12 +276,7 @@ def tableau_de_bord(request):
     """
     Tableau de bord simple pour l'historique (exposé si tu as un template 'historiquetroupeau/dashboard.html').
     """
-    total = Historiquetroupeau.objects.count()
-    par_statut = (
-        Historiquetroupeau.objects
-        .values("statut").annotate(c=Count("id"))
-        .order_by("-c")
-    )
+    total, par_statut = resume.totaux()
     derniers = (
         Historiquetroupeau.objects
         .select_related("troupeau")
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maladie', '0001_initial'),
+        ('troupeau', '0004_message_boucle_active'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='maladie',
+            name='maladie_mal_Date_ob_8df658_idx',
+        ),
+        migrations.AddIndex(
+            model_name='maladie',
+            index=models.Index(fields=['Date_observation', 'id'], name='maladie_mal_Date_ob_676858_idx'),
+        ),
+    ]
@@ -114,7 +114,7 @@ class Maladie(models.Model):
         verbose_name_plural = 'Maladies'
         indexes = [
             models.Index(fields=['Boucle_Ovin']),
-            models.Index(fields=['Date_observation']),
+            models.Index(fields=['Date_observation', 'id']),  # tri des listes (pagination par curseur)
             models.Index(fields=['Nom_Maladie']),
         ]
 
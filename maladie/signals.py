@@ -6,6 +6,7 @@ from django.utils.timezone import now
 import logging
 
 from .models import Maladie
+from pahou.pagination import suivre_modifications
 
 logger = logging.getLogger(__name__)
 
@@ -58,3 +59,7 @@ def alert_maladie_active_longue(sender, instance: Maladie, created, **kwargs):
     except Exception:
         # On ne bloque jamais la sauvegarde si le log échoue
         pass
+
+
+# Totaux en cache des listes paginées (pahou/pagination.py)
+suivre_modifications(Maladie)
@@ -7,6 +7,7 @@ app_name = "maladie"
 urlpatterns = [
     path("", views.MaladieListView.as_view(), name="maladie_list"),
     path("dashboard/", views.dashboard, name="dashboard"),
+    path("export/excel/", views.export_excel, name="export_excel"),
     path("ajouter/", views.MaladieCreateView.as_view(), name="maladie_create"),
     path("<int:pk>/", views.MaladieDetailView.as_view(), name="maladie_detail"),
     path("modifier/<int:pk>/", views.MaladieUpdateView.as_view(), name="maladie_update"),
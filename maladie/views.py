@@ -4,14 +4,16 @@ import csv  # (si besoin plus tard pour export)
 
 from django.contrib import messages
 from django.core.exceptions import ValidationError
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.db import IntegrityError
-from django.db.models import Q, Count
+from django.db.models import Count, Q, Sum
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views import View
 
 from .forms import MaladieForm
 from .models import Maladie
+from pahou.exports import iterer, libelles, reponse_xlsx
+from pahou.pagination import paginer
+from recherche.moteur import rechercher
 
 
 # ========= Helpers =========
@@ -49,15 +51,6 @@ def _filtered_qs(request):
     dfrom = _parse_date(request.GET.get("from"))
     dto = _parse_date(request.GET.get("to"))
 
-    if q:
-        qs = qs.filter(
-            Q(Boucle_Ovin__boucle_ovin__icontains=q) |
-            Q(Nom_Maladie__icontains=q) |
-            Q(Symptomes_Observes__icontains=q) |
-            Q(Veterinaire__icontains=q) |
-            Q(Observations__icontains=q)
-        )
-
     if statut:
         qs = qs.filter(Statut=statut)
 
@@ -69,7 +62,10 @@ def _filtered_qs(request):
     if dto:
         qs = qs.filter(Date_observation__lte=dto)
 
-    return qs.order_by("-Date_observation", "-id")
+    qs = qs.order_by("-Date_observation", "-id")
+    if q:
+        qs = rechercher(qs, q)  # index plein texte, classé par pertinence
+    return qs
 
 
 # ========= Vues HTML =========
@@ -80,15 +76,7 @@ class MaladieListView(View):
     def get(self, request):
         base_qs = _filtered_qs(request)
 
-        paginator = Paginator(base_qs, self.paginate_by)
-        page = request.GET.get("page")
-
-        try:
-            page_obj = paginator.get_page(page)
-        except PageNotAnInteger:
-            page_obj = paginator.get_page(1)
-        except EmptyPage:
-            page_obj = paginator.get_page(paginator.num_pages)
+        page_obj = paginer(request, base_qs, self.paginate_by)
 
         ctx = {
             "maladies": page_obj.object_list,
@@ -222,3 +210,43 @@ def dashboard(request):
         "par_maladie": par_maladie,
         "derniers": derniers,
     })
+
+
+# ========= Export Excel =========
+
+def export_excel(request):
+    """
+    Classeur des maladies filtrées : une feuille des cas (lue par lots,
+    boucle par jointure) et une par maladie (cas, actifs, coût total).
+    """
+    qs = _filtered_qs(request)
+    nom = libelles(Maladie.NOM_CHOICES)
+    symptome = libelles(Maladie.SYMPTOMES_CHOICES)
+    traitement = libelles(Maladie.TRAITEMENT_CHOICES)
+    gravite = libelles(Maladie.GRAVITE_CHOICES)
+    statut = libelles(Maladie.STATUT_CHOICES)
+    cas = (
+        [observation, guerison, boucle, nom(n), symptome(sy), traitement(tr), duree, cout,
+         gravite(g), statut(st), veterinaire, (observations or "").replace("\n", " ").strip()]
+        for observation, guerison, boucle, n, sy, tr, duree, cout, g, st, veterinaire, observations in iterer(
+            qs, "Date_observation", "Date_guerison", "Boucle_Ovin__boucle_ovin", "Nom_Maladie",
+            "Symptomes_Observes", "Traitement_Administre", "Duree_Traitement", "Cout_Traitement_FCFA",
+            "Gravite", "Statut", "Veterinaire", "Observations",
+        )
+    )
+    par_maladie = (
+        qs.order_by().values_list("Nom_Maladie")
+        .annotate(c=Count("id"), actifs=Count("id", filter=Q(Statut="Actif")), cout=Sum("Cout_Traitement_FCFA"))
+        .order_by("-c", "Nom_Maladie")
+    )
+    try:
+        return reponse_xlsx(f"maladies_{datetime.now().date()}.xlsx", [
+            ("Maladies", ["Date d'observation", "Date de guérison", "Boucle", "Maladie", "Symptômes",
+                          "Traitement", "Durée (j)", "Coût (FCFA)", "Gravité", "Statut", "Vétérinaire",
+                          "Observations"], cas),
+            ("Par maladie", ["Maladie", "Cas", "Actifs", "Coût total (FCFA)"],
+             ([nom(n), c, actifs, cout] for n, c, actifs, cout in par_maladie.iterator())),
+        ])
+    except ImportError:
+        messages.error(request, "La fonctionnalité Excel nécessite la librairie openpyxl")
+        return redirect("maladie:maladie_list")
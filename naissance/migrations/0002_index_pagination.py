@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accouplement', '0002_index_pagination'),
+        ('naissance', '0001_initial'),
+        ('troupeau', '0004_message_boucle_active'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='naissance',
+            index=models.Index(fields=['date_mise_bas', 'id'], name='naissance_date_mi_666894_idx'),
+        ),
+    ]
@@ -60,6 +60,9 @@ class Naissance(models.Model):
                 name='uniq_naissance_mere_date'
             ),
         ]
+        indexes = [
+            models.Index(fields=['date_mise_bas', 'id']),  # tri des listes (pagination par curseur)
+        ]
 
     def __str__(self):
         return f"Naissance du {self.date_mise_bas:%d/%m/%Y} — mère {getattr(self.boucle_mere, 'boucle_ovin', '—')}"
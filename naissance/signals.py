@@ -5,6 +5,7 @@ from django.db.models.signals import post_save
 from django.dispatch import receiver
 
 from .models import Naissance
+from pahou.pagination import suivre_modifications
 
 logger = logging.getLogger(__name__)
 
@@ -29,3 +30,7 @@ def after_naissance_save(sender, instance: Naissance, created: bool, **kwargs):
 
     # Exécute le log après commit (sécurise contre les rollbacks)
     transaction.on_commit(_log)
+
+
+# Totaux en cache des listes paginées (pahou/pagination.py)
+suivre_modifications(Naissance)
@@ -3,14 +3,15 @@ from datetime import datetime
 
 from django.contrib import messages
 from django.core.exceptions import ValidationError
-from django.core.paginator import Paginator
 from django.db import IntegrityError
-from django.db.models import Q, Count, Avg
+from django.db.models import Count, Avg
 from django.shortcuts import get_object_or_404, render, redirect
 from django.views import View
 
 from .models import Naissance
 from .forms import NaissanceForm
+from pahou.pagination import paginer
+from recherche.moteur import rechercher
 
 
 # --------- Helpers ---------
@@ -51,15 +52,6 @@ def _filtered_queryset(request):
     dfrom = _parse_date(request.GET.get("from"))
     dto = _parse_date(request.GET.get("to"))
 
-    if q:
-        qs = qs.filter(
-            Q(boucle_mere__boucle_ovin__icontains=q) |
-            Q(nom_male_externe__icontains=q) |
-            Q(observations__icontains=q) |
-            Q(accouplement__boucle_brebis__boucle_ovin__icontains=q) |
-            Q(accouplement__boucle_belier__boucle_ovin__icontains=q)
-        )
-
     if origine in ("Interne", "Externe", "Inconnu"):
         qs = qs.filter(origine_accouplement=origine)
 
@@ -68,6 +60,8 @@ def _filtered_queryset(request):
     if dto:
         qs = qs.filter(date_mise_bas__lte=dto)
 
+    if q:
+        qs = rechercher(qs, q)  # index plein texte, classé par pertinence
     return qs
 
 
@@ -79,8 +73,7 @@ class NaissanceListView(View):
 
     def get(self, request):
         qs = _filtered_queryset(request)
-        paginator = Paginator(qs, self.PAGE_SIZE)
-        page_obj = paginator.get_page(request.GET.get("page"))
+        page_obj = paginer(request, qs, self.PAGE_SIZE)
 
         ctx = {
             "naissances": page_obj,             # itérable dans le template
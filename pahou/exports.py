@@ -0,0 +1,118 @@
+# pahou/exports.py
+"""
+Exports CSV en flux (StreamingHttpResponse), en mémoire constante.
+
+Les lignes viennent de `values_list(...).iterator(chunk_size=...)` : pas
+d'instance de modèle, les boucles liées sont lues par jointure dans la même
+requête et les libellés des choix résolus en mémoire (libelles()). Le premier
+octet part dès le premier lot lu ; les lignes sont regroupées par paquets
+pour limiter le nombre de morceaux envoyés.
+
+    return reponse_csv(
+        "troupeau.csv", ["Boucle", "Sexe"],
+        ((b, sexe(s)) for b, s in iterer(qs, "boucle_ovin", "sexe")),
+    )
+
+Excel : reponse_xlsx() écrit un classeur de plusieurs feuilles avec openpyxl
+en écriture seule (chaque feuille part en flux dans un fichier temporaire
+d'openpyxl), enregistré dans un fichier temporaire servi par FileResponse.
+openpyxl n'est importé qu'à l'appel : ImportError s'il manque.
+
+    return reponse_xlsx("ventes.xlsx", [
+        ("Ventes", ["Date", "Boucle"], iterer(qs, "date_vente", "boucle_ovin__boucle_ovin")),
+        ("Par mois", ["Mois", "Nombre"], par_mois),
+    ])
+"""
+import csv
+import io
+import itertools
+import re
+import tempfile
+
+from django.http import FileResponse, StreamingHttpResponse
+
+TAILLE_LOT = 2000      # lignes lues par aller-retour base
+LIGNES_PAR_MORCEAU = 500  # lignes CSV par morceau envoyé
+XLSX_EN_MEMOIRE = 4 * 1024 * 1024  # au-delà, le classeur enregistré passe sur disque
+XLSX_LIGNES_MAX = 1048576  # limite d'Excel par feuille, en-tête compris
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def iterer(qs, *champs, chunk_size=TAILLE_LOT):
+    """Tuples `champs` du queryset, lus par lots (curseur serveur sous PostgreSQL)."""
+    return qs.values_list(*champs).iterator(chunk_size=chunk_size)
+
+
+def libelles(choix):
+    """Fonction code -> libellé d'un *_CHOIX (le code lui-même s'il est inconnu, '' si vide)."""
+    table = dict(choix)
+    return lambda code: table.get(code, code) if code is not None else ''
+
+
+def lignes_csv(entetes, lignes, bom=False, **format_csv):
+    """Génère le texte CSV (en-têtes puis lignes) par morceaux ; `format_csv` va à csv.writer."""
+    tampon = io.StringIO()
+    writer = csv.writer(tampon, **format_csv)
+    if bom:
+        tampon.write("\ufeff")
+    writer.writerow(entetes)
+    yield tampon.getvalue()   # en-têtes envoyés avant la première requête
+    tampon.seek(0)
+    tampon.truncate()
+    n = 0
+    for ligne in lignes:
+        writer.writerow(ligne)
+        n += 1
+        if n % LIGNES_PAR_MORCEAU == 0:
+            yield tampon.getvalue()
+            tampon.seek(0)
+            tampon.truncate()
+    if tampon.tell():
+        yield tampon.getvalue()
+
+
+def reponse_csv(nom_fichier, entetes, lignes, content_type="text/csv", bom=False, delimiter=";", **format_csv):
+    """StreamingHttpResponse en pièce jointe pour des lignes CSV (itérable de séquences)."""
+    response = StreamingHttpResponse(
+        lignes_csv(entetes, lignes, bom=bom, delimiter=delimiter, **format_csv),
+        content_type=content_type,
+    )
+    response["Content-Disposition"] = f'attachment; filename="{nom_fichier}"'
+    return response
+
+
+def _titre_feuille(titre):
+    """Titre de feuille Excel valide (31 caractères, sans []:*?/\\)."""
+    return re.sub(r"[\[\]:*?/\\]", "-", str(titre))[:31] or "Feuille"
+
+
+def reponse_xlsx(nom_fichier, feuilles):
+    """
+    FileResponse en pièce jointe d'un classeur .xlsx ; `feuilles` est une
+    liste de (titre, en-têtes, lignes), les lignes étant un itérable lu une
+    seule fois. En-têtes en gras, ligne d'en-tête figée ; les lignes au-delà
+    de la limite d'Excel ne sont pas écrites.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    classeur = Workbook(write_only=True)
+    gras = Font(bold=True)
+    for titre, entetes, lignes in feuilles:
+        feuille = classeur.create_sheet(title=_titre_feuille(titre))
+        feuille.freeze_panes = "A2"
+        cellules = []
+        for entete in entetes:
+            cellule = WriteOnlyCell(feuille, value=entete)
+            cellule.font = gras
+            cellules.append(cellule)
+        feuille.append(cellules)
+        for ligne in itertools.islice(lignes, XLSX_LIGNES_MAX - 1):
+            feuille.append(ligne)
+
+    fichier = tempfile.SpooledTemporaryFile(max_size=XLSX_EN_MEMOIRE)
+    classeur.save(fichier)
+    fichier.seek(0)
+    # FileResponse ferme (et supprime) le fichier temporaire en fin d'envoi
+    return FileResponse(fichier, as_attachment=True, filename=nom_fichier, content_type=XLSX_CONTENT_TYPE)
@@ -0,0 +1,95 @@
+# pahou/mixins.py
+"""
+Mixins de modèles partagés entre les applications.
+"""
+import copy
+
+
+class SuiviModificationsMixin:
+    """
+    Suivi des champs modifiés sans relire la ligne en base.
+
+    Les valeurs des champs concrets sont mémorisées à la lecture (from_db,
+    refresh_from_db) et après chaque sauvegarde. `get_dirty_fields()` compare
+    l'état courant à ce cliché.
+
+    save() sur une instance déjà en base calcule update_fields lui-même : seuls
+    les champs modifiés (plus les champs auto_now) sont écrits. Sans effet si
+    update_fields, force_insert ou une autre base sont demandés. Un champ
+    modifié par un receveur pre_save n'est donc écrit que s'il l'était déjà.
+
+    À placer avant models.Model dans les bases :
+        class Croissance(SuiviModificationsMixin, models.Model): ...
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._prendre_cliche()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._prendre_cliche(fields)
+
+    def _champs_suivis(self, noms=None):
+        champs = [f for f in self._meta.concrete_fields if not f.primary_key]
+        if noms is not None:
+            noms = set(noms)
+            champs = [f for f in champs if f.name in noms or f.attname in noms]
+        return champs
+
+    def _prendre_cliche(self, noms=None):
+        """Mémorise la valeur actuelle des champs chargés (`noms` : tous si None)."""
+        cliche = self.__dict__.setdefault('_valeurs_initiales', {})
+        for f in self._champs_suivis(noms):
+            if f.attname in self.__dict__:
+                valeur = self.__dict__[f.attname]
+                cliche[f.attname] = copy.deepcopy(valeur) if isinstance(valeur, (dict, list)) else valeur
+
+    def _champs_modifies(self):
+        """Champs chargés dont la valeur diffère du cliché (ou absents du cliché)."""
+        if self._state.adding:
+            return []
+        cliche = self.__dict__.get('_valeurs_initiales', {})
+        return [
+            f for f in self._champs_suivis()
+            if f.attname in self.__dict__
+            and (f.attname not in cliche or cliche[f.attname] != self.__dict__[f.attname])
+        ]
+
+    def get_dirty_fields(self):
+        """
+        {nom du champ: valeur initiale} des champs modifiés depuis la lecture
+        (identifiant brut pour une FK). Vide pour une instance pas encore
+        enregistrée. Un champ différé (only/defer) affecté sans avoir été lu
+        n'a pas de valeur initiale connue : elle est lue en base (une requête,
+        seulement dans ce cas).
+        """
+        modifies = self._champs_modifies()
+        cliche = self.__dict__.get('_valeurs_initiales', {})
+        inconnus = [f.attname for f in modifies if f.attname not in cliche]
+        anciens = {}
+        if inconnus:
+            anciens = (type(self)._base_manager.using(self._state.db)
+                       .filter(pk=self.pk).values(*inconnus).first()) or {}
+        return {
+            f.name: cliche[f.attname] if f.attname in cliche else anciens.get(f.attname)
+            for f in modifies
+        }
+
+    def save(self, *args, **kwargs):
+        automatique = (
+            not args
+            and not self._state.adding
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+            and kwargs.get('using') in (None, self._state.db)
+        )
+        if automatique:
+            noms = [f.name for f in self._champs_modifies()]
+            noms += [f.name for f in self._meta.concrete_fields
+                     if getattr(f, 'auto_now', False) and f.name not in noms]
+            kwargs['update_fields'] = noms
+        super().save(*args, **kwargs)
+        self._prendre_cliche(kwargs.get('update_fields'))
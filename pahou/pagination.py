@@ -0,0 +1,333 @@
+# pahou/pagination.py
+"""
+Pagination par curseur (« seek ») des grandes listes d'événements.
+
+Les listes sont triées par (-date, -id). Plutôt qu'un OFFSET, dont le coût
+croît avec le numéro de page, la page suivante est lue juste après la
+dernière ligne affichée :
+
+    WHERE date <= d AND (date < d OR (date = d AND id < i))
+    ORDER BY date DESC, id DESC LIMIT n + 1
+
+ce qui, avec un index composite (date, id), coûte le même prix en page 1 ou
+en page 2000. Les liens Précédent / Suivant portent ce curseur dans `avant`
+ou `apres` en plus de `page`, qui ne sert alors plus qu'à l'affichage.
+Un lien `?page=N` sans curseur (signet, lien existant) reste valide : il est
+servi par OFFSET, lu depuis la fin de la liste (ordre inversé) pour les
+pages de la seconde moitié. Une liste qui n'est pas triée sur des champs du
+modèle terminés par la clé primaire (ex. recherche classée par pertinence)
+est paginée par OFFSET uniquement.
+
+Le total et les répartitions affichés avec la liste sont mis en cache
+(compter_en_cache, memoriser) sous une clé qui contient la version du
+modèle. suivre_modifications() la renouvelle à chaque sauvegarde ou
+suppression validée ; les écritures en masse (bulk_create, delete() d'un
+QuerySet) appellent invalider() elles-mêmes. La version est un horodatage
+(time_ns) écrit par cache.set et non un compteur : deux invalidations
+simultanées dans deux workers donnent chacune une version nouvelle, sans
+lecture-modification-écriture (cache.incr n'est pas atomique sur
+FileBasedCache). Un changement dans une table liée (ex. boucle renommée,
+filtre `q`) n'est vu qu'à l'expiration du cache : d'ici là, les pages de la
+seconde moitié, lues depuis la fin sur le total en cache, peuvent être
+décalées ; une page incomplète (total en cache trop grand) est recomptée.
+
+    class VenteListView(PaginationCurseurMixin, ListView): ...
+
+    page_obj = paginer(request, qs, 25)   # vues View
+"""
+import base64
+import hashlib
+import json
+import math
+import time
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.utils.functional import cached_property
+
+DUREE_CACHE = 10 * 60
+
+
+# =========================
+# Cache des totaux
+# =========================
+
+def _cle_version(modele):
+    return f"pagination:version:{modele._meta.label_lower}"
+
+
+def version_modele(modele):
+    """Version des données du modèle (renouvelée à chaque écriture validée)."""
+    cle = _cle_version(modele)
+    version = cache.get(cle)
+    if version is None:
+        # Départ horodaté : une clé évincée du cache ne ressert pas d'anciennes versions
+        cache.add(cle, time.time_ns(), None)
+        version = cache.get(cle, 0)
+    return version
+
+
+def invalider(modele):
+    """Périme les totaux en cache du modèle (nouvelle version, écrite sans relire l'ancienne)."""
+    cache.set(_cle_version(modele), time.time_ns(), None)
+
+
+def _invalider_au_commit(sender, using=None, **kwargs):
+    transaction.on_commit(lambda: invalider(sender), using=using)
+
+
+def suivre_modifications(*modeles):
+    """Invalide les totaux en cache à chaque save() / delete() validé de ces modèles."""
+    for modele in modeles:
+        uid = f"pagination_invalider_{modele._meta.label_lower}"
+        post_save.connect(_invalider_au_commit, sender=modele, dispatch_uid=f"{uid}_save")
+        post_delete.connect(_invalider_au_commit, sender=modele, dispatch_uid=f"{uid}_delete")
+
+
+def empreinte(queryset):
+    """Empreinte de la requête SQL (et de ses paramètres) d'un QuerySet."""
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:  # ex. filtre `pk__in=[]`
+        sql, params = 'vide', ()
+    return hashlib.md5(repr((sql, params)).encode()).hexdigest()
+
+
+def memoriser(queryset, nom, calcul, timeout=DUREE_CACHE):
+    """
+    Résultat de calcul() mis en cache pour ce QuerySet filtré, jusqu'à la
+    prochaine écriture sur son modèle :
+
+        par_type = memoriser(base, "par_type", lambda: list(base.values(...)...))
+    """
+    modele = queryset.model
+    cle = f"pagination:{modele._meta.label_lower}:{version_modele(modele)}:{nom}:{empreinte(queryset)}"
+    valeur = cache.get(cle)
+    if valeur is None:
+        valeur = calcul()
+        cache.set(cle, valeur, timeout)
+    return valeur
+
+
+def compter_en_cache(queryset, timeout=DUREE_CACHE):
+    return memoriser(queryset.order_by(), "count", queryset.count, timeout)
+
+
+# =========================
+# Curseurs
+# =========================
+
+def _cles_tri(queryset):
+    """[(champ, décroissant)] d'après order_by, ou None si l'ordre ne permet pas de curseur."""
+    ordre = queryset.query.order_by
+    meta = queryset.model._meta
+    cles = []
+    for terme in ordre:
+        if not isinstance(terme, str) or terme == '?':
+            return None
+        nom = terme.lstrip('-')
+        try:
+            champ = meta.pk if nom == 'pk' else meta.get_field(nom)
+        except FieldDoesNotExist:
+            return None
+        if champ.is_relation or champ.null:
+            return None
+        cles.append((champ, terme.startswith('-')))
+    if not cles or not cles[-1][0].primary_key:
+        return None
+    return cles
+
+
+def _encoder(valeurs):
+    brut = json.dumps(valeurs, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(brut).decode().rstrip('=')
+
+
+def _decoder(jeton, cles):
+    """Valeurs du curseur, ou None si le jeton est illisible."""
+    try:
+        brut = base64.urlsafe_b64decode(jeton + '=' * (-len(jeton) % 4))
+        valeurs = json.loads(brut)
+        if not isinstance(valeurs, list) or len(valeurs) != len(cles):
+            return None
+        valeurs = [champ.to_python(v) for (champ, _desc), v in zip(cles, valeurs)]
+    except Exception:
+        return None
+    return None if any(v is None for v in valeurs) else valeurs
+
+
+def _filtre_seek(cles, valeurs, vers_la_fin):
+    """Lignes strictement après (vers_la_fin) ou avant le curseur, dans l'ordre de la liste."""
+    def operateur(desc):
+        return 'lt' if desc == vers_la_fin else 'gt'
+
+    filtre = Q()
+    egalites = {}
+    for (champ, desc), valeur in zip(cles, valeurs):
+        filtre |= Q(**egalites, **{f"{champ.attname}__{operateur(desc)}": valeur})
+        egalites[champ.attname] = valeur
+    # Borne sur la première clé : sert de condition d'index (parcours à partir du curseur)
+    (premier, desc), valeur = cles[0], valeurs[0]
+    borne = Q(**{f"{premier.attname}__{operateur(desc)}e": valeur})
+    return borne & filtre
+
+
+def _curseur(objet, cles):
+    if objet is None or cles is None:
+        return ''
+    valeurs = [getattr(objet, champ.attname) for champ, _desc in cles]
+    return '' if any(v is None for v in valeurs) else _encoder(valeurs)
+
+
+# =========================
+# Paginateur
+# =========================
+
+class PaginateurCurseur:
+    """Partie de l'API de django.core.paginator.Paginator lue par les templates."""
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    @cached_property
+    def count(self):
+        return compter_en_cache(self.queryset)
+
+    @cached_property
+    def num_pages(self):
+        return max(1, math.ceil(self.count / self.per_page))
+
+    @property
+    def page_range(self):
+        return range(1, self.num_pages + 1)
+
+
+class PageCurseur:
+    """Page de résultats ; curseur_precedent / curseur_suivant vont dans `avant` / `apres`."""
+
+    def __init__(self, object_list, number, paginator, cles, precedente, suivante):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self._precedente = precedente
+        self._suivante = suivante
+        self.curseur_precedent = _curseur(object_list[0], cles) if precedente and object_list else ''
+        self.curseur_suivant = _curseur(object_list[-1], cles) if suivante and object_list else ''
+
+    def __repr__(self):
+        return f"<Page {self.number}>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._suivante
+
+    def has_previous(self):
+        return self._precedente
+
+    def has_other_pages(self):
+        return self._precedente or self._suivante
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return max(1, self.number - 1)
+
+    def start_index(self):
+        if not self.object_list:
+            return 0
+        return (self.number - 1) * self.paginator.per_page + 1
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1 if self.object_list else 0
+
+
+def _numero(valeur):
+    try:
+        return max(1, int(valeur))
+    except (TypeError, ValueError):
+        return 1
+
+
+def _depuis_la_fin(queryset, total, debut, taille):
+    """Lignes [debut, debut + taille) lues en ordre inverse ; None si le total est trop grand."""
+    fin = min(debut + taille, total)
+    lignes = list(queryset.reverse()[max(0, total - fin):total - debut])
+    if len(lignes) < fin - debut:
+        return None
+    lignes.reverse()
+    return lignes
+
+
+def _page_offset(queryset, paginator, numero, taille):
+    """Page `numero` par OFFSET (lien sans curseur) ; la seconde moitié est lue depuis la fin."""
+    if numero > 1 and numero > paginator.num_pages:
+        numero = paginator.num_pages
+    debut = (numero - 1) * taille
+    if numero > 1 and debut > paginator.count // 2:
+        lignes = _depuis_la_fin(queryset, paginator.count, debut, taille)
+        if lignes is None:
+            # Total en cache trop grand (suppression dans une table liée, écriture
+            # non suivie) : page incomplète, on recompte et on périme le cache
+            paginator.__dict__.update(count=queryset.count())
+            invalider(queryset.model)
+            paginator.__dict__.pop('num_pages', None)
+            numero = min(numero, paginator.num_pages)
+            debut = (numero - 1) * taille
+            lignes = _depuis_la_fin(queryset, paginator.count, debut, taille) or []
+        return lignes, numero, numero > 1, debut + len(lignes) < paginator.count
+    lignes = list(queryset[debut:debut + taille + 1])
+    return lignes[:taille], numero, numero > 1, len(lignes) > taille
+
+
+def paginer(request, queryset, par_page, param_page='page'):
+    """
+    Page demandée par `request.GET` :
+      - apres=<curseur> : lignes suivant ce curseur (lien Suivant) ;
+      - avant=<curseur> : lignes précédant ce curseur (lien Précédent) ;
+      - sinon page=N par OFFSET (liens existants).
+    """
+    cles = _cles_tri(queryset)
+    paginator = PaginateurCurseur(queryset, par_page)
+    numero = _numero(request.GET.get(param_page))
+    apres = avant = None
+    if cles is not None:
+        apres = _decoder(request.GET.get('apres') or '', cles)
+        avant = None if apres else _decoder(request.GET.get('avant') or '', cles)
+
+    if apres:
+        lignes = list(queryset.filter(_filtre_seek(cles, apres, True))[:par_page + 1])
+        precedente, suivante = True, len(lignes) > par_page
+        lignes = lignes[:par_page]
+        numero = max(numero, 2)
+    elif avant:
+        lignes = list(queryset.filter(_filtre_seek(cles, avant, False)).reverse()[:par_page + 1])
+        precedente, suivante = len(lignes) > par_page, True
+        lignes = lignes[:par_page]
+        lignes.reverse()
+        numero = numero if precedente else 1
+    else:
+        lignes, numero, precedente, suivante = _page_offset(queryset, paginator, numero, par_page)
+
+    return PageCurseur(lignes, numero, paginator, cles, precedente, suivante)
+
+
+class PaginationCurseurMixin:
+    """ListView paginée par curseur (voir paginer) ; `paginate_by` inchangé."""
+
+    def paginate_queryset(self, queryset, page_size):
+        page = paginer(self.request, queryset, page_size, self.page_kwarg)
+        return page.paginator, page, page.object_list, page.has_other_pages()
@@ -47,6 +47,8 @@ INSTALLED_APPS = [
     "vente.apps.VenteConfig",
     "genealogie.apps.GenealogieConfig",
     "alimentation.apps.AlimentationConfig",
+    "recherche.apps.RechercheConfig",
+    "taches.apps.TachesConfig",
 ]
 
 # === Middleware ===
@@ -120,6 +122,33 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# === Cache partagé entre workers ===
+# Fichiers locaux plutôt que la mémoire du processus : les matrices et les
+# rapports mis en cache sont vus par tous les workers (la version du pedigree,
+# elle, est un compteur en base : troupeau.models.VersionPartagee).
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get("CACHE_DIR", str(BASE_DIR / "var" / "cache")),
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    }
+}
+
+# Stock de parenté (fichiers mmap lus par les workers, voir troupeau/stock_parente.py)
+PARENTE_STOCK_DIR = Path(os.environ.get("PARENTE_STOCK_DIR", BASE_DIR / "var" / "parente"))
+
+# Rétention de l'historique (commande nettoyer_historique, voir historiquetroupeau/retention.py)
+# 0 = pas de limite
+HISTORIQUE_RETENTION_NOMBRE = int(os.environ.get("HISTORIQUE_RETENTION_NOMBRE", "100")) or None
+HISTORIQUE_RETENTION_JOURS = int(os.environ.get("HISTORIQUE_RETENTION_JOURS", "0")) or None
+HISTORIQUE_ARCHIVE_DIR = Path(os.environ.get("HISTORIQUE_ARCHIVE_DIR", BASE_DIR / "var" / "archives" / "historique"))
+
+# Tâches de fond (imports…), exécutées par `manage.py traiter_taches` (voir taches/moteur.py).
+# Les fichiers téléversés sont rangés sous MEDIA_ROOT/taches/ : le worker doit voir le même MEDIA_ROOT.
+TACHES_INTERVALLE = float(os.environ.get("TACHES_INTERVALLE", "2"))
+# Une tâche en cours sans signe de vie depuis ce délai (s) est reprise par un autre worker
+TACHES_DELAI_ABANDON = int(os.environ.get("TACHES_DELAI_ABANDON", "600"))
+
 # === WhiteNoise pour Render ===
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
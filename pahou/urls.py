@@ -41,6 +41,7 @@ urlpatterns = [
     path("vaccination/", include(("vaccination.urls", "vaccination"), namespace="vaccination")),
     path("veterinaire/", include(("veterinaire.urls", "veterinaire"), namespace="veterinaire")),
     path("vente/", include(("vente.urls", "vente"), namespace="vente")),
+    path("taches/", include(("taches.urls", "taches"), namespace="taches")),
 ]
 
 # Fichiers statiques & médias en développement
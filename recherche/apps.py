@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class RechercheConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'recherche'
+    verbose_name = "Recherche plein texte"
+
+    def ready(self):
+        from . import signals  # noqa
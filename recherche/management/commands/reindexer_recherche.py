@@ -0,0 +1,32 @@
+# recherche/management/commands/reindexer_recherche.py
+"""
+Reconstruit l'index de recherche plein texte.
+
+    python manage.py reindexer_recherche
+    python manage.py reindexer_recherche vente.vente maladie.maladie
+
+À lancer après une écriture qui ne passe pas par les signaux (SQL brut,
+update() ou bulk_create hors historique, restauration de sauvegarde).
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recherche.moteur import DOCUMENTS, reconstruire
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche plein texte (tous les modèles indexés par défaut)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('modeles', nargs='*', help=f"Modèles à réindexer parmi : {', '.join(DOCUMENTS)}.")
+
+    def handle(self, *args, **options):
+        inconnus = [m for m in options['modeles'] if m.lower() not in DOCUMENTS]
+        if inconnus:
+            raise CommandError(f"Modèle(s) non indexé(s) : {', '.join(inconnus)}.")
+        debut = time.monotonic()
+        resultat = reconstruire([m.lower() for m in options['modeles']] or None)
+        for label, nb in resultat.items():
+            self.stdout.write(f"{label} : {nb} document(s)")
+        self.stdout.write(self.style.SUCCESS(f"Index de recherche reconstruit en {time.monotonic() - debut:.2f} s."))
@@ -0,0 +1,157 @@
+from django.db import migrations, models
+
+# Index plein texte selon la base (voir recherche/models.py)
+SQL_INDEX = {
+    'postgresql': [
+        "ALTER TABLE recherche_document ADD COLUMN vecteur tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('french'::regconfig, texte)) STORED",
+        "CREATE INDEX recherche_document_vecteur_gin ON recherche_document USING gin (vecteur)",
+    ],
+    'sqlite': [
+        "CREATE VIRTUAL TABLE recherche_fts USING fts5("
+        "texte, content='recherche_document', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2')",
+        "CREATE TRIGGER recherche_document_ai AFTER INSERT ON recherche_document BEGIN "
+        "INSERT INTO recherche_fts(rowid, texte) VALUES (new.id, new.texte); END",
+        "CREATE TRIGGER recherche_document_ad AFTER DELETE ON recherche_document BEGIN "
+        "INSERT INTO recherche_fts(recherche_fts, rowid, texte) VALUES ('delete', old.id, old.texte); END",
+        "CREATE TRIGGER recherche_document_au AFTER UPDATE ON recherche_document BEGIN "
+        "INSERT INTO recherche_fts(recherche_fts, rowid, texte) VALUES ('delete', old.id, old.texte); "
+        "INSERT INTO recherche_fts(rowid, texte) VALUES (new.id, new.texte); END",
+    ],
+}
+SQL_SUPPRESSION = {
+    'postgresql': [
+        "DROP INDEX IF EXISTS recherche_document_vecteur_gin",
+        "ALTER TABLE recherche_document DROP COLUMN IF EXISTS vecteur",
+    ],
+    'sqlite': [
+        "DROP TRIGGER IF EXISTS recherche_document_ai",
+        "DROP TRIGGER IF EXISTS recherche_document_ad",
+        "DROP TRIGGER IF EXISTS recherche_document_au",
+        "DROP TABLE IF EXISTS recherche_fts",
+    ],
+}
+
+
+def _executer(schema_editor, requetes):
+    for sql in requetes.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(sql)
+
+
+def creer_index(apps, schema_editor):
+    _executer(schema_editor, SQL_INDEX)
+
+
+def supprimer_index(apps, schema_editor):
+    _executer(schema_editor, SQL_SUPPRESSION)
+
+
+# Champs indexés à la création de l'index. Figés ici plutôt qu'importés de
+# recherche.moteur, qui suit les modèles courants : la suite de l'index passe
+# par les signaux, ou par `manage.py reindexer_recherche`.
+DOCUMENTS = {
+    'historiquetroupeau.historiquetroupeau': (
+        'troupeau__boucle_ovin', 'statut', 'changements__boucle_ovin', 'observations',
+    ),
+    'vente.vente': (
+        'boucle_ovin__boucle_ovin', 'type_acheteur', 'proprietaire_ovin', 'observations',
+    ),
+    'maladie.maladie': (
+        'Boucle_Ovin__boucle_ovin', 'Nom_Maladie', 'Symptomes_Observes', 'Veterinaire', 'Observations',
+    ),
+    'naissance.naissance': (
+        'boucle_mere__boucle_ovin', 'nom_male_externe', 'observations',
+        'accouplement__boucle_brebis__boucle_ovin', 'accouplement__boucle_belier__boucle_ovin',
+    ),
+    'gestation.gestation': (
+        'boucle_brebis__boucle_ovin', 'methode_confirmation', 'etat_gestation', 'observations',
+    ),
+    'alimentation.alimentation': (
+        'Boucle_Ovin__boucle_ovin', 'Observations', 'Type_Aliment', 'Objectif',
+    ),
+}
+TAILLE_LOT = 2000
+
+
+def _libelles(modele, lookup):
+    """Libellés des choix du champ désigné par le lookup (None sans choix ou à travers un JSONField)."""
+    champ = None
+    for nom in lookup.split('__'):
+        if champ is not None:
+            if not champ.is_relation:
+                return None
+            modele = champ.related_model
+        champ = modele._meta.get_field(nom)
+    return dict(champ.flatchoices) if champ.choices else None
+
+
+def _aplatir(valeur):
+    if valeur is None or valeur == '':
+        return
+    if isinstance(valeur, (list, tuple)):
+        for v in valeur:
+            yield from _aplatir(v)
+    elif isinstance(valeur, dict):
+        for v in valeur.values():
+            yield from _aplatir(v)
+    else:
+        yield str(valeur)
+
+
+def remplir_index(apps, schema_editor):
+    using = schema_editor.connection.alias
+    DocumentRecherche = apps.get_model('recherche', 'DocumentRecherche')
+    for label, lookups in DOCUMENTS.items():
+        modele = apps.get_model(label)
+        libelles = [_libelles(modele, lookup) for lookup in lookups]
+        documents = []
+        lignes = (modele._base_manager.using(using).order_by('pk')
+                  .values_list('pk', *lookups).iterator(chunk_size=TAILLE_LOT))
+        for pk, *valeurs in lignes:
+            morceaux = []
+            for valeur, choix in zip(valeurs, libelles):
+                for texte in _aplatir(valeur):
+                    morceaux.append(texte)
+                    if choix and str(choix.get(valeur, texte)) != texte:
+                        morceaux.append(str(choix[valeur]))
+            documents.append(DocumentRecherche(modele=label, objet_id=pk, texte=' '.join(morceaux)))
+            if len(documents) >= TAILLE_LOT:
+                DocumentRecherche.objects.using(using).bulk_create(documents)
+                documents = []
+        DocumentRecherche.objects.using(using).bulk_create(documents)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('alimentation', '0001_initial'),
+        ('gestation', '0003_index_pagination'),
+        ('historiquetroupeau', '0005_index_pagination'),
+        ('maladie', '0002_index_pagination'),
+        ('naissance', '0002_index_pagination'),
+        ('troupeau', '0004_message_boucle_active'),
+        ('vente', '0002_index_pagination'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentRecherche',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modele', models.CharField(max_length=100)),
+                ('objet_id', models.BigIntegerField()),
+                ('texte', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'verbose_name': 'Document de recherche',
+                'verbose_name_plural': 'Documents de recherche',
+                'db_table': 'recherche_document',
+                'constraints': [models.UniqueConstraint(fields=('modele', 'objet_id'), name='uniq_document_recherche')],
+            },
+        ),
+        migrations.RunPython(creer_index, supprimer_index),
+        migrations.RunPython(remplir_index, migrations.RunPython.noop),
+    ]
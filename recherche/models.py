@@ -0,0 +1,28 @@
+from django.db import models
+
+
+class DocumentRecherche(models.Model):
+    """
+    Texte indexé d'un enregistrement (vente, maladie, historique…), tenu à
+    jour par les signaux de recherche/signals.py.
+
+    L'index plein texte lui-même dépend de la base (migration 0001) :
+      - PostgreSQL : colonne générée `vecteur` (tsvector, configuration
+        'french') avec un index GIN ;
+      - SQLite : table FTS5 `recherche_fts` à contenu externe, alimentée par
+        des triggers sur cette table.
+    """
+    modele = models.CharField(max_length=100)      # app_label.model
+    objet_id = models.BigIntegerField()
+    texte = models.TextField(blank=True, default='')
+
+    class Meta:
+        db_table = 'recherche_document'
+        verbose_name = "Document de recherche"
+        verbose_name_plural = "Documents de recherche"
+        constraints = [
+            models.UniqueConstraint(fields=['modele', 'objet_id'], name='uniq_document_recherche'),
+        ]
+
+    def __str__(self):
+        return f"{self.modele} #{self.objet_id}"
@@ -0,0 +1,314 @@
+# recherche/moteur.py
+"""
+Recherche plein texte du paramètre `q` des listes.
+
+Chaque modèle de DOCUMENTS a une ligne DocumentRecherche par enregistrement.
+Son texte réunit les champs qu'interrogeaient les anciens `icontains`, plus
+le libellé des champs à choix. Les recherches passent par l'index de la
+base :
+  - PostgreSQL : `vecteur @@ to_tsquery('french', …)` (index GIN), classement
+    ts_rank ;
+  - SQLite : `recherche_fts MATCH …` (FTS5), classement bm25.
+Une première requête compte les correspondances (jusqu'à SEUIL_DENSE) :
+  - au plus SEUIL_CLASSEMENT : résultats classés par pertinence ;
+  - au plus SEUIL_DENSE : filtre `pk IN (sous-requête)`, ordre de la liste ;
+  - au-delà (terme très courant) : test EXISTS par ligne, la liste étant lue
+    dans son ordre (index de date) jusqu'à la fin de la page.
+Chaque mot saisi est cherché en préfixe (« B12 » trouve « B12345 ») et tous
+doivent être présents. Une sous-chaîne au milieu d'un mot (« 345 ») n'est
+plus trouvée, contrairement à l'ancien LIKE '%q%'. Les autres bases gardent
+ce LIKE.
+
+    qs = rechercher(qs, q)   # filtré et classé par pertinence, puis par l'ordre d'origine
+"""
+import re
+
+from django.apps import apps as registre_apps
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections, router, transaction
+from django.db.models import BooleanField, Case, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import DocumentRecherche
+
+TAILLE_LOT = 2000
+
+# Modèle indexé -> champs (lookups ORM) réunis dans le texte du document
+DOCUMENTS = {
+    'historiquetroupeau.historiquetroupeau': (
+        'troupeau__boucle_ovin', 'statut', 'changements__boucle_ovin', 'observations',
+    ),
+    'vente.vente': (
+        'boucle_ovin__boucle_ovin', 'type_acheteur', 'proprietaire_ovin', 'observations',
+    ),
+    'maladie.maladie': (
+        'Boucle_Ovin__boucle_ovin', 'Nom_Maladie', 'Symptomes_Observes', 'Veterinaire', 'Observations',
+    ),
+    'naissance.naissance': (
+        'boucle_mere__boucle_ovin', 'nom_male_externe', 'observations',
+        'accouplement__boucle_brebis__boucle_ovin', 'accouplement__boucle_belier__boucle_ovin',
+    ),
+    'gestation.gestation': (
+        'boucle_brebis__boucle_ovin', 'methode_confirmation', 'etat_gestation', 'observations',
+    ),
+    'alimentation.alimentation': (
+        'Boucle_Ovin__boucle_ovin', 'Observations', 'Type_Aliment', 'Objectif',
+    ),
+}
+
+_MOTS = re.compile(r'\w+')
+
+
+def _label(modele):
+    return modele._meta.label_lower
+
+
+def _champ_final(modele, lookup):
+    """Champ désigné par un lookup (None s'il traverse un JSONField)."""
+    champ = None
+    for nom in lookup.split('__'):
+        if champ is not None:
+            if not champ.is_relation:
+                return None
+            modele = champ.related_model
+        try:
+            champ = modele._meta.get_field(nom)
+        except FieldDoesNotExist:
+            return None
+    return champ
+
+
+def _aplatir(valeur):
+    if valeur is None or valeur == '':
+        return
+    if isinstance(valeur, (list, tuple)):
+        for v in valeur:
+            yield from _aplatir(v)
+    elif isinstance(valeur, dict):
+        for v in valeur.values():
+            yield from _aplatir(v)
+    else:
+        yield str(valeur)
+
+
+def _textes(modele, pks=None, using=None):
+    """Itère (pk, texte) pour les enregistrements du modèle (tous si pks est None)."""
+    lookups = DOCUMENTS[_label(modele)]
+    libelles = []
+    for lookup in lookups:
+        champ = _champ_final(modele, lookup)
+        libelles.append(dict(champ.flatchoices) if champ is not None and champ.choices else None)
+
+    qs = modele._base_manager.using(using or router.db_for_read(modele)).order_by('pk')
+    if pks is not None:
+        qs = qs.filter(pk__in=pks)
+    for pk, *valeurs in qs.values_list('pk', *lookups).iterator(chunk_size=TAILLE_LOT):
+        morceaux = []
+        for valeur, choix in zip(valeurs, libelles):
+            for texte in _aplatir(valeur):
+                morceaux.append(texte)
+                if choix and str(choix.get(valeur, texte)) != texte:
+                    morceaux.append(str(choix[valeur]))
+        yield pk, ' '.join(morceaux)
+
+
+def _ecrire(label, paires, using):
+    documents = [DocumentRecherche(modele=label, objet_id=pk, texte=texte) for pk, texte in paires]
+    if documents:
+        DocumentRecherche.objects.using(using).bulk_create(
+            documents, batch_size=TAILLE_LOT,
+            update_conflicts=True, unique_fields=['modele', 'objet_id'], update_fields=['texte'],
+        )
+
+
+# =========================
+# Indexation
+# =========================
+
+def est_indexe(modele):
+    return _label(modele) in DOCUMENTS
+
+
+def indexer(modele, pks, using=None):
+    """(Ré)indexe les enregistrements `pks` du modèle (upsert du texte)."""
+    pks = list(pks)
+    if not pks or not est_indexe(modele):
+        return
+    using = using or router.db_for_write(DocumentRecherche)
+    for debut in range(0, len(pks), TAILLE_LOT):
+        _ecrire(_label(modele), _textes(modele, pks[debut:debut + TAILLE_LOT], using), using)
+
+
+def desindexer(modele, pks, using=None):
+    pks = list(pks)
+    if not pks or not est_indexe(modele):
+        return
+    using = using or router.db_for_write(DocumentRecherche)
+    documents = DocumentRecherche.objects.using(using).filter(modele=_label(modele))
+    for debut in range(0, len(pks), TAILLE_LOT):
+        documents.filter(objet_id__in=pks[debut:debut + TAILLE_LOT]).delete()
+
+
+def desindexer_requete(queryset, using=None):
+    """Retire de l'index les enregistrements d'un QuerySet (avant son delete() en masse)."""
+    if not est_indexe(queryset.model):
+        return
+    using = using or router.db_for_write(DocumentRecherche)
+    (DocumentRecherche.objects.using(using)
+     .filter(modele=_label(queryset.model), objet_id__in=queryset.order_by().values('pk'))
+     .delete())
+
+
+def reindexer_boucle(troupeau_pk, using=None):
+    """Réindexe les documents qui reprennent la boucle de cet animal."""
+    for label, lookups in DOCUMENTS.items():
+        modele = registre_apps.get_model(label)
+        filtre = Q()
+        for lookup in lookups:
+            if lookup.endswith('__boucle_ovin'):
+                filtre |= Q(**{lookup[:-len('__boucle_ovin')]: troupeau_pk})
+        if filtre:
+            pks = modele._base_manager.using(using).filter(filtre).values_list('pk', flat=True)
+            indexer(modele, pks, using=using)
+
+
+def reconstruire(labels=None, using=None):
+    """Reconstruit l'index des modèles (tous par défaut) ; retourne {label: nombre}."""
+    using = using or router.db_for_write(DocumentRecherche)
+    resultat = {}
+    for label in labels or DOCUMENTS:
+        modele = registre_apps.get_model(label)
+        with transaction.atomic(using=using):
+            DocumentRecherche.objects.using(using).filter(modele=label).delete()
+            lot, nb = [], 0
+            for paire in _textes(modele, using=using):
+                lot.append(paire)
+                if len(lot) >= TAILLE_LOT:
+                    _ecrire(label, lot, using)
+                    nb, lot = nb + len(lot), []
+            _ecrire(label, lot, using)
+            resultat[label] = nb + len(lot)
+    return resultat
+
+
+# =========================
+# Recherche
+# =========================
+
+# Jusqu'à SEUIL_CLASSEMENT résultats : classés par pertinence ; jusqu'à
+# SEUIL_DENSE : lus depuis l'index plein texte ; au-delà : testés ligne à ligne
+SEUIL_CLASSEMENT = 1000
+SEUIL_DENSE = 20000
+
+# Correspondances, sans tri : la lecture s'arrête à la limite passée.
+# CROSS JOIN : SQLite parcourt l'index FTS d'abord.
+_SQL_CORRESPONDANCES = {
+    'postgresql': (
+        "SELECT d.objet_id FROM recherche_document d "
+        "WHERE d.vecteur @@ to_tsquery('french', %s) AND d.modele = %s LIMIT %s"
+    ),
+    'sqlite': (
+        "SELECT d.objet_id FROM recherche_fts CROSS JOIN recherche_document d ON d.id = recherche_fts.rowid "
+        "WHERE recherche_fts MATCH %s AND +d.modele = %s LIMIT %s"
+    ),
+}
+
+# Score des correspondances (plus grand = plus pertinent) ; bm25() est négatif
+_SQL_SCORES = {
+    'postgresql': (
+        "SELECT d.objet_id, ts_rank(d.vecteur, to_tsquery('french', %s)) FROM recherche_document d "
+        "WHERE d.vecteur @@ to_tsquery('french', %s) AND d.modele = %s"
+    ),
+    'sqlite': (
+        "SELECT d.objet_id, -bm25(recherche_fts) FROM recherche_fts "
+        "CROSS JOIN recherche_document d ON d.id = recherche_fts.rowid "
+        "WHERE recherche_fts MATCH %s AND +d.modele = %s"
+    ),
+}
+
+# Sous-requête des objet_id trouvés pour (requête, modèle)
+_SQL_IDS = {
+    'postgresql': (
+        "SELECT d.objet_id FROM recherche_document d "
+        "WHERE d.vecteur @@ to_tsquery('french', %s) AND d.modele = %s"
+    ),
+    # « +d.modele » écarte l'index (modele, objet_id)
+    'sqlite': (
+        "SELECT d.objet_id FROM recherche_document d "
+        "WHERE d.id IN (SELECT rowid FROM recherche_fts WHERE recherche_fts MATCH %s) AND +d.modele = %s"
+    ),
+}
+
+# Test par ligne : la liste est lue dans son ordre (index de date) et s'arrête
+# à la fin de la page
+_SQL_EXISTE = {
+    'postgresql': (
+        "EXISTS (SELECT 1 FROM recherche_document d WHERE d.modele = %s AND d.objet_id = {pk} "
+        "AND d.vecteur @@ to_tsquery('french', %s))"
+    ),
+    # SQLite évalue une seule fois la sous-requête MATCH (liste des rowid)
+    'sqlite': (
+        "EXISTS (SELECT 1 FROM recherche_document d WHERE d.modele = %s AND d.objet_id = {pk} "
+        "AND d.id IN (SELECT rowid FROM recherche_fts WHERE recherche_fts MATCH %s))"
+    ),
+}
+
+
+def _requete(vendor, mots):
+    if vendor == 'postgresql':
+        return ' & '.join(f"{mot}:*" for mot in mots)
+    return ' AND '.join(f'"{mot}"*' for mot in mots)
+
+
+def _executer(queryset, sql, params):
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _nombre(queryset, vendor, requete, label):
+    """Nombre de correspondances, borné à SEUIL_DENSE + 1."""
+    return len(_executer(queryset, _SQL_CORRESPONDANCES[vendor], [requete, label, SEUIL_DENSE + 1]))
+
+
+def _scores(queryset, vendor, requete, label):
+    params = [requete, label]
+    if vendor == 'postgresql':
+        params.insert(0, requete)
+    return dict(_executer(queryset, _SQL_SCORES[vendor], params))
+
+
+def _like(queryset, q):
+    filtre = Q()
+    for lookup in DOCUMENTS[_label(queryset.model)]:
+        filtre |= Q(**{f"{lookup}__icontains": q})
+    return queryset.filter(filtre)
+
+
+def rechercher(queryset, q):
+    """Filtre le QuerySet sur `q` et le classe par pertinence (voir le docstring du module)."""
+    mots = _MOTS.findall(q or '')
+    vendor = connections[queryset.db].vendor
+    if not mots or vendor not in _SQL_SCORES:
+        return _like(queryset, q)
+
+    label = _label(queryset.model)
+    requete = _requete(vendor, mots)
+    nombre = _nombre(queryset, vendor, requete, label)
+    if nombre > SEUIL_DENSE:
+        qn = connections[queryset.db].ops.quote_name
+        pk = f"{qn(queryset.model._meta.db_table)}.{qn(queryset.model._meta.pk.column)}"
+        return queryset.filter(RawSQL(_SQL_EXISTE[vendor].format(pk=pk), [label, requete],
+                                      output_field=BooleanField()))
+    if nombre > SEUIL_CLASSEMENT:
+        return queryset.filter(pk__in=RawSQL(_SQL_IDS[vendor], [requete, label]))
+    scores = _scores(queryset, vendor, requete, label)
+    ordre = queryset.query.order_by or queryset.model._meta.ordering
+    rang = Case(
+        *[When(pk=pk, then=Value(float(score))) for pk, score in scores.items()],
+        default=Value(0.0), output_field=FloatField(),
+    )
+    return (queryset
+            .filter(pk__in=list(scores))
+            .annotate(rang_recherche=rang)
+            .order_by('-rang_recherche', *ordre))
@@ -0,0 +1,35 @@
+from django.apps import apps
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .moteur import DOCUMENTS, desindexer, indexer, reindexer_boucle
+from troupeau.models import Troupeau
+
+
+def indexer_document(sender, instance, raw=False, using=None, **kwargs):
+    if not raw:
+        indexer(sender, [instance.pk], using=using)
+
+
+def desindexer_document(sender, instance, using=None, **kwargs):
+    desindexer(sender, [instance.pk], using=using)
+
+
+# Modèles supprimés uniquement en masse (purge de rétention) : désindexés sur
+# place par desindexer_requete()/desindexer(), sans receveur ligne par ligne
+# qui doublerait les DELETE et empêcherait la suppression rapide.
+SUPPRESSIONS_EN_MASSE = {'historiquetroupeau.historiquetroupeau'}
+
+for label in DOCUMENTS:
+    modele = apps.get_model(label)
+    post_save.connect(indexer_document, sender=modele, dispatch_uid=f"recherche_indexer_{label}")
+    if label not in SUPPRESSIONS_EN_MASSE:
+        post_delete.connect(desindexer_document, sender=modele, dispatch_uid=f"recherche_desindexer_{label}")
+
+
+@receiver(post_save, sender=Troupeau, dispatch_uid="recherche_troupeau_boucle")
+def reindexer_boucle_modifiee(sender, instance, created, update_fields=None, raw=False, using=None, **kwargs):
+    """Les documents reprennent la boucle des animaux : on les réindexe si elle change."""
+    if created or raw or (update_fields is not None and 'boucle_ovin' not in update_fields):
+        return
+    reindexer_boucle(instance.pk, using=using)
@@ -0,0 +1,79 @@
+import importlib
+from datetime import date, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from django.apps import apps
+from django.db import connection
+from django.test import TestCase
+
+from alimentation.models import Alimentation
+from troupeau.models import Troupeau
+
+from . import moteur
+from .models import DocumentRecherche
+
+
+def creer_alimentation(animal, jour, observations, **champs):
+    return Alimentation.objects.create(
+        Boucle_Ovin=animal, Date_alimentation=date(2024, 1, 1) + timedelta(days=jour),
+        Type_Aliment='Son de mais', Quantite_Kg=1.5, Objectif='Entretien', Observations=observations, **champs,
+    )
+
+
+class RechercheTests(TestCase):
+
+    def setUp(self):
+        self.animal = Troupeau.objects.create(
+            boucle_ovin='B12345', sexe='male', race='balami', statut='naissance',
+            origine_ovin='pahou', proprietaire_ovin='miguel',
+        )
+        self.rations = [creer_alimentation(self.animal, jour, f"ration {jour} paille") for jour in range(3)]
+
+    def trouves(self, q):
+        return list(moteur.rechercher(Alimentation.objects.all(), q).values_list('pk', flat=True))
+
+    def test_prefixe_libelle_et_accents(self):
+        self.assertEqual(len(self.trouves('B12')), 3)
+        self.assertEqual(len(self.trouves('mais')), 3)     # libellé « Son de maïs », sans accent
+        self.assertEqual(self.trouves('ration 1'), [self.rations[1].pk])
+        self.assertEqual(self.trouves('345'), [])          # pas de sous-chaîne au milieu d'un mot
+
+    def test_declencheurs_suivent_les_ecritures(self):
+        ration = self.rations[0]
+        ration.Observations = 'luzerne'
+        ration.save()
+        self.assertEqual(self.trouves('luzerne'), [ration.pk])
+        self.assertEqual(len(self.trouves('paille')), 2)
+
+        ration.delete()
+        self.assertEqual(self.trouves('luzerne'), [])
+        self.assertFalse(DocumentRecherche.objects.filter(modele='alimentation.alimentation',
+                                                          objet_id=ration.pk).exists())
+
+        self.animal.boucle_ovin = 'C777'
+        self.animal.save()
+        self.assertEqual(len(self.trouves('C777')), 2)
+        self.assertEqual(self.trouves('B12'), [])
+
+    def test_seuils(self):
+        ordre_liste = [r.pk for r in sorted(self.rations, key=lambda r: r.Date_alimentation, reverse=True)]
+        # 3 correspondances : classement, sous-requête IN, puis test EXISTS par ligne
+        for classement, dense, annote in ((3, 10, True), (1, 10, False), (1, 2, False)):
+            with self.subTest(classement=classement, dense=dense), \
+                    mock.patch.object(moteur, 'SEUIL_CLASSEMENT', classement), \
+                    mock.patch.object(moteur, 'SEUIL_DENSE', dense):
+                qs = moteur.rechercher(Alimentation.objects.all(), 'paille')
+                self.assertEqual('rang_recherche' in qs.query.annotations, annote)
+                self.assertEqual(sorted(qs.values_list('pk', flat=True)), sorted(ordre_liste))
+                if not annote:
+                    self.assertEqual(list(qs.values_list('pk', flat=True)), ordre_liste)
+
+    def test_remplissage_de_la_migration(self):
+        attendus = sorted(DocumentRecherche.objects.values_list('modele', 'objet_id', 'texte'))
+        DocumentRecherche.objects.all().delete()
+        migration = importlib.import_module('recherche.migrations.0001_initial')
+        # Seul l'alias de la connexion sert au remplissage
+        migration.remplir_index(apps, SimpleNamespace(connection=connection))
+        self.assertEqual(sorted(DocumentRecherche.objects.values_list('modele', 'objet_id', 'texte')), attendus)
+        self.assertEqual(len(self.trouves('paille')), 3)
@@ -0,0 +1,24 @@
+from django.contrib import admin
+
+from .models import Tache
+
+
+@admin.register(Tache)
+class TacheAdmin(admin.ModelAdmin):
+    """Suivi des tâches de fond (imports, documents) ; l'avancement n'est modifié que par le worker."""
+
+    list_display = ('id', 'type', 'nom_fichier', 'statut', 'curseur', 'reussis', 'nb_erreurs', 'cree_le', 'fin')
+    list_filter = ('type', 'statut')
+    search_fields = ('nom_fichier', 'empreinte')
+    date_hierarchy = 'cree_le'
+    list_select_related = ('cree_par',)
+    empty_value_display = '—'
+    list_per_page = 50
+    exclude = ('plan', 'erreurs')
+    readonly_fields = (
+        'type', 'fichier', 'nom_fichier', 'empreinte', 'parametres', 'resultat', 'statut', 'cree_par', 'cree_le',
+        'debut', 'fin', 'travailleur', 'battement', 'total', 'curseur', 'reussis', 'nb_erreurs', 'duree', 'message',
+    )
+
+    def has_add_permission(self, request):
+        return False
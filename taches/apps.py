@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class TachesConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'taches'
+    verbose_name = "Tâches de fond"
+
+    def ready(self):
+        # Traitements déclarés par les applications dans leur module `taches.py`
+        from django.utils.module_loading import autodiscover_modules
+        autodiscover_modules('taches')
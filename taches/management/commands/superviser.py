@@ -0,0 +1,82 @@
+# taches/management/commands/superviser.py
+"""
+Lance le serveur web et le worker des tâches dans le même service (ils
+partagent MEDIA_ROOT et le stock de parenté), voir render.yaml :
+
+    python manage.py superviser -- gunicorn pahou.wsgi:application --bind 0.0.0.0:$PORT
+
+  - le worker (`traiter_taches`) est relancé s'il s'arrête, après une pause
+    qui double à chaque arrêt rapproché (plafonnée à une minute) ;
+  - si le serveur web s'arrête, le worker est arrêté et la commande sort avec
+    le code du serveur (l'hébergeur redémarre le service) ;
+  - SIGTERM / SIGINT sont transmis aux deux processus, qui ont --delai-arret
+    secondes pour finir (le worker termine sa tranche et remet la tâche en
+    attente) avant SIGKILL.
+"""
+import signal
+import subprocess
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+PAUSE_MAX = 60
+
+
+class Command(BaseCommand):
+    help = "Lance une commande web (après --) et le worker traiter_taches, relancé s'il s'arrête."
+
+    def add_arguments(self, parser):
+        parser.add_argument('web', nargs='+', help="Commande du serveur web (ex. gunicorn …).")
+        parser.add_argument('--delai-arret', type=float, default=30,
+                            help="Secondes laissées aux processus pour s'arrêter (défaut : 30).")
+
+    def handle(self, *args, **options):
+        self.arret = False
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, self.arreter)
+
+        try:
+            web = subprocess.Popen(options['web'])
+        except OSError as e:
+            raise CommandError(f"Serveur web non lancé : {e}") from e
+        worker, pause, depart = self.lancer_worker(), 1, time.monotonic()
+        code = None
+        while not self.arret:
+            code = web.poll()
+            if code is not None:
+                self.stderr.write(f"Serveur web arrêté (code {code}).")
+                break
+            if worker is not None and worker.poll() is not None:
+                # Arrêts rapprochés : pause doublée ; worker resté longtemps en vie : remise à 1 s
+                if time.monotonic() - depart > PAUSE_MAX:
+                    pause = 1
+                self.stderr.write(f"Worker arrêté (code {worker.returncode}), relance dans {pause} s.")
+                worker, relance, pause = None, time.monotonic() + pause, min(pause * 2, PAUSE_MAX)
+            if worker is None and time.monotonic() >= relance:
+                worker, depart = self.lancer_worker(), time.monotonic()
+            time.sleep(0.5)
+
+        self.terminer([p for p in (web, worker) if p is not None], options['delai_arret'])
+        if code:
+            sys.exit(code)
+
+    def lancer_worker(self):
+        # -m django : même interpréteur, DJANGO_SETTINGS_MODULE hérité de manage.py
+        return subprocess.Popen([sys.executable, '-m', 'django', 'traiter_taches'])
+
+    def terminer(self, processus, delai):
+        for p in processus:
+            if p.poll() is None:
+                p.send_signal(signal.SIGTERM)
+        fin = time.monotonic() + delai
+        for p in processus:
+            try:
+                p.wait(max(0.0, fin - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                self.stderr.write(f"Processus {p.pid} toujours actif après {delai} s : SIGKILL.")
+                p.kill()
+                p.wait()
+
+    def arreter(self, signum, frame):
+        self.arret = True
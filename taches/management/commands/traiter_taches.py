@@ -0,0 +1,63 @@
+# taches/management/commands/traiter_taches.py
+"""
+Worker des tâches de fond (imports…), voir taches/moteur.py.
+
+    python manage.py traiter_taches              # boucle (Procfile : worker)
+    python manage.py traiter_taches --une-fois   # vide la file puis s'arrête (cron)
+
+Sur Render, lancé avec gunicorn par `superviser` (render.yaml), qui le relance
+s'il s'arrête.
+
+SIGTERM / Ctrl-C : la tranche en cours est terminée, la tâche remise en
+attente ; elle reprendra au curseur au prochain démarrage.
+"""
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from taches.moteur import executer, identifiant_travailleur, reclamer
+
+
+class Command(BaseCommand):
+    help = "Exécute les tâches de fond en attente (et reprend les tâches abandonnées)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--une-fois', action='store_true',
+                            help="S'arrête quand il n'y a plus de tâche en attente.")
+        parser.add_argument('--intervalle', type=float, default=settings.TACHES_INTERVALLE,
+                            help=f"Secondes entre deux recherches de tâche (défaut : {settings.TACHES_INTERVALLE}).")
+
+    def handle(self, *args, **options):
+        self.arret = False
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, self.arreter)
+
+        travailleur = identifiant_travailleur()
+        self.stdout.write(f"Worker {travailleur} démarré.")
+        while not self.arret:
+            close_old_connections()
+            tache = reclamer(travailleur)
+            if tache is None:
+                if options['une_fois']:
+                    break
+                self.attendre(options['intervalle'])
+                continue
+            self.stdout.write(f"Tâche #{tache.pk} ({tache.type}, {tache.nom_fichier})…")
+            executer(tache, arret=lambda: self.arret)
+            style = {'terminee': self.style.SUCCESS, 'echouee': self.style.ERROR}.get(tache.statut, str)
+            self.stdout.write(style(
+                f"Tâche #{tache.pk} {tache.get_statut_display().lower()} : {tache.reussis} réussis, "
+                f"{tache.nb_erreurs} erreur(s), {tache.curseur}/{tache.a_traiter or 0} en {tache.duree:.1f} s."
+            ))
+        self.stdout.write(f"Worker {travailleur} arrêté.")
+
+    def arreter(self, signum, frame):
+        self.arret = True
+
+    def attendre(self, secondes):
+        fin = time.monotonic() + secondes
+        while not self.arret and time.monotonic() < fin:
+            time.sleep(min(0.5, secondes))
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(help_text='Traitement enregistré, ex. troupeau.import', max_length=100)),
+                ('fichier', models.FileField(upload_to='taches/%Y/%m/')),
+                ('nom_fichier', models.CharField(max_length=255)),
+                ('empreinte', models.CharField(help_text='SHA-256 du contenu du fichier', max_length=64)),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', 'En cours'), ('terminee', 'Terminée'), ('echouee', 'Échouée')], default='en_attente', max_length=12)),
+                ('cree_le', models.DateTimeField(auto_now_add=True)),
+                ('debut', models.DateTimeField(blank=True, null=True)),
+                ('fin', models.DateTimeField(blank=True, null=True)),
+                ('travailleur', models.CharField(blank=True, default='', help_text='hôte:pid du worker', max_length=100)),
+                ('battement', models.DateTimeField(blank=True, help_text='Dernier signe de vie du worker', null=True)),
+                ('plan', models.JSONField(blank=True, null=True)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('curseur', models.PositiveIntegerField(default=0)),
+                ('reussis', models.PositiveIntegerField(default=0)),
+                ('erreurs', models.JSONField(blank=True, default=list)),
+                ('nb_erreurs', models.PositiveIntegerField(default=0)),
+                ('duree', models.FloatField(default=0, help_text='Secondes de traitement cumulées')),
+                ('message', models.TextField(blank=True, default='')),
+                ('cree_par', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='taches', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Tâche',
+                'verbose_name_plural': 'Tâches',
+                'db_table': 'taches_tache',
+                'ordering': ['-cree_le', '-id'],
+                'indexes': [models.Index(fields=['statut', 'cree_le'], name='tache_statut_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('statut', 'echouee'), _negated=True), fields=('type', 'empreinte'), name='uniq_tache_fichier')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taches', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tache',
+            name='parametres',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='tache',
+            name='resultat',
+            field=models.FileField(blank=True, upload_to='taches/resultats/%Y/%m/'),
+        ),
+        migrations.AlterField(
+            model_name='tache',
+            name='empreinte',
+            field=models.CharField(help_text='SHA-256 du fichier, ou du contenu du document demandé', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='tache',
+            name='fichier',
+            field=models.FileField(blank=True, upload_to='taches/%Y/%m/'),
+        ),
+    ]
@@ -0,0 +1,120 @@
+from django.conf import settings
+from django.db import models
+from django.db.models import Q
+from django.urls import reverse
+
+
+class Tache(models.Model):
+    """
+    Traitement de fond d'un fichier téléversé (import…) ou d'une génération
+    de document (PDF…), exécuté par la commande `traiter_taches` en tranches
+    validées une à une (voir moteur.py).
+
+    `plan` est la liste des unités à traiter (numéros de ligne pour un
+    import), fixée à la première exécution ; `curseur` est le nombre
+    d'unités déjà validées, enregistré dans la transaction de chaque tranche :
+    une tâche interrompue reprend au curseur, sans doublon.
+
+    Une génération n'a pas de `fichier` : ses `parametres` décrivent le
+    document, `empreinte` le contenu attendu, et le document produit est
+    rangé dans `resultat`.
+    """
+    EN_ATTENTE = 'en_attente'
+    EN_COURS = 'en_cours'
+    TERMINEE = 'terminee'
+    ECHOUEE = 'echouee'
+    STATUT_CHOIX = [
+        (EN_ATTENTE, 'En attente'),
+        (EN_COURS, 'En cours'),
+        (TERMINEE, 'Terminée'),
+        (ECHOUEE, 'Échouée'),
+    ]
+
+    type = models.CharField(max_length=100, help_text="Traitement enregistré, ex. troupeau.import")
+    fichier = models.FileField(upload_to='taches/%Y/%m/', blank=True)
+    nom_fichier = models.CharField(max_length=255)
+    empreinte = models.CharField(max_length=64, help_text="SHA-256 du fichier, ou du contenu du document demandé")
+    parametres = models.JSONField(default=dict, blank=True)
+    statut = models.CharField(max_length=12, choices=STATUT_CHOIX, default=EN_ATTENTE)
+    cree_par = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True,
+                                 on_delete=models.SET_NULL, related_name='taches')
+    cree_le = models.DateTimeField(auto_now_add=True)
+    debut = models.DateTimeField(null=True, blank=True)
+    fin = models.DateTimeField(null=True, blank=True)
+
+    travailleur = models.CharField(max_length=100, blank=True, default='', help_text="hôte:pid du worker")
+    battement = models.DateTimeField(null=True, blank=True, help_text="Dernier signe de vie du worker")
+
+    plan = models.JSONField(null=True, blank=True)
+    total = models.PositiveIntegerField(default=0)
+    curseur = models.PositiveIntegerField(default=0)
+    reussis = models.PositiveIntegerField(default=0)
+    erreurs = models.JSONField(default=list, blank=True)
+    nb_erreurs = models.PositiveIntegerField(default=0)
+    duree = models.FloatField(default=0, help_text="Secondes de traitement cumulées")
+    message = models.TextField(blank=True, default='')
+    resultat = models.FileField(upload_to='taches/resultats/%Y/%m/', blank=True)
+
+    class Meta:
+        db_table = 'taches_tache'
+        ordering = ['-cree_le', '-id']
+        verbose_name = "Tâche"
+        verbose_name_plural = "Tâches"
+        constraints = [
+            # Un même fichier n'est traité qu'une fois (sauf après un échec)
+            models.UniqueConstraint(fields=['type', 'empreinte'], condition=~Q(statut='echouee'),
+                                    name='uniq_tache_fichier'),
+        ]
+        indexes = [
+            models.Index(fields=['statut', 'cree_le'], name='tache_statut_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.type} #{self.pk} ({self.get_statut_display()})"
+
+    @property
+    def a_traiter(self):
+        return len(self.plan) if self.plan is not None else None
+
+    @property
+    def progression(self):
+        """Pourcentage d'avancement (0 tant que le plan n'est pas fait)."""
+        if self.statut == self.TERMINEE:
+            return 100
+        if not self.plan:
+            return 0
+        return round(100 * self.curseur / len(self.plan), 1)
+
+    @property
+    def debit(self):
+        """Unités traitées par seconde de traitement."""
+        return round(self.curseur / self.duree, 1) if self.duree else None
+
+    @property
+    def resultat_disponible(self):
+        """Document produit toujours présent sur le stockage."""
+        return bool(self.resultat) and self.resultat.storage.exists(self.resultat.name)
+
+    def etat(self, depuis=0, limite=200):
+        """État pour l'API de suivi ; erreurs à partir de l'indice `depuis`."""
+        return {
+            'id': self.pk,
+            'type': self.type,
+            'statut': self.statut,
+            'statut_libelle': self.get_statut_display(),
+            'fichier': self.nom_fichier,
+            'total': self.total,
+            'a_traiter': self.a_traiter,
+            'traites': self.curseur,
+            'reussis': self.reussis,
+            'nb_erreurs': self.nb_erreurs,
+            'progression': self.progression,
+            'debit': self.debit,
+            'duree': round(self.duree, 2),
+            'message': self.message,
+            'debut': self.debut.isoformat() if self.debut else None,
+            'fin': self.fin.isoformat() if self.fin else None,
+            'depuis': depuis,
+            'erreurs': self.erreurs[depuis:depuis + limite],
+            'resultat': reverse('taches:telecharger', args=[self.pk]) if self.resultat else None,
+        }
@@ -0,0 +1,331 @@
+# taches/moteur.py
+"""
+Tâches de fond sur fichier téléversé, traitées par tranches reprenables.
+
+Une application déclare un traitement dans son module `taches.py` (chargé
+au démarrage par TachesConfig.ready) :
+
+    @traitement('troupeau.import')
+    class ImportTroupeau(Traitement):
+        libelle = "Import du troupeau"
+        def planifier(self, fichier): ...      # {'total', 'plan', 'erreurs'}
+        def traiter(self, fichier, unites): ...  # {'reussis', 'erreurs'}
+
+La vue appelle soumettre(nom, fichier) : le fichier est rangé sous
+MEDIA_ROOT/taches/ et la tâche mise en attente. Un fichier au contenu
+identique (SHA-256) déjà soumis au même traitement, et non échoué, n'est pas
+traité deux fois : la tâche existante est renvoyée.
+
+Sans fichier téléversé (génération de document), la vue appelle
+demander(nom, empreinte, nom_fichier, parametres) ; traiter() reçoit alors
+fichier=None et renvoie le document produit sous la clé 'resultat'
+(nom, contenu), rangé sous MEDIA_ROOT/taches/resultats/. L'empreinte décrit
+le contenu attendu : tant qu'elle ne change pas, la tâche déjà terminée (et
+son document) est renvoyée au lieu d'être recalculée.
+
+La commande `traiter_taches` (worker) réclame les tâches et les exécute :
+  - planifier() une seule fois, sans écriture métier : le plan (liste des
+    unités, ex. numéros de ligne) et ses erreurs sont enregistrés ;
+  - traiter() tranche par tranche (`taille_lot` unités), chaque tranche et
+    l'avancement du curseur dans la même transaction : après un arrêt
+    brutal, la tâche reprend à la dernière tranche validée, sans doublon ;
+  - après le COMMIT de chaque tranche, le signal `tranche_terminee` est
+    envoyé (tampons vidés comme en fin de requête, ex. historique) ;
+  - le worker signe chaque écriture (travailleur, battement) ; pendant
+    planifier() et chaque tranche, un thread rafraîchit le battement tous
+    les TACHES_DELAI_ABANDON / 5 secondes. Une tâche en cours sans battement
+    depuis TACHES_DELAI_ABANDON secondes (worker tué) est considérée
+    abandonnée et reprise par un autre worker. Toute écriture d'un worker
+    dépossédé est refusée et sa tranche annulée.
+"""
+import contextlib
+import hashlib
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Tache
+
+logger = logging.getLogger(__name__)
+
+TRAITEMENTS = {}
+
+# Envoyé après le COMMIT de chaque tranche (sender = classe du traitement) :
+# équivalent de request_finished pour le worker (ex. tampon d'historique vidé)
+tranche_terminee = Signal()
+
+
+def traitement(nom):
+    """Décorateur : enregistre une sous-classe de Traitement sous `nom`."""
+    def enregistrer(classe):
+        classe.nom = nom
+        TRAITEMENTS[nom] = classe
+        return classe
+    return enregistrer
+
+
+class Traitement:
+    """
+    Traitement d'un fichier par tranches. Une instance par exécution : elle
+    peut garder le fichier lu entre planifier() et les tranches.
+    """
+    nom = ''
+    libelle = ''
+    taille_lot = 500
+    url_retour = None   # nom d'URL proposé sur la page de suivi
+
+    def __init__(self, tache):
+        self.tache = tache
+
+    def planifier(self, fichier):
+        """{'total': unités lues, 'plan': [unités à traiter, dans l'ordre], 'erreurs': [...]}"""
+        raise NotImplementedError
+
+    def traiter(self, fichier, unites):
+        """
+        Traite une tranche du plan dans la transaction courante :
+        {'reussis': n, 'erreurs': [...]}, plus 'resultat': (nom, contenu) pour
+        un document produit.
+        """
+        raise NotImplementedError
+
+
+class TachePerdue(Exception):
+    """La tâche a été reprise par un autre worker (ou n'est plus en cours)."""
+
+
+def identifiant_travailleur():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def calculer_empreinte(fichier):
+    """SHA-256 hexadécimal d'un fichier téléversé (lu par morceaux)."""
+    h = hashlib.sha256()
+    for morceau in fichier.chunks():
+        h.update(morceau)
+    fichier.seek(0)
+    return h.hexdigest()
+
+
+def soumettre(nom, fichier, utilisateur=None):
+    """
+    Met en attente le traitement `nom` du fichier téléversé.
+    Retourne (tâche, créée) ; créée vaut False si ce fichier a déjà été soumis.
+    """
+    if nom not in TRAITEMENTS:
+        raise ValueError(f"Traitement inconnu : {nom}")
+    empreinte = calculer_empreinte(fichier)
+    existantes = Tache.objects.filter(type=nom, empreinte=empreinte).exclude(statut=Tache.ECHOUEE)
+    existante = existantes.first()
+    if existante is not None:
+        return existante, False
+
+    tache = Tache(type=nom, nom_fichier=os.path.basename(fichier.name)[:255], empreinte=empreinte,
+                  cree_par=_auteur(utilisateur))
+    tache.fichier.save(tache.nom_fichier, fichier, save=False)
+    try:
+        with transaction.atomic():
+            tache.save()
+    except IntegrityError:
+        # Même fichier soumis en parallèle
+        tache.fichier.delete(save=False)
+        return existantes.get(), False
+    return tache, True
+
+
+def demander(nom, empreinte, nom_fichier, parametres=None, utilisateur=None):
+    """
+    Met en attente la génération `nom` d'un document (sans fichier téléversé).
+    Retourne (tâche, créée) ; créée vaut False si une tâche de même empreinte
+    est en cours ou terminée, son document toujours disponible.
+    """
+    if nom not in TRAITEMENTS:
+        raise ValueError(f"Traitement inconnu : {nom}")
+    existantes = Tache.objects.filter(type=nom, empreinte=empreinte).exclude(statut=Tache.ECHOUEE)
+    existante = existantes.first()
+    if existante is not None:
+        if existante.statut != Tache.TERMINEE or existante.resultat_disponible:
+            return existante, False
+        # Document effacé du stockage (disque éphémère, purge) : on le refait
+        existante.delete()
+
+    tache = Tache(type=nom, nom_fichier=nom_fichier[:255], empreinte=empreinte,
+                  parametres=parametres or {}, cree_par=_auteur(utilisateur))
+    try:
+        with transaction.atomic():
+            tache.save()
+    except IntegrityError:
+        # Même document demandé en parallèle
+        return existantes.get(), False
+    return tache, True
+
+
+def _auteur(utilisateur):
+    return utilisateur if utilisateur is not None and utilisateur.is_authenticated else None
+
+
+def relancer(tache):
+    """Remet en attente une tâche échouée (reprise au curseur). False si impossible."""
+    try:
+        with transaction.atomic():
+            return bool(Tache.objects.filter(pk=tache.pk, statut=Tache.ECHOUEE)
+                        .update(statut=Tache.EN_ATTENTE, message='', fin=None, travailleur=''))
+    except IntegrityError:
+        return False   # le même fichier a été soumis de nouveau entre-temps
+
+
+def reclamer(travailleur):
+    """Prend la plus ancienne tâche en attente ou abandonnée ; None s'il n'y en a pas."""
+    maintenant = timezone.now()
+    limite = maintenant - timedelta(seconds=settings.TACHES_DELAI_ABANDON)
+    candidates = list(
+        Tache.objects.filter(Q(statut=Tache.EN_ATTENTE) | Q(statut=Tache.EN_COURS, battement__lt=limite))
+        .order_by('pk').values_list('pk', 'statut', 'travailleur', 'battement')[:10]
+    )
+    for pk, statut, ancien, battement in candidates:
+        # Prise conditionnelle : un seul worker gagne
+        if Tache.objects.filter(pk=pk, statut=statut, travailleur=ancien, battement=battement).update(
+            statut=Tache.EN_COURS, travailleur=travailleur, battement=maintenant,
+            debut=Coalesce(F('debut'), maintenant),
+        ):
+            if statut == Tache.EN_COURS:
+                logger.warning("[Tâches] Reprise de la tâche #%s abandonnée par %s", pk, ancien)
+            return Tache.objects.get(pk=pk)
+    return None
+
+
+def _sauver(tache, **champs):
+    """Écrit l'avancement si `tache` appartient toujours à ce worker (sinon TachePerdue)."""
+    champs['battement'] = timezone.now()
+    if not Tache.objects.filter(pk=tache.pk, statut=Tache.EN_COURS, travailleur=tache.travailleur).update(**champs):
+        raise TachePerdue(tache.pk)
+    for nom, valeur in champs.items():
+        setattr(tache, nom, valeur)
+
+
+class _Battement(threading.Thread):
+    """
+    Rafraîchit `battement` pendant que la tâche s'exécute, même si une
+    tranche (ou planifier) dure plus longtemps que TACHES_DELAI_ABANDON.
+    Écrit par sa propre connexion, hors de la transaction de la tranche.
+    """
+
+    def __init__(self, tache):
+        super().__init__(name=f"battement-{tache.pk}", daemon=True)
+        self.pk, self.travailleur = tache.pk, tache.travailleur
+        self.fin = threading.Event()
+
+    def run(self):
+        intervalle = max(1.0, settings.TACHES_DELAI_ABANDON / 5)
+        try:
+            while not self.fin.wait(intervalle):
+                try:
+                    if not Tache.objects.filter(pk=self.pk, statut=Tache.EN_COURS, travailleur=self.travailleur).update(
+                        battement=timezone.now()
+                    ):
+                        return   # tâche reprise par un autre worker ou plus en cours
+                except DatabaseError:
+                    logger.warning("[Tâches] Battement de la tâche #%s non écrit", self.pk, exc_info=True)
+        finally:
+            connection.close()
+
+
+@contextlib.contextmanager
+def _battement(tache):
+    if connection.vendor == 'sqlite':
+        # Un seul écrivain : le thread bloquerait la transaction de la tranche
+        # (développement, un seul worker ; TACHES_DELAI_ABANDON à ajuster)
+        yield
+        return
+    battement = _Battement(tache)
+    battement.start()
+    try:
+        yield
+    finally:
+        battement.fin.set()
+        battement.join()
+
+
+def _ranger(tache, nom, contenu):
+    """Enregistre le document produit ; retourne son nom sur le stockage."""
+    if isinstance(contenu, bytes):
+        contenu = ContentFile(contenu)
+    champ = tache.resultat.field
+    return champ.storage.save(champ.generate_filename(tache, nom), contenu)
+
+
+def _purger_anciens(tache):
+    """Efface les documents périmés : mêmes traitement et paramètres, produits avant `tache`."""
+    anciennes = (Tache.objects.filter(type=tache.type, parametres=tache.parametres, pk__lt=tache.pk)
+                 .exclude(resultat=''))
+    for pk, nom in anciennes.values_list('pk', 'resultat'):
+        tache.resultat.storage.delete(nom)
+        Tache.objects.filter(pk=pk).update(resultat='')
+
+
+def executer(tache, arret=lambda: False):
+    """
+    Exécute (ou reprend) une tâche réclamée. `arret()` est consulté entre les
+    tranches : la tâche est alors remise en attente et reprendra au curseur.
+    """
+    classe = TRAITEMENTS.get(tache.type)
+    try:
+        if classe is None:
+            raise ValueError(f"Traitement inconnu : {tache.type}")
+        operation = classe(tache)
+        with _battement(tache), tache.fichier.open('rb') if tache.fichier else contextlib.nullcontext() as fichier:
+            if tache.plan is None:
+                debut = time.monotonic()
+                plan = operation.planifier(fichier)
+                _sauver(tache, plan=list(plan['plan']), total=plan['total'], erreurs=list(plan['erreurs']),
+                        nb_erreurs=len(plan['erreurs']), duree=tache.duree + time.monotonic() - debut)
+
+            while tache.curseur < len(tache.plan):
+                if arret():
+                    _sauver(tache, statut=Tache.EN_ATTENTE, travailleur='')
+                    logger.info("[Tâches] Tâche #%s suspendue à %s/%s", tache.pk, tache.curseur, len(tache.plan))
+                    return tache
+                debut = time.monotonic()
+                unites = tache.plan[tache.curseur:tache.curseur + operation.taille_lot]
+                with transaction.atomic():
+                    resultat = operation.traiter(fichier, unites)
+                    champs = {}
+                    if resultat.get('resultat'):
+                        champs['resultat'] = _ranger(tache, *resultat['resultat'])
+                    try:
+                        _sauver(tache, curseur=tache.curseur + len(unites),
+                                reussis=tache.reussis + resultat['reussis'],
+                                erreurs=tache.erreurs + list(resultat['erreurs']),
+                                nb_erreurs=tache.nb_erreurs + len(resultat['erreurs']),
+                                duree=tache.duree + time.monotonic() - debut, **champs)
+                    except TachePerdue:
+                        if champs:
+                            tache.resultat.storage.delete(champs['resultat'])
+                        raise
+                tranche_terminee.send(sender=classe, tache=tache)
+
+        _sauver(tache, statut=Tache.TERMINEE, fin=timezone.now())
+        if tache.resultat:
+            _purger_anciens(tache)
+        logger.info("[Tâches] Tâche #%s terminée : %s réussis, %s erreurs en %.1f s",
+                    tache.pk, tache.reussis, tache.nb_erreurs, tache.duree)
+    except TachePerdue:
+        logger.warning("[Tâches] Tâche #%s reprise par un autre worker, abandon par %s", tache.pk, tache.travailleur)
+    except Exception as e:
+        logger.exception("[Tâches] Échec de la tâche #%s", tache.pk)
+        try:
+            _sauver(tache, statut=Tache.ECHOUEE, fin=timezone.now(), message=str(e) or e.__class__.__name__)
+        except TachePerdue:
+            pass
+    return tache
@@ -0,0 +1,101 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.test import TestCase
+from django.utils import timezone
+
+from .models import Tache
+from .moteur import TachePerdue, Traitement, _sauver, demander, executer, reclamer, traitement
+
+UNITES = list(range(7))
+
+
+class Plantage(BaseException):
+    """Arrêt brutal du worker au milieu d'une tranche (non intercepté par executer)."""
+
+
+@traitement('essai.reprise')
+class TraitementEssai(Traitement):
+    """Une unité traitée = un Group créé dans la transaction de la tranche."""
+    libelle = "Essai de reprise"
+    taille_lot = 2
+    planter_a = None
+
+    def planifier(self, fichier):
+        return {'total': len(UNITES), 'plan': UNITES, 'erreurs': []}
+
+    def traiter(self, fichier, unites):
+        for unite in unites:
+            Group.objects.create(name=f'unite-{unite}')
+            if unite == self.planter_a:
+                raise Plantage
+        return {'reussis': len(unites), 'erreurs': []}
+
+
+class RepriseTests(TestCase):
+
+    def setUp(self):
+        self.tache, _ = demander('essai.reprise', 'essai', 'essai.txt')
+        TraitementEssai.planter_a = None
+
+    def abandonner(self):
+        """Le worker mort ne bat plus depuis plus de TACHES_DELAI_ABANDON secondes."""
+        vieux = timezone.now() - timedelta(seconds=settings.TACHES_DELAI_ABANDON + 1)
+        Tache.objects.filter(pk=self.tache.pk).update(battement=vieux)
+
+    def unites_traitees(self):
+        return sorted(int(nom.split('-')[1]) for nom in Group.objects.values_list('name', flat=True))
+
+    def test_reprise_apres_plantage_sans_doublon(self):
+        tache = reclamer('mort')
+        TraitementEssai.planter_a = 3   # deuxième tranche (2, 3) interrompue
+        with self.assertRaises(Plantage):
+            executer(tache)
+
+        tache.refresh_from_db()
+        self.assertEqual((tache.statut, tache.travailleur, tache.curseur), (Tache.EN_COURS, 'mort', 2))
+        self.assertEqual(self.unites_traitees(), [0, 1])   # tranche interrompue annulée
+
+        # Battement récent : la tâche n'est pas encore considérée abandonnée
+        self.assertIsNone(reclamer('w2'))
+        self.abandonner()
+        TraitementEssai.planter_a = None
+        tache = reclamer('w2')
+        self.assertEqual((tache.pk, tache.travailleur), (self.tache.pk, 'w2'))
+        executer(tache)
+
+        tache.refresh_from_db()
+        self.assertEqual(tache.statut, Tache.TERMINEE)
+        self.assertEqual(tache.curseur, len(UNITES))
+        self.assertEqual(tache.reussis, len(UNITES))
+        self.assertEqual(self.unites_traitees(), UNITES)
+
+    def test_worker_depossede_refuse(self):
+        ancienne = reclamer('mort')
+
+        def reprise_pendant_l_execution():
+            # Le worker est jugé mort et sa tâche reprise juste avant sa première tranche
+            if Tache.objects.filter(pk=ancienne.pk, travailleur='mort').exists():
+                self.abandonner()
+                reclamer('w2')
+            return False
+
+        executer(ancienne, arret=reprise_pendant_l_execution)
+        # Tranche du worker dépossédé annulée, avancement non écrit
+        self.assertFalse(Group.objects.exists())
+        tache = Tache.objects.get(pk=self.tache.pk)
+        self.assertEqual((tache.statut, tache.travailleur, tache.curseur), (Tache.EN_COURS, 'w2', 0))
+        with self.assertRaises(TachePerdue):
+            _sauver(ancienne, statut=Tache.ECHOUEE)
+
+    def test_suspension_reprend_au_curseur(self):
+        appels = iter([False, True])
+        executer(reclamer('w1'), arret=lambda: next(appels, True))
+        tache = Tache.objects.get(pk=self.tache.pk)
+        self.assertEqual((tache.statut, tache.travailleur, tache.curseur), (Tache.EN_ATTENTE, '', 2))
+
+        executer(reclamer('w2'))
+        tache.refresh_from_db()
+        self.assertEqual(tache.statut, Tache.TERMINEE)
+        self.assertEqual(self.unites_traitees(), UNITES)
@@ -0,0 +1,12 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'taches'
+
+urlpatterns = [
+    path('<int:pk>/', views.detail, name='detail'),
+    path('<int:pk>/statut/', views.statut, name='statut'),
+    path('<int:pk>/relancer/', views.relancer_tache, name='relancer'),
+    path('<int:pk>/telecharger/', views.telecharger, name='telecharger'),
+]
@@ -0,0 +1,58 @@
+from django.contrib import messages
+from django.http import FileResponse, Http404, JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import NoReverseMatch, reverse
+from django.views.decorators.http import require_POST
+
+from .models import Tache
+from .moteur import TRAITEMENTS, relancer
+
+
+def detail(request, pk):
+    """Page de suivi d'une tâche ; l'avancement est rafraîchi par l'API `statut`."""
+    tache = get_object_or_404(Tache, pk=pk)
+    classe = TRAITEMENTS.get(tache.type)
+    url_retour = None
+    if classe is not None and classe.url_retour:
+        try:
+            url_retour = reverse(classe.url_retour)
+        except NoReverseMatch:
+            pass
+    return render(request, 'taches/detail.html', {
+        'tache': tache,
+        'libelle': classe.libelle if classe is not None else tache.type,
+        'url_retour': url_retour,
+    })
+
+
+def statut(request, pk):
+    """
+    GET /taches/<pk>/statut/?depuis=N
+    État et avancement (unités/s, erreurs) ; erreurs à partir de l'indice N,
+    pour un suivi par interrogation périodique.
+    """
+    tache = get_object_or_404(Tache, pk=pk)
+    try:
+        depuis = max(0, int(request.GET.get('depuis', 0)))
+    except ValueError:
+        depuis = 0
+    return JsonResponse(tache.etat(depuis=depuis))
+
+
+def telecharger(request, pk):
+    """Document produit par une tâche terminée."""
+    tache = get_object_or_404(Tache, pk=pk, statut=Tache.TERMINEE)
+    if not tache.resultat_disponible:
+        raise Http404("Document introuvable : il a été remplacé par une version plus récente ou effacé.")
+    return FileResponse(tache.resultat.open('rb'), as_attachment=True, filename=tache.nom_fichier)
+
+
+@require_POST
+def relancer_tache(request, pk):
+    tache = get_object_or_404(Tache, pk=pk)
+    if relancer(tache):
+        messages.success(request, f"Tâche n° {tache.pk} remise en attente : reprise après "
+                                  f"{tache.curseur} élément(s) déjà traité(s).")
+    else:
+        messages.error(request, "Cette tâche ne peut pas être relancée (non échouée, ou fichier soumis de nouveau).")
+    return redirect('taches:detail', pk=tache.pk)
@@ -1,10 +1,13 @@
 from datetime import date
 from django.contrib import admin
 from django import forms
+from django.db.models import Count, Q
 from django.forms import DateInput, NumberInput, Textarea
+from django.utils import timezone
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 
+from .consanguinite import recalculer_coefficients
 from .models import Troupeau
 
 
@@ -153,8 +156,14 @@ class TroupeauAdmin(admin.ModelAdmin):
 
     @admin.display(description="Descendants")
     def get_descendants_count(self, obj):
-        count = obj.agneaux_pere.count() if obj.sexe == 'male' else obj.agneaux_mere.count()
-        return f"{count} descendant{'s' if count > 1 else ''}"
+        # Une seule requête indexée sur la table d'ascendance (côtés père et mère)
+        stats = obj.descendances.aggregate(
+            enfants=Count('descendant', distinct=True, filter=Q(profondeur=1)),
+            total=Count('descendant', distinct=True),
+        )
+        enfants, total = stats['enfants'], stats['total']
+        return (f"{enfants} enfant{'s' if enfants > 1 else ''}, "
+                f"{total} descendant{'s' if total > 1 else ''} au total")
 
     @admin.display(description="Enfants directs (lecture seule)")
     def children_links(self, obj):
@@ -171,28 +180,23 @@ class TroupeauAdmin(admin.ModelAdmin):
     # ----- Actions -----
     @admin.action(description="Activer les boucles sélectionnées")
     def activer_boucles(self, request, queryset):
-        updated = queryset.update(boucle_active=True)
+        updated = queryset.update(boucle_active=True, updated_at=timezone.now())
         self.message_user(request, f"{updated} boucle(s) activée(s).")
 
     @admin.action(description="Désactiver les boucles sélectionnées")
     def desactiver_boucles(self, request, queryset):
-        updated = queryset.update(boucle_active=False)
+        updated = queryset.update(boucle_active=False, updated_at=timezone.now())
         self.message_user(request, f"{updated} boucle(s) désactivée(s).")
 
     @admin.action(description="Marquer comme vendus")
     def marquer_vendus(self, request, queryset):
-        updated = queryset.update(statut='vendu', boucle_active=False, date_sortie=date.today())
+        updated = queryset.update(statut='vendu', boucle_active=False, date_sortie=date.today(),
+                                  updated_at=timezone.now())
         self.message_user(request, f"{updated} animal(aux) marqué(s) comme vendu(s).")
 
     @admin.action(description="Recalculer la consanguinité")
     def recalculer_consanguinite(self, request, queryset):
-        count = 0
-        for obj in queryset:
-            nouveau = obj.coefficient_consanguinite_wright()
-            if (obj.coefficient_consanguinite or 0.0) != nouveau:
-                obj.coefficient_consanguinite = nouveau
-                obj.save(update_fields=['coefficient_consanguinite'])
-                count += 1
+        count = recalculer_coefficients(queryset)
         self.message_user(request, f"Consanguinité recalculée pour {count} animal(aux).")
 
     def get_queryset(self, request):
@@ -0,0 +1,187 @@
+# troupeau/arbre.py
+"""
+Arbre d'affichage du troupeau (vue arbre) : chaque animal est rattaché à sa
+mère si elle est connue, sinon à son père (FK de Troupeau).
+
+Chaque animal a un NoeudArbre : parent d'affichage, profondeur (0 = racine)
+et chemin matérialisé, suite des ids des ancêtres d'affichage puis du sien,
+chacun sur LARGEUR caractères en base 36 suivis de '/' :
+"0000001/000000c/". Le sous-arbre d'un animal est l'ensemble des chemins
+qui commencent par le sien (LIKE 'prefixe%' sur l'index unique).
+
+Maintenance :
+  - Troupeau.save() appelle mettre_a_jour_noeud() quand la filiation change :
+    le sous-arbre entier est déplacé en une seule requête UPDATE ;
+  - les signaux de suppression traitent les enfants (SET_NULL sans save()) ;
+  - reconstruire_arbre() (commande `rebuild_closure`) refait toute la table.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Concat, Substr
+
+from .models import NoeudArbre, Troupeau
+
+logger = logging.getLogger(__name__)
+
+LARGEUR = 7
+CHIFFRES = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def segment(pk):
+    """Segment de chemin d'un id : LARGEUR caractères base 36 + '/'."""
+    chiffres = []
+    while pk:
+        pk, reste = divmod(pk, 36)
+        chiffres.append(CHIFFRES[reste])
+    return ''.join(reversed(chiffres)).rjust(LARGEUR, '0') + '/'
+
+
+def calculer_noeuds(lignes):
+    """
+    (pk, parent_id, chemin, profondeur) pour des lignes (pk, pere_id, mere_id).
+    Un parent absent des lignes est ignoré ; un cycle (donnée corrompue) est
+    rompu en faisant une racine du premier animal revisité.
+    """
+    parent = {}
+    for pk, pere_id, mere_id in lignes:
+        parent[pk] = mere_id or pere_id
+    parent = {pk: p if p in parent else None for pk, p in parent.items()}
+
+    noeuds = {}
+    for depart in parent:
+        # Remontée jusqu'à un nœud déjà calculé (ou une racine)
+        pile, vus = [], set()
+        pk = depart
+        while pk is not None and pk not in noeuds:
+            if pk in vus:
+                logger.warning("[Arbre] Cycle de filiation rompu en %s", pk)
+                parent[pk] = None
+                break
+            vus.add(pk)
+            pile.append(pk)
+            pk = parent[pk]
+        for pk in reversed(pile):
+            p = parent[pk]
+            if p is None or p not in noeuds:
+                noeuds[pk] = (None, segment(pk), 0)
+            else:
+                _pp, chemin, profondeur = noeuds[p]
+                noeuds[pk] = (p, chemin + segment(pk), profondeur + 1)
+    return [(pk, p, chemin, profondeur) for pk, (p, chemin, profondeur) in noeuds.items()]
+
+
+def mettre_a_jour_noeud(pk):
+    """
+    Recalcule le nœud de l'animal `pk` d'après ses parents en base et déplace
+    tout son sous-arbre (chemins et profondeurs) en une requête.
+    Retourne le nombre de nœuds modifiés.
+    """
+    animal = Troupeau.objects.filter(pk=pk).values('pere_boucle_id', 'mere_boucle_id').first()
+    if animal is None:
+        return 0
+    parent_id = animal['mere_boucle_id'] or animal['pere_boucle_id']
+    noeud = NoeudArbre.objects.filter(pk=pk).values('parent_id', 'chemin', 'profondeur').first()
+    parent = NoeudArbre.objects.filter(pk=parent_id).values('chemin', 'profondeur').first() if parent_id else None
+
+    if parent is not None and noeud is not None and parent['chemin'].startswith(noeud['chemin']):
+        logger.warning("[Arbre] %s ne peut pas être rattaché à son propre descendant %s", pk, parent_id)
+        parent = None
+    if parent is None:
+        parent_id = None
+    chemin = (parent['chemin'] if parent else '') + segment(pk)
+    profondeur = parent['profondeur'] + 1 if parent else 0
+
+    if noeud is None:
+        NoeudArbre.objects.create(animal_id=pk, parent_id=parent_id, chemin=chemin, profondeur=profondeur)
+        return 1
+    if (noeud['parent_id'], noeud['chemin']) == (parent_id, chemin):
+        return 0
+
+    with transaction.atomic():
+        NoeudArbre.objects.filter(pk=pk).update(parent_id=parent_id)
+        return NoeudArbre.objects.filter(chemin__startswith=noeud['chemin']).update(
+            chemin=Concat(Value(chemin), Substr('chemin', len(noeud['chemin']) + 1)),
+            profondeur=F('profondeur') + (profondeur - noeud['profondeur']),
+        )
+
+
+def ajouter_noeuds(pks, batch_size=1000):
+    """
+    Crée les nœuds d'animaux nouveaux (sans descendance en base), en une
+    lecture des parents déjà placés et un bulk_create (import en masse).
+    Retourne le nombre de nœuds créés.
+    """
+    lignes = list(Troupeau.objects.filter(pk__in=list(pks)).order_by()
+                  .values_list('id', 'pere_boucle_id', 'mere_boucle_id'))
+    nouveaux = {pk for pk, _p, _m in lignes}
+    parents = {mere_id or pere_id for _pk, pere_id, mere_id in lignes} - nouveaux - {None}
+    places = {
+        pk: (chemin, profondeur)
+        for pk, chemin, profondeur in NoeudArbre.objects.filter(pk__in=parents)
+        .values_list('pk', 'chemin', 'profondeur')
+    }
+
+    # Racines du lot dont le parent d'affichage est déjà placé : tout leur
+    # sous-arbre est décalé sous le chemin de ce parent
+    affichage = {pk: mere_id or pere_id for pk, pere_id, mere_id in lignes}
+    noeuds = calculer_noeuds(lignes)
+    decalages = {}
+    for pk, p, _chemin, _profondeur in noeuds:
+        if p is None and affichage[pk] in places:
+            decalages[pk] = (affichage[pk], *places[affichage[pk]])
+    if decalages:
+        decales = []
+        for pk, p, chemin, profondeur in noeuds:
+            racine = int(chemin[:LARGEUR], 36)
+            if racine in decalages:
+                parent, prefixe, profondeur_parent = decalages[racine]
+                p = parent if pk == racine else p
+                chemin, profondeur = prefixe + chemin, profondeur + profondeur_parent + 1
+            decales.append((pk, p, chemin, profondeur))
+        noeuds = decales
+    NoeudArbre.objects.bulk_create(
+        (NoeudArbre(animal_id=pk, parent_id=p, chemin=chemin, profondeur=profondeur)
+         for pk, p, chemin, profondeur in noeuds),
+        batch_size=batch_size,
+    )
+    return len(noeuds)
+
+
+def reconstruire_arbre(batch_size=1000):
+    """Reconstruit toute la table depuis les FK parents. Retourne le nombre de nœuds."""
+    noeuds = calculer_noeuds(Troupeau.objects.order_by().values_list('id', 'pere_boucle_id', 'mere_boucle_id'))
+    with transaction.atomic():
+        NoeudArbre.objects.all().delete()
+        NoeudArbre.objects.bulk_create(
+            (NoeudArbre(animal_id=pk, parent_id=p, chemin=chemin, profondeur=profondeur)
+             for pk, p, chemin, profondeur in noeuds),
+            batch_size=batch_size,
+        )
+    return len(noeuds)
+
+
+# =========================
+# Lecture (vue arbre)
+# =========================
+
+def enfants_affichage(parent_id=None):
+    """
+    Enfants d'affichage de `parent_id` (racines si None), triés par race puis
+    boucle. Un animal sans nœud (créé sans save(), ex. bulk_create) est racine.
+    """
+    qs = (Troupeau.objects
+          .only('id', 'boucle_ovin', 'sexe', 'race', 'boucle_active')
+          .order_by('race', 'boucle_ovin', 'id'))
+    if parent_id is None:
+        return qs.filter(noeud_arbre__parent__isnull=True)
+    return qs.filter(noeud_arbre__parent_id=parent_id)
+
+
+def compter_enfants(ids):
+    """{id: nombre d'enfants d'affichage} pour les animaux `ids` (une requête)."""
+    return dict(
+        NoeudArbre.objects.filter(parent_id__in=list(ids))
+        .values('parent_id').annotate(nb=Count('pk')).values_list('parent_id', 'nb')
+    )
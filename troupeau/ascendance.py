@@ -0,0 +1,86 @@
+# troupeau/ascendance.py
+"""
+Table de fermeture du pedigree (Ascendance) : une ligne par chemin distinct
+(ancêtre, descendant, profondeur, côté), le côté étant celui du premier pas
+depuis le descendant (par son père ou par sa mère).
+
+Les lignes sont calculées à partir du pedigree effectif (Genealogie prioritaire
+sur les FK), en ordre topologique, puis écrites par bulk_create :
+  - mise à jour incrémentale : quand la filiation d'un animal change, seules
+    les lignes de cet animal et de sa descendance sont remplacées ;
+  - reconstruction complète : `reconstruire_ascendance()` ou la commande
+    `rebuild_closure`.
+"""
+from django.db import transaction
+
+from .consanguinite import ordonner_pedigree
+from .models import Ascendance
+
+COTES = (Ascendance.COTE_PERE, Ascendance.COTE_MERE)
+
+
+def lignes_ascendance(pedigree, ids=None):
+    """
+    Lignes (ancetre_id, descendant_id, profondeur, cote) pour les animaux `ids`
+    (tous si None) d'un pedigree [(id, pere_id, mere_id), ...] contenant au
+    moins leurs ascendants.
+    """
+    ordre, peres, meres = ordonner_pedigree(pedigree)
+    cibles = None if ids is None else set(ids)
+
+    # ancetres[k] : {(position ancêtre, profondeur)} de la position k
+    ancetres = [frozenset()] * len(ordre)
+    for k in range(1, len(ordre)):
+        chemins = set()
+        pk = ordre[k]
+        emettre = cibles is None or pk in cibles
+        for cote, parent in zip(COTES, (peres[k], meres[k])):
+            if not parent:
+                continue
+            cote_chemins = {(parent, 1)}
+            cote_chemins.update((a, p + 1) for a, p in ancetres[parent])
+            chemins |= cote_chemins
+            if emettre:
+                for a, p in cote_chemins:
+                    yield ordre[a], pk, p, cote
+        ancetres[k] = frozenset(chemins)
+
+
+def _ecrire(lignes, batch_size):
+    Ascendance.objects.bulk_create(
+        (Ascendance(ancetre_id=a, descendant_id=d, profondeur=p, cote=c) for a, d, p, c in lignes),
+        batch_size=batch_size,
+    )
+
+
+def mettre_a_jour_ascendance(*pks, batch_size=1000):
+    """
+    Remplace les lignes des animaux `pks` et de toute leur descendance
+    (à appeler après un changement de filiation, index déjà patché).
+    Retourne le nombre d'animaux traités.
+    """
+    from .pedigree import obtenir_index
+
+    index = obtenir_index()
+    cibles = set()
+    for pk in pks:
+        if pk in index:
+            cibles.add(pk)
+            cibles.update(index.descendants(pk))
+    if not cibles:
+        return 0
+    with transaction.atomic():
+        Ascendance.objects.filter(descendant_id__in=cibles).delete()
+        _ecrire(list(lignes_ascendance(index.pedigree(cibles), cibles)), batch_size)
+    return len(cibles)
+
+
+def reconstruire_ascendance(batch_size=1000):
+    """Reconstruit toute la table depuis le pedigree en base. Retourne le nombre de lignes."""
+    from .consanguinite import charger_pedigree
+
+    lignes = list(lignes_ascendance(charger_pedigree()))
+    with transaction.atomic():
+        Ascendance.objects.all().delete()
+        _ecrire(lignes, batch_size)
+    return len(lignes)
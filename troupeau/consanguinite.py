@@ -0,0 +1,423 @@
+# troupeau/consanguinite.py
+"""
+Moteur de consanguinité à l'échelle du troupeau.
+
+Le pedigree est chargé une seule fois (id, père, mère), trié de façon
+topologique (parents avant descendants), puis les coefficients F de tous les
+animaux sont calculés en une passe avec l'algorithme de Meuwissen & Luo (1992).
+Aucune limite de profondeur : tout l'ascendant connu est pris en compte.
+"""
+import hashlib
+import heapq
+from collections import defaultdict, deque
+
+from django.db import transaction
+
+from .models import Troupeau
+
+# Tolérance utilisée pour décider si un coefficient stocké doit être réécrit
+TOLERANCE = 0.00001
+
+
+# =========================
+# Chargement / tri du pedigree
+# =========================
+
+def charger_pedigree():
+    """
+    Pedigree effectif [(id, pere_id, mere_id), ...] de tout le troupeau.
+    Les parents déclarés dans Genealogie sont prioritaires sur les FK de Troupeau.
+    """
+    from genealogie.models import Genealogie
+
+    surcharges = {
+        agneau_id: (pere_id, mere_id)
+        for agneau_id, pere_id, mere_id in Genealogie.objects.values_list('agneau_id', 'pere_id', 'mere_id')
+    }
+    return [
+        (pk, *surcharges.get(pk, (pere_id, mere_id)))
+        for pk, pere_id, mere_id in Troupeau.objects.order_by().values_list('id', 'pere_boucle_id', 'mere_boucle_id')
+    ]
+
+
+def ordonner_pedigree(pedigree):
+    """
+    Tri topologique (Kahn) d'un pedigree [(id, pere_id, mere_id), ...].
+
+    Retourne (ordre, peres, meres) :
+      - ordre[k] = id de l'animal en position k (k >= 1, ordre[0] = None) ;
+      - peres[k] / meres[k] = position du parent (0 = inconnu).
+    Les parents absents du pedigree sont considérés inconnus ; un éventuel
+    cycle (donnée corrompue) est rompu en ignorant le lien parent fautif.
+    """
+    parents = {}
+    for pk, pere_id, mere_id in pedigree:
+        parents[pk] = (pere_id, mere_id)
+
+    enfants = defaultdict(list)
+    attente = {}
+    for pk, (pere_id, mere_id) in parents.items():
+        n = 0
+        for parent_id in (pere_id, mere_id):
+            if parent_id is not None and parent_id != pk and parent_id in parents:
+                enfants[parent_id].append(pk)
+                n += 1
+        attente[pk] = n
+
+    ordre = [None]
+    position = {}
+    file = deque(sorted(pk for pk, n in attente.items() if n == 0))
+    restants = len(parents)
+
+    while restants:
+        if not file:
+            # Cycle : on débloque le plus petit id restant
+            file.append(min(pk for pk, n in attente.items() if n > 0))
+        pk = file.popleft()
+        if attente.get(pk) is None:
+            continue
+        del attente[pk]
+        restants -= 1
+        position[pk] = len(ordre)
+        ordre.append(pk)
+        for enfant in enfants.get(pk, ()):
+            if enfant in attente:
+                attente[enfant] -= 1
+                if attente[enfant] == 0:
+                    file.append(enfant)
+
+    peres = [0] * len(ordre)
+    meres = [0] * len(ordre)
+    for k in range(1, len(ordre)):
+        pere_id, mere_id = parents[ordre[k]]
+        # Un parent placé après l'enfant provient d'un cycle rompu : ignoré
+        p = position.get(pere_id, 0)
+        m = position.get(mere_id, 0)
+        peres[k] = p if p < k else 0
+        meres[k] = m if m < k else 0
+    return ordre, peres, meres
+
+
+def restreindre_aux_ascendants(pedigree, ids):
+    """Sous-pedigree contenant uniquement `ids` et tous leurs ascendants."""
+    parents = {pk: (p, m) for pk, p, m in pedigree}
+    gardes = set()
+    pile = [pk for pk in ids if pk in parents]
+    while pile:
+        pk = pile.pop()
+        if pk in gardes:
+            continue
+        gardes.add(pk)
+        for parent_id in parents[pk]:
+            if parent_id is not None and parent_id in parents and parent_id not in gardes:
+                pile.append(parent_id)
+    return [(pk, p, m) for pk, (p, m) in parents.items() if pk in gardes]
+
+
+# =========================
+# Algorithme de Meuwissen & Luo
+# =========================
+
+def _consanguinite_positions(peres, meres):
+    """
+    F pour chaque position (1..n) d'un pedigree ordonné.
+    D[i] est la variance d'échantillonnage mendélien de i ; F[0] = -1 pour
+    un parent inconnu, ce qui donne D = 1, 0.75 - F/4 ou 0.5 - (Fp+Fm)/4.
+    """
+    n = len(peres) - 1
+    F = [0.0] * (n + 1)
+    D = [0.0] * (n + 1)
+    F[0] = -1.0
+    deja_calcules = {}
+
+    for i in range(1, n + 1):
+        s, d = peres[i], meres[i]
+        D[i] = 0.5 - 0.25 * (F[s] + F[d])
+        if not s or not d:
+            F[i] = 0.0
+            continue
+
+        cle = (s, d) if s < d else (d, s)
+        if cle in deja_calcules:
+            # Pleins frères/sœurs : même coefficient
+            F[i] = deja_calcules[cle]
+            continue
+
+        F[i] = deja_calcules[cle] = _somme_contributions(i, peres, meres, D) - 1.0
+
+    F[0] = 0.0
+    return F, D
+
+
+def _somme_contributions(i, peres, meres, D):
+    """Σ L_j² · D_j sur i et ses ascendants (parcours par position décroissante)."""
+    L = {i: 1.0}
+    tas = [-i]
+    somme = 0.0
+    while tas:
+        j = -heapq.heappop(tas)
+        lj = L.pop(j)
+        somme += lj * lj * D[j]
+        for k in (peres[j], meres[j]):
+            if k:
+                if k in L:
+                    L[k] += 0.5 * lj
+                else:
+                    L[k] = 0.5 * lj
+                    heapq.heappush(tas, -k)
+    return somme
+
+
+def calculer_consanguinite(pedigree):
+    """
+    Coefficients F de tous les animaux d'un pedigree [(id, pere_id, mere_id), ...].
+    Retourne {id: F} (arrondi à 5 décimales, valeurs dans 0..1).
+    """
+    ordre, peres, meres = ordonner_pedigree(pedigree)
+    F, _D = _consanguinite_positions(peres, meres)
+    return {ordre[k]: round(max(F[k], 0.0), 5) for k in range(1, len(ordre))}
+
+
+def coefficient_descendance(pere_id, mere_id, pedigree=None):
+    """
+    Coefficient F attendu pour un descendant (hypothétique) de pere_id × mere_id,
+    c'est-à-dire la parenté (coancestry) entre les deux parents.
+    """
+    if not pere_id or not mere_id or pere_id == mere_id:
+        return 0.0
+    if pedigree is None:
+        # Index en mémoire du processus : aucune requête une fois construit
+        from .pedigree import obtenir_index
+        pedigree = obtenir_index().pedigree([pere_id, mere_id])
+    sous_pedigree = restreindre_aux_ascendants(pedigree, [pere_id, mere_id])
+    ordre, peres, meres = ordonner_pedigree(sous_pedigree)
+    position = {pk: k for k, pk in enumerate(ordre) if pk is not None}
+    s, d = position.get(pere_id, 0), position.get(mere_id, 0)
+    if not s or not d:
+        return 0.0
+
+    _F, D = _consanguinite_positions(peres, meres)
+    # Ajout d'un individu virtuel en dernière position
+    i = len(ordre)
+    peres = peres + [s]
+    meres = meres + [d]
+    D = D + [0.5 - 0.25 * (_F[s] + _F[d])]
+    F = _somme_contributions(i, peres, meres, D) - 1.0
+    return round(max(F, 0.0), 5)
+
+
+def _produit_parente(x, peres, meres, D, debut=None):
+    """
+    u = A·x (A : parenté additive) sans former A, avec A = T·D·T' (Colleau, 2002) :
+      - remontée  v = T'·x (positions décroissantes, vers les parents) ;
+      - descente  u = T·(D·v) (positions croissantes, u_i = D_i v_i + (u_p + u_m)/2).
+    `debut` : plus grande position non nulle de x (toutes par défaut).
+    O(n) par produit ; x et u sont indexés par position (x[0] ignoré).
+    """
+    n = len(peres) - 1
+    v = list(x)
+    for i in range(n if debut is None else debut, 0, -1):
+        vi = v[i]
+        if vi:
+            v[peres[i]] += 0.5 * vi
+            v[meres[i]] += 0.5 * vi
+    # u[0] reste nul : un parent inconnu n'apporte rien
+    u = [0.0] * (n + 1)
+    for i in range(1, n + 1):
+        u[i] = D[i] * v[i] + 0.5 * (u[peres[i]] + u[meres[i]])
+    return u
+
+
+def _colonne_parente(s, peres, meres, D):
+    """Colonne A·e_s de la matrice de parenté additive (position s >= 1)."""
+    x = [0.0] * len(peres)
+    x[s] = 1.0
+    # Seules les positions <= s peuvent être des ascendants de s
+    return _produit_parente(x, peres, meres, D, debut=s)
+
+
+def matrice_descendance(males, femelles, pedigree):
+    """
+    F attendu des descendants de chaque couple mâle × femelle, c'est-à-dire la
+    moitié de la parenté additive a(m, f). Retourne une liste de lignes (une par
+    mâle, dans l'ordre de `males`) contenant un coefficient par femelle.
+
+    Chaque ligne est une colonne A·e_m obtenue en O(n) par la méthode de
+    Colleau (voir _produit_parente). Le pedigree est restreint aux ascendants
+    des candidats.
+    """
+    sous_pedigree = restreindre_aux_ascendants(pedigree, [*males, *femelles])
+    ordre, peres, meres = ordonner_pedigree(sous_pedigree)
+    position = {pk: k for k, pk in enumerate(ordre) if pk is not None}
+    _F, D = _consanguinite_positions(peres, meres)
+    colonnes = [position.get(pk, 0) for pk in femelles]
+
+    lignes = []
+    for pk in males:
+        s = position.get(pk, 0)
+        if not s:
+            lignes.append([0.0] * len(femelles))
+            continue
+        u = _colonne_parente(s, peres, meres, D)
+        lignes.append([round(0.5 * u[k], 5) if k else 0.0 for k in colonnes])
+    return lignes
+
+
+def parente_moyenne_positions(membres, peres, meres, D):
+    """
+    Parenté moyenne (coancestry, 0..1) de tous les couples d'un groupe de
+    positions, soi-même compris : x'·A·x / (2·k²) avec x l'indicatrice du
+    groupe, soit un seul produit A·x en O(n) au lieu de k² coefficients.
+    """
+    if not membres:
+        return None
+    x = [0.0] * len(peres)
+    for k in membres:
+        x[k] = 1.0
+    u = _produit_parente(x, peres, meres, D)
+    return sum(u[k] for k in membres) / (2.0 * len(membres) ** 2)
+
+
+def matrice_accouplements(race=None, proprietaire=None, timeout=24 * 3600):
+    """
+    Matrice F attendu de tous les mâles actifs × femelles actives (filtrables
+    par race et propriétaire). Le résultat est mis en cache ; la clé contient
+    la version de filiation et l'empreinte des candidats, donc toute
+    modification de parents ou de la liste des candidats le renouvelle (une
+    boucle renommée sur un animal non candidat, non).
+
+    Retourne {'version', 'males': [(id, boucle)], 'femelles': [(id, boucle)],
+    'coefficients': [[F, ...], ...]}.
+    """
+    from django.core.cache import cache
+
+    from .pedigree import version_filiation
+    from .stock_parente import matrice_parente
+
+    qs = Troupeau.objects.filter(boucle_active=True).order_by('boucle_ovin')
+    if race:
+        qs = qs.filter(race=race)
+    if proprietaire:
+        qs = qs.filter(proprietaire_ovin=proprietaire)
+
+    males, femelles = [], []
+    for pk, boucle, sexe in qs.values_list('id', 'boucle_ovin', 'sexe'):
+        if sexe == 'male':
+            males.append((pk, boucle))
+        elif sexe == 'femelle':
+            femelles.append((pk, boucle))
+
+    version = version_filiation()
+    empreinte = hashlib.md5(repr((males, femelles)).encode()).hexdigest()
+    cle = f"troupeau:matrice:{version}:{empreinte}"
+    resultat = cache.get(cle)
+    if resultat is None:
+        resultat = {
+            'version': version,
+            'males': males,
+            'femelles': femelles,
+            'coefficients': matrice_parente([pk for pk, _b in males], [pk for pk, _b in femelles]),
+        }
+        cache.set(cle, resultat, timeout)
+    return resultat
+
+
+def coefficient_animal(animal, pedigree=None):
+    """
+    Coefficient F d'un animal (enregistré ou non) à partir de ses parents.
+    Seul l'ascendant de l'animal est évalué.
+    """
+    return coefficient_descendance(animal.pere_boucle_id, animal.mere_boucle_id, pedigree=pedigree)
+
+
+# =========================
+# Recalcul et écriture en base
+# =========================
+
+def recalculer_coefficients(queryset=None, batch_size=500):
+    """
+    Recalcule F pour tout le troupeau en une passe et écrit uniquement les
+    lignes modifiées avec bulk_update. `queryset` limite les lignes écrites
+    (le calcul utilise toujours le pedigree complet).
+    Retourne le nombre d'animaux mis à jour.
+    """
+    coefficients = calculer_consanguinite(charger_pedigree())
+
+    if queryset is None:
+        queryset = Troupeau.objects.all()
+
+    modifies = []
+    for pk, ancien in queryset.order_by().values_list('id', 'coefficient_consanguinite').iterator():
+        nouveau = coefficients.get(pk, 0.0)
+        if abs((ancien or 0.0) - nouveau) > TOLERANCE:
+            modifies.append(Troupeau(pk=pk, coefficient_consanguinite=nouveau))
+
+    if modifies:
+        with transaction.atomic():
+            Troupeau.objects.bulk_update(modifies, ['coefficient_consanguinite'], batch_size=batch_size)
+    return len(modifies)
+
+
+def propager_consanguinite(animal, batch_size=500):
+    """
+    Recalcule F pour `animal` (instance ou id) et toute sa descendance (ordre
+    topologique du pedigree) et écrit les lignes modifiées en un seul
+    bulk_update, Genealogie.fa compris.
+    À appeler après la sauvegarde d'un changement de filiation.
+    Retourne le nombre d'animaux mis à jour.
+    """
+    from .pedigree import obtenir_index
+
+    pk = animal.pk if isinstance(animal, Troupeau) else animal
+    index = obtenir_index()
+    cibles = [pk, *index.descendants(pk)]
+    coefficients = calculer_consanguinite(index.pedigree(cibles))
+
+    modifies = []
+    anciens = Troupeau.objects.filter(pk__in=cibles).values_list('id', 'coefficient_consanguinite')
+    for pk, ancien in anciens:
+        nouveau = coefficients.get(pk, 0.0)
+        if abs((ancien or 0.0) - nouveau) > TOLERANCE:
+            modifies.append(Troupeau(pk=pk, coefficient_consanguinite=nouveau))
+
+    with transaction.atomic():
+        if modifies:
+            Troupeau.objects.bulk_update(modifies, ['coefficient_consanguinite'], batch_size=batch_size)
+        _ecrire_fa_genealogies(coefficients, agneaux=cibles, batch_size=batch_size)
+    if isinstance(animal, Troupeau):
+        animal.coefficient_consanguinite = coefficients.get(pk, 0.0)
+    return len(modifies)
+
+
+def _ecrire_fa_genealogies(coefficients, agneaux=None, batch_size=500):
+    """Aligne Genealogie.fa (0..1) sur les coefficients calculés ; retourne le nombre de lignes écrites."""
+    from genealogie.models import Genealogie
+
+    qs = Genealogie.objects.order_by()
+    if agneaux is not None:
+        qs = qs.filter(agneau_id__in=agneaux)
+    modifies = []
+    for pk, agneau_id, ancien in qs.values_list('id', 'agneau_id', 'fa').iterator():
+        nouveau = coefficients.get(agneau_id, 0.0)
+        if abs((ancien or 0.0) - nouveau) > TOLERANCE:
+            modifies.append(Genealogie(pk=pk, fa=nouveau))
+    if modifies:
+        Genealogie.objects.bulk_update(modifies, ['fa'], batch_size=batch_size)
+    return len(modifies)
+
+
+def recalculer_fa_genealogies(queryset=None, batch_size=500):
+    """
+    Recalcule Genealogie.fa en une seule passe Meuwissen & Luo (calcul partagé
+    par toutes les lignes). `queryset` limite les fiches écrites, le calcul
+    étant alors restreint à l'ascendance de leurs agneaux.
+    Retourne le nombre de fiches mises à jour.
+    """
+    pedigree = charger_pedigree()
+    agneaux = None
+    if queryset is not None:
+        agneaux = list(queryset.values_list('agneau_id', flat=True))
+        pedigree = restreindre_aux_ascendants(pedigree, agneaux)
+    coefficients = calculer_consanguinite(pedigree)
+    with transaction.atomic():
+        return _ecrire_fa_genealogies(coefficients, agneaux=agneaux, batch_size=batch_size)
@@ -0,0 +1,107 @@
+# troupeau/documents.py
+"""
+Documents PDF du troupeau (export complet, planche d'étiquettes, étiquette
+individuelle), rendus par WeasyPrint dans une tâche de fond
+(troupeau/taches.py, worker `traiter_taches`) et gardés sous MEDIA_ROOT.
+
+L'empreinte d'un document résume ce qu'il contiendra : les colonnes
+affichées de chaque animal retenu (boucles des parents comprises), lues par
+une seule requête values_list sans rendu, et la version du gabarit (SHA-256
+de sa source). Elle suit donc aussi les écritures qui ne touchent pas
+`updated_at` (QuerySet.update, bulk_update des coefficients, boucle d'un
+parent renommée). Tant qu'elle ne change pas, la tâche déjà terminée est
+renvoyée et son PDF servi tel quel.
+
+    tache, creee = demander_document('etiquettes', ids=[3, 5], utilisateur=request.user)
+"""
+import hashlib
+import json
+from datetime import datetime
+
+from django.template.loader import get_template, render_to_string
+
+from taches.moteur import demander
+
+from .models import Troupeau
+
+# document -> gabarit HTML (aussi affiché tel quel dans le navigateur)
+GABARITS = {
+    'export': 'troupeau/export_pdf.html',
+    'etiquettes': 'troupeau/etiquettes.html',
+    'etiquette': 'troupeau/etiquette_individuelle.html',
+}
+
+# Colonnes lues par les gabarits (libellés des choix compris, via la valeur)
+CHAMPS_AFFICHES = (
+    'id', 'boucle_ovin', 'sexe', 'race', 'naissance_date', 'pere_boucle__boucle_ovin',
+    'mere_boucle__boucle_ovin', 'statut', 'proprietaire_ovin', 'coefficient_consanguinite', 'boucle_active',
+)
+
+
+def pdf_disponible():
+    """WeasyPrint importable (bibliothèques système Pango/Cairo comprises)."""
+    try:
+        import weasyprint  # noqa: F401
+    except (ImportError, OSError):
+        return False
+    return True
+
+
+def animaux(document, ids=None):
+    """Animaux du document : `ids` s'ils sont donnés, sinon tout le troupeau (export) ou les boucles actives."""
+    qs = Troupeau.objects.all()
+    if ids is not None:
+        qs = qs.filter(pk__in=ids)
+    elif document == 'etiquettes':
+        qs = qs.filter(boucle_active=True)
+    return qs.order_by('boucle_ovin')
+
+
+def contexte_document(document, ids=None):
+    qs = animaux(document, ids)
+    if document == 'etiquette':
+        return {'animal': qs.get(), 'today': datetime.now()}
+    return {'animaux': qs.select_related('pere_boucle', 'mere_boucle'), 'today': datetime.now()}
+
+
+def version_gabarit(nom):
+    """SHA-256 (abrégé) de la source du gabarit : une retouche invalide les PDF déjà produits."""
+    return hashlib.sha256(get_template(nom).template.source.encode('utf-8')).hexdigest()[:16]
+
+
+def empreinte(document, ids=None):
+    h = hashlib.sha256(json.dumps([document, ids, version_gabarit(GABARITS[document])]).encode('utf-8'))
+    for ligne in animaux(document, ids).values_list(*CHAMPS_AFFICHES).iterator(chunk_size=2000):
+        h.update(repr(ligne).encode('utf-8'))
+    return h.hexdigest()
+
+
+def nom_fichier(document, ids=None):
+    date = datetime.now().date()
+    if document == 'export':
+        return f"troupeau_export_{date}.pdf"
+    if document == 'etiquette':
+        boucle = animaux(document, ids).values_list('boucle_ovin', flat=True).get()
+        return f"etiquette_{boucle}_{date}.pdf"
+    return f"etiquettes_{date}.pdf"
+
+
+def demander_document(document, ids=None, utilisateur=None):
+    """Tâche de génération du PDF (existante si le document est inchangé) : (tâche, créée)."""
+    if document not in GABARITS:
+        raise ValueError(f"Document inconnu : {document}")
+    ids = sorted(set(ids)) if ids is not None else None
+    return demander(
+        'troupeau.pdf', empreinte(document, ids), nom_fichier(document, ids),
+        parametres={'document': document, 'ids': ids}, utilisateur=utilisateur,
+    )
+
+
+def rendre_pdf(document, ids=None):
+    """Octets du PDF ; les erreurs (WeasyPrint absent, gabarit…) remontent à la tâche."""
+    try:
+        from weasyprint import HTML
+    except (ImportError, OSError) as e:
+        raise RuntimeError(f"WeasyPrint indisponible : {e}") from e
+    html = render_to_string(GABARITS[document], contexte_document(document, ids))
+    return HTML(string=html).write_pdf()
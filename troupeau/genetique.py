@@ -0,0 +1,162 @@
+# troupeau/genetique.py
+"""
+Indicateurs de génétique des populations par race et par année de naissance.
+
+Une seule passe en ordre topologique sur le pedigree effectif donne, pour
+chaque animal :
+  - F (Meuwissen & Luo) ;
+  - le nombre de générations complètes équivalentes ge = Σ (1/2)^n sur tous
+    les chemins vers des ancêtres connus (Maignel et al., 1996) ;
+  - ΔF individuel = 1 - (1 - F)^(1 / (ge - 1)) (Gutiérrez et al., 2008),
+    d'où Ne = 1 / (2 · ΔF moyen) ;
+  - l'indice de complétude du pedigree de MacCluer et al. (1983) sur
+    PROFONDEUR_MACCLUER générations.
+La parenté moyenne d'une cohorte (tous ses couples, soi-même compris) est
+obtenue par un seul produit A·x (Colleau) par cohorte.
+L'intervalle de génération est l'âge moyen (années) des parents à la
+naissance de leurs descendants.
+"""
+from collections import defaultdict
+
+from .consanguinite import _consanguinite_positions, ordonner_pedigree, parente_moyenne_positions
+from .models import Troupeau
+
+PROFONDEUR_MACCLUER = 5
+JOURS_PAR_AN = 365.25
+
+
+def indicateurs_individuels(pedigree, profondeur=PROFONDEUR_MACCLUER):
+    """
+    {id: (F, ge, delta_f | None, completude)} pour un pedigree [(id, pere_id, mere_id), ...].
+    """
+    ordre, peres, meres = ordonner_pedigree(pedigree)
+    return _indicateurs_positions(ordre, peres, meres, profondeur)[0]
+
+
+def _indicateurs_positions(ordre, peres, meres, profondeur):
+    """(indicateurs par id, D de Meuwissen & Luo par position)."""
+    F, D = _consanguinite_positions(peres, meres)
+    n = len(ordre)
+    ge = [0.0] * n
+    # connus[k][g] : nombre d'ancêtres connus de k à la génération g + 1
+    connus = [[0] * profondeur for _k in range(n)]
+    vide = [0] * profondeur
+
+    resultat = {}
+    for k in range(1, n):
+        completudes = []
+        for parent in (peres[k], meres[k]):
+            if parent:
+                ge[k] += 0.5 * (1.0 + ge[parent])
+                cote = [1, *connus[parent][:profondeur - 1]]
+                connus[k] = [a + b for a, b in zip(connus[k], cote)]
+            else:
+                cote = vide
+            # Proportion d'ancêtres connus par génération de ce côté, moyennée
+            completudes.append(sum(c / 2 ** g for g, c in enumerate(cote)) / profondeur)
+
+        c_pere, c_mere = completudes
+        # Moyenne harmonique des deux côtés : nulle dès qu'un côté est inconnu
+        completude = 2 * c_pere * c_mere / (c_pere + c_mere) if c_pere and c_mere else 0.0
+        f = max(F[k], 0.0)
+        delta_f = 1.0 - (1.0 - f) ** (1.0 / (ge[k] - 1.0)) if ge[k] > 1.0 else None
+        resultat[ordre[k]] = (f, ge[k], delta_f, completude)
+    return resultat, D
+
+
+def _moyenne(valeurs):
+    return sum(valeurs) / len(valeurs) if valeurs else None
+
+
+def _resume(cohorte, peres, meres, D):
+    delta_f = _moyenne(cohorte['delta_f'])
+    return {
+        'effectif': cohorte['effectif'],
+        'f_moyen': _moyenne(cohorte['f']),
+        'parente_moyenne': parente_moyenne_positions(cohorte['positions'], peres, meres, D),
+        'delta_f': delta_f,
+        'ne': 1.0 / (2.0 * delta_f) if delta_f else None,
+        'ge_moyen': _moyenne(cohorte['ge']),
+        'completude': _moyenne(cohorte['completude']),
+        'intervalle': _moyenne(cohorte['intervalles']),
+        'nb_intervalles': len(cohorte['intervalles']),
+    }
+
+
+def rapport_population(index=None):
+    """
+    Indicateurs par race puis par année de naissance :
+    [{'race', 'libelle', 'total': {...}, 'cohortes': [{'annee', ...}, ...]}, ...]
+    """
+    if index is None:
+        from .pedigree import obtenir_index
+        index = obtenir_index()
+
+    ordre, peres, meres = ordonner_pedigree(index.pedigree())
+    individus, D = _indicateurs_positions(ordre, peres, meres, PROFONDEUR_MACCLUER)
+    position = {pk: k for k, pk in enumerate(ordre) if pk is not None}
+    naissances = dict(Troupeau.objects.order_by().values_list('id', 'naissance_date'))
+
+    def nouvelle_cohorte():
+        return {'effectif': 0, 'positions': [], 'f': [], 'ge': [], 'delta_f': [], 'completude': [],
+                'intervalles': []}
+
+    cohortes = defaultdict(nouvelle_cohorte)
+    for pk, (f, ge, delta_f, completude) in individus.items():
+        ligne = index.ligne(pk)
+        naissance = naissances.get(pk)
+        annee = naissance.year if naissance else None
+        intervalles = []
+        if naissance:
+            for parent_id in index.parents(pk):
+                naissance_parent = naissances.get(parent_id)
+                if naissance_parent and naissance_parent < naissance:
+                    intervalles.append((naissance - naissance_parent).days / JOURS_PAR_AN)
+        for cle in ((ligne.race, annee), (ligne.race, 'total')):
+            c = cohortes[cle]
+            c['effectif'] += 1
+            c['positions'].append(position[pk])
+            c['f'].append(f)
+            c['ge'].append(ge)
+            c['completude'].append(completude)
+            c['intervalles'].extend(intervalles)
+            if delta_f is not None:
+                c['delta_f'].append(delta_f)
+
+    libelles = dict(Troupeau.RACE_CHOIX)
+    races = sorted({race for race, _a in cohortes}, key=lambda r: libelles.get(r, r or ''))
+    return [
+        {
+            'race': race,
+            'libelle': libelles.get(race, race),
+            'total': _resume(cohortes[(race, 'total')], peres, meres, D),
+            'cohortes': [
+                {'annee': annee, **_resume(c, peres, meres, D)}
+                for (r, annee), c in sorted(
+                    ((cle, c) for cle, c in cohortes.items() if cle[0] == race and cle[1] != 'total'),
+                    key=lambda item: (item[0][1] is None, item[0][1] or 0),
+                )
+            ],
+        }
+        for race in races
+    ]
+
+
+def rapport_population_cache(timeout=24 * 3600):
+    """
+    rapport_population() mis en cache jusqu'au prochain changement de
+    filiation (version partagée) ou de fiche animal (updated_at).
+    """
+    from django.core.cache import cache
+    from django.db.models import Count, Max
+
+    from .pedigree import version_filiation
+
+    etat = Troupeau.objects.aggregate(n=Count('id'), maj=Max('updated_at'))
+    maj = etat['maj'].isoformat() if etat['maj'] else ''
+    cle = f"troupeau:rapport_population:{version_filiation()}:{etat['n']}:{maj}"
+    rapport = cache.get(cle)
+    if rapport is None:
+        rapport = rapport_population()
+        cache.set(cle, rapport, timeout)
+    return rapport
@@ -0,0 +1,428 @@
+# troupeau/importation.py
+"""
+Import en masse du troupeau depuis un fichier CSV (séparateur « ; » ou « , »)
+ou XLSX (openpyxl en lecture seule), colonnes du modèle téléchargeable.
+
+Le fichier est lu en entier puis validé en bloc, sans requête par ligne :
+  - chaque ligne passe les règles du modèle (choix, longueurs, dates dans le
+    bon ordre et pas dans le futur, mesures positives) sans accès à la base ;
+  - boucles actives en double dans le fichier, ou déjà actives dans le
+    troupeau (une seule requête pour toutes les boucles du fichier et des
+    parents) ;
+  - parents (`pere_boucle`, `mere_boucle`) cherchés par numéro de boucle
+    parmi les lignes actives du fichier, y compris plus bas, puis parmi les
+    animaux actifs ; sexe vérifié.
+Les lignes valides sont ordonnées de façon topologique (parents du fichier
+d'abord) et insérées génération par génération par bulk_create, dans une
+transaction. Une ligne dont un parent du fichier est refusé, ou prise dans
+un cycle de filiation, est refusée aussi.
+
+Les signaux de Troupeau ne sont pas déclenchés : à la fin de l'insertion,
+les nouveaux animaux sont ajoutés à l'index de pedigree (patch, comme un
+save()), leur consanguinité est calculée sur leur seule ascendance, la table
+d'ascendance et l'arbre d'affichage reçoivent les nouvelles lignes et
+l'historique « Création » passe par l'écriture groupée (un bulk_create au
+commit). Un import par tranches ne recharge donc pas le troupeau à chaque
+tranche : son coût suit la taille du fichier, pas celle du troupeau.
+
+    rapport = importer_fichier(fichier)   # commande importer_troupeau
+    rapport['importes'], rapport['erreurs']  # [{'ligne', 'boucle', 'messages'}]
+
+Depuis le site, l'import est une tâche de fond (troupeau/taches.py) :
+planifier_lignes() une fois, puis importer_lignes() par tranches de l'ordre.
+"""
+import csv
+import io
+import unicodedata
+from datetime import date, datetime
+
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+from django.db import transaction
+
+from .models import Troupeau
+
+TAILLE_LOT = 500
+
+COLONNES = (
+    'boucle_ovin', 'sexe', 'race', 'naissance_date',
+    'pere_boucle', 'mere_boucle', 'statut', 'proprietaire_ovin',
+    'origine_ovin', 'poids_initial', 'taille_initiale', 'observations',
+)
+# Colonnes facultatives reconnues en plus du modèle
+COLONNES_DATES = ('naissance_date', 'achat_date', 'entree_date', 'date_sortie')
+
+# En-têtes de l'export CSV/Excel acceptés (réimport d'un export)
+ALIAS = {
+    'numero de boucle': 'boucle_ovin',
+    'date de naissance': 'naissance_date',
+    'pere': 'pere_boucle',
+    'mere': 'mere_boucle',
+    'proprietaire': 'proprietaire_ovin',
+    'origine': 'origine_ovin',
+    'remarques': 'observations',
+}
+
+STATUTS_INACTIFS = ('vendu', 'decede', 'sortie')
+CHAMPS_PARENTS = {'pere_boucle': 'male', 'mere_boucle': 'femelle'}
+
+
+# =========================
+# Lecture du fichier
+# =========================
+
+def _normaliser(texte):
+    """Minuscules sans accents ni espaces superflus (comparaisons d'en-têtes et de choix)."""
+    texte = unicodedata.normalize('NFKD', str(texte).strip().lower())
+    return ''.join(c for c in texte if not unicodedata.combining(c))
+
+
+def _colonne(entete):
+    cle = _normaliser(entete or '')
+    return ALIAS.get(cle, cle.replace(' ', '_'))
+
+
+def _lire_csv(contenu):
+    try:
+        texte = contenu.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        texte = contenu.decode('cp1252')  # fichier enregistré par Excel sous Windows
+    premiere = texte.split('\n', 1)[0]
+    separateur = ';' if premiere.count(';') >= premiere.count(',') else ','
+    lecteur = csv.reader(io.StringIO(texte), delimiter=separateur)
+    entetes = [_colonne(e) for e in next(lecteur, [])]
+    for valeurs in lecteur:
+        if any(v.strip() for v in valeurs):
+            yield lecteur.line_num, dict(zip(entetes, valeurs))
+
+
+def _lire_xlsx(fichier):
+    try:
+        import openpyxl
+    except ImportError:
+        raise ValueError("L'import Excel nécessite la librairie openpyxl")
+
+    classeur = openpyxl.load_workbook(fichier, read_only=True, data_only=True)
+    try:
+        lignes = classeur.active.iter_rows(values_only=True)
+        entetes = [_colonne(e) for e in next(lignes, ())]
+        for numero, valeurs in enumerate(lignes, start=2):
+            if any(v not in (None, '') for v in valeurs):
+                yield numero, dict(zip(entetes, valeurs))
+    finally:
+        classeur.close()
+
+
+def lire_fichier(fichier):
+    """[(numéro de ligne, {colonne: valeur})] d'un fichier CSV ou XLSX téléversé."""
+    nom = (getattr(fichier, 'name', '') or '').lower()
+    if nom.endswith(('.xlsx', '.xlsm')):
+        lignes = list(_lire_xlsx(fichier))
+    else:
+        lignes = list(_lire_csv(fichier.read()))
+    if not lignes:
+        raise ValueError("Le fichier ne contient aucune ligne.")
+    if 'boucle_ovin' not in lignes[0][1]:
+        raise ValueError("Colonne 'boucle_ovin' absente (voir le modèle d'import).")
+    return lignes
+
+
+# =========================
+# Conversion des valeurs
+# =========================
+
+def lire_date(val):
+    """Accepte une date, 'YYYY-MM-DD' ou 'DD/MM/YYYY' -> date | None"""
+    if isinstance(val, datetime):
+        return val.date()
+    if isinstance(val, date):
+        return val
+    s = str(val).strip() if val is not None else ''
+    if not s:
+        return None
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Date invalide: {val} (formats attendus: YYYY-MM-DD ou DD/MM/YYYY)")
+
+
+def lire_nombre(val):
+    """Accepte un nombre, '12.3' ou '12,3' -> float | None"""
+    if isinstance(val, (int, float)):
+        return float(val)
+    s = str(val).strip() if val is not None else ''
+    if s == "":
+        return None
+    try:
+        return float(s.replace(",", "."))
+    except ValueError:
+        raise ValueError(f"Nombre invalide: {val}")
+
+
+def _texte(val):
+    if val is None:
+        return ''
+    if isinstance(val, float) and val.is_integer():
+        val = int(val)  # boucle numérique lue dans une cellule Excel
+    return str(val).strip()
+
+
+def _choix_par_libelle(choix):
+    """{code ou libellé normalisé: code} pour les champs à choix."""
+    table = {}
+    for code, libelle in choix:
+        table[_normaliser(code)] = code
+        table[_normaliser(libelle)] = code
+    return table
+
+
+CHOIX = {
+    'sexe': _choix_par_libelle(Troupeau.SEXE_CHOIX),
+    'race': _choix_par_libelle(Troupeau.RACE_CHOIX),
+    'statut': _choix_par_libelle(Troupeau.STATUT_CHOIX),
+    'proprietaire_ovin': _choix_par_libelle(Troupeau.PROPRIETAIRE_CHOIX),
+    'origine_ovin': _choix_par_libelle(Troupeau.ORIGINE_CHOIX),
+}
+
+
+# =========================
+# Validation
+# =========================
+
+class _Ligne:
+    __slots__ = ('numero', 'animal', 'parents', 'erreurs', 'generation')
+
+    def __init__(self, numero):
+        self.numero = numero
+        self.animal = None
+        self.parents = {}      # champ -> boucle du parent
+        self.erreurs = []
+        self.generation = None
+
+
+def _construire(numero, valeurs):
+    """Ligne du fichier -> animal non sauvegardé, validé par les règles du modèle (sans requête)."""
+    ligne = _Ligne(numero)
+    champs = {}
+    for nom in ('boucle_ovin', 'observations'):
+        champs[nom] = _texte(valeurs.get(nom))
+    champs['observations'] = champs['observations'] or None
+    for nom, table in CHOIX.items():
+        brut = _texte(valeurs.get(nom))
+        champs[nom] = table.get(_normaliser(brut), brut)
+    for nom, lecture in [*((n, lire_date) for n in COLONNES_DATES),
+                         ('poids_initial', lire_nombre), ('taille_initiale', lire_nombre)]:
+        try:
+            champs[nom] = lecture(valeurs.get(nom))
+        except ValueError as e:
+            ligne.erreurs.append(str(e))
+    for champ in CHAMPS_PARENTS:
+        boucle = _texte(valeurs.get(champ))
+        if boucle:
+            ligne.parents[champ] = boucle
+
+    animal = Troupeau(**champs)
+    animal.boucle_active = animal.statut not in STATUTS_INACTIFS
+    try:
+        animal._valider_champs({f.name for f in Troupeau._meta.concrete_fields} - set(CHAMPS_PARENTS))
+    except ValidationError as e:
+        for champ, messages in e.message_dict.items():
+            if champ == NON_FIELD_ERRORS:
+                ligne.erreurs.extend(messages)
+            else:
+                libelle = Troupeau._meta.get_field(champ).verbose_name
+                ligne.erreurs.extend(f"{libelle} : {message}" for message in messages)
+    ligne.animal = animal
+    return ligne
+
+
+def _verifier_boucles(lignes, existants):
+    """Boucles actives en double dans le fichier ou déjà actives dans le troupeau."""
+    premieres = {}
+    for ligne in lignes:
+        animal = ligne.animal
+        if not animal.boucle_active or not animal.boucle_ovin:
+            continue
+        if animal.boucle_ovin in existants:
+            ligne.erreurs.append(f"La boucle {animal.boucle_ovin} est déjà active dans le troupeau.")
+        elif animal.boucle_ovin in premieres:
+            ligne.erreurs.append(
+                f"La boucle {animal.boucle_ovin} est déjà active à la ligne {premieres[animal.boucle_ovin].numero}."
+            )
+        else:
+            premieres[animal.boucle_ovin] = ligne
+    return premieres
+
+
+def _resoudre_parents(lignes, du_fichier, existants):
+    """
+    Parents de chaque ligne : {champ: ligne du fichier} (liens internes) ;
+    les parents déjà en base sont posés directement sur l'animal.
+    """
+    liens = {}
+    for ligne in lignes:
+        internes = {}
+        boucles = ligne.parents
+        if boucles.get('pere_boucle') and boucles.get('pere_boucle') == boucles.get('mere_boucle'):
+            ligne.erreurs.append("Le père et la mère ne peuvent pas être le même animal.")
+        for champ, sexe_attendu in CHAMPS_PARENTS.items():
+            boucle = boucles.get(champ)
+            if not boucle:
+                continue
+            libelle = Troupeau._meta.get_field(champ).verbose_name
+            parent = du_fichier.get(boucle)
+            if parent is ligne:
+                ligne.erreurs.append(f"{libelle} : un animal ne peut pas être son propre parent.")
+            elif parent is not None:
+                if parent.animal.sexe != sexe_attendu:
+                    ligne.erreurs.append(f"{libelle} : {boucle} (ligne {parent.numero}) n'est pas de sexe "
+                                         f"{dict(Troupeau.SEXE_CHOIX)[sexe_attendu].lower()}.")
+                else:
+                    internes[champ] = parent
+            elif boucle in existants:
+                pk, sexe = existants[boucle]
+                if sexe != sexe_attendu:
+                    ligne.erreurs.append(f"{libelle} : {boucle} n'est pas de sexe "
+                                         f"{dict(Troupeau.SEXE_CHOIX)[sexe_attendu].lower()}.")
+                else:
+                    setattr(ligne.animal, f"{champ}_id", pk)
+            else:
+                ligne.erreurs.append(f"{libelle} : boucle {boucle} introuvable (ni active dans le troupeau, "
+                                     f"ni active dans le fichier).")
+        liens[ligne] = internes
+    return liens
+
+
+def _ordonner(lignes, liens):
+    """
+    Générations des lignes valides (0 = parents hors fichier) par tri
+    topologique ; une ligne dont un parent du fichier est refusé, ou prise
+    dans un cycle, est refusée. Retourne les lignes valides par génération.
+    """
+    enfants = {ligne: [] for ligne in lignes}
+    attente = {}
+    for ligne in lignes:
+        attente[ligne] = len(liens[ligne])
+        for parent in liens[ligne].values():
+            enfants[parent].append(ligne)
+
+    file = [ligne for ligne in lignes if attente[ligne] == 0]
+    generations = []
+    while file:
+        ligne = file.pop()
+        if not ligne.erreurs:
+            ligne.generation = max((p.generation for p in liens[ligne].values()), default=-1) + 1
+            while len(generations) <= ligne.generation:
+                generations.append([])
+            generations[ligne.generation].append(ligne)
+        for enfant in enfants[ligne]:
+            if ligne.erreurs:
+                enfant.erreurs.append(f"Parent {ligne.animal.boucle_ovin} (ligne {ligne.numero}) non importé.")
+            attente[enfant] -= 1
+            if attente[enfant] == 0:
+                file.append(enfant)
+
+    for ligne, n in attente.items():
+        if n:
+            ligne.erreurs.append("Cycle de filiation dans le fichier.")
+    return generations
+
+
+# =========================
+# Import
+# =========================
+
+def _finaliser(animaux, batch_size):
+    """Ce que Troupeau.save() et ses signaux font par animal, une fois pour tout le lot."""
+    from historiquetroupeau.ecriture import enregistrer
+
+    from .arbre import ajouter_noeuds
+    from .ascendance import mettre_a_jour_ascendance
+    from .consanguinite import TOLERANCE, calculer_consanguinite
+    from .pedigree import obtenir_index, patcher_index
+    from .signals import historique_creation
+
+    # Parents avant enfants (ordre des générations) : chaque parent a déjà sa position
+    patcher_index(lambda index: [index.appliquer_animal(animal) for animal in animaux])
+    pks = [animal.pk for animal in animaux]
+    # Nouveaux animaux sans descendance en base : F calculé sur leur ascendance seule
+    coefficients = calculer_consanguinite(obtenir_index().pedigree(pks))
+    modifies = []
+    for animal in animaux:
+        coefficient = coefficients.get(animal.pk, 0.0)
+        if abs((animal.coefficient_consanguinite or 0.0) - coefficient) > TOLERANCE:
+            animal.coefficient_consanguinite = coefficient
+            modifies.append(animal)
+    Troupeau.objects.bulk_update(modifies, ['coefficient_consanguinite'], batch_size=batch_size)
+    mettre_a_jour_ascendance(*pks, batch_size=batch_size)
+    ajouter_noeuds(pks, batch_size=batch_size)
+    for animal in Troupeau.objects.filter(pk__in=pks).order_by('pk').iterator(chunk_size=batch_size):
+        enregistrer(historique_creation(animal))
+
+
+def _valider(lignes_brutes):
+    """Lignes construites, liens internes et générations des lignes valides (une requête)."""
+    lignes = [_construire(numero, valeurs) for numero, valeurs in lignes_brutes]
+
+    boucles = {l.animal.boucle_ovin for l in lignes if l.animal.boucle_active and l.animal.boucle_ovin}
+    boucles.update(b for l in lignes for b in l.parents.values())
+    existants = {
+        boucle: (pk, sexe)
+        for boucle, pk, sexe in Troupeau.objects.filter(boucle_active=True, boucle_ovin__in=boucles)
+        .values_list('boucle_ovin', 'id', 'sexe')
+    }
+
+    du_fichier = _verifier_boucles(lignes, existants)
+    liens = _resoudre_parents(lignes, du_fichier, existants)
+    return lignes, liens, _ordonner(lignes, liens)
+
+
+def _erreurs(lignes):
+    return [
+        {'ligne': l.numero, 'boucle': l.animal.boucle_ovin, 'messages': l.erreurs}
+        for l in sorted(lignes, key=lambda l: l.numero) if l.erreurs
+    ]
+
+
+def planifier_lignes(lignes_brutes):
+    """
+    Validation seule, sans écriture : {'lignes': n, 'ordre': [numéros des
+    lignes valides, parents avant enfants], 'erreurs': [...]}.
+
+    Importer l'ordre par tranches successives (importer_lignes sur chaque
+    tranche) donne le même résultat qu'en une fois : les parents d'une
+    tranche sont dans la même tranche ou déjà en base.
+    """
+    lignes, _liens, generations = _valider(lignes_brutes)
+    return {
+        'lignes': len(lignes),
+        'ordre': [l.numero for generation in generations for l in generation],
+        'erreurs': _erreurs(lignes),
+    }
+
+
+def importer_lignes(lignes_brutes, batch_size=TAILLE_LOT):
+    """
+    Valide et importe [(numéro, {colonne: valeur})]. Retourne
+    {'lignes': n, 'importes': n, 'erreurs': [{'ligne', 'boucle', 'messages'}]}.
+    """
+    lignes, liens, generations = _valider(lignes_brutes)
+
+    animaux = []
+    if generations:
+        with transaction.atomic():
+            for generation in generations:
+                for ligne in generation:
+                    for champ, parent in liens[ligne].items():
+                        setattr(ligne.animal, champ, parent.animal)
+                Troupeau.objects.bulk_create([l.animal for l in generation], batch_size=batch_size)
+                animaux.extend(l.animal for l in generation)
+            _finaliser(animaux, batch_size)
+
+    return {'lignes': len(lignes), 'importes': len(animaux), 'erreurs': _erreurs(lignes)}
+
+
+def importer_fichier(fichier, batch_size=TAILLE_LOT):
+    """Lit (lire_fichier) puis importe un fichier CSV/XLSX ; ValueError si illisible."""
+    return importer_lignes(lire_fichier(fichier), batch_size=batch_size)
@@ -0,0 +1,42 @@
+# troupeau/management/commands/importer_troupeau.py
+"""
+Import en masse d'un fichier CSV ou XLSX (même format que la page d'import,
+voir troupeau/importation.py), sans limite de durée de requête.
+
+    python manage.py importer_troupeau animaux.csv
+    python manage.py importer_troupeau animaux.xlsx --batch-size 1000
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from historiquetroupeau.ecriture import vider
+from troupeau.importation import TAILLE_LOT, importer_fichier
+
+
+class Command(BaseCommand):
+    help = "Importe des animaux depuis un fichier CSV ou XLSX ; les lignes refusées sont listées."
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichier', help="Chemin du fichier .csv ou .xlsx.")
+        parser.add_argument('--batch-size', type=int, default=TAILLE_LOT,
+                            help=f"Taille des lots du bulk_create (défaut : {TAILLE_LOT}).")
+
+    def handle(self, *args, **options):
+        debut = time.monotonic()
+        try:
+            with open(options['fichier'], 'rb') as fichier:
+                rapport = importer_fichier(fichier, batch_size=max(1, options['batch_size']))
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        finally:
+            # Pas de request_finished hors requête : lignes d'historique restées en tampon
+            vider()
+
+        for erreur in rapport['erreurs']:
+            self.stderr.write(f"Ligne {erreur['ligne']} ({erreur['boucle'] or '—'}) : "
+                              + " ; ".join(erreur['messages']))
+        self.stdout.write(self.style.SUCCESS(
+            f"{rapport['importes']} animaux importés sur {rapport['lignes']} ligne(s), "
+            f"{len(rapport['erreurs'])} refusée(s), en {time.monotonic() - debut:.2f} s."
+        ))
@@ -0,0 +1,40 @@
+# troupeau/management/commands/rebuild_closure.py
+"""
+Reconstruction complète de la table d'ascendance (fermeture du pedigree)
+et de l'arbre d'affichage (chemins matérialisés de la vue arbre).
+
+    python manage.py rebuild_closure
+    python manage.py rebuild_closure --batch-size 5000
+
+À lancer après une modification de filiation faite hors ORM (QuerySet.update,
+SQL brut, import sans signaux) ; en temps normal la table est tenue à jour
+de façon incrémentale par Troupeau.save() et les signaux.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from troupeau.arbre import reconstruire_arbre
+from troupeau.ascendance import reconstruire_ascendance
+from troupeau.pedigree import invalider_index
+
+
+class Command(BaseCommand):
+    help = ("Reconstruit la table d'ascendance (ancêtre, descendant, profondeur, côté) "
+            "et l'arbre d'affichage depuis le pedigree.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Taille des lots du bulk_create (défaut : 1000).")
+
+    def handle(self, *args, **options):
+        debut = time.monotonic()
+        batch_size = max(1, options['batch_size'])
+        nb = reconstruire_ascendance(batch_size=batch_size)
+        nb_noeuds = reconstruire_arbre(batch_size=batch_size)
+        # Le pedigree a pu changer hors ORM : les index en mémoire sont périmés aussi
+        invalider_index()
+        self.stdout.write(self.style.SUCCESS(
+            f"Table d'ascendance reconstruite : {nb} lignes, arbre : {nb_noeuds} nœuds, "
+            f"en {time.monotonic() - debut:.2f} s."
+        ))
@@ -0,0 +1,30 @@
+# troupeau/management/commands/rebuild_kinship_store.py
+"""
+Reconstruction du stock de parenté partagé (fichier mmap des workers).
+
+    python manage.py rebuild_kinship_store
+
+En temps normal le stock est reconstruit par le worker de tâches
+(`traiter_taches`, tâche `troupeau.parente`) à la demande du premier lecteur
+qui constate un changement de filiation ; la commande permet de le préparer
+à l'avance (après un déploiement, un import, etc.).
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from troupeau.stock_parente import construire_stock
+
+
+class Command(BaseCommand):
+    help = "Reconstruit le fichier de parenté (triangle float32 des animaux actifs) de la version courante de la filiation."
+
+    def handle(self, *args, **options):
+        debut = time.monotonic()
+        chemin = construire_stock()
+        if chemin is None:
+            raise CommandError("Modifications de pedigree en attente : réessayer après validation.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Stock de parenté écrit : {chemin} ({chemin.stat().st_size} octets) "
+            f"en {time.monotonic() - debut:.2f} s."
+        ))
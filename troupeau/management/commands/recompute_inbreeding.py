@@ -0,0 +1,128 @@
+# troupeau/management/commands/recompute_inbreeding.py
+"""
+Recalcul des coefficients de consanguinité de tout le troupeau, hors requête HTTP.
+
+    python manage.py recompute_inbreeding
+    python manage.py recompute_inbreeding --race bali_bali --since-updated 2025-01-01
+    python manage.py recompute_inbreeding --dry-run
+    python manage.py recompute_inbreeding --resume-after 4200
+
+Le pedigree est chargé une fois et F est calculé pour tous les animaux en une
+passe ; les lignes ciblées sont ensuite parcourues par blocs d'ids croissants.
+Chaque bloc est écrit (bulk_update), Genealogie.fa de ses animaux compris,
+dans sa propre transaction : une interruption laisse les blocs précédents
+validés et la commande indique l'id à passer à --resume-after pour reprendre.
+Relancer sans option est aussi sûr : seules les lignes dont le coefficient
+diffère sont réécrites.
+"""
+import time
+from datetime import datetime, time as dt_time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from troupeau.consanguinite import TOLERANCE, _ecrire_fa_genealogies, calculer_consanguinite, charger_pedigree
+from troupeau.models import Troupeau
+from troupeau.signals import DisableSignals
+
+
+def _parse_depuis(val):
+    """'YYYY-MM-DD' ou 'YYYY-MM-DDTHH:MM[:SS]' -> datetime aware."""
+    for fmt in ("%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%d"):
+        try:
+            dt = datetime.strptime(val, fmt)
+        except ValueError:
+            continue
+        if fmt == "%Y-%m-%d":
+            dt = datetime.combine(dt.date(), dt_time.min)
+        return timezone.make_aware(dt) if timezone.is_naive(dt) else dt
+    raise CommandError(f"Date invalide pour --since-updated : {val} (attendu YYYY-MM-DD[THH:MM[:SS]])")
+
+
+class Command(BaseCommand):
+    help = "Recalcule les coefficients de consanguinité (Meuwissen & Luo) par blocs, avec bulk_update."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Calcule et compte les changements sans rien écrire.")
+        parser.add_argument('--since-updated', dest='since_updated',
+                            help="Ne traite que les animaux modifiés depuis cette date (YYYY-MM-DD[THH:MM]).")
+        parser.add_argument('--race', choices=[code for code, _label in Troupeau.RACE_CHOIX],
+                            help="Ne traite que les animaux de cette race.")
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help="Nombre d'animaux lus par bloc (défaut : 2000).")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Taille des lots du bulk_update (défaut : 500).")
+        parser.add_argument('--resume-after', type=int, default=0,
+                            help="Reprend après cet id (valeur affichée lors d'une interruption).")
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        chunk_size = max(1, options['chunk_size'])
+        batch_size = max(1, options['batch_size'])
+        dernier_id = options['resume_after'] or 0
+
+        debut = time.monotonic()
+        coefficients = calculer_consanguinite(charger_pedigree())
+        self.stdout.write(
+            f"Pedigree chargé et calculé : {len(coefficients)} animaux en {time.monotonic() - debut:.2f} s"
+        )
+
+        qs = Troupeau.objects.order_by('id')
+        if options['race']:
+            qs = qs.filter(race=options['race'])
+        if options['since_updated']:
+            qs = qs.filter(updated_at__gte=_parse_depuis(options['since_updated']))
+
+        traites = modifies = fiches = 0
+        debut = time.monotonic()
+        try:
+            with DisableSignals():
+                while True:
+                    bloc = list(
+                        qs.filter(id__gt=dernier_id)
+                          .values_list('id', 'coefficient_consanguinite')[:chunk_size]
+                    )
+                    if not bloc:
+                        break
+
+                    a_ecrire = [
+                        Troupeau(pk=pk, coefficient_consanguinite=coefficients.get(pk, 0.0))
+                        for pk, ancien in bloc
+                        if abs((ancien or 0.0) - coefficients.get(pk, 0.0)) > TOLERANCE
+                    ]
+                    if not dry_run:
+                        with transaction.atomic():
+                            if a_ecrire:
+                                Troupeau.objects.bulk_update(a_ecrire, ['coefficient_consanguinite'],
+                                                             batch_size=batch_size)
+                            # Fa des fiches Genealogie du bloc : même valeur que le troupeau
+                            fiches += _ecrire_fa_genealogies(coefficients, agneaux=[pk for pk, _f in bloc],
+                                                             batch_size=batch_size)
+
+                    traites += len(bloc)
+                    modifies += len(a_ecrire)
+                    dernier_id = bloc[-1][0]
+                    self._progression(traites, modifies, debut, dernier_id)
+        except KeyboardInterrupt:
+            self.stderr.write(self.style.WARNING(
+                f"\nInterrompu. Blocs validés jusqu'à l'id {dernier_id} : "
+                f"relancer avec --resume-after {dernier_id}"
+            ))
+            return
+
+        duree = time.monotonic() - debut
+        debit = traites / duree if duree > 0 else float(traites)
+        verbe = "à modifier (dry-run)" if dry_run else "modifiés"
+        self.stdout.write(self.style.SUCCESS(
+            f"Terminé : {traites} animaux traités, {modifies} {verbe}, "
+            f"{fiches} Fa de généalogie réécrit(s), {duree:.2f} s ({debit:.0f} animaux/s)."
+        ))
+
+    def _progression(self, traites, modifies, debut, dernier_id):
+        duree = time.monotonic() - debut
+        debit = traites / duree if duree > 0 else float(traites)
+        self.stdout.write(
+            f"  {traites} traités, {modifies} modifiés — {debit:.0f} animaux/s (dernier id : {dernier_id})"
+        )
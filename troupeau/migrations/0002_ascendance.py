@@ -0,0 +1,104 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:27
+
+from collections import defaultdict, deque
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def _ordonner(parents):
+    """Ids en ordre topologique (parents avant enfants) ; un cycle est rompu au plus petit id."""
+    enfants = defaultdict(list)
+    attente = {}
+    for pk, couple in parents.items():
+        attente[pk] = 0
+        for parent in couple:
+            if parent is not None and parent != pk and parent in parents:
+                enfants[parent].append(pk)
+                attente[pk] += 1
+    file = deque(sorted(pk for pk, n in attente.items() if n == 0))
+    ordre, places = [], set()
+    while len(ordre) < len(parents):
+        if not file:
+            file.append(min(pk for pk in parents if pk not in places))
+        pk = file.popleft()
+        if pk in places:
+            continue
+        places.add(pk)
+        ordre.append(pk)
+        for enfant in enfants[pk]:
+            if enfant not in places:
+                attente[enfant] -= 1
+                if attente[enfant] == 0:
+                    file.append(enfant)
+    return ordre
+
+
+def _lignes_ascendance(pedigree):
+    """
+    Lignes (ancetre_id, descendant_id, profondeur, cote) de tout le pedigree,
+    cote = côté du premier pas depuis le descendant. Figé ici plutôt
+    qu'importé de troupeau.ascendance, qui suit le modèle courant.
+    """
+    parents = {pk: (pere_id, mere_id) for pk, pere_id, mere_id in pedigree}
+    ancetres = {}   # id -> {(ancêtre, profondeur)}
+    for pk in _ordonner(parents):
+        chemins = set()
+        for cote, parent in zip(('pere', 'mere'), parents[pk]):
+            # Parent inconnu, hors troupeau ou placé après l'enfant (cycle rompu) : ignoré
+            if parent is None or parent not in ancetres:
+                continue
+            cote_chemins = {(parent, 1)} | {(a, p + 1) for a, p in ancetres[parent]}
+            chemins |= cote_chemins
+            for a, p in cote_chemins:
+                yield a, pk, p, cote
+        ancetres[pk] = frozenset(chemins)
+
+
+def construire_ascendance(apps, schema_editor):
+    Troupeau = apps.get_model('troupeau', 'Troupeau')
+    Genealogie = apps.get_model('genealogie', 'Genealogie')
+    Ascendance = apps.get_model('troupeau', 'Ascendance')
+
+    surcharges = {
+        agneau_id: (pere_id, mere_id)
+        for agneau_id, pere_id, mere_id in Genealogie.objects.values_list('agneau_id', 'pere_id', 'mere_id')
+    }
+    pedigree = [
+        (pk, *surcharges.get(pk, (pere_id, mere_id)))
+        for pk, pere_id, mere_id in Troupeau.objects.values_list('id', 'pere_boucle_id', 'mere_boucle_id')
+    ]
+    Ascendance.objects.bulk_create(
+        (Ascendance(ancetre_id=a, descendant_id=d, profondeur=p, cote=c)
+         for a, d, p, c in _lignes_ascendance(pedigree)),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('troupeau', '0001_initial'),
+        ('genealogie', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Ascendance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('profondeur', models.PositiveSmallIntegerField(help_text='1 = parent, 2 = grand-parent, ...')),
+                ('cote', models.CharField(choices=[('pere', 'Côté père'), ('mere', 'Côté mère')], help_text='Côté du premier pas depuis le descendant', max_length=4)),
+                ('ancetre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendances', to='troupeau.troupeau')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ascendances', to='troupeau.troupeau')),
+            ],
+            options={
+                'verbose_name': 'Ascendance',
+                'verbose_name_plural': 'Ascendances',
+                'db_table': 'troupeau_ascendance',
+                'indexes': [models.Index(fields=['descendant', 'profondeur'], name='ascendance_desc_prof_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ancetre', 'profondeur', 'descendant', 'cote'), name='uniq_ascendance_chemin')],
+            },
+        ),
+        migrations.RunPython(construire_ascendance, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def construire_arbre(apps, schema_editor):
+    from troupeau.arbre import calculer_noeuds
+
+    Troupeau = apps.get_model('troupeau', 'Troupeau')
+    NoeudArbre = apps.get_model('troupeau', 'NoeudArbre')
+    NoeudArbre.objects.bulk_create(
+        (NoeudArbre(animal_id=pk, parent_id=p, chemin=chemin, profondeur=profondeur)
+         for pk, p, chemin, profondeur in calculer_noeuds(
+             Troupeau.objects.values_list('id', 'pere_boucle_id', 'mere_boucle_id'))),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('troupeau', '0002_ascendance'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoeudArbre',
+            fields=[
+                ('animal', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='noeud_arbre', serialize=False, to='troupeau.troupeau')),
+                ('chemin', models.CharField(help_text="Ids des ancêtres d'affichage puis de l'animal (base 36)", max_length=1000, unique=True)),
+                ('profondeur', models.PositiveIntegerField(default=0, help_text='0 = racine')),
+                ('parent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='noeuds_enfants', to='troupeau.troupeau')),
+            ],
+            options={
+                'verbose_name': "Nœud de l'arbre",
+                'verbose_name_plural': "Nœuds de l'arbre",
+                'db_table': 'troupeau_arbre',
+            },
+        ),
+        migrations.RunPython(construire_arbre, migrations.RunPython.noop),
+    ]
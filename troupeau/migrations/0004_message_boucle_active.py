@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('troupeau', '0003_arbre'),
+    ]
+
+    operations = [
+        migrations.AlterConstraint(
+            model_name='troupeau',
+            name='uniq_boucle_ovin_active',
+            constraint=models.UniqueConstraint(condition=models.Q(('boucle_active', True)), fields=('boucle_ovin',), name='uniq_boucle_ovin_active', violation_error_message='Cette boucle est déjà active pour un autre animal.'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('troupeau', '0004_message_boucle_active'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionPartagee',
+            fields=[
+                ('nom', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('valeur', models.BigIntegerField()),
+            ],
+            options={
+                'verbose_name': 'Version partagée',
+                'verbose_name_plural': 'Versions partagées',
+                'db_table': 'troupeau_version',
+            },
+        ),
+    ]
@@ -1,11 +1,61 @@
+import time
 from datetime import date
-from django.db import models
-from django.db.models import Q
+from django.apps import apps
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import F, Q
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 
+from pahou.mixins import SuiviModificationsMixin
 
-class Troupeau(models.Model):
+
+GENERATIONS_MAX = 6
+
+
+class TroupeauQuerySet(models.QuerySet):
+    def arbre_genealogique(self, pk, generations=4):
+        """
+        Ascendance de `pk` sur `generations` générations en UNE requête
+        (CTE récursive, SQLite et PostgreSQL), parents effectifs (Genealogie
+        prioritaire sur les FK).
+
+        Retourne une liste indexée par génération : arbre[0] = [animal],
+        arbre[1] = [père, mère], arbre[2] = [GP pp, GM pm, GP mp, GM mm], ...
+        (numérotation de Sosa : le père de la case i est 2i, la mère 2i+1 ;
+        None pour un ancêtre inconnu). Liste vide si l'animal n'existe pas.
+        """
+        generations = max(0, min(int(generations), GENERATIONS_MAX))
+        q = connection.ops.quote_name
+        troupeau = q(Troupeau._meta.db_table)
+        genealogie = q(apps.get_model('genealogie', 'Genealogie')._meta.db_table)
+        sql = f"""
+            WITH RECURSIVE arbre (animal_id, pere_id, mere_id, generation, sosa) AS (
+                SELECT t.id, COALESCE(g.pere_id, t.pere_boucle_id), COALESCE(g.mere_id, t.mere_boucle_id), 0, 1
+                FROM {troupeau} t LEFT JOIN {genealogie} g ON g.agneau_id = t.id
+                WHERE t.id = %s
+                UNION ALL
+                SELECT t.id, COALESCE(g.pere_id, t.pere_boucle_id), COALESCE(g.mere_id, t.mere_boucle_id),
+                       a.generation + 1,
+                       2 * a.sosa + CASE WHEN t.id = a.pere_id THEN 0 ELSE 1 END
+                FROM arbre a
+                JOIN {troupeau} t ON t.id = a.pere_id OR t.id = a.mere_id
+                LEFT JOIN {genealogie} g ON g.agneau_id = t.id
+                WHERE a.generation < %s
+            )
+            SELECT t.*, arbre.generation AS arbre_generation, arbre.sosa AS arbre_sosa
+            FROM arbre JOIN {troupeau} t ON t.id = arbre.animal_id
+            ORDER BY arbre.sosa
+        """
+        lignes = list(self.model.objects.raw(sql, [pk, generations]))
+        if not lignes:
+            return []
+        arbre = [[None] * (2 ** g) for g in range(generations + 1)]
+        for animal in lignes:
+            arbre[animal.arbre_generation][animal.arbre_sosa - 2 ** animal.arbre_generation] = animal
+        return arbre
+
+
+class Troupeau(SuiviModificationsMixin, models.Model):
     """
     Modèle représentant un animal ovin dans le troupeau
     """
@@ -182,6 +232,8 @@ class Troupeau(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TroupeauQuerySet.as_manager()
+
     class Meta:
         db_table = 'troupeau'
         verbose_name = _("Animal du troupeau")
@@ -200,6 +252,7 @@ class Troupeau(models.Model):
                 fields=['boucle_ovin'],
                 condition=Q(boucle_active=True),
                 name='uniq_boucle_ovin_active',
+                violation_error_message=_("Cette boucle est déjà active pour un autre animal."),
             ),
         ]
 
@@ -241,191 +294,322 @@ class Troupeau(models.Model):
     # ---- Validation ----
     def clean(self):
         super().clean()
+        self._valider()
+
+    def _valider(self, champs=None):
+        """
+        Règles métier. `champs` (noms) : ne vérifier que les règles qui portent
+        sur au moins un de ces champs (toutes si None).
+        L'unicité de la boucle active est garantie par la contrainte
+        uniq_boucle_ovin_active (validate_constraints des formulaires, base).
+        """
+        def concerne(*noms):
+            return champs is None or not champs.isdisjoint(noms)
+
         errors = {}
         today = date.today()
 
         # Futur interdit
-        if self.naissance_date and self.naissance_date > today:
+        if concerne('naissance_date') and self.naissance_date and self.naissance_date > today:
             errors['naissance_date'] = _("La date de naissance ne peut pas être dans le futur.")
-        if self.achat_date and self.achat_date > today:
+        if concerne('achat_date') and self.achat_date and self.achat_date > today:
             errors['achat_date'] = _("La date d'achat ne peut pas être dans le futur.")
-        if self.entree_date and self.entree_date > today:
+        if concerne('entree_date') and self.entree_date and self.entree_date > today:
             errors['entree_date'] = _("La date d'entrée ne peut pas être dans le futur.")
-        if self.date_sortie and self.date_sortie > today:
+        if concerne('date_sortie') and self.date_sortie and self.date_sortie > today:
             errors['date_sortie'] = _("La date de sortie ne peut pas être dans le futur.")
 
         # Ordre logique des dates
         if self.naissance_date:
-            if self.achat_date and self.naissance_date > self.achat_date:
+            if concerne('naissance_date', 'achat_date') and self.achat_date and self.naissance_date > self.achat_date:
                 errors['achat_date'] = _("La date d'achat doit être postérieure à la date de naissance.")
-            if self.entree_date and self.naissance_date > self.entree_date:
+            if concerne('naissance_date', 'entree_date') and self.entree_date and self.naissance_date > self.entree_date:
                 errors['entree_date'] = _("La date d'entrée doit être postérieure à la date de naissance.")
-            if self.date_sortie and self.naissance_date > self.date_sortie:
+            if concerne('naissance_date', 'date_sortie') and self.date_sortie and self.naissance_date > self.date_sortie:
                 errors['date_sortie'] = _("La date de sortie doit être postérieure à la date de naissance.")
 
-        if self.achat_date and self.entree_date and self.entree_date < self.achat_date:
+        if (concerne('achat_date', 'entree_date')
+                and self.achat_date and self.entree_date and self.entree_date < self.achat_date):
             errors['entree_date'] = _("La date d'entrée ne peut pas être antérieure à la date d'achat.")
-        if self.entree_date and self.date_sortie and self.date_sortie < self.entree_date:
+        if (concerne('entree_date', 'date_sortie')
+                and self.entree_date and self.date_sortie and self.date_sortie < self.entree_date):
             errors['date_sortie'] = _("La date de sortie ne peut pas être antérieure à la date d'entrée.")
 
         # Mesures positives
-        if self.poids_initial is not None and self.poids_initial <= 0:
+        if concerne('poids_initial') and self.poids_initial is not None and self.poids_initial <= 0:
             errors['poids_initial'] = _("Le poids doit être positif.")
-        if self.taille_initiale is not None and self.taille_initiale <= 0:
+        if concerne('taille_initiale') and self.taille_initiale is not None and self.taille_initiale <= 0:
             errors['taille_initiale'] = _("La taille doit être positive.")
 
         # Parents cohérents
-        if self.pere_boucle == self:
+        if concerne('pere_boucle', 'mere_boucle'):
+            errors.update(self._erreurs_parents())
+
+        if errors:
+            raise ValidationError(errors)
+
+    def _erreurs_parents(self):
+        """Règles sur les parents ; ceux qui ne sont pas déjà en cache sont lus en une requête."""
+        errors = {}
+        pere_id, mere_id = self.pere_boucle_id, self.mere_boucle_id
+        if self.pk is not None and pere_id == self.pk:
             errors['pere_boucle'] = _("Un animal ne peut pas être son propre père.")
-        if self.mere_boucle == self:
+        if self.pk is not None and mere_id == self.pk:
             errors['mere_boucle'] = _("Un animal ne peut pas être sa propre mère.")
-        if self.pere_boucle and self.mere_boucle and self.pere_boucle == self.mere_boucle:
+        if pere_id and mere_id and pere_id == mere_id:
             errors['mere_boucle'] = _("Le père et la mère ne peuvent pas être le même animal.")
 
-        if self.pere_boucle:
-            if self.pere_boucle.sexe != 'male':
-                errors['pere_boucle'] = _("Le père doit être un animal de sexe masculin.")
-            if not self.pere_boucle.boucle_active:
-                errors['pere_boucle'] = _("Le père doit être un animal actif dans le troupeau.")
-        if self.mere_boucle:
-            if self.mere_boucle.sexe != 'femelle':
-                errors['mere_boucle'] = _("La mère doit être un animal de sexe féminin.")
-            if not self.mere_boucle.boucle_active:
-                errors['mere_boucle'] = _("La mère doit être un animal actif dans le troupeau.")
-
-        # Unicité de la boucle active
-        if self.boucle_active:
-            existing = Troupeau.objects.filter(
-                boucle_ovin=self.boucle_ovin,
-                boucle_active=True
-            ).exclude(pk=self.pk)
-            if existing.exists():
-                errors['boucle_ovin'] = _("Cette boucle est déjà active pour un autre animal.")
-
-        if errors:
-            raise ValidationError(errors)
+        parents = {}
+        a_lire = []
+        for champ, pk in (('pere_boucle', pere_id), ('mere_boucle', mere_id)):
+            if pk is None:
+                continue
+            if self._meta.get_field(champ).is_cached(self):
+                parent = getattr(self, champ)
+                parents[pk] = (parent.sexe, parent.boucle_active)
+            else:
+                a_lire.append(pk)
+        if a_lire:
+            for pk, sexe, actif in Troupeau.objects.filter(pk__in=a_lire).values_list('id', 'sexe', 'boucle_active'):
+                parents[pk] = (sexe, actif)
+
+        regles = (
+            ('pere_boucle', pere_id, 'male',
+             _("Le père doit être un animal de sexe masculin."),
+             _("Le père doit être un animal actif dans le troupeau.")),
+            ('mere_boucle', mere_id, 'femelle',
+             _("La mère doit être un animal de sexe féminin."),
+             _("La mère doit être un animal actif dans le troupeau.")),
+        )
+        for champ, pk, sexe_attendu, message_sexe, message_actif in regles:
+            if pk is None or champ in errors:
+                continue
+            if pk not in parents:
+                errors[champ] = _("Cet animal n'existe pas dans le troupeau.")
+                continue
+            sexe, actif = parents[pk]
+            if sexe != sexe_attendu:
+                errors[champ] = message_sexe
+            if not actif:
+                errors[champ] = message_actif
+        return errors
 
     # ---- Généalogie ----
-    def _get_ancestors_paths(self, current, max_depth, path=None, ancestors=None, visited=None):
+    def coefficient_consanguinite_wright(self):
         """
-        Retourne un dict {ancêtre: [(distance_pere, distance_mere), ...]} jusqu'à max_depth.
-        Protégé contre les boucles infinies.
+        Coefficient de consanguinité de Wright (tout l'ascendant connu).
+        Délègue au moteur de troupeau (Meuwissen & Luo) : fonctionne aussi
+        pour un animal non enregistré dont seuls les parents sont renseignés.
         """
-        if ancestors is None:
-            ancestors = {}
-        if path is None:
-            path = (0, 0)
-        if visited is None:
-            visited = set()
+        from .consanguinite import coefficient_animal
+        return coefficient_animal(self)
 
-        if max_depth == 0 or not current or current.pk in visited:
-            return ancestors
+    def get_descendants(self):
+        """Descendants directs (côtés père et mère), via la table d'ascendance"""
+        return Troupeau.objects.filter(pk__in=Ascendance.objects.descendants_de(self.pk, max_depth=1))
 
-        visited.add(current.pk)
+    def get_all_descendants(self, max_depth=3):
+        """Descendants jusqu'à max_depth générations (une requête sur la table d'ascendance)"""
+        return list(Troupeau.objects.filter(pk__in=Ascendance.objects.descendants_de(self.pk, max_depth=max_depth)))
 
-        if current != self:
-            ancestors.setdefault(current, []).append(path)
+    def ancetres_communs(self, autre):
+        """Ancêtres communs à cet animal et à `autre` (une requête)"""
+        return Troupeau.objects.filter(pk__in=Ascendance.objects.ancetres_communs(self.pk, autre.pk))
 
-        try:
-            if current.pere_boucle:
-                self._get_ancestors_paths(
-                    current.pere_boucle, max_depth - 1,
-                    (path[0] + 1, path[1]), ancestors, visited.copy()
-                )
-            if current.mere_boucle:
-                # ✅ correction: utiliser la bonne signature/ordre des paramètres
-                self._get_ancestors_paths(
-                    current.mere_boucle, max_depth - 1,
-                    (path[0], path[1] + 1), ancestors, visited.copy()
-                )
-        except RecursionError:
-            pass
-
-        return ancestors
-
-    def coefficient_consanguinite_wright(self, max_generations=3, cache=None):
+    # ---- Sauvegarde ----
+    def _champs_concernes(self, update_fields):
+        """Noms des champs écrits par cette sauvegarde (None = tous : création)."""
+        if self._state.adding:
+            return None
+        if update_fields is not None:
+            return {self._meta.get_field(nom).name for nom in update_fields}
+        return {f.name for f in self._champs_modifies()}
+
+    def _valider_champs(self, champs):
         """
-        Coefficient de consanguinité de Wright (récursif, avec cache et garde-fous).
+        full_clean() limité aux champs écrits : clean_fields() sur ces champs et
+        règles métier qui les concernent. Les FK parents sont validées par
+        _erreurs_parents (une requête pour les deux) plutôt que par
+        ForeignKey.validate (une requête chacune).
         """
-        if cache is None:
-            cache = {}
+        exclude = {'pere_boucle', 'mere_boucle'}
+        if champs is not None:
+            exclude.update(f.name for f in self._meta.concrete_fields if f.name not in champs)
+        errors = {}
+        for etape in (lambda: self.clean_fields(exclude=exclude), lambda: self._valider(champs)):
+            try:
+                etape()
+            except ValidationError as e:
+                errors = e.update_error_dict(errors)
+        if errors:
+            raise ValidationError(errors)
 
-        if self.pk and self.pk in cache:
-            return cache[self.pk]
+    def save(self, *args, **kwargs):
+        """
+        Sauvegarde avec mise à jour auto de boucle_active et du coefficient.
+
+        Seuls les champs écrits (update_fields, sinon les champs modifiés depuis
+        la lecture) sont validés ; un changement de statut n'entraîne donc ni
+        lecture des parents ni requête d'unicité : l'unicité de la boucle active
+        est assurée par la contrainte en base (IntegrityError convertie en
+        ValidationError). Si la filiation change, F, la table d'ascendance et
+        l'arbre d'affichage sont recalculés pour l'animal et toute sa
+        descendance dans la même transaction.
+        """
+        update_fields = kwargs.get('update_fields')
 
-        if not self.pere_boucle or not self.mere_boucle:
-            if self.pk:
-                cache[self.pk] = 0.0
-            return 0.0
+        # Adapter boucle_active selon le statut (ne **force** pas True)
+        if self.statut in ['vendu', 'decede', 'sortie'] and self.boucle_active:
+            self.boucle_active = False
+            if update_fields is not None:
+                kwargs['update_fields'] = update_fields = {*update_fields, 'boucle_active'}
 
-        if max_generations <= 0:
-            if self.pk:
-                cache[self.pk] = 0.0
-            return 0.0
+        champs = self._champs_concernes(update_fields)
+        if champs is None or champs:
+            self._valider_champs(champs)
 
+        parents_modifies = champs is None or not champs.isdisjoint({'pere_boucle', 'mere_boucle'})
         try:
-            pere_anc = self._get_ancestors_paths(self.pere_boucle, max_generations)
-            mere_anc = self._get_ancestors_paths(self.mere_boucle, max_generations)
-            communs = set(pere_anc.keys()).intersection(mere_anc.keys())
-
-            if not communs:
-                if self.pk:
-                    cache[self.pk] = 0.0
-                return 0.0
-
-            F = 0.0
-            for anc in communs:
-                dist_p = min(d[0] for d in pere_anc[anc])
-                dist_m = min(d[1] for d in mere_anc[anc])
-                Fa = anc.coefficient_consanguinite_wright(
-                    max_generations=max_generations - 1, cache=cache
-                )
-                F += (1 / 2) ** (dist_p + dist_m + 1) * (1 + Fa)
-
-            F = round(F, 5)
-            if self.pk:
-                cache[self.pk] = F
-            return F
-
-        except (RecursionError, AttributeError):
-            if self.pk:
-                cache[self.pk] = 0.0
-            return 0.0
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+
+                if parents_modifies:
+                    from .arbre import mettre_a_jour_noeud
+                    from .ascendance import mettre_a_jour_ascendance
+                    from .consanguinite import propager_consanguinite
+                    from .pedigree import signaler_filiation
+                    propager_consanguinite(self)
+                    mettre_a_jour_ascendance(self.pk)
+                    mettre_a_jour_noeud(self.pk)
+                    if champs is not None:
+                        # Un nouvel animal ne change la parenté d'aucun couple existant
+                        signaler_filiation(using=self._state.db)
+        except IntegrityError as e:
+            # SQLite : « UNIQUE constraint failed: troupeau.boucle_ovin », PostgreSQL : nom de la contrainte
+            if 'uniq_boucle_ovin_active' in str(e) or (self.boucle_active and 'boucle_ovin' in str(e)):
+                raise ValidationError(
+                    {'boucle_ovin': _("Cette boucle est déjà active pour un autre animal.")}
+                ) from e
+            raise
+
+
+class AscendanceQuerySet(models.QuerySet):
+    def descendants_de(self, pk, max_depth=None):
+        """Ids des descendants de `pk` (jusqu'à max_depth générations)."""
+        qs = self.filter(ancetre_id=pk)
+        if max_depth is not None:
+            qs = qs.filter(profondeur__lte=max_depth)
+        return qs.values('descendant_id')
+
+    def ancetres_de(self, pk, max_depth=None):
+        """Ids des ancêtres de `pk` (jusqu'à max_depth générations)."""
+        qs = self.filter(descendant_id=pk)
+        if max_depth is not None:
+            qs = qs.filter(profondeur__lte=max_depth)
+        return qs.values('ancetre_id')
+
+    def ancetres_communs(self, pk1, pk2):
+        """Ids des ancêtres communs à deux animaux."""
+        return self.filter(descendant_id=pk1, ancetre_id__in=self.ancetres_de(pk2)).values('ancetre_id')
+
+    def descendance_par_pere(self):
+        """[{'ancetre': id, 'nb': nombre d'enfants}] pour chaque père."""
+        return (self.filter(profondeur=1, cote=Ascendance.COTE_PERE)
+                .values('ancetre').annotate(nb=models.Count('descendant', distinct=True))
+                .order_by('-nb'))
+
+
+class Ascendance(models.Model):
+    """
+    Table de fermeture du pedigree : une ligne par chemin distinct entre un
+    ancêtre et un descendant. Maintenue par troupeau.ascendance.
+    """
+    COTE_PERE = 'pere'
+    COTE_MERE = 'mere'
+    COTE_CHOIX = [
+        (COTE_PERE, 'Côté père'),
+        (COTE_MERE, 'Côté mère'),
+    ]
 
-    def get_descendants(self):
-        """Descendants directs"""
-        return self.agneaux_pere.all() if self.sexe == 'male' else self.agneaux_mere.all()
+    ancetre = models.ForeignKey(Troupeau, on_delete=models.CASCADE, related_name='descendances')
+    descendant = models.ForeignKey(Troupeau, on_delete=models.CASCADE, related_name='ascendances')
+    profondeur = models.PositiveSmallIntegerField(help_text="1 = parent, 2 = grand-parent, ...")
+    cote = models.CharField(max_length=4, choices=COTE_CHOIX,
+                            help_text="Côté du premier pas depuis le descendant")
 
-    def get_all_descendants(self, max_depth=3):
-        """Descendants jusqu'à max_depth générations"""
-        descendants = set()
+    objects = AscendanceQuerySet.as_manager()
+
+    class Meta:
+        db_table = 'troupeau_ascendance'
+        verbose_name = _("Ascendance")
+        verbose_name_plural = _("Ascendances")
+        constraints = [
+            models.UniqueConstraint(
+                fields=['ancetre', 'profondeur', 'descendant', 'cote'],
+                name='uniq_ascendance_chemin',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['descendant', 'profondeur'], name='ascendance_desc_prof_idx'),
+        ]
 
-        def _collect(animal, depth):
-            if depth <= 0:
-                return
-            for child in animal.get_descendants():
-                if child not in descendants:
-                    descendants.add(child)
-                    _collect(child, depth - 1)
+    def __str__(self):
+        return f"{self.ancetre_id} → {self.descendant_id} ({self.profondeur}, {self.cote})"
 
-        _collect(self, max_depth)
-        return list(descendants)
 
-    # ---- Sauvegarde ----
-    def save(self, *args, **kwargs):
-        """Sauvegarde avec mise à jour auto de boucle_active et du coefficient."""
-        # Adapter boucle_active selon le statut (ne **force** pas True)
-        if self.statut in ['vendu', 'decede', 'sortie']:
-            self.boucle_active = False
+class NoeudArbre(models.Model):
+    """
+    Position d'un animal dans l'arbre d'affichage (vue arbre) : rattaché à sa
+    mère si elle est connue, sinon à son père. Le chemin matérialisé donne le
+    sous-arbre par simple préfixe. Maintenu par troupeau.arbre.
+    """
+    animal = models.OneToOneField(Troupeau, on_delete=models.CASCADE, primary_key=True,
+                                  related_name='noeud_arbre')
+    parent = models.ForeignKey(Troupeau, on_delete=models.SET_NULL, null=True, blank=True,
+                               related_name='noeuds_enfants')
+    chemin = models.CharField(max_length=1000, unique=True,
+                              help_text="Ids des ancêtres d'affichage puis de l'animal (base 36)")
+    profondeur = models.PositiveIntegerField(default=0, help_text="0 = racine")
+
+    class Meta:
+        db_table = 'troupeau_arbre'
+        verbose_name = _("Nœud de l'arbre")
+        verbose_name_plural = _("Nœuds de l'arbre")
+
+    def __str__(self):
+        return f"{self.animal_id} ({self.profondeur}) {self.chemin}"
+
 
-        # Validation
-        self.full_clean()
+class VersionPartagee(models.Model):
+    """
+    Compteur partagé par tous les processus (workers web, worker de tâches).
+    L'incrément est un UPDATE atomique en base : deux processus qui valident
+    en même temps obtiennent deux versions distinctes, ce que cache.incr()
+    d'un cache fichier ou local ne garantit pas.
+    """
+    nom = models.CharField(max_length=50, primary_key=True)
+    valeur = models.BigIntegerField()
 
-        # Sauvegarde initiale
-        super().save(*args, **kwargs)
+    class Meta:
+        db_table = 'troupeau_version'
+        verbose_name = _("Version partagée")
+        verbose_name_plural = _("Versions partagées")
 
-        # Mise à jour coefficient sans reboucler
-        nouveau = self.coefficient_consanguinite_wright()
-        if abs((self.coefficient_consanguinite or 0.0) - nouveau) > 0.00001:
-            self.coefficient_consanguinite = nouveau
-            Troupeau.objects.filter(pk=self.pk).update(coefficient_consanguinite=nouveau)
+    def __str__(self):
+        return f"{self.nom} = {self.valeur}"
+
+    @classmethod
+    def lire(cls, nom):
+        valeur = cls.objects.filter(nom=nom).values_list('valeur', flat=True).first()
+        if valeur is None:
+            # Départ horodaté : une base recréée ne ressert pas les clés de cache d'avant
+            valeur = cls.objects.get_or_create(nom=nom, defaults={'valeur': time.time_ns()})[0].valeur
+        return valeur
+
+    @classmethod
+    def incrementer(cls, nom):
+        """Incrémente le compteur et retourne la nouvelle valeur."""
+        with transaction.atomic():
+            cls.objects.get_or_create(nom=nom, defaults={'valeur': time.time_ns()})
+            cls.objects.filter(nom=nom).update(valeur=F('valeur') + 1)
+            return cls.objects.values_list('valeur', flat=True).get(nom=nom)
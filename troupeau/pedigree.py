@@ -0,0 +1,445 @@
+# troupeau/pedigree.py
+"""
+Index de pedigree en mémoire, un par processus (worker gunicorn).
+
+L'index est construit paresseusement au premier usage (2 requêtes : Troupeau
++ Genealogie), puis toutes les traversées (ascendants, descendants, frères et
+sœurs, parenté) se font en mémoire sans aucune requête.
+
+Cohérence :
+  - les signaux post_save / post_delete de Troupeau et Genealogie patchent
+    l'index local et incrémentent une version partagée (VersionPartagee,
+    UPDATE atomique en base) une fois la transaction validée ;
+  - un autre processus qui voit une version différente reconstruit son index ;
+    les versions partagées sont relues au plus une fois par requête HTTP (à
+    chaque appel hors requête : worker, commandes) ;
+  - un patch appliqué dans une transaction ou un savepoint annulé est détecté
+    (son callback on_commit a été écarté par Django) et provoque une
+    reconstruction, y compris dans une transaction ultérieure.
+Pour une modification faite hors ORM (QuerySet.update, SQL brut) sur les
+parents, appeler `invalider_index()`.
+
+version_filiation() n'est incrémentée que par un changement de parents
+(Troupeau.save, Genealogie, suppression d'un parent) : le stock de parenté
+et les matrices d'accouplement mis en cache en dépendent, pas des boucles.
+"""
+import threading
+from array import array
+from collections import deque, namedtuple
+
+from django.core.signals import request_finished, request_started
+from django.db import connection, transaction
+from django.dispatch import receiver
+
+from .consanguinite import coefficient_descendance
+from .models import Troupeau, VersionPartagee
+
+CLE_VERSION = 'pedigree'
+# Ne change qu'avec la filiation (parents, Genealogie) : clé du stock de parenté et des matrices
+CLE_FILIATION = 'filiation'
+INCONNU = -1
+
+LigneAnimal = namedtuple('LigneAnimal', 'pk boucle_ovin sexe race boucle_active')
+
+_verrou = threading.RLock()
+_index = None
+_local = threading.local()   # versions lues pendant la requête en cours
+
+
+class IndexPedigree:
+    """
+    Pedigree compact : chaque animal occupe une position fixe ; les parents
+    (effectifs) sont stockés dans deux tableaux de positions, les enfants dans
+    une liste d'adjacence. Les parents déclarés dans Genealogie sont
+    prioritaires sur les FK de Troupeau (ils complètent les FK non renseignées).
+    """
+
+    def __init__(self, lignes, genealogies, version=None):
+        self.version = version
+        # Patchs locaux pas encore confirmés par un commit : [(callback on_commit, position)]
+        self.en_attente = []
+        self.position = {}
+        self.ids = array('q')
+        self.lignes = []
+        self.peres_fk = array('q')
+        self.meres_fk = array('q')
+        self.peres = array('q')
+        self.meres = array('q')
+        self.enfants_par_position = []
+        self.surcharges = {}
+
+        parents_fk = []
+        for pk, boucle, sexe, race, actif, pere_id, mere_id in lignes:
+            self._ajouter_position(LigneAnimal(pk, boucle, sexe, race, actif))
+            parents_fk.append((pere_id, mere_id))
+
+        for pos, (pere_id, mere_id) in enumerate(parents_fk):
+            self.peres_fk[pos] = self.position.get(pere_id, INCONNU)
+            self.meres_fk[pos] = self.position.get(mere_id, INCONNU)
+
+        for agneau_id, pere_id, mere_id in genealogies:
+            pos = self.position.get(agneau_id)
+            if pos is not None:
+                self.surcharges[pos] = (self.position.get(pere_id, INCONNU),
+                                        self.position.get(mere_id, INCONNU))
+
+        for pos in range(len(self.ids)):
+            self._lier_parents(pos)
+
+    # -----------------------
+    # Construction / patchs
+    # -----------------------
+    @classmethod
+    def depuis_base(cls, version=None):
+        from genealogie.models import Genealogie
+
+        lignes = (Troupeau.objects.order_by('id')
+                  .values_list('id', 'boucle_ovin', 'sexe', 'race', 'boucle_active',
+                               'pere_boucle_id', 'mere_boucle_id'))
+        genealogies = Genealogie.objects.values_list('agneau_id', 'pere_id', 'mere_id')
+        return cls(lignes.iterator(), genealogies.iterator(), version=version)
+
+    def _ajouter_position(self, ligne):
+        pos = len(self.ids)
+        self.position[ligne.pk] = pos
+        self.ids.append(ligne.pk)
+        self.lignes.append(ligne)
+        for tableau in (self.peres_fk, self.meres_fk, self.peres, self.meres):
+            tableau.append(INCONNU)
+        self.enfants_par_position.append([])
+        return pos
+
+    def _delier_parents(self, pos):
+        for parent in {self.peres[pos], self.meres[pos]}:
+            if parent != INCONNU and pos in self.enfants_par_position[parent]:
+                self.enfants_par_position[parent].remove(pos)
+        self.peres[pos] = self.meres[pos] = INCONNU
+
+    def _lier_parents(self, pos):
+        pere, mere = self.surcharges.get(pos, (self.peres_fk[pos], self.meres_fk[pos]))
+        # Garde-fous : un animal n'est pas son propre parent
+        self.peres[pos] = pere if pere != pos else INCONNU
+        self.meres[pos] = mere if mere != pos else INCONNU
+        for parent in {self.peres[pos], self.meres[pos]}:
+            if parent != INCONNU:
+                self.enfants_par_position[parent].append(pos)
+
+    def appliquer_animal(self, animal):
+        """Ajoute ou met à jour un animal (après save)."""
+        ligne = LigneAnimal(animal.pk, animal.boucle_ovin, animal.sexe, animal.race, animal.boucle_active)
+        pos = self.position.get(animal.pk)
+        if pos is None:
+            pos = self._ajouter_position(ligne)
+        else:
+            self.lignes[pos] = ligne
+            self._delier_parents(pos)
+        self.peres_fk[pos] = self.position.get(animal.pere_boucle_id, INCONNU)
+        self.meres_fk[pos] = self.position.get(animal.mere_boucle_id, INCONNU)
+        self._lier_parents(pos)
+
+    def est_a_jour(self, animal):
+        """True si l'index reflète déjà cet animal (ligne et parents déclarés)."""
+        pos = self.position.get(animal.pk)
+        if pos is None:
+            return False
+        return (self.lignes[pos] == (animal.pk, animal.boucle_ovin, animal.sexe, animal.race, animal.boucle_active)
+                and self.peres_fk[pos] == self.position.get(animal.pere_boucle_id, INCONNU)
+                and self.meres_fk[pos] == self.position.get(animal.mere_boucle_id, INCONNU))
+
+    def retirer_animal(self, pk):
+        """Retire un animal supprimé ; ses enfants perdent ce parent (SET_NULL)."""
+        pos = self.position.pop(pk, None)
+        if pos is None:
+            return
+        self._delier_parents(pos)
+        self.surcharges.pop(pos, None)
+        for enfant in list(self.enfants_par_position[pos]):
+            self._delier_parents(enfant)
+            if self.peres_fk[enfant] == pos:
+                self.peres_fk[enfant] = INCONNU
+            if self.meres_fk[enfant] == pos:
+                self.meres_fk[enfant] = INCONNU
+            surcharge = self.surcharges.get(enfant)
+            if surcharge and pos in surcharge:
+                # Genealogie utilise PROTECT : ne devrait pas arriver, par prudence
+                del self.surcharges[enfant]
+            self._lier_parents(enfant)
+        self.enfants_par_position[pos] = []
+        self.lignes[pos] = None
+
+    def appliquer_genealogie(self, agneau_id, pere_id, mere_id):
+        pos = self.position.get(agneau_id)
+        if pos is None:
+            return
+        self._delier_parents(pos)
+        self.surcharges[pos] = (self.position.get(pere_id, INCONNU), self.position.get(mere_id, INCONNU))
+        self._lier_parents(pos)
+
+    def retirer_genealogie(self, agneau_id):
+        pos = self.position.get(agneau_id)
+        if pos is None:
+            return
+        self._delier_parents(pos)
+        self.surcharges.pop(pos, None)
+        self._lier_parents(pos)
+
+    # -----------------------
+    # Lectures (aucune requête)
+    # -----------------------
+    def __contains__(self, pk):
+        return pk in self.position
+
+    def __len__(self):
+        return len(self.position)
+
+    def ligne(self, pk):
+        """LigneAnimal (pk, boucle_ovin, sexe, race, boucle_active) ou None."""
+        pos = self.position.get(pk)
+        return None if pos is None else self.lignes[pos]
+
+    def _id(self, pos):
+        return None if pos == INCONNU else self.ids[pos]
+
+    def parents(self, pk):
+        """(pere_id, mere_id) effectifs."""
+        pos = self.position.get(pk)
+        if pos is None:
+            return None, None
+        return self._id(self.peres[pos]), self._id(self.meres[pos])
+
+    def enfants(self, pk):
+        pos = self.position.get(pk)
+        if pos is None:
+            return []
+        return [self.ids[e] for e in self.enfants_par_position[pos]]
+
+    def ascendants(self, pk, max_depth=None):
+        """{ancetre_id: profondeur minimale} (1 = parent)."""
+        return self._parcourir(pk, max_depth, lambda pos: (self.peres[pos], self.meres[pos]))
+
+    def descendants(self, pk, max_depth=None):
+        """{descendant_id: profondeur minimale} (1 = enfant), côtés père et mère."""
+        return self._parcourir(pk, max_depth, lambda pos: self.enfants_par_position[pos])
+
+    def _parcourir(self, pk, max_depth, voisins):
+        depart = self.position.get(pk)
+        if depart is None:
+            return {}
+        vus = {depart: 0}
+        file = deque([depart])
+        while file:
+            pos = file.popleft()
+            profondeur = vus[pos] + 1
+            if max_depth is not None and profondeur > max_depth:
+                continue
+            for autre in voisins(pos):
+                if autre != INCONNU and autre not in vus:
+                    vus[autre] = profondeur
+                    file.append(autre)
+        del vus[depart]
+        return {self.ids[pos]: d for pos, d in vus.items()}
+
+    def freres_soeurs(self, pk, demi=True):
+        """Ids des frères/sœurs (pleins, et demi si `demi`)."""
+        pos = self.position.get(pk)
+        if pos is None:
+            return []
+        pere, mere = self.peres[pos], self.meres[pos]
+        candidats = set()
+        for parent in (pere, mere):
+            if parent != INCONNU:
+                candidats.update(self.enfants_par_position[parent])
+        candidats.discard(pos)
+        if not demi:
+            candidats = {c for c in candidats
+                         if pere != INCONNU and mere != INCONNU
+                         and self.peres[c] == pere and self.meres[c] == mere}
+        return sorted(self.ids[c] for c in candidats)
+
+    def pedigree(self, ids=None):
+        """
+        [(id, pere_id, mere_id), ...] : tout l'index, ou seulement `ids` et
+        leurs ascendants (format attendu par troupeau.consanguinite).
+        """
+        if ids is None:
+            positions = range(len(self.ids))
+        else:
+            positions = set()
+            pile = [self.position[pk] for pk in ids if pk in self.position]
+            while pile:
+                pos = pile.pop()
+                if pos in positions:
+                    continue
+                positions.add(pos)
+                for parent in (self.peres[pos], self.meres[pos]):
+                    if parent != INCONNU and parent not in positions:
+                        pile.append(parent)
+        return [(self.ids[pos], self._id(self.peres[pos]), self._id(self.meres[pos]))
+                for pos in positions if self.lignes[pos] is not None]
+
+    def parente(self, pk1, pk2):
+        """Coefficient de parenté (coancestry, 0..1) entre deux animaux."""
+        if pk1 == pk2:
+            return round(0.5 * (1.0 + self.consanguinite(pk1)), 5)
+        return coefficient_descendance(pk1, pk2, pedigree=self.pedigree([pk1, pk2]))
+
+    def consanguinite(self, pk):
+        """Coefficient F (0..1) d'un animal d'après ses parents effectifs."""
+        pere_id, mere_id = self.parents(pk)
+        return coefficient_descendance(pere_id, mere_id, pedigree=self.pedigree([pk]))
+
+
+# =========================
+# Accès à l'index du processus
+# =========================
+
+def version_pedigree():
+    """Version partagée du pedigree (incrémentée à chaque modification validée)."""
+    return VersionPartagee.lire(CLE_VERSION)
+
+
+def _incrementer_version():
+    return VersionPartagee.incrementer(CLE_VERSION)
+
+
+def version_filiation():
+    """
+    Version partagée de la filiation seule : contrairement à version_pedigree(),
+    elle ne bouge pas quand une boucle, un sexe, une race ou le statut actif change.
+    Lue une seule fois par requête HTTP.
+    """
+    return _version_courante(CLE_FILIATION)
+
+
+def signaler_filiation(using=None):
+    """À appeler quand des parents changent : incrémente version_filiation() au commit."""
+    transaction.on_commit(lambda: _retenir_version(CLE_FILIATION, VersionPartagee.incrementer(CLE_FILIATION)),
+                          using=using)
+
+
+def _version_courante(cle=CLE_VERSION):
+    """VersionPartagee `cle`, relue une seule fois par requête HTTP."""
+    versions = getattr(_local, 'versions', None)
+    if versions is not None and cle in versions:
+        return versions[cle]
+    valeur = VersionPartagee.lire(cle)
+    if versions is not None:
+        versions[cle] = valeur
+    return valeur
+
+
+def _retenir_version(cle, valeur):
+    """Version validée par ce processus : connue sans relecture jusqu'à la fin de la requête."""
+    versions = getattr(_local, 'versions', None)
+    if versions is not None:
+        versions[cle] = valeur
+
+
+@receiver(request_started, dispatch_uid="pedigree_debut_requete")
+def _debut_requete(sender, **kwargs):
+    _local.versions = {}
+
+
+@receiver(request_finished, dispatch_uid="pedigree_fin_requete")
+def _fin_requete(sender, **kwargs):
+    _local.versions = None
+
+
+def _attendre_commit(index, rappel):
+    """Confie `rappel` à on_commit ; dans une transaction, il reste en attente sur `index`."""
+    transaction.on_commit(rappel)
+    if connection.in_atomic_block:
+        index.en_attente.append((rappel, len(connection.run_on_commit) - 1))
+
+
+def _retirer_attente(index, rappel):
+    index.en_attente = [(r, pos) for r, pos in index.en_attente if r is not rappel]
+
+
+def _patch_annule(index):
+    """
+    Vrai si un patch (ou la construction) de `index` a été annulé : son
+    callback on_commit n'est plus enregistré (rollback de la transaction ou
+    d'un savepoint).
+    """
+    if not index.en_attente:
+        return False
+    if not connection.in_atomic_block:
+        return True
+    rappels = connection.run_on_commit
+    enregistres = None
+    for rappel, position in index.en_attente:
+        if position < len(rappels) and rappels[position][1] is rappel:
+            continue
+        # Liste décalée par un savepoint annulé : recherche complète
+        if enregistres is None:
+            enregistres = {id(func) for _sids, func, _robust in rappels}
+        if id(rappel) not in enregistres:
+            return True
+    return False
+
+
+def obtenir_index():
+    """Index du processus, (re)construit si absent, périmé ou issu d'un rollback."""
+    global _index
+    with _verrou:
+        version = _version_courante()
+        index = _index
+        if index is not None and _patch_annule(index):
+            # Patch appliqué dans une transaction (ou un savepoint) jamais validé
+            index = None
+        if index is None or (not index.en_attente and index.version != version):
+            index = _index = IndexPedigree.depuis_base(version=version)
+            if connection.in_atomic_block:
+                # Construit avec des données non encore validées : à confirmer au commit
+                def _confirmer_construction():
+                    with _verrou:
+                        _retirer_attente(index, _confirmer_construction)
+                _attendre_commit(index, _confirmer_construction)
+        return index
+
+
+def invalider_index():
+    """Force la reconstruction de l'index dans tous les processus."""
+    global _index
+    with _verrou:
+        _index = None
+    transaction.on_commit(lambda: _retenir_version(CLE_VERSION, _incrementer_version()))
+    signaler_filiation()
+
+
+def est_construit():
+    return _index is not None
+
+
+def modifications_en_attente():
+    """Vrai si l'index local porte des patchs pas encore validés (transaction en cours)."""
+    index = _index
+    return index is not None and bool(index.en_attente)
+
+
+def patcher_index(operation):
+    """
+    Applique `operation(index)` sur l'index local s'il est construit, puis
+    incrémente la version partagée au commit. Utilisé par les signaux.
+    """
+    def _confirmer():
+        global _index
+        nouvelle_version = _incrementer_version()
+        _retenir_version(CLE_VERSION, nouvelle_version)
+        with _verrou:
+            if _index is index and index is not None:
+                _retirer_attente(index, _confirmer)
+                if nouvelle_version == (index.version or 0) + 1:
+                    index.version = nouvelle_version
+                else:
+                    # Un autre processus a aussi modifié le pedigree
+                    _index = None
+
+    with _verrou:
+        index = _index
+        if index is not None:
+            operation(index)
+            _attendre_commit(index, _confirmer)
+            return
+    transaction.on_commit(_confirmer)
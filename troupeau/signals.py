@@ -1,119 +1,92 @@
-from django.db.models.signals import pre_save, post_save, pre_delete
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
-from django.core.exceptions import ObjectDoesNotExist
-from django.db import transaction
 import logging
 
-from .models import Troupeau
+from .arbre import mettre_a_jour_noeud
+from .ascendance import mettre_a_jour_ascendance
+from .consanguinite import propager_consanguinite
+from .models import NoeudArbre, Troupeau
+from .pedigree import obtenir_index, patcher_index, est_construit, signaler_filiation
+from historiquetroupeau.ecriture import enregistrer
 from historiquetroupeau.models import Historiquetroupeau
 
 logger = logging.getLogger(__name__)
 
 
+# Champs de Troupeau suivis dans l'historique (clés du diff `changements`)
+CHAMPS_HISTORIQUE = (
+    'boucle_ovin',
+    'naissance_date',
+    'boucle_active',
+    'proprietaire_ovin',
+    'origine_ovin',
+    'statut',
+    'sexe',
+    'race',
+    'achat_date',
+    'entree_date',
+    'date_sortie',
+    'poids_initial',
+    'taille_initiale',
+    'coefficient_consanguinite',
+)
+
+
 @receiver(pre_save, sender=Troupeau, dispatch_uid="troupeau_pre_save_historique_modification")
 def creer_historique_modification(sender, instance, **kwargs):
     """
     Crée un historique lors de la modification d'un troupeau.
     """
     # Si création, rien à faire ici
-    if not instance.pk:
+    if not instance.pk or instance._state.adding:
         return
 
-    try:
-        # On lit l'ancien état tel qu'en BD
-        ancien = Troupeau.objects.get(pk=instance.pk)
-    except ObjectDoesNotExist:
-        logger.warning(f"Tentative de modification d'un Troupeau inexistant: {instance.pk}")
+    # Ancien état d'après le cliché pris à la lecture (aucune requête)
+    anciennes_valeurs = instance.get_dirty_fields()
+    if not anciennes_valeurs:
         return
 
-    # Champs à suivre (cohérents avec le modèle)
-    champs_a_suivre = [
-        'boucle_ovin',
-        'naissance_date',
-        'boucle_active',
-        'proprietaire_ovin',
-        'origine_ovin',
-        'statut',
-        'sexe',
-        'race',
-        'achat_date',
-        'entree_date',
-        'date_sortie',
-        'poids_initial',
-        'taille_initiale',
-        'coefficient_consanguinite',
-    ]
-
-    # Mapping vers les champs du modèle d'historique
-    correspondance_champs = {
-        'boucle_ovin': ('ancienne_boucle', 'nouvelle_boucle'),
-        'naissance_date': ('ancienne_naissance_date', 'nouvelle_naissance_date'),
-        'boucle_active': ('ancienne_boucle_active', 'nouvelle_boucle_active'),
-        'proprietaire_ovin': ('ancien_proprietaire', 'nouveau_proprietaire'),
-        'origine_ovin': ('ancienne_origine', 'nouvelle_origine'),
-        'statut': ('ancien_statut', 'nouveau_statut'),
-        'sexe': ('ancien_sexe', 'nouveau_sexe'),
-        'race': ('ancienne_race', 'nouvelle_race'),
-        'achat_date': ('ancienne_achat_date', 'nouvelle_achat_date'),
-        'entree_date': ('ancienne_entree_date', 'nouvelle_entree_date'),
-        'date_sortie': ('ancienne_date_sortie', 'nouvelle_date_sortie'),
-        'poids_initial': ('ancien_poids_initial', 'nouveau_poids_initial'),
-        'taille_initiale': ('ancienne_taille_initiale', 'nouvelle_taille_initiale'),
-        'coefficient_consanguinite': ('ancien_coefficient', 'nouveau_coefficient'),
-    }
-
-    changements = []
-    donnees_historique = {}
-    changements_details = []
-
-    for champ in champs_a_suivre:
-        if not hasattr(ancien, champ) or not hasattr(instance, champ):
-            logger.warning(f"Champ {champ} non trouvé sur Troupeau")
-            continue
-
-        try:
-            ancien_val = getattr(ancien, champ)
-            nouveau_val = getattr(instance, champ)
-
-            if _valeurs_different(ancien_val, nouveau_val):
-                changements.append(champ)
-
-                ancien_str = _formater_valeur(ancien_val)
-                nouveau_str = _formater_valeur(nouveau_val)
-                changements_details.append(f"{champ}: {ancien_str} → {nouveau_str}")
-
-                if champ in correspondance_champs:
-                    ancien_nom, nouveau_nom = correspondance_champs[champ]
-                    donnees_historique[ancien_nom] = ancien_val
-                    donnees_historique[nouveau_nom] = nouveau_val
-
-        except (AttributeError, TypeError) as e:
-            logger.error(f"Erreur comparaison champ {champ}: {e}")
+    changements = {}
+    for champ in CHAMPS_HISTORIQUE:
+        if champ not in anciennes_valeurs:
             continue
+        ancien_val = anciennes_valeurs[champ]
+        nouveau_val = getattr(instance, champ)
+        if _valeurs_different(ancien_val, nouveau_val):
+            changements[champ] = [ancien_val, nouveau_val]
 
     if changements:
         try:
-            with transaction.atomic():
-                observations = f"Champs modifiés: {', '.join(changements)}"
-                if changements_details:
-                    details = '; '.join(changements_details[:3])
-                    observations += f"\nDétails: {details}"
-                    if len(changements_details) > 3:
-                        observations += f" (+{len(changements_details) - 3} autres)"
-
-                Historiquetroupeau.objects.create(
-                    troupeau=instance,
-                    date_evenement=timezone.now().date(),
-                    statut='Modification',
-                    observations=observations[:500],
-                    **donnees_historique
-                )
-                logger.info(f"Historique créé pour Troupeau {instance.pk}: {len(changements)} champ(s) modifié(s)")
+            enregistrer(Historiquetroupeau(
+                troupeau=instance,
+                date_evenement=timezone.now().date(),
+                statut='Modification',
+                changements=changements,
+            ))
+            logger.debug("Historique enregistré pour Troupeau %s: %s champ(s) modifié(s)", instance.pk, len(changements))
         except Exception as e:
             logger.error(f"Erreur création historique (modification) pour {instance.pk}: {e}")
 
 
+def historique_creation(instance):
+    """Ligne d'historique « Création » d'un animal (non sauvegardée)."""
+    # Évite l'avertissement IDE sur get_FOO_display (même rendu)
+    sexe_label = dict(Troupeau.SEXE_CHOIX).get(instance.sexe, instance.sexe)
+    race_label = dict(Troupeau.RACE_CHOIX).get(instance.race, instance.race)
+    return Historiquetroupeau(
+        troupeau=instance,
+        date_evenement=timezone.now().date(),
+        statut='Création',
+        observations=f"Nouvel animal ajouté: {instance.boucle_ovin} ({sexe_label}, {race_label})",
+        changements={
+            champ: [None, valeur] for champ in CHAMPS_HISTORIQUE
+            if (valeur := getattr(instance, champ)) is not None
+        },
+    )
+
+
 @receiver(post_save, sender=Troupeau, dispatch_uid="troupeau_post_save_historique_creation")
 def creer_historique_creation(sender, instance, created, **kwargs):
     """
@@ -123,25 +96,8 @@ def creer_historique_creation(sender, instance, created, **kwargs):
         return
 
     try:
-        with transaction.atomic():
-            # Évite l'avertissement IDE sur get_FOO_display (même rendu)
-            sexe_label = dict(Troupeau.SEXE_CHOIX).get(instance.sexe, instance.sexe)
-            race_label = dict(Troupeau.RACE_CHOIX).get(instance.race, instance.race)
-
-            Historiquetroupeau.objects.create(
-                troupeau=instance,
-                date_evenement=timezone.now().date(),
-                statut='Création',
-                observations=f"Nouvel animal ajouté: {instance.boucle_ovin} ({sexe_label}, {race_label})",
-                nouvelle_boucle=instance.boucle_ovin,
-                nouvelle_naissance_date=instance.naissance_date,
-                nouveau_sexe=instance.sexe,
-                nouvelle_race=instance.race,
-                nouveau_statut=instance.statut,
-                nouveau_proprietaire=instance.proprietaire_ovin,
-                nouvelle_origine=instance.origine_ovin,
-            )
-            logger.info(f"Historique de création créé pour Troupeau {instance.pk}")
+        enregistrer(historique_creation(instance))
+        logger.debug("Historique de création enregistré pour Troupeau %s", instance.pk)
     except Exception as e:
         logger.error(f"Erreur historique de création pour {instance.pk}: {e}")
 
@@ -152,24 +108,20 @@ def creer_historique_suppression(sender, instance, **kwargs):
     Crée un historique avant la suppression d'un animal.
     """
     try:
-        with transaction.atomic():
-            sexe_label = dict(Troupeau.SEXE_CHOIX).get(instance.sexe, instance.sexe)
-            race_label = dict(Troupeau.RACE_CHOIX).get(instance.race, instance.race)
-
-            Historiquetroupeau.objects.create(
-                troupeau=None,  # L'objet va être supprimé
-                date_evenement=timezone.now().date(),
-                statut='Suppression',
-                observations=f"Animal supprimé: {instance.boucle_ovin} ({sexe_label}, {race_label})",
-                ancienne_boucle=instance.boucle_ovin,
-                ancienne_naissance_date=instance.naissance_date,
-                ancien_sexe=instance.sexe,
-                ancienne_race=instance.race,
-                ancien_statut=instance.statut,
-                ancien_proprietaire=instance.proprietaire_ovin,
-                ancienne_origine=instance.origine_ovin,
-            )
-            logger.info(f"Historique de suppression créé pour Troupeau {instance.pk}")
+        sexe_label = dict(Troupeau.SEXE_CHOIX).get(instance.sexe, instance.sexe)
+        race_label = dict(Troupeau.RACE_CHOIX).get(instance.race, instance.race)
+
+        enregistrer(Historiquetroupeau(
+            troupeau=None,  # L'objet va être supprimé
+            date_evenement=timezone.now().date(),
+            statut='Suppression',
+            observations=f"Animal supprimé: {instance.boucle_ovin} ({sexe_label}, {race_label})",
+            changements={
+                champ: [valeur, None] for champ in CHAMPS_HISTORIQUE
+                if (valeur := getattr(instance, champ)) is not None
+            },
+        ))
+        logger.debug("Historique de suppression enregistré pour Troupeau %s", instance.pk)
     except Exception as e:
         logger.error(f"Erreur historique de suppression pour {instance.pk}: {e}")
 
@@ -187,37 +139,58 @@ def _valeurs_different(val1, val2):
     return val1 != val2
 
 
-def _formater_valeur(valeur):
-    """
-    Formate une valeur pour l'affichage dans l'historique
-    """
-    if valeur is None:
-        return "Non défini"
-    if isinstance(valeur, bool):
-        return "Oui" if valeur else "Non"
-    if isinstance(valeur, float):
-        return f"{valeur:.2f}"
-    if hasattr(valeur, 'strftime'):  # Date/DateTime
-        return valeur.strftime("%d/%m/%Y")
-    return str(valeur)
-
-
-@receiver(post_save, sender=Troupeau, dispatch_uid="troupeau_post_save_nettoyage_historique")
-def nettoyer_historique_ancien(sender, instance, **kwargs):
+# Champs de Troupeau repris dans l'index de pedigree
+CHAMPS_PEDIGREE = {
+    'boucle_ovin', 'sexe', 'race', 'boucle_active',
+    'pere_boucle', 'mere_boucle', 'pere_boucle_id', 'mere_boucle_id',
+}
+
+
+@receiver(post_save, sender=Troupeau, dispatch_uid="troupeau_post_save_index_pedigree")
+def mettre_a_jour_index_pedigree(sender, instance, update_fields=None, **kwargs):
     """
-    Garde les 100 derniers enregistrements d'historique par animal.
+    Répercute la sauvegarde dans l'index de pedigree en mémoire
+    (et invalide celui des autres processus au commit).
     """
-    try:
-        anciens = (Historiquetroupeau.objects
-                   .filter(troupeau=instance)
-                   .order_by('-date_evenement')
-                   [100:])  # tout ce qui dépasse 100
-        if anciens:
-            ids = list(anciens.values_list('id', flat=True))
-            Historiquetroupeau.objects.filter(id__in=ids).delete()
-            logger.info(f"Nettoyage historique: {len(ids)} enregistrements supprimés pour {instance.pk}")
-    except Exception as e:
-        logger.error(f"Erreur nettoyage historique pour {instance.pk}: {e}")
+    if update_fields is not None and not CHAMPS_PEDIGREE.intersection(update_fields):
+        return
+    if est_construit() and obtenir_index().est_a_jour(instance):
+        return
+    patcher_index(lambda index: index.appliquer_animal(instance))
+
+
+@receiver(post_delete, sender=Troupeau, dispatch_uid="troupeau_post_delete_index_pedigree")
+def retirer_de_index_pedigree(sender, instance, **kwargs):
+    pk = instance.pk
+    patcher_index(lambda index: index.retirer_animal(pk))
+
+
+@receiver(pre_delete, sender=Troupeau, dispatch_uid="troupeau_pre_delete_enfants_ascendance")
+def memoriser_enfants(sender, instance, **kwargs):
+    """Enfants de l'animal supprimé : leur filiation change (SET_NULL) sans save()."""
+    instance._enfants_avant_suppression = obtenir_index().enfants(instance.pk)
+    instance._enfants_arbre = list(NoeudArbre.objects.filter(parent_id=instance.pk).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Troupeau, dispatch_uid="troupeau_post_delete_ascendance")
+def mettre_a_jour_ascendance_enfants(sender, instance, **kwargs):
+    """Les lignes où l'animal est ancêtre partent en cascade ; on reconstruit celles de ses enfants."""
+    enfants = getattr(instance, '_enfants_avant_suppression', None)
+    if enfants:
+        # Suppression en masse : les enfants supprimés dans le même lot sont déjà partis
+        enfants = list(Troupeau.objects.filter(pk__in=enfants).values_list('pk', flat=True))
+        mettre_a_jour_ascendance(*enfants)
+        signaler_filiation(using=kwargs.get('using'))
+        # Parent perdu : F des enfants restants et de leur descendance (Genealogie.fa compris)
+        transaction.on_commit(lambda: _propager_enfants(enfants), using=kwargs.get('using'))
+    # Enfants d'affichage : rattachés au père (ou racines) avec leur sous-arbre
+    for pk in getattr(instance, '_enfants_arbre', ()):
+        mettre_a_jour_noeud(pk)
+
+
+def _propager_enfants(enfants):
+    for pk in Troupeau.objects.filter(pk__in=enfants).values_list('pk', flat=True):
+        propager_consanguinite(pk)
 
 
 class DisableSignals:
@@ -237,7 +210,6 @@ class DisableSignals:
             (pre_save, creer_historique_modification),
             (post_save, creer_historique_creation),
             (pre_delete, creer_historique_suppression),
-            (post_save, nettoyer_historique_ancien),
         ]
         for signal, receiver_func in to_disable:
             try:
@@ -0,0 +1,287 @@
+# troupeau/stock_parente.py
+"""
+Stock de parenté sur disque, partagé par tous les workers gunicorn.
+
+La parenté (coancestry, 0..1) de tous les couples d'animaux actifs est écrite
+dans un fichier `parente-v<version>.bin`, <version> étant la version de
+filiation (version_filiation(), incrémentée seulement quand des parents
+changent ; une boucle renommée ou désactivée ne périme pas le stock) :
+  - en-tête de 64 octets : signature, version, n, empreinte md5 du pedigree ;
+  - les n identifiants triés (int64) ;
+  - le triangle inférieur, diagonale comprise, en float32 ligne par ligne :
+    la case (i, j), j <= i, est à l'indice i·(i+1)/2 + j.
+Les workers l'ouvrent en lecture seule par mmap : les pages sont partagées
+entre processus par le noyau et un id est retrouvé par dichotomie sur le
+fichier, sans dictionnaire ; la mémoire propre à chaque worker ne grandit
+pas avec le troupeau. Précision float32 : ~1e-7, sous l'arrondi à 5 décimales.
+
+Écriture dans un fichier temporaire du même répertoire puis os.replace()
+(atomique) : un lecteur ne voit jamais de fichier partiel. Le constructeur
+enregistre aussi en base un jeton (début de l'empreinte du pedigree, clé
+VersionPartagee 'parente') : un fichier n'est ouvert que si sa version et
+son jeton sont ceux de la base, ce qui écarte sans recalcul le fichier
+d'une autre base (recréée ou restaurée) de même version. Quand la version
+change, le premier lecteur demande la reconstruction au worker (tâche
+`troupeau.parente`, une seule par version grâce à l'empreinte) et aucun
+calcul n'a lieu dans la requête ; en attendant, les appels retombent sur le
+calcul direct par l'index en mémoire. Un animal activé depuis la dernière
+reconstruction n'est pas dans le stock : même repli.
+Reconstruction manuelle : `python manage.py rebuild_kinship_store`.
+"""
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from contextlib import suppress
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import VersionPartagee
+
+from .consanguinite import (
+    _colonne_parente,
+    _consanguinite_positions,
+    coefficient_descendance,
+    matrice_descendance,
+    ordonner_pedigree,
+    restreindre_aux_ascendants,
+)
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE = b'PAHOUPA1'
+ENTETE = struct.Struct('<8sQI16s28x')
+# Jeton du dernier stock écrit (VersionPartagee)
+CLE_JETON = 'parente'
+
+_verrou = threading.Lock()
+_stock = None
+_reconstruction_demandee = None
+
+
+def repertoire_stock():
+    return Path(getattr(settings, 'PARENTE_STOCK_DIR', Path(settings.BASE_DIR) / 'var' / 'parente'))
+
+
+def chemin_stock(version):
+    return repertoire_stock() / f'parente-v{version}.bin'
+
+
+def empreinte_pedigree(pedigree):
+    """Empreinte md5 (16 octets) d'un pedigree [(id, pere_id, mere_id), ...]."""
+    return hashlib.md5(repr(sorted(pedigree)).encode()).digest()
+
+
+def jeton(empreinte):
+    """Jeton enregistré en base pour un stock : 8 premiers octets de son empreinte."""
+    return int.from_bytes(empreinte[:8], 'little', signed=True)
+
+
+# =========================
+# Lecture
+# =========================
+
+class StockParente:
+    """Vue en lecture seule (mmap) d'un fichier de parenté."""
+
+    def __init__(self, chemin):
+        with open(chemin, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        signature, self.version, self.n, self.empreinte = ENTETE.unpack_from(self._mmap, 0)
+        fin_ids = ENTETE.size + 8 * self.n
+        if signature != SIGNATURE or len(self._mmap) != fin_ids + 4 * (self.n * (self.n + 1) // 2):
+            self._mmap.close()
+            raise ValueError(f"Fichier de parenté invalide : {chemin}")
+        vue = memoryview(self._mmap)
+        self.ids = vue[ENTETE.size:fin_ids].cast('q')
+        self.valeurs = vue[fin_ids:].cast('f')
+
+    def __len__(self):
+        return self.n
+
+    def __contains__(self, pk):
+        return self.indice(pk) is not None
+
+    def indice(self, pk):
+        i = bisect_left(self.ids, pk)
+        return i if i < self.n and self.ids[i] == pk else None
+
+    def _valeur(self, i, j):
+        if i < j:
+            i, j = j, i
+        return self.valeurs[i * (i + 1) // 2 + j]
+
+    def parente(self, pk1, pk2):
+        """Parenté entre deux animaux du stock, None si l'un n'y est pas."""
+        i, j = self.indice(pk1), self.indice(pk2)
+        if i is None or j is None:
+            return None
+        return round(self._valeur(i, j), 5)
+
+    def matrice(self, lignes, colonnes):
+        """Parentés lignes × colonnes (listes d'ids), None si un id manque."""
+        indices_lignes = [self.indice(pk) for pk in lignes]
+        indices_colonnes = [self.indice(pk) for pk in colonnes]
+        if None in indices_lignes or None in indices_colonnes:
+            return None
+        return [[round(self._valeur(i, j), 5) for j in indices_colonnes] for i in indices_lignes]
+
+
+def _ouvrir(version):
+    """Stock de `version` s'il existe et porte le jeton enregistré en base (une requête)."""
+    chemin = chemin_stock(version)
+    if not chemin.exists():
+        return None
+    try:
+        stock = StockParente(chemin)
+    except (OSError, ValueError):
+        logger.warning("[Parenté] Stock illisible : %s", chemin, exc_info=True)
+        return None
+    # Garde-fou si la base a été recréée ou restaurée : même version, autre pedigree
+    if stock.version != version or jeton(stock.empreinte) != VersionPartagee.lire(CLE_JETON):
+        logger.info("[Parenté] Stock %s périmé (jeton différent)", chemin.name)
+        return None
+    return stock
+
+
+def obtenir_stock(reconstruire=True):
+    """
+    Stock de la version de filiation courante, ouvert une fois par processus.
+    None s'il n'est pas (encore) disponible : la reconstruction est alors
+    demandée au worker si `reconstruire`.
+    """
+    global _stock
+    from .pedigree import modifications_en_attente, version_filiation
+
+    if modifications_en_attente():
+        # Filiation modifiée dans la transaction en cours : le stock ne la voit pas
+        return None
+    version = version_filiation()
+    with _verrou:
+        if _stock is not None and _stock.version == version:
+            return _stock
+        stock = _ouvrir(version)
+        if stock is not None:
+            # L'ancien mmap est libéré quand plus aucun thread ne le référence
+            _stock = stock
+            return stock
+    if reconstruire:
+        transaction.on_commit(lambda: demander_reconstruction(version))
+    return None
+
+
+def demander_reconstruction(version):
+    """Met en attente la tâche de reconstruction de `version` (une fois par processus)."""
+    global _reconstruction_demandee
+    from taches.moteur import demander
+
+    if _reconstruction_demandee == version:
+        return
+    demander('troupeau.parente', f'parente-v{version}', chemin_stock(version).name,
+             parametres={'version': version})
+    _reconstruction_demandee = version
+
+
+# =========================
+# Consultation (stock, sinon calcul direct)
+# =========================
+
+def coefficient_couple(pere_id, mere_id):
+    """F attendu d'un descendant de pere_id × mere_id (voir coefficient_descendance)."""
+    if not pere_id or not mere_id or pere_id == mere_id:
+        return 0.0
+    stock = obtenir_stock()
+    if stock is not None:
+        valeur = stock.parente(pere_id, mere_id)
+        if valeur is not None:
+            return max(valeur, 0.0)
+    return coefficient_descendance(pere_id, mere_id)
+
+
+def matrice_parente(males, femelles):
+    """F attendu mâles × femelles (voir matrice_descendance), lu dans le stock si possible."""
+    if not males or not femelles:
+        return [[] for _pk in males]
+    stock = obtenir_stock()
+    if stock is not None:
+        lignes = stock.matrice(males, femelles)
+        if lignes is not None:
+            return lignes
+    from .pedigree import obtenir_index
+    return matrice_descendance(males, femelles, obtenir_index().pedigree([*males, *femelles]))
+
+
+# =========================
+# Construction
+# =========================
+
+def calculer_triangle(ids, pedigree):
+    """Triangle inférieur array('f') des parentés entre `ids` (dans cet ordre)."""
+    ordre, peres, meres = ordonner_pedigree(restreindre_aux_ascendants(pedigree, ids))
+    position = {pk: k for k, pk in enumerate(ordre) if pk is not None}
+    _F, D = _consanguinite_positions(peres, meres)
+    positions = [position[pk] for pk in ids]
+
+    valeurs = array('f')
+    for i, s in enumerate(positions):
+        u = _colonne_parente(s, peres, meres, D)
+        valeurs.extend([0.5 * u[k] for k in positions[:i + 1]])
+    return valeurs
+
+
+def construire_stock():
+    """
+    Écrit le stock de la version de filiation courante (animaux actifs, lus
+    en base) puis supprime les autres versions. Retourne le chemin, ou None
+    si l'index local porte des modifications non validées.
+    """
+    from . import pedigree as module_pedigree
+
+    if module_pedigree.modifications_en_attente():
+        return None
+    # Version lue avant le pedigree : un stock étiqueté d'une version déjà
+    # dépassée est simplement ignoré, l'inverse servirait une filiation périmée.
+    # Index propre à la construction : celui du processus peut dater, et le
+    # worker appelle cette fonction dans la transaction de sa tranche.
+    version = module_pedigree.version_filiation()
+    index = module_pedigree.IndexPedigree.depuis_base(version=version)
+    ids = sorted(ligne.pk for ligne in index.lignes if ligne is not None and ligne.boucle_active)
+    pedigree = index.pedigree(ids)
+
+    debut = time.monotonic()
+    valeurs = calculer_triangle(ids, pedigree)
+    empreinte = empreinte_pedigree(pedigree)
+    repertoire = repertoire_stock()
+    repertoire.mkdir(parents=True, exist_ok=True)
+    chemin = chemin_stock(version)
+    descripteur, temporaire = tempfile.mkstemp(dir=repertoire, prefix='.parente-', suffix='.tmp')
+    try:
+        with os.fdopen(descripteur, 'wb') as f:
+            f.write(ENTETE.pack(SIGNATURE, version, len(ids), empreinte))
+            f.write(array('q', ids).tobytes())
+            f.write(valeurs.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporaire, chemin)
+    except BaseException:
+        with suppress(OSError):
+            os.unlink(temporaire)
+        raise
+    VersionPartagee.objects.update_or_create(nom=CLE_JETON, defaults={'valeur': jeton(empreinte)})
+
+    # Les lecteurs qui ont encore l'ancien fichier en mmap le gardent jusqu'à fermeture
+    for ancien in repertoire.glob('parente-v*.bin'):
+        if ancien != chemin:
+            with suppress(OSError):
+                ancien.unlink()
+    logger.info("[Parenté] Stock v%s écrit : %s animaux en %.2f s", version, len(ids), time.monotonic() - debut)
+    return chemin
+
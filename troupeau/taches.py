@@ -0,0 +1,75 @@
+# troupeau/taches.py
+"""Traitements de fond du troupeau (voir taches/moteur.py)."""
+from taches.moteur import Traitement, traitement
+from taches.models import Tache
+
+from .documents import rendre_pdf
+from .importation import TAILLE_LOT, importer_lignes, lire_fichier, planifier_lignes
+from .stock_parente import construire_stock
+
+
+@traitement('troupeau.import')
+class ImportTroupeau(Traitement):
+    """
+    Import CSV/XLSX : le plan est la liste des numéros de ligne valides,
+    parents avant enfants ; chaque tranche passe par importer_lignes, les
+    parents des tranches précédentes étant alors trouvés en base.
+    """
+    libelle = "Import du troupeau"
+    taille_lot = TAILLE_LOT
+    url_retour = 'troupeau:liste'
+
+    _lignes = None
+
+    def lignes(self, fichier):
+        if self._lignes is None:
+            self._lignes = dict(lire_fichier(fichier))
+        return self._lignes
+
+    def planifier(self, fichier):
+        plan = planifier_lignes(self.lignes(fichier).items())
+        return {'total': plan['lignes'], 'plan': plan['ordre'], 'erreurs': plan['erreurs']}
+
+    def traiter(self, fichier, unites):
+        lignes = self.lignes(fichier)
+        rapport = importer_lignes([(numero, lignes[numero]) for numero in unites], batch_size=self.taille_lot)
+        return {'reussis': rapport['importes'], 'erreurs': rapport['erreurs']}
+
+
+@traitement('troupeau.pdf')
+class DocumentPdf(Traitement):
+    """
+    PDF du troupeau (troupeau/documents.py) : une seule unité, le rendu
+    WeasyPrint complet ; le fichier produit est rangé par le moteur.
+    """
+    libelle = "Document PDF"
+    taille_lot = 1
+    url_retour = 'troupeau:liste'
+
+    def planifier(self, fichier):
+        return {'total': 1, 'plan': [self.tache.parametres['document']], 'erreurs': []}
+
+    def traiter(self, fichier, unites):
+        contenu = rendre_pdf(self.tache.parametres['document'], self.tache.parametres.get('ids'))
+        return {'reussis': 1, 'erreurs': [], 'resultat': (self.tache.nom_fichier, contenu)}
+
+
+@traitement('troupeau.parente')
+class StockParente(Traitement):
+    """
+    Reconstruction du stock de parenté (troupeau/stock_parente.py), demandée
+    par le premier lecteur qui ne trouve pas celui de la version de filiation
+    courante : le calcul O(n²) se fait dans le worker, jamais dans une requête.
+    """
+    libelle = "Stock de parenté"
+    taille_lot = 1
+
+    def planifier(self, fichier):
+        return {'total': 1, 'plan': [self.tache.parametres['version']], 'erreurs': []}
+
+    def traiter(self, fichier, unites):
+        if construire_stock() is None:
+            raise RuntimeError("Modifications de pedigree en attente : stock non écrit.")
+        # Seule la dernière reconstruction reste dans la liste des tâches
+        Tache.objects.filter(type=self.nom, statut=Tache.TERMINEE).exclude(pk=self.tache.pk).delete()
+        return {'reussis': 1, 'erreurs': []}
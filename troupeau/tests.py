@@ -1,3 +1,346 @@
-from django.test import TestCase
+import io
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.signals import request_finished, request_started
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+
+from . import stock_parente
+from .arbre import calculer_noeuds
+from .ascendance import lignes_ascendance
+from .consanguinite import charger_pedigree, coefficient_descendance
+from .importation import importer_lignes, planifier_lignes
+from .models import GENERATIONS_MAX, Ascendance, NoeudArbre, Troupeau, VersionPartagee
+from .pedigree import IndexPedigree, obtenir_index
+
+# Cache et stock de parenté propres aux tests (pas ceux du poste de développement)
+CACHE_TEST = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def creer_animal(boucle, sexe, pere=None, mere=None, **champs):
+    return Troupeau.objects.create(
+        boucle_ovin=boucle, sexe=sexe, pere_boucle=pere, mere_boucle=mere,
+        race='balami', statut='naissance', origine_ovin='pahou', proprietaire_ovin='miguel', **champs,
+    )
+
+
+def coefficient(animal):
+    return Troupeau.objects.values_list('coefficient_consanguinite', flat=True).get(pk=animal.pk)
+
+
+class PedigreeMixin:
+    """
+    Pedigree connu :
+        P × M  -> S (mâle), D (femelle)   pleins frère et sœur
+        P × M2 -> H (femelle)             demi-sœur de S
+        S × D  -> X (femelle)             F = 1/4
+        S × H  -> Y                       F = 1/8
+        S × X  -> Z                       F = 3/8 (père × sa fille consanguine)
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.p = creer_animal('P', 'male')
+        self.m = creer_animal('M', 'femelle')
+        self.m2 = creer_animal('M2', 'femelle')
+        self.s = creer_animal('S', 'male', self.p, self.m)
+        self.d = creer_animal('D', 'femelle', self.p, self.m)
+        self.h = creer_animal('H', 'femelle', self.p, self.m2)
+        self.x = creer_animal('X', 'femelle', self.s, self.d)
+        self.y = creer_animal('Y', 'male', self.s, self.h)
+        self.z = creer_animal('Z', 'male', self.s, self.x)
+
+
+@override_settings(CACHES=CACHE_TEST, PARENTE_STOCK_DIR=tempfile.mkdtemp(prefix='parente-tests-'))
+class ConsanguiniteTests(PedigreeMixin, TransactionTestCase):
+
+    def test_coefficients_enregistres(self):
+        self.assertEqual(coefficient(self.s), 0.0)
+        self.assertEqual(coefficient(self.x), 0.25)
+        self.assertEqual(coefficient(self.y), 0.125)
+        self.assertEqual(coefficient(self.z), 0.375)
+
+    def test_parente_des_couples(self):
+        self.assertEqual(coefficient_descendance(self.s.pk, self.d.pk), 0.25)
+        self.assertEqual(coefficient_descendance(self.s.pk, self.h.pk), 0.125)
+        self.assertEqual(coefficient_descendance(self.p.pk, self.m2.pk), 0.0)
+        self.assertEqual(coefficient_descendance(self.s.pk, self.x.pk), 0.375)
+
+    def test_changement_de_parent_propage_aux_descendants(self):
+        # X n'est plus issue de S × D mais de P × M2 : X non consanguine, Z = S × demi-sœur
+        self.x.pere_boucle, self.x.mere_boucle = self.p, self.m2
+        self.x.save()
+        self.assertEqual(coefficient(self.x), 0.0)
+        self.assertEqual(coefficient(self.z), 0.125)
+
+    def test_suppression_d_un_parent_propage_aux_descendants(self):
+        from genealogie.models import Genealogie
+
+        genealogie = Genealogie.objects.create(agneau=self.z, pere=self.s, mere=self.x)
+        self.assertEqual(Genealogie.objects.get(pk=genealogie.pk).fa, 0.375)
+        # X perd sa mère (SET_NULL) : X non consanguine, Z = S × sa fille non consanguine
+        self.d.delete()
+        self.assertEqual(coefficient(self.x), 0.0)
+        self.assertEqual(coefficient(self.z), 0.25)
+        self.assertEqual(Genealogie.objects.get(pk=genealogie.pk).fa, 0.25)
+
+
+@override_settings(CACHES=CACHE_TEST, PARENTE_STOCK_DIR=tempfile.mkdtemp(prefix='parente-tests-'))
+class FermetureTests(PedigreeMixin, TransactionTestCase):
+    """Table de fermeture maintenue pas à pas = reconstruction complète."""
+
+    def assertCoherent(self):
+        attendues = sorted(lignes_ascendance(charger_pedigree()))
+        self.assertEqual(
+            sorted(Ascendance.objects.values_list('ancetre_id', 'descendant_id', 'profondeur', 'cote')),
+            attendues,
+        )
+
+    def test_creation(self):
+        self.assertCoherent()
+
+    def test_changement_de_parents(self):
+        self.x.mere_boucle = self.h
+        self.x.save()
+        self.assertCoherent()
+        self.d.pere_boucle = None
+        self.d.save()
+        self.assertCoherent()
+
+    def test_suppression_d_un_ancetre(self):
+        Troupeau.objects.filter(pk=self.d.pk).delete()
+        self.assertCoherent()
+        self.s.delete()
+        self.assertCoherent()
+
+    def test_suppression_en_masse(self):
+        Troupeau.objects.filter(pk__in=[self.s.pk, self.x.pk]).delete()
+        self.assertCoherent()
+
+
+class ArbreTests(FermetureTests):
+    """Mêmes scénarios pour l'arbre d'affichage (NoeudArbre) : égal à un recalcul complet."""
+
+    def assertCoherent(self):
+        noeuds = calculer_noeuds(Troupeau.objects.values_list('id', 'pere_boucle_id', 'mere_boucle_id'))
+        self.assertEqual(
+            sorted(NoeudArbre.objects.values_list('animal_id', 'parent_id', 'chemin', 'profondeur')),
+            sorted(noeuds),
+        )
+
+
+@override_settings(CACHES=CACHE_TEST, PARENTE_STOCK_DIR=tempfile.mkdtemp(prefix='parente-tests-'))
+class ArbreGenealogiqueTests(PedigreeMixin, TransactionTestCase):
+
+    def boucles(self, arbre):
+        return [[a.boucle_ovin if a else None for a in animaux] for animaux in arbre]
+
+    def test_numerotation_de_sosa(self):
+        with self.assertNumQueries(1):
+            arbre = Troupeau.objects.arbre_genealogique(self.z.pk, generations=3)
+        # S est à la fois père (case 2) et grand-père maternel (case 6) de Z
+        self.assertEqual(self.boucles(arbre), [
+            ['Z'],
+            ['S', 'X'],
+            ['P', 'M', 'S', 'D'],
+            [None, None, None, None, 'P', 'M', 'P', 'M'],
+        ])
+        self.assertEqual(arbre[2][2].pk, self.s.pk)
+
+    def test_fiche_genealogie_prioritaire(self):
+        from genealogie.models import Genealogie
+
+        Genealogie.objects.create(agneau=self.y, pere=self.s, mere=self.d)
+        self.assertEqual(self.boucles(Troupeau.objects.arbre_genealogique(self.y.pk, generations=2)),
+                         [['Y'], ['S', 'D'], ['P', 'M', 'P', 'M']])
+
+    def test_bornes(self):
+        self.assertEqual(Troupeau.objects.arbre_genealogique(0), [])
+        self.assertEqual(self.boucles(Troupeau.objects.arbre_genealogique(self.s.pk, generations=0)), [['S']])
+        self.assertEqual(len(Troupeau.objects.arbre_genealogique(self.s.pk, generations=50)), GENERATIONS_MAX + 1)
+
+
+@override_settings(CACHES=CACHE_TEST, PARENTE_STOCK_DIR=tempfile.mkdtemp(prefix='parente-tests-'))
+class SauvegardeTests(PedigreeMixin, TransactionTestCase):
+    """Troupeau.save() ne valide et ne recalcule que ce qui concerne les champs écrits."""
+
+    def test_changement_sans_filiation(self):
+        animal = Troupeau.objects.get(pk=self.x.pk)
+        animal.observations = 'boiterie'
+        animal.statut = 'vendu'
+        with mock.patch.object(Troupeau, '_erreurs_parents', side_effect=AssertionError), \
+                mock.patch('troupeau.consanguinite.propager_consanguinite', side_effect=AssertionError):
+            animal.save()
+        self.assertEqual(
+            Troupeau.objects.filter(pk=animal.pk).values_list('observations', 'boucle_active').get(),
+            ('boiterie', False),
+        )
+
+    def test_boucle_active_ajoutee_aux_champs_ecrits(self):
+        animal = Troupeau.objects.get(pk=self.y.pk)
+        animal.statut = 'decede'
+        animal.save(update_fields=['statut'])
+        self.assertFalse(Troupeau.objects.get(pk=animal.pk).boucle_active)
+
+    def test_seuls_les_champs_ecrits_sont_valides(self):
+        animal = Troupeau.objects.get(pk=self.z.pk)
+        animal.poids_initial = -1
+        animal.observations = 'pesée à refaire'
+        animal.save(update_fields=['observations'])
+        with self.assertRaises(ValidationError) as erreur:
+            animal.save()
+        self.assertEqual(list(erreur.exception.message_dict), ['poids_initial'])
+
+        # Parents relus et validés quand la filiation change
+        animal = Troupeau.objects.get(pk=self.z.pk)
+        animal.mere_boucle = self.p
+        with self.assertRaises(ValidationError) as erreur:
+            animal.save()
+        self.assertEqual(list(erreur.exception.message_dict), ['mere_boucle'])
+
+    def test_boucle_active_en_double(self):
+        animal = Troupeau.objects.get(pk=self.y.pk)
+        animal.boucle_ovin = 'Z'
+        with self.assertRaises(ValidationError) as erreur:
+            animal.save()
+        self.assertEqual(list(erreur.exception.message_dict), ['boucle_ovin'])
+        self.assertEqual(Troupeau.objects.get(pk=self.y.pk).boucle_ovin, 'Y')
+
+
+@override_settings(CACHES=CACHE_TEST, PARENTE_STOCK_DIR=tempfile.mkdtemp(prefix='parente-tests-'))
+class RecalculCommandeTests(PedigreeMixin, TransactionTestCase):
+
+    def test_recompute_inbreeding_aligne_genealogie(self):
+        from genealogie.models import Genealogie
+
+        genealogie = Genealogie.objects.create(agneau=self.z, pere=self.s, mere=self.x)
+        Troupeau.objects.update(coefficient_consanguinite=0.0)
+        Genealogie.objects.update(fa=0.0)
+        call_command('recompute_inbreeding', '--chunk-size', '3', stdout=io.StringIO())
+        self.assertEqual(coefficient(self.x), 0.25)
+        self.assertEqual(coefficient(self.z), 0.375)
+        self.assertEqual(Genealogie.objects.get(pk=genealogie.pk).fa, 0.375)
+
+
+@override_settings(CACHES=CACHE_TEST, PARENTE_STOCK_DIR=tempfile.mkdtemp(prefix='parente-tests-'))
+class IndexPedigreeTests(PedigreeMixin, TransactionTestCase):
+
+    def test_aucune_requete_dans_une_requete_http(self):
+        request_started.send(sender=None)
+        try:
+            obtenir_index()
+            stock_parente.coefficient_couple(self.s.pk, self.d.pk)
+            with self.assertNumQueries(0):
+                index = obtenir_index()
+                index.parente(self.s.pk, self.d.pk)
+                self.assertEqual(stock_parente.coefficient_couple(self.s.pk, self.d.pk), 0.25)
+        finally:
+            request_finished.send(sender=None)
+
+    def test_savepoint_annule_dans_la_transaction(self):
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    self.x.mere_boucle = self.h
+                    self.x.save()
+                    self.assertEqual(obtenir_index().parents(self.x.pk), (self.s.pk, self.h.pk))
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            self.assertEqual(obtenir_index().parents(self.x.pk), (self.s.pk, self.d.pk))
+
+    def test_rollback_puis_nouvelle_transaction(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.x.mere_boucle = self.h
+                self.x.save()
+                raise RuntimeError
+        with transaction.atomic():
+            self.assertEqual(obtenir_index().parents(self.x.pk), (self.s.pk, self.d.pk))
+
+
+@override_settings(CACHES=CACHE_TEST, PARENTE_STOCK_DIR=tempfile.mkdtemp(prefix='parente-tests-'))
+class StockParenteTests(PedigreeMixin, TransactionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        stock_parente._stock = None
+        stock_parente.construire_stock()
+
+    def test_lecture_du_stock(self):
+        # Ouverture : version de filiation et jeton, sans recharger le pedigree
+        with self.assertNumQueries(2):
+            stock = stock_parente.obtenir_stock(reconstruire=False)
+        self.assertIsNotNone(stock)
+        request_started.send(sender=None)
+        try:
+            stock_parente.obtenir_stock(reconstruire=False)
+            with self.assertNumQueries(0):
+                self.assertEqual(stock_parente.matrice_parente([self.s.pk, self.p.pk], [self.d.pk, self.h.pk]),
+                                 [[0.25, 0.125], [0.25, 0.25]])
+        finally:
+            request_finished.send(sender=None)
+        self.assertEqual(stock_parente.coefficient_couple(self.s.pk, self.x.pk), 0.375)
+
+    def test_jeton_d_une_autre_base(self):
+        VersionPartagee.objects.filter(nom=stock_parente.CLE_JETON).update(valeur=0)
+        self.assertIsNone(stock_parente.obtenir_stock(reconstruire=False))
+        # Repli sur le calcul direct
+        self.assertEqual(stock_parente.matrice_parente([self.s.pk], [self.d.pk]), [[0.25]])
+
+
+def ligne_import(boucle, sexe, pere='', mere=''):
+    return {
+        'boucle_ovin': boucle, 'sexe': sexe, 'pere_boucle': pere, 'mere_boucle': mere,
+        'race': 'balami', 'statut': 'naissance', 'origine_ovin': 'pahou', 'proprietaire_ovin': 'miguel',
+    }
+
+
+@override_settings(CACHES=CACHE_TEST, PARENTE_STOCK_DIR=tempfile.mkdtemp(prefix='parente-tests-'))
+class ImportationTests(PedigreeMixin, TransactionTestCase):
+    """N1 = S × N2, N2 pleine sœur de S déclarée plus bas dans le fichier : F(N1) = 1/4."""
+
+    def lignes(self):
+        return [
+            (2, ligne_import('N1', 'femelle', 'S', 'N2')),
+            (3, ligne_import('N2', 'femelle', 'P', 'M')),
+            (4, ligne_import('S', 'male')),                  # déjà active dans le troupeau
+            (5, ligne_import('N3', 'male', 'P', 'M2')),
+            (6, ligne_import('N3', 'male')),                 # doublon dans le fichier
+            (7, ligne_import('N4', 'male', 'S', 'N9')),      # mère introuvable
+        ]
+
+    def verifier_import(self):
+        n1, n2, n3 = (Troupeau.objects.get(boucle_ovin=b, boucle_active=True) for b in ('N1', 'N2', 'N3'))
+        self.assertEqual((n1.pere_boucle_id, n1.mere_boucle_id), (self.s.pk, n2.pk))
+        self.assertEqual(coefficient(n1), 0.25)
+        self.assertEqual(coefficient(n3), 0.0)
+        self.assertEqual(obtenir_index().parents(n1.pk), (self.s.pk, n2.pk))
+        self.assertEqual(
+            sorted(Ascendance.objects.values_list('ancetre_id', 'descendant_id', 'profondeur', 'cote')),
+            sorted(lignes_ascendance(charger_pedigree())),
+        )
+        self.assertFalse(Troupeau.objects.filter(boucle_ovin='N4').exists())
+
+    def test_parents_plus_bas_et_doublons(self):
+        rapport = importer_lignes(self.lignes())
+        self.assertEqual((rapport['lignes'], rapport['importes']), (6, 3))
+        self.assertEqual([e['ligne'] for e in rapport['erreurs']], [4, 6, 7])
+        self.verifier_import()
+
+    def test_import_par_tranches(self):
+        lignes = dict(self.lignes())
+        plan = planifier_lignes(lignes.items())
+        # Parents avant enfants : N2 avant N1
+        self.assertLess(plan['ordre'].index(3), plan['ordre'].index(2))
+        self.assertEqual(sorted(plan['ordre']), [2, 3, 5])
+
+        obtenir_index()
+        # Les tranches patchent l'index du processus sans recharger le troupeau
+        with mock.patch.object(IndexPedigree, 'depuis_base', side_effect=AssertionError):
+            for numero in plan['ordre']:
+                self.assertEqual(importer_lignes([(numero, lignes[numero])])['importes'], 1)
+        self.verifier_import()
@@ -28,6 +28,7 @@ urlpatterns = [
 
     # ⚠️ Harmonisé avec tes templates : `rapport_consanguinite`
     path('rapport-consanguinite/', views.rapport_consanguinite, name='rapport_consanguinite'),
+    path('rapport-genetique/', views.rapport_genetique, name='rapport_genetique'),
 
     # === ACTIONS ET OUTILS ===
     path('actions-masse/', views.troupeau_actions_masse, name='actions_masse'),
@@ -54,8 +55,10 @@ urlpatterns = [
     path('api/recherche/', views.api_recherche_animaux, name='api_recherche'),
     path('api/parents-disponibles/', views.api_parents_disponibles, name='api_parents_disponibles'),
     path('api/genealogie/<int:pk>/', views.api_genealogie, name='api_genealogie'),
+    path('api/arbre/<int:pk>/enfants/', views.api_arbre_enfants, name='api_arbre_enfants'),
     path('api/valider-boucle/', views.api_valider_boucle, name='api_valider_boucle'),
     path('api/calculer-consanguinite/', views.api_calculer_consanguinite, name='api_calculer_consanguinite'),
+    path('api/matrice-consanguinite/', views.api_matrice_consanguinite, name='api_matrice_consanguinite'),
 
     # === UTILITAIRES ===
     path('etiquettes/', views.generer_etiquettes, name='etiquettes'),
@@ -72,10 +75,10 @@ urlpatterns = [
     path('race/<str:race>/', views.troupeau_par_race, name='par_race'),
     path('proprietaire/<str:proprietaire>/', views.troupeau_par_proprietaire, name='par_proprietaire'),
 
-    # === MAINTENANCE ET ADMIN (placeholder -> redirige vers liste) ===
+    # === MAINTENANCE ET ADMIN (placeholders -> redirigent vers liste, sauf nettoyage) ===
     path('maintenance/', include([
         path('', RedirectView.as_view(pattern_name='troupeau:liste'), name='maintenance'),
-        path('nettoyer-historique/', RedirectView.as_view(pattern_name='troupeau:liste'), name='nettoyer_historique'),
+        path('nettoyer-historique/', views.nettoyer_historique, name='nettoyer_historique'),
         path('verifier-coherence/', RedirectView.as_view(pattern_name='troupeau:liste'), name='verifier_coherence'),
         path('sauvegarder/', RedirectView.as_view(pattern_name='troupeau:liste'), name='sauvegarder'),
         path('restaurer/', RedirectView.as_view(pattern_name='troupeau:liste'), name='restaurer'),
@@ -84,7 +87,7 @@ urlpatterns = [
     # === URLS SPÉCIALISÉES PAR CONTEXTE (placeholders) ===
     path('elevage/', include([
         path('', RedirectView.as_view(pattern_name='troupeau:liste'), name='dashboard_elevage'),
-        path('saillies/', RedirectView.as_view(pattern_name='troupeau:liste'), name='planning_saillies'),
+        path('saillies/', views.planning_saillies, name='planning_saillies'),
         path('gestations/', RedirectView.as_view(pattern_name='troupeau:liste'), name='suivi_gestations'),
         path('naissances/', RedirectView.as_view(pattern_name='troupeau:liste'), name='registre_naissances'),
     ])),
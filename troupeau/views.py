@@ -1,49 +1,41 @@
 # troupeau/views.py
 from datetime import datetime
 import csv
-from io import TextIOWrapper, BytesIO
 
 from django.contrib import messages
+from django.contrib.auth.decorators import user_passes_test
+from django.core.paginator import Paginator
 from django.db.models import Q, Count
-from django.http import HttpResponse, JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse_lazy, reverse
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView
 
+from pahou.exports import iterer, libelles, reponse_csv, reponse_xlsx
+from taches.models import Tache
+from taches.moteur import soumettre
+
+from .arbre import compter_enfants, enfants_affichage
+from .consanguinite import matrice_accouplements, recalculer_coefficients, recalculer_fa_genealogies
+from .documents import GABARITS, contexte_document, demander_document, pdf_disponible
 from .forms import TroupeauForm
-from .models import Troupeau
+from .models import NoeudArbre, Troupeau
+from .pedigree import obtenir_index
+from .stock_parente import coefficient_couple
 
 
 # =========================
 # Helpers internes
 # =========================
 
-def _parse_date(val):
-    """Accepte 'YYYY-MM-DD' ou 'DD/MM/YYYY' -> date | None"""
-    if not val:
-        return None
-    s = str(val).strip()
-    if not s:
-        return None
-    for fmt in ("%Y-%m-%d", "%d/%m/%Y"):
-        try:
-            return datetime.strptime(s, fmt).date()
-        except ValueError:
-            continue
-    raise ValueError(f"Date invalide: {val} (formats attendus: YYYY-MM-DD ou DD/MM/YYYY)")
+GENERATIONS_PAR_DEFAUT = 4
+# Nœuds par page dans la vue arbre (racines et enfants d'un nœud)
+ARBRE_PAR_PAGE = 50
 
 
-def _parse_float(val):
-    """Accepte '12.3' ou '12,3' -> float | None"""
-    if val is None:
-        return None
-    s = str(val).strip()
-    if s == "":
-        return None
-    try:
-        return float(s.replace(",", "."))
-    except ValueError:
-        raise ValueError(f"Nombre invalide: {val}")
+def _libelle_generation(g):
+    libelles = {1: 'Parents', 2: 'Grands-parents', 3: 'Arrière-grands-parents'}
+    return libelles.get(g, f"{g}e génération")
 
 
 # =========================
@@ -109,6 +101,19 @@ def rapport_consanguinite(request):
     return render(request, 'troupeau/rapport_consanguinite.html', {'animaux': animaux})
 
 
+def rapport_genetique(request):
+    """
+    Génétique des populations par race et année de naissance : F moyen, ΔF,
+    Ne, générations équivalentes, complétude (MacCluer), intervalle de génération.
+    Calcul en une passe sur le pedigree, mis en cache jusqu'au prochain changement.
+    """
+    from .genetique import PROFONDEUR_MACCLUER, rapport_population_cache
+    return render(request, 'troupeau/rapport_genetique.html', {
+        'races': rapport_population_cache(),
+        'profondeur': PROFONDEUR_MACCLUER,
+    })
+
+
 def troupeau_actions_masse(request):
     if request.method == 'POST':
         messages.info(request, "Aucune action de masse définie pour le moment.")
@@ -118,14 +123,52 @@ def troupeau_actions_masse(request):
 
 def recalculer_consanguinite(request):
     if request.method == 'POST':
-        for animal in Troupeau.objects.all():
-            # la logique de recalcul peut être déclenchée dans save()
-            animal.save()
-        messages.success(request, 'Coefficients de consanguinité recalculés !')
+        # Calcul en une passe sur tout le pedigree + bulk_update des lignes modifiées
+        nb = recalculer_coefficients()
+        nb_fa = recalculer_fa_genealogies()
+        messages.success(
+            request,
+            f'Coefficients de consanguinité recalculés ! ({nb} animal(aux), {nb_fa} généalogie(s) mis à jour)'
+        )
         return redirect('troupeau:liste')
     return render(request, 'troupeau/confirm_recalcul.html')
 
 
+def _limite(valeur, defaut):
+    """Limite saisie (entier, 0 = aucune) ; `defaut` si vide ou invalide."""
+    valeur = (valeur or '').strip()
+    if not valeur.isdigit():
+        return defaut
+    return int(valeur) or None
+
+
+@user_passes_test(lambda u: u.is_active and u.is_staff)
+def nettoyer_historique(request):
+    """Purge de l'historique hors rétention (voir historiquetroupeau/retention.py)."""
+    from historiquetroupeau.retention import lignes_a_purger, parametres_retention, purger_historique
+
+    nombre, jours = parametres_retention()
+    source = request.POST if request.method == 'POST' else request.GET
+    nombre = _limite(source.get('garder'), nombre)
+    jours = _limite(source.get('jours'), jours)
+
+    if request.method == 'POST':
+        if nombre is None and jours is None:
+            messages.warning(request, "Aucune limite de rétention : rien à purger.")
+        else:
+            resultat = purger_historique(nombre, jours, archiver=bool(request.POST.get('archiver')))
+            archive = f" (archive : {resultat['archive'].name})" if resultat['archive'] else ""
+            messages.success(request, f"Historique nettoyé : {resultat['supprimees']} ligne(s) supprimée(s){archive}.")
+        return redirect('troupeau:nettoyer_historique')
+
+    a_purger = lignes_a_purger(nombre, jours).count() if (nombre or jours) else 0
+    return render(request, 'troupeau/nettoyer_historique.html', {
+        'garder': nombre,
+        'jours': jours,
+        'a_purger': a_purger,
+    })
+
+
 def valider_donnees_troupeau(request):
     anomalies = []
     # Ex: doublons de boucle active
@@ -169,45 +212,25 @@ def rapport_reproducteurs(request):
 
 
 def import_troupeau(request):
+    """
+    Import CSV/XLSX en masse : le fichier est confié à une tâche de fond
+    (troupeau/taches.py, worker `traiter_taches`) dont on suit l'avancement.
+    Un fichier déjà envoyé renvoie vers sa tâche au lieu d'être réimporté.
+    """
     if request.method == 'POST' and request.FILES.get('fichier_import'):
         fichier = request.FILES['fichier_import']
-        try:
-            lignes = csv.DictReader(TextIOWrapper(fichier.file, encoding='utf-8'), delimiter=';')
-            compteur = 0
-            erreurs = []
-
-            for ligne in lignes:
-                try:
-                    Troupeau.objects.create(
-                        boucle_ovin=(ligne.get('boucle_ovin') or '').strip(),
-                        sexe=(ligne.get('sexe') or '').strip(),
-                        race=(ligne.get('race') or '').strip(),
-                        naissance_date=_parse_date(ligne.get('naissance_date')),
-                        statut=(ligne.get('statut') or '').strip(),
-                        proprietaire_ovin=(ligne.get('proprietaire_ovin') or '').strip(),
-                        origine_ovin=(ligne.get('origine_ovin') or '').strip(),
-                        poids_initial=_parse_float(ligne.get('poids_initial')),
-                        taille_initiale=_parse_float(ligne.get('taille_initiale')),
-                        observations=(ligne.get('observations') or '').strip() or None
-                    )
-                    compteur += 1
-                except Exception as e:
-                    erreurs.append(f"Ligne {lignes.line_num}: {str(e)}")
-
-            if erreurs:
-                messages.warning(request, f"{compteur} animaux importés, {len(erreurs)} erreurs.")
-                for erreur in erreurs[:5]:
-                    messages.error(request, erreur)
-            else:
-                messages.success(request, f"{compteur} animaux importés avec succès !")
-
-            return redirect('troupeau:liste')
-
-        except Exception as e:
-            messages.error(request, f"Erreur lors de l'import: {str(e)}")
+        if not fichier.name.lower().endswith(('.csv', '.xlsx', '.xlsm')):
+            messages.error(request, "Format non pris en charge : fichier .csv ou .xlsx attendu.")
             return redirect('troupeau:import')
+        tache, creee = soumettre('troupeau.import', fichier, utilisateur=request.user)
+        if creee:
+            messages.success(request, f"Fichier reçu : import n° {tache.pk} programmé.")
+        else:
+            messages.info(request, f"Ce fichier a déjà été envoyé : suivi de l'import n° {tache.pk}.")
+        return redirect('taches:detail', pk=tache.pk)
 
-    return render(request, 'troupeau/import.html')
+    imports = Tache.objects.filter(type='troupeau.import').select_related('cree_par')[:10]
+    return render(request, 'troupeau/import.html', {'imports': imports})
 
 
 def download_import_template(request):
@@ -222,153 +245,113 @@ def download_import_template(request):
     return response
 
 
+EXPORT_ENTETES = [
+    'Numéro de boucle', 'Sexe', 'Race', 'Date de naissance',
+    'Père', 'Mère', 'Statut', 'Propriétaire',
+    'Coefficient de consanguinité', 'Remarques'
+]
+
+
+def _lignes_export():
+    """
+    Lignes d'export du troupeau (ordre EXPORT_ENTETES) en une requête lue par
+    lots : boucles des parents par jointure, libellés des choix en mémoire.
+    Date et coefficient restent bruts (mis en forme par chaque format).
+    """
+    sexe = libelles(Troupeau.SEXE_CHOIX)
+    race = libelles(Troupeau.RACE_CHOIX)
+    statut = libelles(Troupeau.STATUT_CHOIX)
+    proprietaire = libelles(Troupeau.PROPRIETAIRE_CHOIX)
+    for (boucle, s, r, naissance, pere, mere, st, p, coefficient, observations) in iterer(
+        Troupeau.objects.order_by('boucle_ovin'),
+        'boucle_ovin', 'sexe', 'race', 'naissance_date',
+        'pere_boucle__boucle_ovin', 'mere_boucle__boucle_ovin',
+        'statut', 'proprietaire_ovin', 'coefficient_consanguinite', 'observations',
+    ):
+        yield [boucle, sexe(s), race(r), naissance, pere or '', mere or '', statut(st), proprietaire(p),
+               coefficient, observations or '']
+
+
 def export_troupeau_csv(request):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="troupeau_export_{datetime.now().date()}.csv"'
-    writer = csv.writer(response, delimiter=';')
-    writer.writerow([
-        'Numéro de boucle', 'Sexe', 'Race', 'Date de naissance',
-        'Père', 'Mère', 'Statut', 'Propriétaire',
-        'Coefficient de consanguinité', 'Remarques'
-    ])
-    for animal in Troupeau.objects.all().order_by('boucle_ovin'):
-        writer.writerow([
-            animal.boucle_ovin,
-            getattr(animal, 'get_sexe_display', lambda: animal.sexe)(),
-            getattr(animal, 'get_race_display', lambda: animal.race)(),
-            animal.naissance_date.strftime('%d/%m/%Y') if animal.naissance_date else '',
-            animal.pere_boucle.boucle_ovin if animal.pere_boucle else '',
-            animal.mere_boucle.boucle_ovin if animal.mere_boucle else '',
-            getattr(animal, 'get_statut_display', lambda: animal.statut)(),
-            getattr(animal, 'get_proprietaire_ovin_display', lambda: animal.proprietaire_ovin)(),
-            f"{animal.coefficient_consanguinite:.5f}".replace('.', ',') if animal.coefficient_consanguinite is not None else '',
-            animal.observations or ''
-        ])
-    return response
+    def formater():
+        for ligne in _lignes_export():
+            naissance, coefficient = ligne[3], ligne[8]
+            ligne[3] = naissance.strftime('%d/%m/%Y') if naissance else ''
+            ligne[8] = f"{coefficient:.5f}".replace('.', ',') if coefficient is not None else ''
+            yield ligne
+
+    return reponse_csv(f"troupeau_export_{datetime.now().date()}.csv", EXPORT_ENTETES, formater())
 
 
 def export_troupeau_excel(request):
+    def formater():
+        for ligne in _lignes_export():
+            coefficient = ligne[8]
+            ligne[8] = round(coefficient, 5) if coefficient is not None else 0.0
+            yield ligne
+
     try:
-        import openpyxl
+        return reponse_xlsx(f"troupeau_export_{datetime.now().date()}.xlsx", [
+            ("Troupeau", EXPORT_ENTETES, formater()),
+        ])
     except ImportError:
         messages.error(request, "La fonctionnalité Excel nécessite la librairie openpyxl")
         return redirect('troupeau:liste')
 
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Troupeau"
-    ws.append([
-        'Numéro de boucle', 'Sexe', 'Race', 'Date de naissance',
-        'Père', 'Mère', 'Statut', 'Propriétaire',
-        'Coefficient de consanguinité', 'Remarques'
-    ])
-    for animal in Troupeau.objects.all().order_by('boucle_ovin'):
-        ws.append([
-            animal.boucle_ovin,
-            getattr(animal, 'get_sexe_display', lambda: animal.sexe)(),
-            getattr(animal, 'get_race_display', lambda: animal.race)(),
-            animal.naissance_date,
-            animal.pere_boucle.boucle_ovin if animal.pere_boucle else '',
-            animal.mere_boucle.boucle_ovin if animal.mere_boucle else '',
-            getattr(animal, 'get_statut_display', lambda: animal.statut)(),
-            getattr(animal, 'get_proprietaire_ovin_display', lambda: animal.proprietaire_ovin)(),
-            float(f"{animal.coefficient_consanguinite:.5f}") if animal.coefficient_consanguinite is not None else 0.0,
-            animal.observations or ''
-        ])
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
 
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="troupeau_export_{datetime.now().date()}.xlsx"'
-    response.write(buffer.read())
-    return response
+def _document_pdf(request, document, ids=None, retour='troupeau:liste'):
+    """
+    Confie le PDF à une tâche de fond (troupeau/documents.py) : un document
+    inchangé depuis sa dernière génération est servi aussitôt, sinon on suit
+    la tâche sur sa page (les erreurs de rendu y sont affichées).
+    """
+    if not pdf_disponible():
+        messages.error(request, "Export PDF indisponible : WeasyPrint n'est pas installé sur le serveur.")
+        return redirect(retour)
+    tache, creee = demander_document(document, ids, utilisateur=request.user)
+    if tache.statut == Tache.TERMINEE:
+        return redirect('taches:telecharger', pk=tache.pk)
+    if not creee:
+        messages.info(request, f"Ce document est déjà en cours de génération (tâche n° {tache.pk}).")
+    return redirect('taches:detail', pk=tache.pk)
 
 
 def export_troupeau_pdf(request):
-    try:
-        from django.template.loader import render_to_string
-        from weasyprint import HTML
-    except Exception:
-        messages.error(request, "Export PDF indisponible (WeasyPrint manquant ?)")
-        return redirect('troupeau:liste')
-
-    animaux = Troupeau.objects.all().order_by('boucle_ovin')
-    html_string = render_to_string('troupeau/export_pdf.html', {
-        'animaux': animaux,
-        'today': datetime.now()
-    })
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename=\"troupeau_export_{datetime.now().date()}.pdf\"'
-    HTML(string=html_string).write_pdf(target=response)
-    return response
+    return _document_pdf(request, 'export')
 
 
 # =========================
 # Étiquettes (HTML/PDF)
 # =========================
 
+def _ids_etiquettes(request):
+    ids = (request.GET.get('ids') or '').strip()
+    if not ids:
+        return None
+    return [int(x) for x in ids.split(',') if x.strip().isdigit()]
+
+
 def generer_etiquettes(request):
     """
     ?ids=1,2,3 pour limiter aux IDs
-    ?format=pdf pour export PDF (fallback HTML si erreur)
+    ?format=pdf pour export PDF (tâche de fond, voir _document_pdf)
     """
-    ids = (request.GET.get('ids') or '').strip()
     fmt = (request.GET.get('format') or 'html').lower()
-
-    if ids:
-        try:
-            id_list = [int(x) for x in ids.split(',') if x.strip().isdigit()]
-        except ValueError:
-            id_list = []
-        animaux = Troupeau.objects.filter(pk__in=id_list)
-    else:
-        animaux = Troupeau.objects.filter(boucle_active=True)
-
-    animaux = animaux.order_by('boucle_ovin')
-    context = {"animaux": animaux, "today": datetime.now()}
-
+    ids = _ids_etiquettes(request)
     if fmt == 'pdf':
-        try:
-            from django.template.loader import render_to_string
-            from weasyprint import HTML
-
-            html_string = render_to_string("troupeau/etiquettes.html", context)
-            response = HttpResponse(content_type="application/pdf")
-            response["Content-Disposition"] = f'attachment; filename=\"etiquettes_{datetime.now().date()}.pdf\"'
-            HTML(string=html_string).write_pdf(target=response)
-            return response
-        except Exception:
-            pass  # fallback HTML
-
-    return render(request, "troupeau/etiquettes.html", context)
+        return _document_pdf(request, 'etiquettes', ids)
+    return render(request, GABARITS['etiquettes'], contexte_document('etiquettes', ids))
 
 
 def generer_etiquette_individuelle(request, pk):
     """
-    ?format=pdf pour export PDF (fallback HTML si indisponible)
+    ?format=pdf pour export PDF (tâche de fond, voir _document_pdf)
     """
     animal = get_object_or_404(Troupeau, pk=pk)
     fmt = (request.GET.get('format') or "html").lower()
-    context = {"animal": animal, "today": datetime.now()}
-
     if fmt == "pdf":
-        try:
-            from django.template.loader import render_to_string
-            from weasyprint import HTML
-
-            html_string = render_to_string("troupeau/etiquette_individuelle.html", context)
-            response = HttpResponse(content_type="application/pdf")
-            filename = f"etiquette_{animal.boucle_ovin}_{datetime.now().date()}.pdf"
-            response["Content-Disposition"] = f'attachment; filename=\"{filename}\"'
-            HTML(string=html_string).write_pdf(target=response)
-            return response
-        except Exception:
-            pass  # fallback HTML
-
-    return render(request, "troupeau/etiquette_individuelle.html", context)
+        return _document_pdf(request, 'etiquette', [animal.pk], retour=reverse('troupeau:detail', args=[animal.pk]))
+    return render(request, GABARITS['etiquette'], {"animal": animal, "today": datetime.now()})
 
 
 # =========================
@@ -431,6 +414,15 @@ class TroupeauDetailView(DetailView):
     template_name = 'troupeau/detail.html'
     context_object_name = 'animal'
 
+    def get_object(self, queryset=None):
+        # Animal + ascendance sur N générations en une seule requête (CTE récursive)
+        generations = self.request.GET.get('generations') or ''
+        generations = int(generations) if generations.isdigit() else GENERATIONS_PAR_DEFAUT
+        self.arbre = Troupeau.objects.arbre_genealogique(self.kwargs['pk'], generations=max(2, generations))
+        if not self.arbre:
+            raise Http404("Animal introuvable")
+        return self.arbre[0][0]
+
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         a = self.object
@@ -438,20 +430,20 @@ class TroupeauDetailView(DetailView):
         # Onglet actif
         tab = (self.request.GET.get('tab') or 'profil').lower()
 
-        # Parents
-        pere = a.pere_boucle
-        mere = a.mere_boucle
-
-        # Grands-parents (si disponibles)
-        gp_pp = pere.pere_boucle if pere else None
-        gp_pm = pere.mere_boucle if pere else None
-        gp_mp = mere.pere_boucle if mere else None
-        gp_mm = mere.mere_boucle if mere else None
-
-        # Enfants directs (on ne dépend pas d'une méthode custom incertaine)
-        enfants = Troupeau.objects.filter(
-            Q(pere_boucle=a) | Q(mere_boucle=a)
-        ).order_by('boucle_ovin')
+        # Parents et grands-parents : cases de Sosa de l'arbre déjà chargé
+        pere, mere = self.arbre[1]
+        gp_pp, gp_pm, gp_mp, gp_mm = self.arbre[2]
+
+        # Descendance lue dans la table d'ascendance (côtés père et mère)
+        enfants = None
+        descendants_par_generation = []
+        if tab == 'descendance':
+            enfants = a.get_descendants().order_by('boucle_ovin')
+            descendants_par_generation = list(
+                a.descendances.values('profondeur')
+                .annotate(nb=Count('descendant', distinct=True))
+                .order_by('profondeur')
+            )
 
         ctx.update({
             'active_tab': tab,
@@ -461,6 +453,14 @@ class TroupeauDetailView(DetailView):
                 'gp_mp': gp_mp, 'gp_mm': gp_mm,
             },
             'enfants': enfants,
+            'descendants_par_generation': descendants_par_generation,
+            # Dernière génération en bas, une colonne par case : chaque ancêtre
+            # couvre les cases de ses propres ascendants
+            'arbre_generations': [
+                {'numero': g, 'libelle': _libelle_generation(g), 'animaux': animaux,
+                 'colspan': 2 ** (len(self.arbre) - 1 - g)}
+                for g, animaux in enumerate(self.arbre) if g
+            ],
             'fa': getattr(a, 'coefficient_consanguinite', None),
         })
         return ctx
@@ -506,62 +506,73 @@ class TroupeauDeleteView(DeleteView):
 
 class TroupeauTreeView(TemplateView):
     """
-    Vue hiérarchique (parents -> enfants).
-    - On attache l’animal sous la mère si connue, sinon sous le père.
-    - Racines = animaux sans parent connu.
-    - Aplatissage DFS pour affichage tabulaire avec indentation.
+    Vue hiérarchique (parents -> enfants), chargée niveau par niveau.
+    - On attache l’animal sous la mère si connue, sinon sous le père
+      (arbre d'affichage stocké, voir troupeau.arbre).
+    - Seules les racines sont rendues (paginées) ; les enfants d'un nœud sont
+      chargés à la demande par api_arbre_enfants.
     """
     template_name = 'troupeau/liste_tree.html'
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
 
-        qs = (Troupeau.objects
-              .select_related('pere_boucle', 'mere_boucle')
-              .only('id', 'boucle_ovin', 'sexe', 'race', 'boucle_active',
-                    'pere_boucle_id', 'mere_boucle_id'))
-
-        # parent -> enfants
-        children = {}
-        for a in qs:
-            parent_id = a.mere_boucle_id or a.pere_boucle_id
-            if parent_id:
-                children.setdefault(parent_id, []).append(a)
-
-        # Racines
-        roots = [a for a in qs if not (a.mere_boucle_id or a.pere_boucle_id)]
-
-        # DFS d’aplatissement
-        tree = []
-        visited = set()
-
-        def dfs(node, depth=0):
-            if node.id in visited:
-                return
-            visited.add(node.id)
-            tree.append({
-                'animal': node,
-                'depth': depth,
-                'indent': depth * 18,  # px d’indentation
-            })
-            for child in sorted(children.get(node.id, []),
-                                key=lambda x: (x.race or '', x.boucle_ovin or '')):
-                dfs(child, depth + 1)
-
-        for root in sorted(roots, key=lambda x: (x.race or '', x.boucle_ovin or '')):
-            dfs(root, 0)
-
-        # Stats rapides
-        ctx['stats'] = {
-            'total': qs.count(),
-            'actifs': sum(1 for a in qs if a.boucle_active),
-            'males': sum(1 for a in qs if (a.sexe or '').lower() in ('male', 'mâle')),
-            'femelles': sum(1 for a in qs if (a.sexe or '').lower() in ('femelle',)),
-        }
-        ctx['tree'] = tree
+        page = Paginator(enfants_affichage(), ARBRE_PAR_PAGE).get_page(self.request.GET.get('page'))
+        nb_enfants = compter_enfants(a.pk for a in page)
+
+        # Stats rapides (une requête)
+        ctx['stats'] = Troupeau.objects.aggregate(
+            total=Count('id'),
+            actifs=Count('id', filter=Q(boucle_active=True)),
+            males=Count('id', filter=Q(sexe__in=('male', 'mâle'))),
+            femelles=Count('id', filter=Q(sexe='femelle')),
+        )
+        ctx['tree'] = [
+            {'animal': a, 'depth': 0, 'indent': 0, 'nb_enfants': nb_enfants.get(a.pk, 0)}
+            for a in page
+        ]
+        ctx['page_obj'] = page
+        ctx['is_paginated'] = page.has_other_pages()
         return ctx
 
 
+def api_arbre_enfants(request, pk):
+    """
+    GET /api/arbre/<pk>/enfants/?page=N
+    Un niveau de l'arbre d'affichage : enfants de l'animal triés par race puis
+    boucle, paginés, avec leur propre nombre d'enfants (bouton de dépliage).
+    """
+    noeud = NoeudArbre.objects.filter(pk=pk).values('profondeur').first()
+    if noeud is None and not Troupeau.objects.filter(pk=pk).exists():
+        raise Http404("Animal introuvable")
+
+    page = Paginator(enfants_affichage(pk), ARBRE_PAR_PAGE).get_page(request.GET.get('page'))
+    nb_enfants = compter_enfants(a.pk for a in page)
+    profondeur = (noeud['profondeur'] if noeud else 0) + 1
+    return JsonResponse({
+        'ok': True,
+        'parent': pk,
+        'page': page.number,
+        'pages': page.paginator.num_pages,
+        'par_page': ARBRE_PAR_PAGE,
+        'total': page.paginator.count,
+        'enfants': [
+            {
+                'id': a.pk,
+                'boucle_ovin': a.boucle_ovin,
+                'sexe': a.get_sexe_display(),
+                'race': a.get_race_display(),
+                'boucle_active': a.boucle_active,
+                'profondeur': profondeur,
+                'nb_enfants': nb_enfants.get(a.pk, 0),
+                'url_detail': reverse('troupeau:detail', args=[a.pk]),
+                'url_modifier': reverse('troupeau:modifier', args=[a.pk]),
+            }
+            for a in page
+        ],
+    })
+
+
 # =========================
 # Vues spécialisées simples
 # =========================
@@ -636,19 +647,32 @@ def api_parents_disponibles(request):
 
 def api_genealogie(request, pk):
     """
-    GET /api/genealogie/<pk>/
-    Retourne père, mère, enfants directs.
+    GET /api/genealogie/<pk>/?generations=4
+    Retourne père, mère, l'ascendance par génération (numérotation de Sosa,
+    une requête), les enfants directs et les frères et sœurs (index en mémoire).
     """
-    a = get_object_or_404(Troupeau, pk=pk)
-    pere = a.pere_boucle
-    mere = a.mere_boucle
-    enfants_qs = Troupeau.objects.filter(Q(pere_boucle=a) | Q(mere_boucle=a)).order_by('boucle_ovin')
+    generations = request.GET.get('generations') or ''
+    generations = int(generations) if generations.isdigit() else GENERATIONS_PAR_DEFAUT
+    arbre = Troupeau.objects.arbre_genealogique(pk, generations=max(1, generations))
+    if not arbre:
+        raise Http404("Animal introuvable")
+
+    def resume(x):
+        return {'id': x.pk, 'boucle_ovin': x.boucle_ovin} if x else None
+
+    a = arbre[0][0]
+    pere, mere = arbre[1]
+    index = obtenir_index()
+    enfants = sorted((index.ligne(x) for x in index.enfants(pk)), key=lambda x: x.boucle_ovin)
+    freres_soeurs = sorted((index.ligne(x) for x in index.freres_soeurs(pk)), key=lambda x: x.boucle_ovin)
     data = {
-        'id': a.id,
+        'id': a.pk,
         'boucle_ovin': a.boucle_ovin,
-        'pere': {'id': pere.id, 'boucle_ovin': pere.boucle_ovin} if pere else None,
-        'mere': {'id': mere.id, 'boucle_ovin': mere.boucle_ovin} if mere else None,
-        'enfants': [{'id': x.id, 'boucle_ovin': x.boucle_ovin} for x in enfants_qs],
+        'pere': resume(pere),
+        'mere': resume(mere),
+        'ascendants': [[resume(x) for x in animaux] for animaux in arbre[1:]],
+        'enfants': [{'id': x.pk, 'boucle_ovin': x.boucle_ovin} for x in enfants],
+        'freres_soeurs': [{'id': x.pk, 'boucle_ovin': x.boucle_ovin} for x in freres_soeurs],
     }
     return JsonResponse(data)
 
@@ -678,15 +702,11 @@ def api_valider_boucle(request):
 def api_calculer_consanguinite(request):
     """
     GET /api/calculer-consanguinite/?pere_id=..&mere_id=..
-    Calcule un coefficient hypothétique pour ce couple.
+    Calcule un coefficient hypothétique pour ce couple (lu dans le stock de
+    parenté partagé quand il est à jour).
     """
     pere_id = request.GET.get('pere_id')
     mere_id = request.GET.get('mere_id')
-    sexe = request.GET.get('sexe', 'male')
-    race = request.GET.get('race', 'bali_bali')
-    statut = request.GET.get('statut', 'naissance')
-    origine = request.GET.get('origine_ovin', 'cotonou')
-    proprietaire = request.GET.get('proprietaire_ovin', 'miguel')
 
     if not (pere_id and mere_id and str(pere_id).isdigit() and str(mere_id).isdigit()):
         return JsonResponse({'ok': False, 'error': 'pere_id et mere_id sont requis'}, status=400)
@@ -694,23 +714,51 @@ def api_calculer_consanguinite(request):
     pere = get_object_or_404(Troupeau, pk=int(pere_id))
     mere = get_object_or_404(Troupeau, pk=int(mere_id))
 
-    temp = Troupeau(
-        pere_boucle=pere,
-        mere_boucle=mere,
-        sexe=sexe,
-        race=race,
-        statut=statut,
-        origine_ovin=origine,
-        proprietaire_ovin=proprietaire
-    )
-    try:
-        coeff = temp.coefficient_consanguinite_wright()
-    except Exception:
-        coeff = 0.0
+    coeff = coefficient_couple(pere.pk, mere.pk)
 
     return JsonResponse({'ok': True, 'coefficient': coeff})
 
 
+def api_matrice_consanguinite(request):
+    """
+    GET /api/matrice-consanguinite/?race=..&proprietaire=..&format=json|csv
+    F attendu des descendants pour tous les mâles actifs × femelles actives.
+    JSON : une ligne de coefficients par mâle, dans l'ordre de `femelles`.
+    CSV : une ligne par mâle, une colonne par femelle (séparateur ';').
+    """
+    race = request.GET.get('race') or None
+    proprietaire = request.GET.get('proprietaire') or None
+    fmt = (request.GET.get('format') or 'json').lower()
+
+    if race and race not in dict(Troupeau.RACE_CHOIX):
+        return JsonResponse({'ok': False, 'error': f'race inconnue : {race}'}, status=400)
+    if proprietaire and proprietaire not in dict(Troupeau.PROPRIETAIRE_CHOIX):
+        return JsonResponse({'ok': False, 'error': f'propriétaire inconnu : {proprietaire}'}, status=400)
+    if fmt not in ('json', 'csv'):
+        return JsonResponse({'ok': False, 'error': 'format attendu : json ou csv'}, status=400)
+
+    matrice = matrice_accouplements(race=race, proprietaire=proprietaire)
+
+    if fmt == 'csv':
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = (
+            f'attachment; filename="matrice_consanguinite_{datetime.now().date()}.csv"'
+        )
+        writer = csv.writer(response, delimiter=';')
+        writer.writerow(['Bélier / Brebis', *(boucle for _pk, boucle in matrice['femelles'])])
+        for (_pk, boucle), ligne in zip(matrice['males'], matrice['coefficients']):
+            writer.writerow([boucle, *(f"{f:.5f}".replace('.', ',') for f in ligne)])
+        return response
+
+    return JsonResponse({
+        'ok': True,
+        'version': matrice['version'],
+        'males': [{'id': pk, 'boucle_ovin': boucle} for pk, boucle in matrice['males']],
+        'femelles': [{'id': pk, 'boucle_ovin': boucle} for pk, boucle in matrice['femelles']],
+        'coefficients': matrice['coefficients'],
+    }, json_dumps_params={'separators': (',', ':')})
+
+
 # --- Pont vers l'historique (lecture seule) ---
 
 def troupeau_historique(request, pk):
@@ -720,3 +768,14 @@ def troupeau_historique(request, pk):
     """
     from historiquetroupeau.views import HistoriqueParTroupeauListView
     return HistoriqueParTroupeauListView.as_view()(request, pk=pk)
+
+
+# --- Pont vers la planification de la lutte ---
+
+def planning_saillies(request):
+    """
+    Délègue au planificateur de lutte de l'app accouplement.
+    Import local pour éviter les imports circulaires.
+    """
+    from accouplement.views import planification_saillies
+    return planification_saillies(request)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('troupeau', '0004_message_boucle_active'),
+        ('vaccination', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vaccination',
+            index=models.Index(fields=['date_vaccination', 'id'], name='vaccination_date_va_352c99_idx'),
+        ),
+    ]
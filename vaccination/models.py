@@ -45,6 +45,7 @@ class Vaccination(models.Model):
         verbose_name_plural = "Vaccinations"
         indexes = [
             models.Index(fields=['boucle_ovin', 'date_vaccination']),
+            models.Index(fields=['date_vaccination', 'id']),  # tri des listes (pagination par curseur)
         ]
 
     def clean(self):
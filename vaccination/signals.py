@@ -5,6 +5,7 @@ from django.core.exceptions import ValidationError
 import logging
 
 from .models import Vaccination
+from pahou.pagination import suivre_modifications
 from troupeau.models import Troupeau
 
 logger = logging.getLogger(__name__)
@@ -98,3 +99,7 @@ def alert_old_vaccination(sender, instance: Vaccination, created, **kwargs):
                 getattr(ovin, "boucle_ovin", str(ovin)),
                 previous.date_vaccination.isoformat(),
             )
+
+
+# Totaux en cache des listes paginées (pahou/pagination.py)
+suivre_modifications(Vaccination)
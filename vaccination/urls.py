@@ -7,6 +7,7 @@ app_name = "vaccination"
 urlpatterns = [
     path("", views.VaccinationListView.as_view(), name="vaccination_list"),
     path("dashboard/", views.vaccination_dashboard, name="vaccination_dashboard"),
+    path("export/excel/", views.export_excel, name="export_excel"),
     path("ajouter/", views.VaccinationCreateView.as_view(), name="vaccination_create"),
     path("<int:pk>/", views.VaccinationDetailView.as_view(), name="vaccination_detail"),
     path("modifier/<int:pk>/", views.VaccinationUpdateView.as_view(), name="vaccination_update"),
@@ -2,14 +2,15 @@
 from datetime import datetime
 from django.contrib import messages
 from django.core.exceptions import ValidationError
-from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
 from django.db import IntegrityError
-from django.db.models import Count, Q
+from django.db.models import Count, Max, Q
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views import View
 
 from .models import Vaccination
 from .forms import VaccinationForm
+from pahou.exports import iterer, libelles, reponse_xlsx
+from pahou.pagination import compter_en_cache, memoriser, paginer
 
 
 # ───────────────────────────
@@ -92,19 +93,15 @@ class VaccinationListView(View):
         qs = _filtered_qs(request)
 
         # Stats simples basées sur le résultat filtré
-        total = qs.count()
-        par_voie = list(qs.values("voie_administration").annotate(c=Count("id")).order_by("-c"))
-        par_type = list(qs.values("type_vaccin").annotate(c=Count("id")).order_by("-c"))
+        # (en cache jusqu'à la prochaine écriture)
+        total = compter_en_cache(qs)
+        par_voie = memoriser(qs, "par_voie", lambda: list(
+            qs.values("voie_administration").annotate(c=Count("id")).order_by("-c")))
+        par_type = memoriser(qs, "par_type", lambda: list(
+            qs.values("type_vaccin").annotate(c=Count("id")).order_by("-c")))
 
-        # Pagination (si tu ne l'utilises pas dans le template, rien ne casse)
-        page_num = request.GET.get("page", 1)
-        paginator = Paginator(qs, self.paginate_by)
-        try:
-            page_obj = paginator.page(page_num)
-        except PageNotAnInteger:
-            page_obj = paginator.page(1)
-        except EmptyPage:
-            page_obj = paginator.page(paginator.num_pages)
+        # Pagination par curseur (si tu ne l'utilises pas dans le template, rien ne casse)
+        page_obj = paginer(request, qs, self.paginate_by)
 
         ctx = {
             "vaccinations": page_obj.object_list,  # liste pour la page courante
@@ -217,3 +214,39 @@ def vaccination_dashboard(request):
         "derniers": list(qs[:20]),
     }
     return render(request, "vaccination/dashboard.html", ctx)
+
+
+# ───────────────────────────
+# Export Excel
+# ───────────────────────────
+def export_excel(request):
+    """
+    Classeur des vaccinations filtrées : une feuille des vaccinations (lue
+    par lots, boucle par jointure) et une par vaccin.
+    """
+    qs = _filtered_qs(request)
+    voie = libelles(Vaccination.VOIE_CHOICES)
+    vaccinations = (
+        [date_vaccination, boucle, type_vaccin, nom_vaccin, dose, voie(voie_administration), veterinaire,
+         (observations or "").replace("\n", " ").strip()]
+        for date_vaccination, boucle, type_vaccin, nom_vaccin, dose, voie_administration, veterinaire, observations
+        in iterer(
+            qs, "date_vaccination", "boucle_ovin__boucle_ovin", "type_vaccin", "nom_vaccin",
+            "dose_vaccin", "voie_administration", "nom_veterinaire", "observations",
+        )
+    )
+    par_vaccin = (
+        qs.order_by().values_list("nom_vaccin", "type_vaccin")
+        .annotate(c=Count("id"), derniere=Max("date_vaccination"))
+        .order_by("-c", "nom_vaccin")
+    )
+    try:
+        return reponse_xlsx(f"vaccinations_{datetime.now().date()}.xlsx", [
+            ("Vaccinations", ["Date", "Boucle", "Type de vaccin", "Nom du vaccin", "Dose (mL)",
+                              "Voie d'administration", "Vétérinaire", "Observations"], vaccinations),
+            ("Par vaccin", ["Nom du vaccin", "Type de vaccin", "Nombre", "Dernière vaccination"],
+             par_vaccin.iterator()),
+        ])
+    except ImportError:
+        messages.error(request, "La fonctionnalité Excel nécessite la librairie openpyxl")
+        return redirect("vaccination:vaccination_list")
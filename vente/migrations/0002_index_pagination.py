@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('troupeau', '0004_message_boucle_active'),
+        ('vente', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='vente',
+            name='vente_vente_date_ve_588cc6_idx',
+        ),
+        migrations.AddIndex(
+            model_name='vente',
+            index=models.Index(fields=['date_vente', 'id'], name='vente_vente_date_ve_134dbc_idx'),
+        ),
+    ]
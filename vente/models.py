@@ -63,7 +63,7 @@ class Vente(models.Model):
         verbose_name_plural = "Ventes"
         ordering = ['-date_vente']
         indexes = [
-            models.Index(fields=['date_vente']),
+            models.Index(fields=['date_vente', 'id']),  # tri des listes (pagination par curseur)
             models.Index(fields=['type_acheteur']),
             models.Index(fields=['proprietaire_ovin']),
             models.Index(fields=['boucle_ovin']),
@@ -3,6 +3,7 @@ from django.dispatch import receiver
 import logging
 
 from .models import Vente
+from pahou.pagination import suivre_modifications
 
 logger = logging.getLogger(__name__)
 
@@ -92,3 +93,7 @@ def vente_deleted(sender, instance: Vente, **kwargs):
         getattr(ovin, "boucle_ovin", ovin) if ovin else "N/A",
         instance.date_vente,
     )
+
+
+# Totaux en cache des listes paginées (pahou/pagination.py)
+suivre_modifications(Vente)
@@ -6,6 +6,7 @@ from .views import (
     VenteUpdateView,
     VenteDeleteView,
     dashboard,
+    export_excel,
 )
 
 app_name = "vente"
@@ -17,4 +18,5 @@ urlpatterns = [
     path("modifier/<int:pk>/", VenteUpdateView.as_view(), name="vente_update"),
     path("supprimer/<int:pk>/", VenteDeleteView.as_view(), name="vente_delete"),
     path("dashboard/", dashboard, name="dashboard"),
+    path("export/excel/", export_excel, name="export_excel"),
 ]
@@ -2,12 +2,15 @@ from datetime import datetime
 from decimal import Decimal
 
 from django.contrib import messages
-from django.db.models import Q, Sum, Avg, Count
+from django.db.models import Sum, Avg, Count
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views import View
 from django.views.generic import ListView, DetailView
 
 from .models import Vente
+from pahou.exports import iterer, libelles, reponse_xlsx
+from pahou.pagination import PaginationCurseurMixin, compter_en_cache, memoriser
+from recherche.moteur import rechercher
 from .forms import VenteForm
 
 
@@ -41,14 +44,6 @@ def _filtered_queryset(request):
     dfrom = _parse_date(request.GET.get("from"))
     dto = _parse_date(request.GET.get("to"))
 
-    if q:
-        qs = qs.filter(
-            Q(boucle_ovin__boucle_ovin__icontains=q)
-            | Q(type_acheteur__icontains=q)
-            | Q(proprietaire_ovin__icontains=q)
-            | Q(observations__icontains=q)
-        )
-
     if acheteur:
         qs = qs.filter(type_acheteur=acheteur)
     if proprio:
@@ -58,11 +53,14 @@ def _filtered_queryset(request):
     if dto:
         qs = qs.filter(date_vente__lte=dto)
 
-    return qs.order_by("-date_vente", "-id")
+    qs = qs.order_by("-date_vente", "-id")
+    if q:
+        qs = rechercher(qs, q)  # index plein texte, classé par pertinence
+    return qs
 
 
 # ---------- List / Detail ----------
-class VenteListView(ListView):
+class VenteListView(PaginationCurseurMixin, ListView):
     model = Vente
     template_name = "vente/liste.html"
     context_object_name = "ventes"
@@ -73,7 +71,7 @@ class VenteListView(ListView):
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        base = _filtered_queryset(self.request)
+        base = self.object_list
 
         # Filtres pour le template
         ctx["filters"] = {
@@ -84,18 +82,20 @@ class VenteListView(ListView):
             "to": self.request.GET.get("to", ""),
         }
 
-        # Stats rapides (protégées contre None)
-        ctx["total"] = base.count()
-        agg = base.aggregate(
+        # Stats rapides (protégées contre None), recalculées après une écriture
+        ctx["total"] = compter_en_cache(base)
+        agg = memoriser(base, "agg", lambda: base.aggregate(
             total_prix=Sum("prix_vente"),
             poids_moyen=Avg("poids_kg"),
-        )
+        ))
         ctx["total_prix"] = agg["total_prix"] or Decimal("0.00")
         ctx["poids_moyen"] = agg["poids_moyen"] or Decimal("0.00")
 
         # Répartitions
-        ctx["par_type"] = list(base.values("type_acheteur").annotate(c=Count("id")).order_by("-c"))
-        ctx["par_proprio"] = list(base.values("proprietaire_ovin").annotate(c=Count("id")).order_by("-c"))
+        ctx["par_type"] = memoriser(base, "par_type", lambda: list(
+            base.values("type_acheteur").annotate(c=Count("id")).order_by("-c")))
+        ctx["par_proprio"] = memoriser(base, "par_proprio", lambda: list(
+            base.values("proprietaire_ovin").annotate(c=Count("id")).order_by("-c")))
         return ctx
 
 
@@ -198,3 +198,37 @@ def dashboard(request):
         },
     }
     return render(request, "vente/dashboard.html", context)
+
+
+# ---------- Export Excel ----------
+def export_excel(request):
+    """
+    Classeur des ventes filtrées (mêmes filtres que la liste) : une feuille
+    des ventes, lue par lots avec la boucle par jointure, et une par mois.
+    """
+    qs = _filtered_queryset(request)
+    acheteur = libelles(Vente.TYPE_ACHETEUR_CHOICES)
+    proprietaire = libelles(Vente.PROPRIETAIRE_CHOICES)
+    ventes = (
+        [date_vente, boucle, poids, prix, acheteur(type_acheteur), proprietaire(proprio),
+         (observations or "").replace("\n", " ").strip()]
+        for date_vente, boucle, poids, prix, type_acheteur, proprio, observations in iterer(
+            qs, "date_vente", "boucle_ovin__boucle_ovin", "poids_kg", "prix_vente",
+            "type_acheteur", "proprietaire_ovin", "observations",
+        )
+    )
+    par_mois = (
+        qs.order_by().values_list("date_vente__year", "date_vente__month")
+        .annotate(n=Count("id"), poids=Sum("poids_kg"), total=Sum("prix_vente"))
+        .order_by("date_vente__year", "date_vente__month")
+    )
+    try:
+        return reponse_xlsx(f"ventes_{datetime.now().date()}.xlsx", [
+            ("Ventes", ["Date de vente", "Boucle", "Poids (kg)", "Prix de vente", "Type d'acheteur",
+                        "Propriétaire", "Observations"], ventes),
+            ("Par mois", ["Mois", "Nombre", "Poids total (kg)", "Total des ventes"],
+             ([f"{annee}-{mois:02d}", n, poids, total] for annee, mois, n, poids, total in par_mois.iterator())),
+        ])
+    except ImportError:
+        messages.error(request, "La fonctionnalité Excel nécessite la librairie openpyxl")
+        return redirect("vente:vente_list")